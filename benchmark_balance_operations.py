@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Balance Operations Benchmark Script
+
+This script fires thousands of concurrent dustbunny transfers between synthetic users
+and checks that the total coin supply is the same before and after. It measures how
+many transfers per second the atomic transfer script handles and, with --legacy, shows
+how many coins the old read-then-write approach creates or destroys under the same load.
+
+The benchmark writes to its own Redis database (db 15 by default) and flushes it
+before and after the run, so never point it at the database the bot uses.
+
+Usage:
+    python benchmark_balance_operations.py [--users] [--transfers] [--threads] [--balance] [--max-amount] [--db] [--legacy]
+
+Example:
+    python benchmark_balance_operations.py --users 50 --transfers 20000 --threads 32 --legacy
+"""
+
+import argparse
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import redis
+
+from module.shared_redis import REDIS_HOST, REDIS_PORT
+from module.user_repository import UserRepository, BALANCE_SECTION, BALANCE_FIELD
+
+
+def seed_users(repo, users, balance):
+    """
+    Create the synthetic users with the same starting balance.
+
+    Returns:
+        The list of usernames.
+    """
+    usernames = [f"bench_user_{i}" for i in range(users)]
+    for username in usernames:
+        repo.create_user(username)
+        repo.set_fields(username, BALANCE_SECTION, {BALANCE_FIELD: balance})
+    return usernames
+
+
+def total_supply(repo, usernames):
+    """
+    Sum the balances of all synthetic users.
+
+    Returns:
+        A tuple of (total supply, number of negative balances).
+    """
+    balances = [repo.get_field(username, BALANCE_SECTION, BALANCE_FIELD, 0) for username in usernames]
+    return sum(balances), sum(1 for balance in balances if balance < 0)
+
+
+def legacy_transfer(repo, from_username, to_username, amount):
+    """
+    Transfer the way the commands used to: read, check and write in separate calls.
+    """
+    balance = repo.get_field(from_username, BALANCE_SECTION, BALANCE_FIELD, 0)
+    if balance < amount:
+        return False
+    receiver_balance = repo.get_field(to_username, BALANCE_SECTION, BALANCE_FIELD, 0)
+    repo.set_fields(from_username, BALANCE_SECTION, {BALANCE_FIELD: balance - amount})
+    repo.set_fields(to_username, BALANCE_SECTION, {BALANCE_FIELD: receiver_balance + amount})
+    return True
+
+
+def run_benchmark(repo, usernames, transfers, threads, max_amount, legacy=False, seed=None):
+    """
+    Run the given number of random transfers from a thread pool.
+
+    Returns:
+        A dictionary containing the benchmark results.
+    """
+    rng = random.Random(seed)
+    jobs = []
+    for _ in range(transfers):
+        from_username, to_username = rng.sample(usernames, 2)
+        jobs.append((from_username, to_username, rng.randint(1, max_amount)))
+
+    def transfer(job):
+        from_username, to_username, amount = job
+        if legacy:
+            return legacy_transfer(repo, from_username, to_username, amount)
+        return repo.transfer(from_username, to_username, amount)[0]
+
+    supply_before, _ = total_supply(repo, usernames)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = list(executor.map(transfer, jobs))
+    elapsed = time.perf_counter() - start
+    supply_after, negative = total_supply(repo, usernames)
+
+    return {
+        'mode': 'legacy' if legacy else 'atomic',
+        'elapsed': elapsed,
+        'ops_per_second': transfers / elapsed if elapsed else 0,
+        'succeeded': sum(results),
+        'failed': len(results) - sum(results),
+        'supply_before': supply_before,
+        'supply_after': supply_after,
+        'negative_balances': negative
+    }
+
+
+def print_results(results):
+    """
+    Print the results of one benchmark run.
+    """
+    print(f"\n=== {results['mode']} transfers ===")
+    print(f"Elapsed time: {results['elapsed']:.2f} seconds ({results['ops_per_second']:.0f} transfers/s)")
+    print(f"Succeeded: {results['succeeded']}, rejected for insufficient funds: {results['failed']}")
+    print(f"Total supply: {results['supply_before']} -> {results['supply_after']} "
+          f"(difference {results['supply_after'] - results['supply_before']})")
+    print(f"Negative balances: {results['negative_balances']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark concurrent dustbunny transfers and check coin conservation')
+    parser.add_argument('--users', type=int, default=50, help='Number of synthetic users')
+    parser.add_argument('--transfers', type=int, default=10000, help='Number of transfers to fire')
+    parser.add_argument('--threads', type=int, default=32, help='Number of concurrent workers')
+    parser.add_argument('--balance', type=int, default=100, help='Starting balance of every user')
+    parser.add_argument('--max-amount', type=int, default=50, help='Largest single transfer')
+    parser.add_argument('--db', type=int, default=15, help='Scratch Redis database used for the benchmark')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed for reproducibility')
+    parser.add_argument('--legacy', action='store_true', help='Also run the old read-then-write transfers for comparison')
+    args = parser.parse_args()
+
+    client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=args.db,
+                         max_connections=args.threads * 2)
+    repo = UserRepository(client=client)
+
+    modes = [False, True] if args.legacy else [False]
+    conserved = True
+    for legacy in modes:
+        client.flushdb()
+        usernames = seed_users(repo, args.users, args.balance)
+        results = run_benchmark(repo, usernames, args.transfers, args.threads, args.max_amount,
+                                legacy=legacy, seed=args.seed)
+        print_results(results)
+        if not legacy:
+            conserved = (results['supply_before'] == results['supply_after']
+                         and results['negative_balances'] == 0)
+    client.flushdb()
+
+    if not conserved:
+        print("\nAtomic transfers did not conserve the coin supply!")
+        sys.exit(1)
+    print("\nAtomic transfers conserved the coin supply.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Bulk Credit Benchmark Script
+
+This script seeds a scratch Redis database with synthetic users and measures how long
+it takes to give every user dustbunnies, the way a broadcaster "!give all" does.
+It compares the SCAN + pipelined bulk credit from module.bulk_user_operations with
+the old approach of one increment round-trip per user, and checks that every user
+was credited exactly once.
+
+The benchmark writes to its own Redis database (db 15 by default) and flushes it
+before and after the run, so never point it at the database the bot uses.
+
+Usage:
+    python benchmark_bulk_credit.py [--users] [--batch-sizes] [--amount] [--db] [--legacy]
+
+Example:
+    python benchmark_bulk_credit.py --users 100000 --batch-sizes 100,1000,5000 --legacy
+"""
+
+import argparse
+import sys
+import time
+
+import redis
+
+from module.shared_redis import REDIS_HOST, REDIS_PORT
+from module.user_repository import UserRepository, BALANCE_SECTION, BALANCE_FIELD, encode_value
+from module.bulk_user_operations import credit_all_users, iter_username_batches
+
+
+def seed_users(repo, users, chunk_size=5000):
+    """
+    Create the synthetic users (profile plus balance hash) with pipelined writes.
+    """
+    for chunk_start in range(0, users, chunk_size):
+        with repo.client.pipeline(transaction=False) as pipe:
+            for i in range(chunk_start, min(chunk_start + chunk_size, users)):
+                username = f"bench_user_{i}"
+                pipe.set(repo.profile_key(username), encode_value({"name": username, "display_name": username}))
+                pipe.hset(repo.section_key(username, BALANCE_SECTION), BALANCE_FIELD, 0)
+            pipe.execute()
+
+
+def check_balances(repo, expected):
+    """
+    Count the users whose balance differs from the expected value.
+
+    Returns:
+        A tuple of (users checked, users with a wrong balance).
+    """
+    checked = wrong = 0
+    for usernames in iter_username_batches(repo):
+        with repo.client.pipeline(transaction=False) as pipe:
+            for username in usernames:
+                pipe.hget(repo.section_key(username, BALANCE_SECTION), BALANCE_FIELD)
+            balances = pipe.execute()
+        checked += len(usernames)
+        wrong += sum(1 for balance in balances if int(balance or 0) != expected)
+    return checked, wrong
+
+
+def legacy_credit(repo, amount):
+    """
+    Credit every user the way give all used to: one increment round-trip per user.
+    """
+    for username in list(repo.iter_usernames()):
+        repo.increment(username, BALANCE_SECTION, BALANCE_FIELD, amount)
+
+
+def print_progress(processed, batches):
+    """
+    Print a single progress line that is overwritten by the next one.
+    """
+    print(f"\r  {processed} users credited in {batches} batches", end="", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark crediting every user with SCAN and pipelines')
+    parser.add_argument('--users', type=int, default=100000, help='Number of synthetic users')
+    parser.add_argument('--batch-sizes', type=str, default='100,1000,5000',
+                        help='Comma-separated list of SCAN/pipeline batch sizes')
+    parser.add_argument('--amount', type=int, default=5, help='Amount given to every user per run')
+    parser.add_argument('--db', type=int, default=15, help='Scratch Redis database used for the benchmark')
+    parser.add_argument('--legacy', action='store_true', help='Also run the old one-round-trip-per-user credit')
+    args = parser.parse_args()
+
+    batch_sizes = [int(x) for x in args.batch_sizes.split(',')]
+    client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=args.db)
+    repo = UserRepository(client=client)
+
+    client.flushdb()
+    print(f"Seeding {args.users} users...")
+    start = time.perf_counter()
+    seed_users(repo, args.users)
+    print(f"Seeded in {time.perf_counter() - start:.2f} seconds")
+
+    expected = 0
+    correct = True
+    for batch_size in batch_sizes:
+        print(f"\n=== bulk credit, batch size {batch_size} ===")
+        result = credit_all_users(args.amount, repository=repo, batch_size=batch_size,
+                                  progress_callback=print_progress)
+        expected += args.amount
+        print()
+        print(f"Elapsed time: {result['elapsed']:.2f} seconds "
+              f"({result['processed'] / result['elapsed'] if result['elapsed'] else 0:.0f} users/s)")
+        print(f"Processed: {result['processed']}, failed: {result['failed']}, batches: {result['batches']}")
+        checked, wrong = check_balances(repo, expected)
+        print(f"Balances checked: {checked}, wrong: {wrong}")
+        correct = correct and checked == args.users and wrong == 0
+
+    if args.legacy:
+        print("\n=== legacy credit, one round-trip per user ===")
+        start = time.perf_counter()
+        legacy_credit(repo, args.amount)
+        elapsed = time.perf_counter() - start
+        expected += args.amount
+        print(f"Elapsed time: {elapsed:.2f} seconds ({args.users / elapsed if elapsed else 0:.0f} users/s)")
+
+    client.flushdb()
+
+    if not correct:
+        print("\nBulk credit did not credit every user exactly once!")
+        sys.exit(1)
+    print("\nBulk credit credited every user exactly once.")
+
+
+if __name__ == '__main__':
+    main()
@@ -4,13 +4,13 @@ Translate Command (AI-based, direct)
 
 This command listens for translation requests and uses the OpenAI API to translate text between English and German, then sends the result to chat/admin as appropriate.
 """
-import json
 
 from openai import OpenAI
 
-from module.message_utils import send_message_to_redis, register_exit_handler
-from module.message_utils import log_startup, log_info, log_error, log_debug
-from module.shared_redis import redis_client_env, pubsub
+from module.message_utils import send_message_to_redis
+from module.message_utils import log_info, log_error, log_debug
+from module.shared_redis import redis_client_env
+from module.command_host import run_command_loop
 
 ##########################
 # Configuration
@@ -21,13 +21,8 @@ LOG_LEVEL = "INFO"  # Use "DEBUG", "INFO", "WARNING", "ERROR", or "CRITICAL"
 ##########################
 # Initialize
 ##########################
-pubsub.subscribe('twitch.command.translate')
-pubsub.subscribe('twitch.command.tr')
+COMMAND_ALIASES = ['translate', 'tr']
 
-##########################
-# Exit Function
-##########################
-register_exit_handler()
 
 ##########################
 # Helper Functions
@@ -143,38 +138,36 @@ def handle_translate_command(message_obj):
 ##########################
 # Main
 ##########################
-log_startup("Translation command is ready and listening for '!translate'", "translate")
+def handle_command_message(message_obj):
+    """Handles one parsed command message.
 
-for message in pubsub.listen():
-    if message["type"] == "message":
-        try:
-            message_obj = json.loads(message['data'].decode('utf-8'))
-            command = message_obj.get('command', '')
-            content = message_obj.get('content', '')
-            user = message_obj.get('author', {}).get('display_name', 'Unknown')
-
-            # More detailed logging for better diagnostics
-            log_debug(f"Translation request received", "translate", {
-                "command": command,
-                "content_length": len(content),
-                "user": user
-            })
+    @param message_obj: The parsed message object from Twitch
+    """
+    try:
+        command = message_obj.get('command', '')
+        content = message_obj.get('content', '')
+        user = message_obj.get('author', {}).get('display_name', 'Unknown')
+
+        # More detailed logging for better diagnostics
+        log_debug(f"Translation request received", "translate", {
+            "command": command,
+            "content_length": len(content),
+            "user": user
+        })
 
-            # Process message
-            handle_translate_command(message_obj)
+        # Process message
+        handle_translate_command(message_obj)
 
-        except json.JSONDecodeError as je:
-            error_msg = f"JSON error in translation command: {je}"
-            print(error_msg)
-            log_error(error_msg, "translate", {
-                "error": str(je),
-                "data": message.get('data', 'N/A')
-            })
-        except Exception as e:
-            error_msg = f"Unexpected error in translation command: {str(e)}"
-            print(error_msg)
-            log_error(error_msg, "translate", {
-                "error": str(e),
-                "traceback": str(e.__traceback__),
-                "message_data": str(message.get('data', 'N/A'))
-            })
+    except Exception as e:
+        error_msg = f"Unexpected error in translation command: {str(e)}"
+        print(error_msg)
+        log_error(error_msg, "translate", {
+            "error": str(e),
+            "traceback": str(e.__traceback__),
+            "message_data": str(message_obj)
+        })
+
+
+if __name__ == "__main__":
+    run_command_loop(COMMAND_ALIASES, handle_command_message, "translate",
+                     "Translation command is ready and listening for '!translate'")
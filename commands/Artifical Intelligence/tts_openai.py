@@ -4,14 +4,14 @@ TTS Command (OpenAI-based, direct to VBAN   )
 
 This command listens for TTS requests and uses OpenAI's TTS API to generate speech from text, then sends the audio to the appropriate output (e.g., VBAN/OBS or other configured system).
 """
-import json
 
 from openai import OpenAI
 
-from module.message_utils import send_message_to_redis, register_exit_handler
-from module.message_utils import log_startup, log_info, log_error, log_debug
+from module.message_utils import send_message_to_redis
+from module.message_utils import log_info, log_error, log_debug
 from module.shared_obs import send_text_to_voice
-from module.shared_redis import redis_client_env, pubsub
+from module.shared_redis import redis_client_env
+from module.command_host import run_command_loop
 
 ##########################
 # Configuration
@@ -22,12 +22,8 @@ LOG_LEVEL = "INFO"  # Use "DEBUG", "INFO", "WARNING", "ERROR", or "CRITICAL"
 ##########################
 # Initialize
 ##########################
-pubsub.subscribe('twitch.command.tts')
+COMMAND_ALIASES = ['tts']
 
-##########################
-# Exit Function
-##########################
-register_exit_handler()
 
 ##########################
 # Helper Functions
@@ -119,35 +115,33 @@ def handle_tts_command(message_obj):
 ##########################
 # Main
 ##########################
-log_startup("TTS command is ready to be used", "tts")
+def handle_command_message(message_obj):
+    """Handles one parsed command message.
 
-for message in pubsub.listen():
-    if message["type"] == "message":
-        try:
-            message_obj = json.loads(message['data'].decode('utf-8'))
-            command = message_obj.get('command', '')
-            content = message_obj.get('content', '')
-            user = message_obj.get('author', {}).get('display_name', 'Unknown')
-
-            log_debug(f"TTS request received", "tts", {
-                "command": command,
-                "content_length": len(content),
-                "user": user
-            })
-
-            handle_tts_command(message_obj)
-        except json.JSONDecodeError as je:
-            error_msg = f"JSON error in TTS command: {je}"
-            print(error_msg)
-            log_error(error_msg, "tts", {
-                "error": str(je),
-                "data": message.get('data', 'N/A')
-            })
-        except Exception as e:
-            error_msg = f"Unexpected error in TTS command: {str(e)}"
-            print(error_msg)
-            log_error(error_msg, "tts", {
-                "error": str(e),
-                "traceback": str(e.__traceback__),
-                "message_data": str(message.get('data', 'N/A'))
-            })
+    @param message_obj: The parsed message object from Twitch
+    """
+    try:
+        command = message_obj.get('command', '')
+        content = message_obj.get('content', '')
+        user = message_obj.get('author', {}).get('display_name', 'Unknown')
+
+        log_debug(f"TTS request received", "tts", {
+            "command": command,
+            "content_length": len(content),
+            "user": user
+        })
+
+        handle_tts_command(message_obj)
+    except Exception as e:
+        error_msg = f"Unexpected error in TTS command: {str(e)}"
+        print(error_msg)
+        log_error(error_msg, "tts", {
+            "error": str(e),
+            "traceback": str(e.__traceback__),
+            "message_data": str(message_obj)
+        })
+
+
+if __name__ == "__main__":
+    run_command_loop(COMMAND_ALIASES, handle_command_message, "tts",
+                     "TTS command is ready to be used")
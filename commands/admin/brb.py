@@ -1,9 +1,9 @@
-import json
-
-from module.shared_redis import redis_client, pubsub
-from module.shared_obs import send_text_to_voice, get_obs_client
-from module.message_utils import send_message_to_redis, register_exit_handler
-from module.message_utils import log_startup, log_info, log_error, log_debug
+from module.shared_redis import redis_client
+from module.shared_obs import send_text_to_voice, get_obs_client, obs_connection
+from module.obs_batch import ObsRequestBatch, ObsBatchError, failed_results, response_data
+from module.message_utils import send_message_to_redis
+from module.message_utils import log_info, log_error, log_debug
+from module.command_host import run_command_loop
 
 ##########################
 # Configuration
@@ -14,14 +14,10 @@ LOG_LEVEL = "INFO"  # Use "DEBUG", "INFO", "WARNING", "ERROR", or "CRITICAL"
 ##########################
 # Initialize
 ##########################
-pubsub.subscribe('twitch.command.brb')
-pubsub.subscribe('twitch.command.pause')
-pubsub.subscribe('twitch.command.break')
+COMMAND_ALIASES = ['brb', 'pause', 'break']
 
-##########################
-# Exit Function
-##########################
-register_exit_handler()
+# Connect to OBS in the background so the first command finds it ready
+obs_connection.start()
 
 
 ##########################
@@ -38,8 +34,15 @@ def enable_scene():
 
     scene_name = "Scene BRB"
     try:
-        current_scene = obs_client.get_current_program_scene().current_program_scene_name
-        obs_client.set_current_program_scene(scene_name)
+        # Read the current scene and switch away from it in one round-trip
+        batch = ObsRequestBatch(halt_on_failure=True)
+        batch.add("GetCurrentProgramScene")
+        batch.add("SetCurrentProgramScene", {"sceneName": scene_name})
+        results = batch.send(obs_client)
+        failed = failed_results(results)
+        if failed:
+            raise ObsBatchError(failed[0]["requestStatus"].get("comment"))
+        current_scene = response_data(results[0])["currentProgramSceneName"]
         log_info(f"Changed scene from {current_scene} to {scene_name}", "brb")
         return current_scene
     except Exception as e:
@@ -61,42 +64,47 @@ def mute_mic():
 ##########################
 # Main
 ##########################
-log_startup("BRB Command is ready to be used", "brb")
-
-for message in pubsub.listen():
-    if message["type"] == "message":
-        try:
-            message_obj = json.loads(message['data'].decode('utf-8'))
-            command = message_obj.get('command')
-            content = message_obj.get('content')
-            print(f"Chat Command: {command} and Message: {content}")
-
-            if not message_obj["author"]["broadcaster"]:
-                log_info("Non-broadcaster attempted to use BRB command", "brb", {
-                    "user": message_obj["author"].get("display_name", "Unknown")
-                })
-                send_message_to_redis('🚨 Only the broadcaster can use this command 🚨')
-                continue
-
-            time_till_timeout = int(content.split()[1]) if len(content.split()) > 1 else 10
-            log_info(f"BRB activated for {time_till_timeout} minutes", "brb", {
-                "user": message_obj["author"].get("display_name", "Unknown"),
-                "timeout": time_till_timeout
-            })
+def handle_command_message(message_obj):
+    """Handles one parsed command message.
+
+    @param message_obj: The parsed message object from Twitch
+    """
+    try:
+        command = message_obj.get('command')
+        content = message_obj.get('content')
+        print(f"Chat Command: {command} and Message: {content}")
 
-            send_message_to_redis(
-                f"I'll be back in {time_till_timeout} minutes 🐰🐻! Meanwhile, have fun playing Suika 🍉🍉🍉.")
-            send_message_to_redis(
-                ' Play it by typing !suika <minutes> to start it. 🍉🍉🍉')
-
-            save_scene = enable_scene()
-            redis_client.set("last_scene_brb", save_scene)
-            mute_mic()
-        except Exception as e:
-            error_msg = f"Error processing BRB command: {e}"
-            print(error_msg)
-            log_error(error_msg, "brb", {
-                "error": str(e),
-                "traceback": str(e.__traceback__),
-                "message_data": str(message.get('data', 'N/A'))
+        if not message_obj["author"]["broadcaster"]:
+            log_info("Non-broadcaster attempted to use BRB command", "brb", {
+                "user": message_obj["author"].get("display_name", "Unknown")
             })
+            send_message_to_redis('🚨 Only the broadcaster can use this command 🚨')
+            return
+
+        time_till_timeout = int(content.split()[1]) if len(content.split()) > 1 else 10
+        log_info(f"BRB activated for {time_till_timeout} minutes", "brb", {
+            "user": message_obj["author"].get("display_name", "Unknown"),
+            "timeout": time_till_timeout
+        })
+
+        send_message_to_redis(
+            f"I'll be back in {time_till_timeout} minutes 🐰🐻! Meanwhile, have fun playing Suika 🍉🍉🍉.")
+        send_message_to_redis(
+            ' Play it by typing !suika <minutes> to start it. 🍉🍉🍉')
+
+        save_scene = enable_scene()
+        redis_client.set("last_scene_brb", save_scene)
+        mute_mic()
+    except Exception as e:
+        error_msg = f"Error processing BRB command: {e}"
+        print(error_msg)
+        log_error(error_msg, "brb", {
+            "error": str(e),
+            "traceback": str(e.__traceback__),
+            "message_data": str(message_obj)
+        })
+
+
+if __name__ == "__main__":
+    run_command_loop(COMMAND_ALIASES, handle_command_message, "brb",
+                     "BRB Command is ready to be used")
@@ -1,8 +1,6 @@
-import json
-
-from module.message_utils import send_message_to_redis, register_exit_handler
-from module.message_utils import log_startup, log_info, log_error
-from module.shared_redis import pubsub
+from module.message_utils import send_message_to_redis
+from module.message_utils import log_info, log_error
+from module.command_host import run_command_loop
 
 ##########################
 # Configuration
@@ -14,14 +12,8 @@ LOG_LEVEL = "INFO"  # Use "DEBUG", "INFO", "WARNING", "ERROR", or "CRITICAL"
 # Initialize
 ##########################
 
-pubsub.subscribe('twitch.command.discord')
-
+COMMAND_ALIASES = ['discord']
 
-##########################
-# Exit Function
-##########################
-# Register SIGINT handler
-register_exit_handler()
 
 ##########################
 # Helper Functions
@@ -31,31 +23,36 @@ register_exit_handler()
 ##########################
 # Main
 ##########################
-log_startup("Discord command is running", "discord")
-
-for message in pubsub.listen():
-    if message["type"] == "message":
-        try:
-            message_obj = json.loads(message['data'].decode('utf-8'))
-            command = message_obj.get('command')
-            content = message_obj.get('content')
-            user = message_obj["author"].get("display_name", "Unknown")
-
-            print(f"Chat Command: {command} and Message: {content}")
-            log_info(f"Received discord command from {user}", "discord")
-
-            if not message_obj["author"]["moderator"]:
-                log_info(f"Non-moderator {user} attempted to use discord command", "discord")
-                send_message_to_redis('🚨 Only moderators can use this command 🚨')
-                continue
-
-            log_info(f"Sending discord link to chat", "discord")
-            send_message_to_redis('Join the discord server at https://discord.gg/dPdWbv8xrj')
-        except Exception as e:
-            error_msg = f"Error processing discord command: {e}"
-            print(error_msg)
-            log_error(error_msg, "discord", {
-                "error": str(e),
-                "traceback": str(e.__traceback__),
-                "message_data": str(message.get('data', 'N/A'))
-            })
+def handle_command_message(message_obj):
+    """Handles one parsed command message.
+
+    @param message_obj: The parsed message object from Twitch
+    """
+    try:
+        command = message_obj.get('command')
+        content = message_obj.get('content')
+        user = message_obj["author"].get("display_name", "Unknown")
+
+        print(f"Chat Command: {command} and Message: {content}")
+        log_info(f"Received discord command from {user}", "discord")
+
+        if not message_obj["author"]["moderator"]:
+            log_info(f"Non-moderator {user} attempted to use discord command", "discord")
+            send_message_to_redis('🚨 Only moderators can use this command 🚨')
+            return
+
+        log_info(f"Sending discord link to chat", "discord")
+        send_message_to_redis('Join the discord server at https://discord.gg/dPdWbv8xrj')
+    except Exception as e:
+        error_msg = f"Error processing discord command: {e}"
+        print(error_msg)
+        log_error(error_msg, "discord", {
+            "error": str(e),
+            "traceback": str(e.__traceback__),
+            "message_data": str(message_obj)
+        })
+
+
+if __name__ == "__main__":
+    run_command_loop(COMMAND_ALIASES, handle_command_message, "discord",
+                     "Discord command is running")
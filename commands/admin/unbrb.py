@@ -1,9 +1,9 @@
-import json
-
-from module.message_utils import send_message_to_redis, register_exit_handler
-from module.message_utils import log_startup, log_info, log_error, log_debug
-from module.shared_obs import send_text_to_voice, get_obs_client
-from module.shared_redis import redis_client, pubsub
+from module.message_utils import send_message_to_redis
+from module.message_utils import log_info, log_error, log_debug
+from module.shared_obs import send_text_to_voice, get_obs_client, obs_connection
+from module.obs_batch import ObsRequestBatch, ObsBatchError, failed_results, response_data
+from module.shared_redis import redis_client
+from module.command_host import run_command_loop
 
 ##########################
 # Configuration
@@ -15,10 +15,11 @@ LOG_LEVEL = "INFO"  # Use "DEBUG", "INFO", "WARNING", "ERROR", or "CRITICAL"
 # Initialize
 ##########################
 
-pubsub.subscribe('twitch.command.unbrb')
+COMMAND_ALIASES = ['unbrb']
+
+# Connect to OBS in the background so the first command finds it ready
+obs_connection.start()
 
-# Register SIGINT handler
-register_exit_handler()
 
 ##########################
 # Helper Functions
@@ -42,8 +43,15 @@ def enable_scene():
         return
 
     try:
-        current_scene = obs_client.get_current_program_scene().current_program_scene_name
-        obs_client.set_current_program_scene(scene_name)
+        # Read the current scene and switch away from it in one round-trip
+        batch = ObsRequestBatch(halt_on_failure=True)
+        batch.add("GetCurrentProgramScene")
+        batch.add("SetCurrentProgramScene", {"sceneName": scene_name})
+        results = batch.send(obs_client)
+        failed = failed_results(results)
+        if failed:
+            raise ObsBatchError(failed[0]["requestStatus"].get("comment"))
+        current_scene = response_data(results[0])["currentProgramSceneName"]
         log_info(f"Changed scene from {current_scene} to {scene_name}", "unbrb")
     except Exception as e:
         error_msg = f"Error changing scene: {e}"
@@ -62,32 +70,37 @@ def unmute_mic():
 ##########################
 # Main
 ##########################
-log_startup("UnBRB Command is now active", "unbrb")
-
-for message in pubsub.listen():
-    if message["type"] == "message":
-        try:
-            message_obj = json.loads(message['data'].decode('utf-8'))
-            command = message_obj.get('command')
-            content = message_obj.get('content')
-            user = message_obj["author"].get("display_name", "Unknown")
-
-            print(f"Chat Command: {command} and Message: {content}")
-            log_info(f"Received unbrb command from {user}", "unbrb")
-
-            if not message_obj["author"]["broadcaster"]:
-                log_info(f"Non-broadcaster {user} attempted to use unbrb command", "unbrb")
-                send_message_to_redis('🚨 Only the broadcaster can use this command 🚨')
-                continue
-
-            log_info("Returning from BRB mode", "unbrb")
-            enable_scene()
-            unmute_mic()
-        except Exception as e:
-            error_msg = f"Error processing unbrb command: {e}"
-            print(error_msg)
-            log_error(error_msg, "unbrb", {
-                "error": str(e),
-                "traceback": str(e.__traceback__),
-                "message_data": str(message.get('data', 'N/A'))
-            })
+def handle_command_message(message_obj):
+    """Handles one parsed command message.
+
+    @param message_obj: The parsed message object from Twitch
+    """
+    try:
+        command = message_obj.get('command')
+        content = message_obj.get('content')
+        user = message_obj["author"].get("display_name", "Unknown")
+
+        print(f"Chat Command: {command} and Message: {content}")
+        log_info(f"Received unbrb command from {user}", "unbrb")
+
+        if not message_obj["author"]["broadcaster"]:
+            log_info(f"Non-broadcaster {user} attempted to use unbrb command", "unbrb")
+            send_message_to_redis('🚨 Only the broadcaster can use this command 🚨')
+            return
+
+        log_info("Returning from BRB mode", "unbrb")
+        enable_scene()
+        unmute_mic()
+    except Exception as e:
+        error_msg = f"Error processing unbrb command: {e}"
+        print(error_msg)
+        log_error(error_msg, "unbrb", {
+            "error": str(e),
+            "traceback": str(e.__traceback__),
+            "message_data": str(message_obj)
+        })
+
+
+if __name__ == "__main__":
+    run_command_loop(COMMAND_ALIASES, handle_command_message, "unbrb",
+                     "UnBRB Command is now active")
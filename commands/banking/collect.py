@@ -1,10 +1,11 @@
-import json
 from datetime import datetime
 
-from module.shared_redis import redis_client, pubsub
+from module.shared_redis import redis_client
+from module.user_repository import user_repository
 
-from module.message_utils import send_message_to_redis, register_exit_handler
-from module.message_utils import log_startup, log_info, log_error, log_debug
+from module.message_utils import send_message_to_redis
+from module.message_utils import log_info, log_error, log_debug
+from module.command_host import run_command_loop
 
 ##########################
 # Configuration
@@ -17,14 +18,8 @@ LOG_LEVEL = "INFO"  # Use "DEBUG", "INFO", "WARNING", "ERROR", or "CRITICAL"
 ##########################
 redis_client.set("daily_interest_rate", 0.02)
 daily_interest_rate = float(redis_client.get("daily_interest_rate"))
-pubsub.subscribe('twitch.command.collect')
-pubsub.subscribe('twitch.command.interest')
+COMMAND_ALIASES = ['collect', 'interest']
 
-##########################
-# Exit Function
-##########################
-# Register SIGINT handler
-register_exit_handler()
 
 ##########################
 # Helper Functions
@@ -98,27 +93,25 @@ def mod_collect_for_user(user_that_collects, target_user):
 
         # Remove @ if present
         target_user_lower = target_user.lower().replace("@", "")
-        user_key = f"user:{target_user_lower}"
 
         log_info(f"Moderator {mod_username} attempting to collect for {target_user}", "collect")
 
-        if not redis_client.exists(user_key):
+        if not user_repository.exists(target_user_lower):
             log_info(f"User {target_user} does not exist or has no bank account", "collect")
             send_message_to_redis(f"{user_that_collects['mention']} the user {target_user} does not exist or has no bank account")
             return
 
-        user_json = redis_client.get(user_key)
-        user_data = json.loads(user_json)
+        banking = user_repository.get_fields(target_user_lower, "banking", ["bunnies_invested", "timestamp_investment"])
 
         # Check if user has invested
-        if "banking" not in user_data or user_data["banking"].get("bunnies_invested", 0) == 0:
+        if banking.get("bunnies_invested", 0) == 0:
             log_info(f"User {target_user} has not invested any points yet", "collect")
             send_message_to_redis(f"{user_that_collects['mention']} the user {target_user} has not invested any points yet")
             return
 
         # Calculate actual days since investment
         current_time = datetime.now(tz=None)
-        timestamp = datetime.fromisoformat(user_data["banking"]["timestamp_investment"])
+        timestamp = datetime.fromisoformat(banking["timestamp_investment"])
         days_since_investment = (current_time - timestamp).days
 
         log_debug(f"Days since investment for {target_user}: {days_since_investment}", "collect")
@@ -137,10 +130,8 @@ def mod_collect_for_user(user_that_collects, target_user):
         # Collect interest with the determined days
         collect_interest_for_user(target_user_obj, force_days)
 
-        # Get the user data again to see if interest was collected
-        user_json = redis_client.get(user_key)
-        user_data = json.loads(user_json)
-        interest_collected = user_data.get("banking", {}).get("last_interest_collected", 0)
+        # Read the result back to see if interest was collected
+        interest_collected = user_repository.get_field(target_user_lower, "banking", "last_interest_collected", 0)
 
         if interest_collected > 0:
             log_info(f"Moderator {mod_username} collected {interest_collected} points for {target_user}", "collect")
@@ -164,20 +155,16 @@ def force_collect_for_user(user_that_forces, target_user, days):
 
         # Remove @ if present
         target_user_lower = target_user.lower().replace("@", "")
-        user_key = f"user:{target_user_lower}"
 
         log_info(f"Broadcaster {broadcaster_username} forcing collect for {target_user} with {days} days", "collect")
 
-        if not redis_client.exists(user_key):
+        if not user_repository.exists(target_user_lower):
             log_info(f"User {target_user} does not exist or has no bank account", "collect")
             send_message_to_redis(f"{user_that_forces['mention']} the user {target_user} does not exist or has no bank account")
             return
 
-        user_json = redis_client.get(user_key)
-        user_data = json.loads(user_json)
-
         # Check if user has invested (optional, as we'll check in collect_interest_for_user too)
-        if "banking" not in user_data or user_data["banking"].get("bunnies_invested", 0) == 0:
+        if user_repository.get_field(target_user_lower, "banking", "bunnies_invested", 0) == 0:
             log_info(f"User {target_user} has not invested any points yet", "collect")
             send_message_to_redis(f"{user_that_forces['mention']} the user {target_user} has not invested any points yet")
             return
@@ -194,10 +181,8 @@ def force_collect_for_user(user_that_forces, target_user, days):
         # Force collect with specified days
         collect_interest_for_user(target_user_obj, days)
 
-        # Get the user data again to see if interest was collected
-        user_json = redis_client.get(user_key)
-        user_data = json.loads(user_json)
-        interest_collected = user_data.get("banking", {}).get("last_interest_collected", 0)
+        # Read the result back to see if interest was collected
+        interest_collected = user_repository.get_field(target_user_lower, "banking", "last_interest_collected", 0)
 
         if interest_collected > 0:
             log_info(f"Broadcaster {broadcaster_username} forced collect for {target_user}: {interest_collected} points", "collect", {
@@ -223,22 +208,13 @@ def collect_interest_for_user(user_obj, force_days=None):
     try:
         username = user_obj.get('mention', user_obj['name'])
         username_lower = user_obj['name'].lower()
-        user_key = f"user:{username_lower}"
 
         log_debug(f"Collecting interest for {username}", "collect", {
             "force_days": force_days
         })
 
-        if redis_client.exists(user_key):
-            user_json = redis_client.get(user_key)
-            user_data = json.loads(user_json)
-
-            # Ensure banking sub-object exists
-            if "banking" not in user_data:
-                log_debug(f"Creating banking object for {username}", "collect")
-                user_data["banking"] = {}
-
-            banking = user_data["banking"]
+        if user_repository.exists(username_lower):
+            banking = user_repository.get_section(username_lower, "banking")
 
             # Set defaults if missing (only banking-specific fields)
             banking.setdefault("bunnies_invested", 0)
@@ -246,57 +222,47 @@ def collect_interest_for_user(user_obj, force_days=None):
             banking.setdefault("total_bunnies_collected", 0)
             banking.setdefault("last_interest_collected", 0)
             banking.setdefault("mention", user_obj.get("mention", user_obj["name"]))
+            previous_total = banking["total_bunnies_collected"]
 
             # Calculate interest
             updated_banking = calculate_interest(banking, force_days)
-            user_data["banking"] = updated_banking
+            interest_collected = updated_banking["total_bunnies_collected"] - previous_total
 
-            # Add the collected interest to dustbunnies
-            interest_collected = updated_banking.get("last_interest_collected", 0)
+            # Interest is added as increments so a concurrent invest or give is not overwritten
+            increments = {"banking": {"bunnies_invested": 0, "total_bunnies_collected": interest_collected}}
             if interest_collected > 0:
                 log_info(f"User {username} collected {interest_collected} points of interest", "collect", {
                     "interest": interest_collected,
-                    "total_collected": updated_banking.get("total_bunnies_collected", 0)
+                    "total_collected": updated_banking["total_bunnies_collected"]
                 })
 
-                # Ensure dustbunnies sub-object exists
-                if "dustbunnies" not in user_data:
-                    user_data["dustbunnies"] = {}
-
                 # Add the interest to collected_dustbunnies
-                previous_dustbunnies = user_data["dustbunnies"].get("collected_dustbunnies", 0)
-                user_data["dustbunnies"]["collected_dustbunnies"] = previous_dustbunnies + interest_collected
+                increments["dustbunnies"] = {"collected_dustbunnies": interest_collected}
+
+            updated = user_repository.update(username_lower, increments=increments, fields={"banking": {
+                "timestamp_investment": updated_banking["timestamp_investment"],
+                "last_interest_collected": updated_banking["last_interest_collected"]
+            }})
 
+            if interest_collected > 0:
                 log_debug(f"Updated dustbunnies for {username}", "collect", {
-                    "previous": previous_dustbunnies,
+                    "previous": updated["dustbunnies"]["collected_dustbunnies"] - interest_collected,
                     "added": interest_collected,
-                    "new_total": user_data["dustbunnies"]["collected_dustbunnies"]
+                    "new_total": updated["dustbunnies"]["collected_dustbunnies"]
                 })
-
-            redis_client.set(user_key, json.dumps(user_data))
-
-            if interest_collected > 0:
                 send_message_to_redis(f"{user_obj['mention']} you have collected {interest_collected} points from interest")
         else:
-            # Create new user JSON if not exists
+            # Create new user if not exists
             log_info(f"Creating new user account for {username}", "collect")
 
-            user_data = {
-                "name": user_obj["name"],
-                "display_name": user_obj.get("display_name", user_obj["name"]),
-                "chat": {"count": 0},
-                "command": {"count": 0},
-                "admin": {"count": 0},
-                "dustbunnies": {},
-                "banking": {
-                    "bunnies_invested": 0,
-                    "timestamp_investment": datetime.now().isoformat(),
-                    "total_bunnies_collected": 0,
-                    "last_interest_collected": 0,
-                    "mention": user_obj.get("mention", user_obj["name"])
-                }
-            }
-            redis_client.set(user_key, json.dumps(user_data))
+            user_repository.update(username_lower,
+                                   increments={"banking": {
+                                       "bunnies_invested": 0,
+                                       "total_bunnies_collected": 0,
+                                       "last_interest_collected": 0
+                                   }},
+                                   fields={"banking": {"timestamp_investment": datetime.now().isoformat()}},
+                                   display_name=user_obj.get("display_name", user_obj["name"]))
             send_message_to_redis(f"{user_obj['mention']} you did not open a bank account yet use !invest to open one")
     except Exception as e:
         error_msg = f"Error collecting interest for user: {e}"
@@ -310,73 +276,71 @@ def collect_interest_for_user(user_obj, force_days=None):
 ##########################
 # Main
 ##########################
-log_startup("Collect command is ready to be used", "collect")
-
-for message in pubsub.listen():
-    if message["type"] == "message":
-        try:
-            message_obj = json.loads(message['data'].decode('utf-8'))
-            command = message_obj.get('command')
-            content = message_obj.get('content')
-            user = message_obj["author"].get("display_name", "Unknown")
-
-            print(f"Chat Command: {command} and Message: {content}")
-            log_info(f"Received collect command from {user}", "collect", {
-                "command": command,
-                "content": content
-            })
+def handle_command_message(message_obj):
+    """Handles one parsed command message.
+
+    @param message_obj: The parsed message object from Twitch
+    """
+    try:
+        command = message_obj.get('command')
+        content = message_obj.get('content')
+        user = message_obj["author"].get("display_name", "Unknown")
+
+        print(f"Chat Command: {command} and Message: {content}")
+        log_info(f"Received collect command from {user}", "collect", {
+            "command": command,
+            "content": content
+        })
 
-            msg_content = message_obj["content"]
-            msg_parts = msg_content.split()
-
-            # Check if this is a broadcaster or mod collecting for someone else
-            if len(msg_parts) > 1 and (message_obj["author"]["broadcaster"] or message_obj["author"]["moderator"]):
-                target_user = msg_parts[1]
-
-                # Check if user starts with @ because we need the username
-                if not target_user.startswith("@"):
-                    log_info(f"User {user} provided invalid target format", "collect")
-                    send_message_to_redis(f"{message_obj['author']['mention']} you need to use the @username to collect for someone")
-                    continue
-
-                # Different behavior for broadcasters and mods
-                if message_obj["author"]["broadcaster"]:
-                    # Broadcaster can specify days or default to 1
-                    if len(msg_parts) > 2:
-                        try:
-                            days = int(msg_parts[2])
-                            log_debug(f"Broadcaster {user} specified {days} days for {target_user}", "collect")
-                        except ValueError:
-                            log_info(f"Broadcaster {user} provided invalid days value", "collect")
-                            send_message_to_redis(f"{message_obj['author']['mention']} the days must be a number")
-                            continue
-                    else:
-                        # Default to 1 day if not specified
-                        days = 1
-                        log_debug(f"Using default 1 day for {target_user}", "collect")
-
-                    # Force collect for the user with specified days
-                    force_collect_for_user(message_obj["author"], target_user, days)
+        msg_content = message_obj["content"]
+        msg_parts = msg_content.split()
+
+        # Check if this is a broadcaster or mod collecting for someone else
+        if len(msg_parts) > 1 and (message_obj["author"]["broadcaster"] or message_obj["author"]["moderator"]):
+            target_user = msg_parts[1]
+
+            # Check if user starts with @ because we need the username
+            if not target_user.startswith("@"):
+                log_info(f"User {user} provided invalid target format", "collect")
+                send_message_to_redis(f"{message_obj['author']['mention']} you need to use the @username to collect for someone")
+                return
+
+            # Different behavior for broadcasters and mods
+            if message_obj["author"]["broadcaster"]:
+                # Broadcaster can specify days or default to 1
+                if len(msg_parts) > 2:
+                    try:
+                        days = int(msg_parts[2])
+                        log_debug(f"Broadcaster {user} specified {days} days for {target_user}", "collect")
+                    except ValueError:
+                        log_info(f"Broadcaster {user} provided invalid days value", "collect")
+                        send_message_to_redis(f"{message_obj['author']['mention']} the days must be a number")
+                        return
                 else:
-                    # For mods, we need to check the actual time
-                    log_info(f"Moderator {user} collecting for {target_user}", "collect")
-                    mod_collect_for_user(message_obj["author"], target_user)
+                    # Default to 1 day if not specified
+                    days = 1
+                    log_debug(f"Using default 1 day for {target_user}", "collect")
+
+                # Force collect for the user with specified days
+                force_collect_for_user(message_obj["author"], target_user, days)
             else:
-                # Regular collect for self
-                log_info(f"User {user} collecting interest for self", "collect")
-                collect_interest_for_user(message_obj["author"])
-        except json.JSONDecodeError as je:
-            error_msg = f"JSON error in collect command: {je}"
-            print(error_msg)
-            log_error(error_msg, "collect", {
-                "error": str(je),
-                "data": message.get('data', 'N/A')
-            })
-        except Exception as e:
-            error_msg = f"Unexpected error in collect command: {str(e)}"
-            print(error_msg)
-            log_error(error_msg, "collect", {
-                "error": str(e),
-                "traceback": str(e.__traceback__),
-                "message_data": str(message.get('data', 'N/A'))
-            })
+                # For mods, we need to check the actual time
+                log_info(f"Moderator {user} collecting for {target_user}", "collect")
+                mod_collect_for_user(message_obj["author"], target_user)
+        else:
+            # Regular collect for self
+            log_info(f"User {user} collecting interest for self", "collect")
+            collect_interest_for_user(message_obj["author"])
+    except Exception as e:
+        error_msg = f"Unexpected error in collect command: {str(e)}"
+        print(error_msg)
+        log_error(error_msg, "collect", {
+            "error": str(e),
+            "traceback": str(e.__traceback__),
+            "message_data": str(message_obj)
+        })
+
+
+if __name__ == "__main__":
+    run_command_loop(COMMAND_ALIASES, handle_command_message, "collect",
+                     "Collect command is ready to be used")
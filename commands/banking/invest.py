@@ -1,11 +1,11 @@
-import json
 import time
 from datetime import datetime
 
-from module.shared_redis import redis_client, pubsub
+from module.user_repository import user_repository
 
-from module.message_utils import send_message_to_redis, register_exit_handler
-from module.message_utils import log_startup, log_info, log_error, log_debug
+from module.message_utils import send_message_to_redis
+from module.message_utils import log_info, log_error, log_debug
+from module.command_host import run_command_loop
 
 ##########################
 # Configuration
@@ -17,19 +17,8 @@ LOG_LEVEL = "INFO"  # Use "DEBUG", "INFO", "WARNING", "ERROR", or "CRITICAL"
 # Initialize
 ##########################
 
-pubsub.subscribe('twitch.command.invest')
-pubsub.subscribe('twitch.command.investment')
-pubsub.subscribe('twitch.command.investing')
-pubsub.subscribe('twitch.command.bank')
-pubsub.subscribe('twitch.command.banking')
-pubsub.subscribe('twitch.command.investments')
-pubsub.subscribe('twitch.command.deposit')
+COMMAND_ALIASES = ['invest', 'investment', 'investing', 'bank', 'banking', 'investments', 'deposit']
 
-##########################
-# Exit Function
-##########################
-# Register SIGINT handler
-register_exit_handler()
 
 ##########################
 # Helper Functions
@@ -49,7 +38,6 @@ def invest_money_as_mod(user_that_invests, receiving_user, invest_amount):
     try:
         investor_name = user_that_invests.get('display_name', 'Unknown')
         user_that_receiving_lower = receiving_user.lower().replace("@", "")
-        user_key = f"user:{user_that_receiving_lower}"
 
         log_debug(f"Mod {investor_name} investing {invest_amount} for {receiving_user}", "invest", {
             "investor": investor_name,
@@ -57,60 +45,27 @@ def invest_money_as_mod(user_that_invests, receiving_user, invest_amount):
             "amount": invest_amount
         })
 
-        if redis_client.exists(user_key):
-            user_json = redis_client.get(user_key)
-            user_obj = json.loads(user_json)
-            log_debug(f"Found existing user {user_that_receiving_lower}", "invest")
-        else:
-            # create new user if not exists
-            log_info(f"Creating new user account for {user_that_receiving_lower}", "invest")
-            user_obj = {
-                "name": user_that_receiving_lower,
-                "display_name": receiving_user.replace("@", ""),
-                "chat": {"count": 0},
-                "command": {"count": 0},
-                "admin": {"count": 0},
-                "dustbunnies": {},
-                "banking": {}
-            }
-
-        if "banking" not in user_obj:
-            log_debug(f"Creating banking object for {user_that_receiving_lower}", "invest")
-            user_obj["banking"] = {}
-
-        if "dustbunnies" not in user_obj:
-            log_debug(f"Creating dustbunnies object for {user_that_receiving_lower}", "invest")
-            user_obj["dustbunnies"] = {}
-
-        # Check if user has enough dustbunnies
-        current_bunnies = user_obj["dustbunnies"].get("collected_dustbunnies", 0)
-        if current_bunnies < invest_amount:
+        # Move the amount from dustbunnies to banking in one atomic step,
+        # failing if the balance cannot cover it
+        success, new_bunnies = user_repository.debit_if_sufficient(user_that_receiving_lower, invest_amount, {"banking": {
+            "bunnies_invested": invest_amount,
+            "total_bunnies_collected": 0,
+            "last_interest_collected": 0
+        }})
+        if not success:
             log_info(f"User {user_that_receiving_lower} has insufficient funds", "invest", {
-                "current": current_bunnies,
+                "current": new_bunnies,
                 "requested": invest_amount
             })
             send_message_to_redis(f"@{user_that_receiving_lower} does not have enough dustbunnies to invest {invest_amount}")
             return False
 
-        # Subtract the invested amount from dustbunnies
-        previous_bunnies = user_obj["dustbunnies"].get("collected_dustbunnies", 0)
-        user_obj["dustbunnies"]["collected_dustbunnies"] = previous_bunnies - invest_amount
-
-        # Only update banking-specific fields
-        previous_invested = user_obj["banking"].get("bunnies_invested", 0)
-        user_obj["banking"]["total_bunnies_collected"] = user_obj["banking"].get("total_bunnies_collected", 0)
-        user_obj["banking"]["bunnies_invested"] = previous_invested + invest_amount
-        user_obj["banking"]["timestamp_investment"] = datetime.now(tz=None).isoformat()
-        user_obj["banking"]["last_interest_collected"] = user_obj["banking"].get("last_interest_collected", 0)
-
-        redis_client.set(user_key, json.dumps(user_obj))
+        user_repository.set_fields(user_that_receiving_lower, "banking", {"timestamp_investment": datetime.now(tz=None).isoformat()},
+                                   display_name=receiving_user.replace("@", ""))
 
         log_info(f"Mod {investor_name} successfully invested for {user_that_receiving_lower}", "invest", {
             "amount": invest_amount,
-            "previous_invested": previous_invested,
-            "new_invested": user_obj["banking"]["bunnies_invested"],
-            "previous_bunnies": previous_bunnies,
-            "new_bunnies": user_obj["dustbunnies"]["collected_dustbunnies"]
+            "new_bunnies": new_bunnies
         })
 
         return True
@@ -139,67 +94,33 @@ def invest_money(user, invest_amount):
     try:
         username = user.get('display_name', user["name"])
         username_lower = user["name"].lower()
-        user_key = f"user:{username_lower}"
 
         log_debug(f"User {username} investing {invest_amount}", "invest", {
             "user": username,
             "amount": invest_amount
         })
 
-        if redis_client.exists(user_key):
-            user_json = redis_client.get(user_key)
-            user_obj = json.loads(user_json)
-            log_debug(f"Found existing user {username}", "invest")
-        else:
-            # Create new user if not exists
-            log_info(f"Creating new user account for {username}", "invest")
-            user_obj = {
-                "name": user["name"],
-                "display_name": user["display_name"],
-                "chat": {"count": 0},
-                "command": {"count": 0},
-                "admin": {"count": 0},
-                "dustbunnies": {},
-                "banking": {}
-            }
-
-        if "banking" not in user_obj:
-            log_debug(f"Creating banking object for {username}", "invest")
-            user_obj["banking"] = {}
-
-        if "dustbunnies" not in user_obj:
-            log_debug(f"Creating dustbunnies object for {username}", "invest")
-            user_obj["dustbunnies"] = {}
-
-        # Check if user has enough dustbunnies
-        current_bunnies = user_obj["dustbunnies"].get("collected_dustbunnies", 0)
-        if current_bunnies < invest_amount:
+        # Move the amount from dustbunnies to banking in one atomic step,
+        # failing if the balance cannot cover it
+        success, new_bunnies = user_repository.debit_if_sufficient(username_lower, invest_amount, {"banking": {
+            "bunnies_invested": invest_amount,
+            "total_bunnies_collected": 0,
+            "last_interest_collected": 0
+        }})
+        if not success:
             log_info(f"User {username} has insufficient funds", "invest", {
-                "current": current_bunnies,
+                "current": new_bunnies,
                 "requested": invest_amount
             })
             send_message_to_redis(f"{user['mention']} you do not have enough dustbunnies to invest {invest_amount}")
             return False
 
-        # Subtract the invested amount from dustbunnies
-        previous_bunnies = user_obj["dustbunnies"].get("collected_dustbunnies", 0)
-        user_obj["dustbunnies"]["collected_dustbunnies"] = previous_bunnies - invest_amount
-
-        # Only update banking-specific fields
-        previous_invested = user_obj["banking"].get("bunnies_invested", 0)
-        user_obj["banking"]["total_bunnies_collected"] = user_obj["banking"].get("total_bunnies_collected", 0)
-        user_obj["banking"]["bunnies_invested"] = previous_invested + invest_amount
-        user_obj["banking"]["timestamp_investment"] = datetime.now(tz=None).isoformat()
-        user_obj["banking"]["last_interest_collected"] = user_obj["banking"].get("last_interest_collected", 0)
-
-        redis_client.set(user_key, json.dumps(user_obj))
+        user_repository.set_fields(username_lower, "banking", {"timestamp_investment": datetime.now(tz=None).isoformat()},
+                                   display_name=user["display_name"])
 
         log_info(f"User {username} successfully invested", "invest", {
             "amount": invest_amount,
-            "previous_invested": previous_invested,
-            "new_invested": user_obj["banking"]["bunnies_invested"],
-            "previous_bunnies": previous_bunnies,
-            "new_bunnies": user_obj["dustbunnies"]["collected_dustbunnies"]
+            "new_bunnies": new_bunnies
         })
 
         return True
@@ -216,83 +137,90 @@ def invest_money(user, invest_amount):
 ##########################
 # Main
 ##########################
-log_startup("Invest command is ready to be used", "invest")
-
-for message in pubsub.listen():
-    if message["type"] == "message":
-        try:
-            message_obj = json.loads(message['data'].decode('utf-8'))
-            command = message_obj.get('command')
-            content = message_obj.get('content')
-            user = message_obj["author"].get("display_name", "Unknown")
-
-            print(f"Chat Command: {command} and Message: {content}")
-            log_info(f"Received invest command from {user}", "invest", {
-                "command": command,
-                "content": content
-            })
+def handle_command_message(message_obj):
+    """Handles one parsed command message.
 
-            msg_content = message_obj["content"]
-            msg_parts = msg_content.split()
-
-            # Check if this is a mod/broadcaster investing for someone else
-            if len(msg_parts) > 2 and (message_obj["author"]["moderator"] or message_obj["author"]["broadcaster"]):
-                invest_for_user = msg_parts[1]
-                try:
-                    invest_amount = int(msg_parts[2])
-                    log_debug(f"{user} specified {invest_amount} for {invest_for_user}", "invest")
-                except ValueError:
-                    log_info(f"User {user} provided invalid amount", "invest")
-                    send_message_to_redis(f"{message_obj['author']['mention']} the amount must be a number")
-                    continue
-
-                # Check if user starts with @ because we need the username
-                if not invest_for_user.startswith("@"):
-                    log_info(f"User {user} provided invalid target format", "invest")
-                    send_message_to_redis(f"{message_obj['author']['mention']} you need to use the @username to invest for someone")
-                    continue
-
-                # Invest for the user as mod/broadcaster
-                log_info(f"{user} investing for {invest_for_user}", "invest", {
-                    "amount": invest_amount,
-                    "is_mod": message_obj["author"]["moderator"],
-                    "is_broadcaster": message_obj["author"]["broadcaster"]
-                })
-
-                if invest_money_as_mod(message_obj["author"], invest_for_user, invest_amount):
-                    send_message_to_redis(f"{message_obj['author']['mention']} invested {invest_amount} points for {invest_for_user}")
-            else:
-                # Regular invest for self
-                try:
-                    invest_amount = int(msg_parts[1]) if len(msg_parts) > 1 else None
-                    if invest_amount:
-                        log_debug(f"User {user} investing {invest_amount} for self", "invest")
-                except ValueError:
-                    log_info(f"User {user} provided invalid amount", "invest")
-                    send_message_to_redis(f"{message_obj['author']['mention']} the amount must be a number")
-                    continue
-
-                if not invest_amount:
-                    log_info(f"User {user} didn't specify an amount", "invest")
-                    send_message_to_redis(f"{message_obj['author']['mention']} you need to specify an amount to invest")
-                    continue
-
-                # Invest
-                log_info(f"User {user} investing {invest_amount} for self", "invest")
-                if invest_money(message_obj["author"], invest_amount):
-                    send_message_to_redis(f"{message_obj['author']['mention']} you have invested {invest_amount} points")
-        except json.JSONDecodeError as je:
-            error_msg = f"JSON error in invest command: {je}"
-            print(error_msg)
-            log_error(error_msg, "invest", {
-                "error": str(je),
-                "data": message.get('data', 'N/A')
-            })
-        except Exception as e:
-            error_msg = f"Unexpected error in invest command: {str(e)}"
-            print(error_msg)
-            log_error(error_msg, "invest", {
-                "error": str(e),
-                "traceback": str(e.__traceback__),
-                "message_data": str(message.get('data', 'N/A'))
+    @param message_obj: The parsed message object from Twitch
+    """
+    try:
+        command = message_obj.get('command')
+        content = message_obj.get('content')
+        user = message_obj["author"].get("display_name", "Unknown")
+
+        print(f"Chat Command: {command} and Message: {content}")
+        log_info(f"Received invest command from {user}", "invest", {
+            "command": command,
+            "content": content
+        })
+
+        msg_content = message_obj["content"]
+        msg_parts = msg_content.split()
+
+        # Check if this is a mod/broadcaster investing for someone else
+        if len(msg_parts) > 2 and (message_obj["author"]["moderator"] or message_obj["author"]["broadcaster"]):
+            invest_for_user = msg_parts[1]
+            try:
+                invest_amount = int(msg_parts[2])
+                if invest_amount <= 0:
+                    log_info(f"User {user} provided non-positive amount: {invest_amount}", "invest")
+                    send_message_to_redis(f"{message_obj['author']['mention']} please enter a positive amount to invest")
+                    return
+                log_debug(f"{user} specified {invest_amount} for {invest_for_user}", "invest")
+            except ValueError:
+                log_info(f"User {user} provided invalid amount", "invest")
+                send_message_to_redis(f"{message_obj['author']['mention']} the amount must be a number")
+                return
+
+            # Check if user starts with @ because we need the username
+            if not invest_for_user.startswith("@"):
+                log_info(f"User {user} provided invalid target format", "invest")
+                send_message_to_redis(f"{message_obj['author']['mention']} you need to use the @username to invest for someone")
+                return
+
+            # Invest for the user as mod/broadcaster
+            log_info(f"{user} investing for {invest_for_user}", "invest", {
+                "amount": invest_amount,
+                "is_mod": message_obj["author"]["moderator"],
+                "is_broadcaster": message_obj["author"]["broadcaster"]
             })
+
+            if invest_money_as_mod(message_obj["author"], invest_for_user, invest_amount):
+                send_message_to_redis(f"{message_obj['author']['mention']} invested {invest_amount} points for {invest_for_user}")
+        else:
+            # Regular invest for self
+            try:
+                invest_amount = int(msg_parts[1]) if len(msg_parts) > 1 else None
+                if invest_amount:
+                    log_debug(f"User {user} investing {invest_amount} for self", "invest")
+            except ValueError:
+                log_info(f"User {user} provided invalid amount", "invest")
+                send_message_to_redis(f"{message_obj['author']['mention']} the amount must be a number")
+                return
+
+            if not invest_amount:
+                log_info(f"User {user} didn't specify an amount", "invest")
+                send_message_to_redis(f"{message_obj['author']['mention']} you need to specify an amount to invest")
+                return
+
+            if invest_amount < 0:
+                log_info(f"User {user} provided non-positive amount: {invest_amount}", "invest")
+                send_message_to_redis(f"{message_obj['author']['mention']} please enter a positive amount to invest")
+                return
+
+            # Invest
+            log_info(f"User {user} investing {invest_amount} for self", "invest")
+            if invest_money(message_obj["author"], invest_amount):
+                send_message_to_redis(f"{message_obj['author']['mention']} you have invested {invest_amount} points")
+    except Exception as e:
+        error_msg = f"Unexpected error in invest command: {str(e)}"
+        print(error_msg)
+        log_error(error_msg, "invest", {
+            "error": str(e),
+            "traceback": str(e.__traceback__),
+            "message_data": str(message_obj)
+        })
+
+
+if __name__ == "__main__":
+    run_command_loop(COMMAND_ALIASES, handle_command_message, "invest",
+                     "Invest command is ready to be used")
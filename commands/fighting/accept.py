@@ -1,12 +1,13 @@
-import json
 import random
 from datetime import datetime
 
 from openai import OpenAI
 
-from module.message_utils import send_message_to_redis, register_exit_handler
-from module.message_utils import log_startup, log_info, log_error, log_debug, log_warning
-from module.shared_redis import redis_client, pubsub, redis_client_env
+from module.message_utils import send_message_to_redis
+from module.message_utils import log_info, log_error, log_debug, log_warning
+from module.shared_redis import redis_client_env
+from module.user_repository import user_repository
+from module.command_host import run_command_loop
 
 ##########################
 # Configuration
@@ -17,7 +18,7 @@ LOG_LEVEL = "INFO"  # Use "DEBUG", "INFO", "WARNING", "ERROR", or "CRITICAL"
 ##########################
 # Initialize
 ##########################
-pubsub.subscribe('twitch.command.accept')
+COMMAND_ALIASES = ['accept']
 
 COOLDOWN_SECONDS = 30
 cooldown_users = {}
@@ -76,10 +77,6 @@ ABILITIES = {
     "Heal": {"cost": 20, "effect": "heal", "value": (20, 35)},
 }
 
-##########################
-# Exit Function
-##########################
-register_exit_handler()
 
 ##########################
 # Helper Functions
@@ -146,70 +143,6 @@ def let_ai_narrate_the_fight(fight_sequence, class_info):
         })
         raise
 
-def get_user_data(username, display_name=None):
-    """
-    Retrieve user data from Redis or create a new user if not found.
-
-    Args:
-        username (str): The username to retrieve
-        display_name (str, optional): The display name to use if creating a new user
-
-    Returns:
-        tuple: (user_data, user_key) - The user data dictionary and Redis key
-    """
-    try:
-        username_lower = username.lower()
-        user_key = f"user:{username_lower}"
-
-        log_debug(f"Retrieving user data for {username}", "accept")
-
-        if redis_client.exists(user_key):
-            user_json = redis_client.get(user_key)
-            user = json.loads(user_json)
-            log_debug(f"Found existing user {username}", "accept")
-        else:
-            log_info(f"Creating new user account for {username}", "accept")
-            user = {
-                "name": username,
-                "display_name": display_name or username,
-                "log": {"chat": 0, "command": 0, "admin": 0, "lurk": 0, "unlurk": 0},
-                "dustbunnies": {},
-                "banking": {},
-                "fighting": {},
-            }
-
-        if "fighting" not in user:
-            log_debug(f"Creating fighting object for {username}", "accept")
-            user["fighting"] = {}
-
-        return user, user_key
-
-    except Exception as e:
-        error_msg = f"Error retrieving user data: {e}"
-        log_error(error_msg, "accept", {
-            "error": str(e),
-            "username": username
-        })
-        # Return a basic user object to prevent further errors
-        return {
-            "name": username,
-            "display_name": display_name or username,
-            "fighting": {}
-        }, f"user:{username.lower()}"
-
-def save_user_data(user_key, user):
-    """Saves user data to Redis using the specified key."""
-    try:
-        log_debug(f"Saving user data for {user.get('display_name', 'Unknown')}", "accept")
-        redis_client.set(user_key, json.dumps(user))
-
-    except Exception as e:
-        error_msg = f"Error saving user data: {e}"
-        log_error(error_msg, "accept", {
-            "error": str(e),
-            "user": user.get('display_name', 'Unknown')
-        })
-
 def check_cooldown(username):
     """Checks if user is on cooldown. Returns remaining seconds or 0 if not on cooldown."""
     try:
@@ -390,8 +323,7 @@ def handle_accept_command(message_obj):
             opponent = opponent.lower()
             log_info(f"User {username} specified opponent: {opponent}", "accept")
         else:
-            user, user_key = get_user_data(username_lower, username)
-            opponent = user["fighting"].get("fight_requested_by")
+            opponent = user_repository.get_field(username_lower, "fighting", "fight_requested_by")
 
             if not opponent:
                 log_warning(f"User {username} has no pending fight requests", "accept")
@@ -401,9 +333,7 @@ def handle_accept_command(message_obj):
             log_info(f"User {username} accepting pending fight request from {opponent}", "accept")
 
         # Remove fight request
-        user, user_key = get_user_data(username_lower, username)
-        user["fighting"]["fight_requested_by"] = ""
-        save_user_data(user_key, user)
+        user_repository.set_fields(username_lower, "fighting", {"fight_requested_by": ""}, display_name=username)
 
         # Start fight
         log_info(f"Starting fight between {username} and {opponent}", "accept")
@@ -508,20 +438,11 @@ def handle_accept_command(message_obj):
             send_message_to_redis(f'@{winner} has won the fight! 🎉')
 
             # Update stats
-            winner_user, winner_key = get_user_data(winner, winner)
-            loser_user, loser_key = get_user_data(loser, loser)
-
-            previous_wins = winner_user["fighting"].get("fights_won", 0)
-            previous_losses = loser_user["fighting"].get("fights_lost", 0)
+            wins = user_repository.increment(winner, "fighting", "fights_won", display_name=winner)
+            losses = user_repository.increment(loser, "fighting", "fights_lost", display_name=loser)
 
-            winner_user["fighting"]["fights_won"] = previous_wins + 1
-            loser_user["fighting"]["fights_lost"] = previous_losses + 1
-
-            log_info(f"Updated {winner}'s win count to {previous_wins + 1}", "accept")
-            log_info(f"Updated {loser}'s loss count to {previous_losses + 1}", "accept")
-
-            save_user_data(winner_key, winner_user)
-            save_user_data(loser_key, loser_user)
+            log_info(f"Updated {winner}'s win count to {wins}", "accept")
+            log_info(f"Updated {loser}'s loss count to {losses}", "accept")
         else:
             log_info("Fight ended in a draw", "accept")
             send_message_to_redis("The fight ended in a draw!")
@@ -536,26 +457,29 @@ def handle_accept_command(message_obj):
 ##########################
 # Main
 ##########################
-# Send startup message
-log_startup("Accept command is ready to be used", "accept")
+def handle_command_message(message_obj):
+    """Handles one parsed command message.
 
-# Main message loop
-for message in pubsub.listen():
-    if message["type"] == "message":
-        try:
-            message_obj = json.loads(message['data'].decode('utf-8'))
-            command = message_obj.get('command', '').lower()
-            content = message_obj.get('content', '')
+    @param message_obj: The parsed message object from Twitch
+    """
+    try:
+        command = message_obj.get('command', '').lower()
+        content = message_obj.get('content', '')
 
-            if command == "accept":
-                log_info(f"Received accept command", "accept", {"content": content})
-                handle_accept_command(message_obj)
+        if command == "accept":
+            log_info(f"Received accept command", "accept", {"content": content})
+            handle_accept_command(message_obj)
 
-        except Exception as e:
-            error_msg = f"Error processing accept command: {e}"
-            # Log the error with detailed information
-            log_error(error_msg, "accept", {
-                "error": str(e),
-                "traceback": str(e.__traceback__),
-                "message_data": str(message.get('data', 'N/A'))
-            })
+    except Exception as e:
+        error_msg = f"Error processing accept command: {e}"
+        # Log the error with detailed information
+        log_error(error_msg, "accept", {
+            "error": str(e),
+            "traceback": str(e.__traceback__),
+            "message_data": str(message_obj)
+        })
+
+
+if __name__ == "__main__":
+    run_command_loop(COMMAND_ALIASES, handle_command_message, "accept",
+                     "Accept command is ready to be used")
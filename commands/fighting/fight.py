@@ -1,10 +1,10 @@
-import json
 from datetime import datetime
 
-from module.shared_redis import redis_client, pubsub
+from module.user_repository import user_repository
 
-from module.message_utils import send_message_to_redis, register_exit_handler
-from module.message_utils import log_startup, log_info, log_error, log_debug, log_warning
+from module.message_utils import send_message_to_redis
+from module.message_utils import log_info, log_error, log_debug, log_warning
+from module.command_host import run_command_loop
 
 ##########################
 # Configuration
@@ -15,86 +15,15 @@ LOG_LEVEL = "INFO"  # Use "DEBUG", "INFO", "WARNING", "ERROR", or "CRITICAL"
 ##########################
 # Initialize
 ##########################
-pubsub.subscribe('twitch.command.fight')
-pubsub.subscribe('twitch.command.battle')
-pubsub.subscribe('twitch.command.duel')
-pubsub.subscribe('twitch.command.flight')
+COMMAND_ALIASES = ['fight', 'battle', 'duel', 'flight']
 
 COOLDOWN_SECONDS = 30
 cooldown_users = {}
 
-##########################
-# Exit Function
-##########################
-register_exit_handler()
 
 ##########################
 # Helper Functions
 ##########################
-def get_user_data(username, display_name=None):
-    """
-    Retrieve user data from Redis or create a new user if not found.
-
-    Args:
-        username (str): The username to retrieve
-        display_name (str, optional): The display name to use if creating a new user
-
-    Returns:
-        tuple: (user_data, user_key) - The user data dictionary and Redis key
-    """
-    try:
-        username_lower = username.lower()
-        user_key = f"user:{username_lower}"
-
-        log_debug(f"Retrieving user data for {username}", "fight")
-
-        if redis_client.exists(user_key):
-            user_json = redis_client.get(user_key)
-            user = json.loads(user_json)
-            log_debug(f"Found existing user {username}", "fight")
-        else:
-            log_info(f"Creating new user account for {username}", "fight")
-            user = {
-                "name": username,
-                "display_name": display_name or username,
-                "log": {"chat": 0, "command": 0, "admin": 0, "lurk": 0, "unlurk": 0},
-                "dustbunnies": {},
-                "banking": {},
-                "fighting": {},
-            }
-
-        if "fighting" not in user:
-            log_debug(f"Creating fighting object for {username}", "fight")
-            user["fighting"] = {}
-
-        return user, user_key
-
-    except Exception as e:
-        error_msg = f"Error retrieving user data: {e}"
-        log_error(error_msg, "fight", {
-            "error": str(e),
-            "username": username
-        })
-        # Return a basic user object to prevent further errors
-        return {
-            "name": username,
-            "display_name": display_name or username,
-            "fighting": {}
-        }, f"user:{username.lower()}"
-
-def save_user_data(user_key, user):
-    """Saves user data to Redis using the specified key."""
-    try:
-        log_debug(f"Saving user data for {user.get('display_name', 'Unknown')}", "fight")
-        redis_client.set(user_key, json.dumps(user))
-
-    except Exception as e:
-        error_msg = f"Error saving user data: {e}"
-        log_error(error_msg, "fight", {
-            "error": str(e),
-            "user": user.get('display_name', 'Unknown')
-        })
-
 def check_cooldown(username):
     """Checks if user is on cooldown. Returns remaining seconds or 0 if not on cooldown."""
     try:
@@ -167,9 +96,7 @@ def handle_fight_command(message_obj):
 
         # Save fight request
         log_info(f"Saving fight request from {username} to {target}", "fight")
-        target_user, target_key = get_user_data(target, target)
-        target_user["fighting"]["fight_requested_by"] = username_lower
-        save_user_data(target_key, target_user)
+        user_repository.set_fields(target, "fighting", {"fight_requested_by": username_lower}, display_name=target)
 
         # Send challenge message
         send_message_to_redis(f"@{target} {username} has requested a fight with you! Type !accept to fight back!")
@@ -188,26 +115,29 @@ def handle_fight_command(message_obj):
 ##########################
 # Main
 ##########################
-# Send startup message
-log_startup("Fight command is ready to be used", "fight")
-
-# Main message loop
-for message in pubsub.listen():
-    if message["type"] == "message":
-        try:
-            message_obj = json.loads(message['data'].decode('utf-8'))
-            command = message_obj.get('command', '').lower()
-            content = message_obj.get('content', '')
-
-            if command in ["fight", "battle", "duel", "flight"]:
-                log_info(f"Received {command} command", "fight", {"content": content})
-                handle_fight_command(message_obj)
-
-        except Exception as e:
-            error_msg = f"Error processing fight command: {e}"
-            # Log the error with detailed information
-            log_error(error_msg, "fight", {
-                "error": str(e),
-                "traceback": str(e.__traceback__),
-                "message_data": str(message.get('data', 'N/A'))
-            })
+def handle_command_message(message_obj):
+    """Handles one parsed command message.
+
+    @param message_obj: The parsed message object from Twitch
+    """
+    try:
+        command = message_obj.get('command', '').lower()
+        content = message_obj.get('content', '')
+
+        if command in ["fight", "battle", "duel", "flight"]:
+            log_info(f"Received {command} command", "fight", {"content": content})
+            handle_fight_command(message_obj)
+
+    except Exception as e:
+        error_msg = f"Error processing fight command: {e}"
+        # Log the error with detailed information
+        log_error(error_msg, "fight", {
+            "error": str(e),
+            "traceback": str(e.__traceback__),
+            "message_data": str(message_obj)
+        })
+
+
+if __name__ == "__main__":
+    run_command_loop(COMMAND_ALIASES, handle_command_message, "fight",
+                     "Fight command is ready to be used")
@@ -18,10 +18,12 @@ import time
 from datetime import datetime
 from threading import Thread, Lock
 
-from module.shared_redis import redis_client, pubsub
+from module.shared_redis import redis_client
+from module.user_repository import user_repository
 
-from module.message_utils import send_message_to_redis, register_exit_handler
-from module.message_utils import log_startup, log_info, log_error, log_debug, log_warning
+from module.message_utils import send_message_to_redis
+from module.message_utils import log_info, log_error, log_debug, log_warning
+from module.command_host import run_command_loop
 
 ##########################
 # Configuration
@@ -33,8 +35,7 @@ LOG_LEVEL = "INFO"  # Use "DEBUG", "INFO", "WARNING", "ERROR", or "CRITICAL"
 # Initialize
 ##########################
 # Subscribe to blackjack command and its alias
-pubsub.subscribe('twitch.command.blackjack')
-pubsub.subscribe('twitch.command.bj')
+COMMAND_ALIASES = ['blackjack', 'bj']
 
 # Initialize game state
 GAME_STATE_KEY = 'game:blackjack:state'
@@ -67,11 +68,6 @@ game_state = {
 # Save initial game state
 redis_client.set(GAME_STATE_KEY, json.dumps(game_state))
 
-##########################
-# Exit Function
-##########################
-# Register SIGINT handler for clean exit
-register_exit_handler()
 
 ##########################
 # Helper Functions
@@ -295,56 +291,40 @@ def end_game(state, players):
         player_value = calculate_hand_value(player_data['hand'])
         player_bust = player_value > 21
         bet_amount = player_data['bet']
-        user_key = f"user:{username}"
 
-        # Get user data
-        if redis_client.exists(user_key):
-            user_json = redis_client.get(user_key)
-            user = json.loads(user_json)
-        else:
+        # Skip players without an account
+        if not user_repository.exists(username):
             continue
 
-        # Initialize gambling stats if they don't exist
-        if "gambling" not in user:
-            user["gambling"] = {
-                "input": 0,
-                "results": 0,
-                "wins": 0,
-                "losses": 0
-            }
-
-        # Determine outcome
+        # Determine outcome, the payout (the stake was taken on join/double) and the stats
         if player_bust:
             # Player busts, loses bet
             result_message = f"@{player_data['display_name']} busts with {player_value} and loses {bet_amount} dustbunnies!"
-            user["gambling"]["results"] = user["gambling"].get("results", 0) - bet_amount
-            user["gambling"]["losses"] = user["gambling"].get("losses", 0) + bet_amount
+            payout = 0
+            stats = {"gambling": {"results": -bet_amount, "losses": bet_amount}}
         elif dealer_bust:
             # Dealer busts, player wins
-            winnings = bet_amount * 2
             result_message = f"@{player_data['display_name']} wins {bet_amount} dustbunnies with {player_value}!"
-            user["dustbunnies"]["collected_dustbunnies"] = user["dustbunnies"].get("collected_dustbunnies", 0) + bet_amount
-            user["gambling"]["results"] = user["gambling"].get("results", 0) + bet_amount
-            user["gambling"]["wins"] = user["gambling"].get("wins", 0) + bet_amount
+            payout = bet_amount
+            stats = {"gambling": {"results": bet_amount, "wins": bet_amount}}
         elif player_value > dealer_value:
             # Player beats dealer
-            winnings = bet_amount * 2
             result_message = f"@{player_data['display_name']} wins {bet_amount} dustbunnies with {player_value} vs dealer's {dealer_value}!"
-            user["dustbunnies"]["collected_dustbunnies"] = user["dustbunnies"].get("collected_dustbunnies", 0) + bet_amount
-            user["gambling"]["results"] = user["gambling"].get("results", 0) + bet_amount
-            user["gambling"]["wins"] = user["gambling"].get("wins", 0) + bet_amount
+            payout = bet_amount
+            stats = {"gambling": {"results": bet_amount, "wins": bet_amount}}
         elif player_value == dealer_value:
             # Push (tie)
             result_message = f"@{player_data['display_name']} pushes with {player_value}. Bet returned."
-            user["dustbunnies"]["collected_dustbunnies"] = user["dustbunnies"].get("collected_dustbunnies", 0) + bet_amount
+            payout = bet_amount
+            stats = {}
         else:
             # Dealer wins
             result_message = f"@{player_data['display_name']} loses {bet_amount} dustbunnies with {player_value} vs dealer's {dealer_value}."
-            user["gambling"]["results"] = user["gambling"].get("results", 0) - bet_amount
-            user["gambling"]["losses"] = user["gambling"].get("losses", 0) + bet_amount
+            payout = 0
+            stats = {"gambling": {"results": -bet_amount, "losses": bet_amount}}
 
-        # Save user data
-        redis_client.set(user_key, json.dumps(user))
+        # Pay out and record the result in one atomic step
+        user_repository.settle_bet(username, 0, payout, stats)
         send_message_to_redis(result_message)
 
     # Clean up game data
@@ -364,7 +344,6 @@ def handle_blackjack(message_obj):
     try:
         username = message_obj["author"]["display_name"]
         username_lower = message_obj["author"]["name"].lower()
-        user_key = f"user:{username_lower}"
         mention = message_obj["author"]["mention"]
 
         # Get command content (action and any arguments)
@@ -392,7 +371,7 @@ def handle_blackjack(message_obj):
             # Handle different blackjack actions
             if action == 'join':
                 log_info(f"User {username} is joining blackjack game", "blackjack")
-                handle_join(state, players, username, username_lower, mention, user_key)
+                handle_join(state, players, username, username_lower, mention)
             elif action == 'hit':
                 log_info(f"User {username} is hitting in blackjack game", "blackjack")
                 handle_hit(state, players, username_lower, mention)
@@ -401,7 +380,7 @@ def handle_blackjack(message_obj):
                 handle_stand(state, players, username_lower, mention)
             elif action == 'double':
                 log_info(f"User {username} is doubling down in blackjack game", "blackjack")
-                handle_double(state, players, username_lower, mention, user_key)
+                handle_double(state, players, username_lower, mention)
             elif action == 'split':
                 log_info(f"User {username} is attempting to split in blackjack game", "blackjack")
                 handle_split(state, players, username_lower, mention)
@@ -417,7 +396,7 @@ def handle_blackjack(message_obj):
             "content": message_obj.get("content", "")
         })
 
-def handle_join(state, players, username, username_lower, mention, user_key):
+def handle_join(state, players, username, username_lower, mention):
     """Handle the join action for blackjack"""
     # Check if game is already in progress
     if state['state'] not in [STATE_IDLE, STATE_JOINING]:
@@ -429,39 +408,19 @@ def handle_join(state, players, username, username_lower, mention, user_key):
         send_message_to_redis(f"{mention} You are already in this blackjack game.")
         return
 
-    # Get user data to verify they have enough points
-    if redis_client.exists(user_key):
-        user_json = redis_client.get(user_key)
-        user = json.loads(user_json)
-    else:
+    # Make sure the user has an account (minimum bet is 10)
+    if not user_repository.exists(username_lower):
         send_message_to_redis(f"{mention} You don't have an account to play blackjack with.")
         return
 
-    # Check if user has enough dustbunnies (minimum bet is 10)
-    if "dustbunnies" not in user or "collected_dustbunnies" not in user["dustbunnies"] or user["dustbunnies"].get("collected_dustbunnies", 0) < 10:
-        send_message_to_redis(f"{mention} You need at least 10 dustbunnies to play blackjack.")
-        return
-
     # Set initial bet amount (can be adjusted later)
     bet_amount = 10
 
-    # Remove bet from user's balance
-    user["dustbunnies"]["collected_dustbunnies"] -= bet_amount
-
-    # Initialize gambling stats if they don't exist
-    if "gambling" not in user:
-        user["gambling"] = {
-            "input": 0,
-            "results": 0,
-            "wins": 0,
-            "losses": 0
-        }
-
-    # Record gambling attempt
-    user["gambling"]["input"] = user["gambling"].get("input", 0) + bet_amount
-
-    # Save user data
-    redis_client.set(user_key, json.dumps(user))
+    # Take the bet from the user's balance and record the attempt in one atomic step
+    success, _ = user_repository.debit_if_sufficient(username_lower, bet_amount, {"gambling": {"input": bet_amount}})
+    if not success:
+        send_message_to_redis(f"{mention} You need at least 10 dustbunnies to play blackjack.")
+        return
 
     # Create player data for the game
     player_data = {
@@ -592,7 +551,7 @@ def handle_stand(state, players, username_lower, mention):
         send_message_to_redis(f"@{next_player_data['display_name']}'s turn. Your hand: {format_hand(next_player_data['hand'])} ({calculate_hand_value(next_player_data['hand'])}). Type !blackjack hit or !blackjack stand")
         start_game_timer()
 
-def handle_double(state, players, username_lower, mention, user_key):
+def handle_double(state, players, username_lower, mention):
     """Handle the double down action for blackjack"""
     if state['state'] != STATE_PLAYING:
         send_message_to_redis(f"{mention} No blackjack game is currently in the playing phase.")
@@ -619,25 +578,18 @@ def handle_double(state, players, username_lower, mention, user_key):
         send_message_to_redis(f"{mention} You can only double down on your initial two cards.")
         return
 
-    # Get user data to verify they have enough points for doubling
-    if redis_client.exists(user_key):
-        user_json = redis_client.get(user_key)
-        user = json.loads(user_json)
-    else:
+    # Make sure the user has an account before doubling
+    if not user_repository.exists(username_lower):
         send_message_to_redis(f"{mention} Error retrieving your account data.")
         return
 
-    # Check if user has enough dustbunnies to double bet
+    # Double the bet if the user's balance covers it
     current_bet = player_data['bet']
-    if "dustbunnies" not in user or "collected_dustbunnies" not in user["dustbunnies"] or user["dustbunnies"].get("collected_dustbunnies", 0) < current_bet:
+    success, _ = user_repository.debit_if_sufficient(username_lower, current_bet, {"gambling": {"input": current_bet}})
+    if not success:
         send_message_to_redis(f"{mention} You don't have enough dustbunnies to double your bet.")
         return
 
-    # Double the bet
-    user["dustbunnies"]["collected_dustbunnies"] -= current_bet
-    user["gambling"]["input"] = user["gambling"].get("input", 0) + current_bet
-    redis_client.set(user_key, json.dumps(user))
-
     player_data['bet'] *= 2
     save_player_data(username_lower, player_data)
 
@@ -674,25 +626,28 @@ def handle_split(state, players, username_lower, mention):
 ##########################
 # Main
 ##########################
-# Send startup message
-log_startup("Blackjack command is ready to be used", "blackjack")
-
-# Main message loop
-for message in pubsub.listen():
-    if message["type"] == "message":
-        try:
-            message_obj = json.loads(message['data'].decode('utf-8'))
-            command = message_obj.get('command')
-            content = message_obj.get('content', '')
-
-            log_debug(f"Received blackjack command", "blackjack", {"command": command, "content": content})
-            handle_blackjack(message_obj)
-
-        except Exception as e:
-            error_msg = f"Error processing blackjack command: {e}"
-            # Log the error with detailed information
-            log_error(error_msg, "blackjack", {
-                "error": str(e),
-                "traceback": str(e.__traceback__),
-                "message_data": str(message.get('data', 'N/A'))
-            })
+def handle_command_message(message_obj):
+    """Handles one parsed command message.
+
+    @param message_obj: The parsed message object from Twitch
+    """
+    try:
+        command = message_obj.get('command')
+        content = message_obj.get('content', '')
+
+        log_debug(f"Received blackjack command", "blackjack", {"command": command, "content": content})
+        handle_blackjack(message_obj)
+
+    except Exception as e:
+        error_msg = f"Error processing blackjack command: {e}"
+        # Log the error with detailed information
+        log_error(error_msg, "blackjack", {
+            "error": str(e),
+            "traceback": str(e.__traceback__),
+            "message_data": str(message_obj)
+        })
+
+
+if __name__ == "__main__":
+    run_command_loop(COMMAND_ALIASES, handle_command_message, "blackjack",
+                     "Blackjack command is ready to be used")
@@ -8,14 +8,14 @@ of winning or losing the amount they bet.
 Usage:
 !gamble <amount> - Gamble the specified amount of dustbunnies
 """
-import json
 import random
 from datetime import datetime, timedelta
 
-from module.shared_redis import redis_client, pubsub
+from module.user_repository import user_repository
 
-from module.message_utils import send_message_to_redis, register_exit_handler
-from module.message_utils import log_startup, log_info, log_error, log_debug, log_warning
+from module.message_utils import send_message_to_redis
+from module.message_utils import log_info, log_error, log_debug, log_warning
+from module.command_host import run_command_loop
 
 ##########################
 # Configuration
@@ -27,19 +27,12 @@ LOG_LEVEL = "INFO"  # Use "DEBUG", "INFO", "WARNING", "ERROR", or "CRITICAL"
 # Initialize
 ##########################
 # Subscribe to gamble command and its aliases
-pubsub.subscribe('twitch.command.gamble')
-pubsub.subscribe('twitch.command.bet')
-pubsub.subscribe('twitch.command.gambling')
+COMMAND_ALIASES = ['gamble', 'bet', 'gambling']
 
 # Initialize cooldown tracking
 COOLDOWN_SECONDS = 30
 cooldown_users = {}
 
-##########################
-# Exit Function
-##########################
-# Register SIGINT handler for clean exit
-register_exit_handler()
 
 ##########################
 # Helper Functions
@@ -83,7 +76,6 @@ def handle_gamble(message_obj):
     try:
         username = message_obj["author"]["display_name"]
         username_lower = username.lower()
-        user_key = f"user:{username_lower}"
         mention = message_obj["author"]["mention"]
 
         # Get command content (amount to gamble)
@@ -108,95 +100,76 @@ def handle_gamble(message_obj):
             log_info(f"User {username} is on cooldown for gambling", "gamble")
             return
 
-        # Get user data
-        if redis_client.exists(user_key):
-            user_json = redis_client.get(user_key)
-            user = json.loads(user_json)
-            log_debug(f"Retrieved user data for {username}", "gamble")
-        else:
+        # Only the balance is needed up front
+        if not user_repository.exists(username_lower):
             log_warning(f"User {username} has no account data", "gamble")
             send_message_to_redis(f"{mention} You don't have any dustbunnies to gamble!")
             return
+        current_dustbunnies = user_repository.get_field(username_lower, "dustbunnies", "collected_dustbunnies")
 
         # Handle 'all' amount
         if amount.lower() == 'all':
-            if "dustbunnies" not in user or "collected_dustbunnies" not in user["dustbunnies"]:
+            if not current_dustbunnies or current_dustbunnies <= 0:
                 log_warning(f"User {username} has no dustbunnies to gamble", "gamble")
                 send_message_to_redis(f"{mention} You don't have any dustbunnies to gamble!")
                 return
-            amount = user["dustbunnies"].get("collected_dustbunnies", 0)
+            amount = current_dustbunnies
             log_info(f"User {username} is gambling all ({amount}) dustbunnies", "gamble")
         else:
             try:
                 amount = int(amount)
+                if amount <= 0:
+                    log_warning(f"User {username} provided non-positive amount: {amount}", "gamble")
+                    send_message_to_redis(f"{mention} Please enter a positive number of dustbunnies to gamble!")
+                    return
                 log_debug(f"Parsed gamble amount: {amount}", "gamble")
             except ValueError:
                 log_warning(f"User {username} provided invalid gamble amount: {amount}", "gamble")
                 send_message_to_redis(f"{mention} Please enter a valid number of dustbunnies to gamble!")
                 return
 
-        # Check if user has enough dustbunnies
-        current_dustbunnies = user["dustbunnies"].get("collected_dustbunnies", 0) if "dustbunnies" in user else 0
-        if "dustbunnies" not in user or "collected_dustbunnies" not in user["dustbunnies"] or current_dustbunnies < amount:
+        # Do the gambling (50/50 chance)
+        gamble_result = random.choice([True, False])
+
+        # Take the stake and pay out in one atomic step, failing if the balance cannot cover it
+        if gamble_result:
+            stats = {"gambling": {"input": amount, "results": amount, "wins": amount}}
+        else:
+            stats = {"gambling": {"input": amount, "results": -amount, "losses": amount}}
+        success, new_amount = user_repository.settle_bet(username_lower, amount, amount * 2 if gamble_result else 0, stats)
+
+        if not success:
             log_warning(f"User {username} doesn't have enough dustbunnies to gamble {amount}", "gamble", {
                 "requested_amount": amount,
-                "available_amount": current_dustbunnies
+                "available_amount": new_amount
             })
             send_message_to_redis(f"{mention} You don't have enough dustbunnies to gamble {amount}! 😢")
             return
 
-        # Initialize gambling stats if they don't exist
-        if "gambling" not in user:
-            log_debug(f"Initializing gambling stats for {username}", "gamble")
-            user["gambling"] = {
-                "input": 0,
-                "results": 0,
-                "wins": 0,
-                "losses": 0
-            }
-
-        # Record gambling attempt
-        user["gambling"]["input"] = user["gambling"].get("input", 0) + amount
-
-        # Do the gambling (50/50 chance)
-        gamble_result = random.choice([True, False])
         log_info(f"User {username} gambling result: {'win' if gamble_result else 'loss'}", "gamble", {
             "amount": amount,
             "result": "win" if gamble_result else "loss"
         })
 
-        # Update user stats based on result
         if gamble_result:
             # User won
-            previous_amount = user["dustbunnies"].get("collected_dustbunnies", 0)
-            user["gambling"]["results"] = user["gambling"].get("results", 0) + amount
-            user["dustbunnies"]["collected_dustbunnies"] = previous_amount + amount
-            user["gambling"]["wins"] = user["gambling"].get("wins", 0) + amount
-
             log_info(f"User {username} won {amount} dustbunnies", "gamble", {
-                "previous_amount": previous_amount,
-                "new_amount": user["dustbunnies"]["collected_dustbunnies"],
+                "previous_amount": new_amount - amount,
+                "new_amount": new_amount,
                 "win_amount": amount
             })
 
             send_message_to_redis(f"{mention} You won {amount} Dustbunnies! 🎉 🐰🐻")
         else:
             # User lost
-            previous_amount = user["dustbunnies"].get("collected_dustbunnies", 0)
-            user["gambling"]["results"] = user["gambling"].get("results", 0) - amount
-            user["dustbunnies"]["collected_dustbunnies"] = previous_amount - amount
-            user["gambling"]["losses"] = user["gambling"].get("losses", 0) + amount
-
             log_info(f"User {username} lost {amount} dustbunnies", "gamble", {
-                "previous_amount": previous_amount,
-                "new_amount": user["dustbunnies"]["collected_dustbunnies"],
+                "previous_amount": new_amount + amount,
+                "new_amount": new_amount,
                 "loss_amount": amount
             })
 
             send_message_to_redis(f"{mention} You lost {amount} Dustbunnies! 😢 🐰🐻")
 
-        # Save updated user data
-        redis_client.set(user_key, json.dumps(user))
         log_debug(f"Saved updated user data for {username}", "gamble")
 
     except Exception as e:
@@ -210,25 +183,28 @@ def handle_gamble(message_obj):
 ##########################
 # Main
 ##########################
-# Send startup message
-log_startup("Gamble command is ready to be used", "gamble")
-
-# Main message loop
-for message in pubsub.listen():
-    if message["type"] == "message":
-        try:
-            message_obj = json.loads(message['data'].decode('utf-8'))
-            command = message_obj.get('command')
-            content = message_obj.get('content', '')
-
-            log_debug(f"Received gamble command", "gamble", {"command": command, "content": content})
-            handle_gamble(message_obj)
-
-        except Exception as e:
-            error_msg = f"Error processing gamble command: {e}"
-            # Log the error with detailed information
-            log_error(error_msg, "gamble", {
-                "error": str(e),
-                "traceback": str(e.__traceback__),
-                "message_data": str(message.get('data', 'N/A'))
-            })
+def handle_command_message(message_obj):
+    """Handles one parsed command message.
+
+    @param message_obj: The parsed message object from Twitch
+    """
+    try:
+        command = message_obj.get('command')
+        content = message_obj.get('content', '')
+
+        log_debug(f"Received gamble command", "gamble", {"command": command, "content": content})
+        handle_gamble(message_obj)
+
+    except Exception as e:
+        error_msg = f"Error processing gamble command: {e}"
+        # Log the error with detailed information
+        log_error(error_msg, "gamble", {
+            "error": str(e),
+            "traceback": str(e.__traceback__),
+            "message_data": str(message_obj)
+        })
+
+
+if __name__ == "__main__":
+    run_command_loop(COMMAND_ALIASES, handle_command_message, "gamble",
+                     "Gamble command is ready to be used")
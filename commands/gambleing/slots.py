@@ -9,14 +9,14 @@ Usage:
 !slots <amount> - Play the slot machine with the specified amount of dustbunnies
 !slots all - Play with all your dustbunnies
 """
-import json
 import random
 from datetime import datetime, timedelta
 
-from module.shared_redis import redis_client, pubsub
+from module.user_repository import user_repository
 
-from module.message_utils import send_message_to_redis, register_exit_handler
-from module.message_utils import log_startup, log_info, log_error, log_debug, log_warning
+from module.message_utils import send_message_to_redis
+from module.message_utils import log_info, log_error, log_debug, log_warning
+from module.command_host import run_command_loop
 
 ##########################
 # Configuration
@@ -27,8 +27,7 @@ LOG_LEVEL = "INFO"  # Use "DEBUG", "INFO", "WARNING", "ERROR", or "CRITICAL"
 ##########################
 # Initialize
 ##########################
-pubsub.subscribe('twitch.command.slots')
-pubsub.subscribe('twitch.command.slot')
+COMMAND_ALIASES = ['slots', 'slot']
 
 # Initialize cooldown tracking
 COOLDOWN_SECONDS = 15
@@ -39,11 +38,6 @@ SLOT_SYMBOLS = ['🍇', '🍒', '🍋', '🍊', '🍎', '🍓', '🍌', '💰',
 # Special symbols have lower probability but higher payout
 SPECIAL_SYMBOLS = ['💰', '💎', '🎰']
 
-##########################
-# Exit Function
-##########################
-# Register SIGINT handler for clean exit
-register_exit_handler()
 
 ##########################
 # Helper Functions
@@ -151,7 +145,6 @@ def handle_slots_command(message_obj):
     try:
         username = message_obj["author"]["display_name"]
         username_lower = username.lower()
-        user_key = f"user:{username_lower}"
         mention = message_obj["author"]["mention"]
 
         # Get command content (amount to gamble)
@@ -178,23 +171,20 @@ def handle_slots_command(message_obj):
             send_message_to_redis(f"{mention} Please wait {remaining} seconds before playing slots again.")
             return
 
-        # Get user data
-        if redis_client.exists(user_key):
-            user_json = redis_client.get(user_key)
-            user = json.loads(user_json)
-            log_debug(f"Retrieved user data for {username}", "slots")
-        else:
+        # Only the balance is needed up front
+        if not user_repository.exists(username_lower):
             log_warning(f"User {username} has no account data", "slots")
             send_message_to_redis(f"{mention} You don't have any dustbunnies to play slots!")
             return
+        current_dustbunnies = user_repository.get_field(username_lower, "dustbunnies", "collected_dustbunnies")
 
         # Handle 'all' amount
         if amount_str.lower() == 'all':
-            if "dustbunnies" not in user or "collected_dustbunnies" not in user["dustbunnies"]:
+            if current_dustbunnies is None:
                 log_warning(f"User {username} has no dustbunnies to play slots", "slots")
                 send_message_to_redis(f"{mention} You don't have any dustbunnies to play slots!")
                 return
-            amount = user["dustbunnies"].get("collected_dustbunnies", 0)
+            amount = current_dustbunnies
             if amount <= 0:
                 log_warning(f"User {username} has no dustbunnies to play slots", "slots")
                 send_message_to_redis(f"{mention} You don't have any dustbunnies to play slots!")
@@ -213,54 +203,34 @@ def handle_slots_command(message_obj):
                 send_message_to_redis(f"{mention} Please enter a valid number of dustbunnies to play slots!")
                 return
 
-        # Check if user has enough dustbunnies
-        current_dustbunnies = user["dustbunnies"].get("collected_dustbunnies", 0) if "dustbunnies" in user else 0
-        if "dustbunnies" not in user or "collected_dustbunnies" not in user["dustbunnies"] or current_dustbunnies < amount:
+        # Run the slots
+        slot1, slot2, slot3, winnings = handle_slots_gambling(amount)
+
+        # Take the bet and pay out the winnings in one atomic step, failing if the balance cannot cover it
+        if winnings > 0:
+            stats = {"gambling": {"input": amount, "slots_played": 1, "results": winnings - amount,
+                                  "wins": winnings, "slots_won": 1}}
+        else:
+            stats = {"gambling": {"input": amount, "slots_played": 1, "results": -amount, "losses": amount}}
+        success, new_amount = user_repository.settle_bet(username_lower, amount, winnings, stats)
+
+        if not success:
             log_warning(f"User {username} doesn't have enough dustbunnies to play slots with {amount}", "slots", {
                 "requested_amount": amount,
-                "available_amount": current_dustbunnies
+                "available_amount": new_amount
             })
             send_message_to_redis(f"{mention} You don't have enough dustbunnies to play slots with {amount}! 😢")
             return
 
-        # Initialize gambling stats if they don't exist
-        if "gambling" not in user:
-            log_debug(f"Initializing gambling stats for {username}", "slots")
-            user["gambling"] = {
-                "input": 0,
-                "results": 0,
-                "wins": 0,
-                "losses": 0,
-                "slots_played": 0,
-                "slots_won": 0
-            }
-
-        # Record gambling attempt
-        user["gambling"]["input"] = user["gambling"].get("input", 0) + amount
-        user["gambling"]["slots_played"] = user["gambling"].get("slots_played", 0) + 1
-
-        previous_amount = user["dustbunnies"].get("collected_dustbunnies", 0)
-
-        # Deduct the bet amount upfront
-        user["dustbunnies"]["collected_dustbunnies"] -= amount
-        log_debug(f"Deducted {amount} dustbunnies from {username}'s balance", "slots")
-
-        # Run the slots
-        slot1, slot2, slot3, winnings = handle_slots_gambling(amount)
+        previous_amount = new_amount - winnings + amount
 
-        # Update user stats based on result
         if winnings > 0:
             # User won
-            user["gambling"]["results"] = user["gambling"].get("results", 0) + (winnings - amount)
-            user["dustbunnies"]["collected_dustbunnies"] += winnings
-            user["gambling"]["wins"] = user["gambling"].get("wins", 0) + winnings
-            user["gambling"]["slots_won"] = user["gambling"].get("slots_won", 0) + 1
-
             log_info(f"User {username} won {winnings} dustbunnies on slots", "slots", {
                 "previous_amount": previous_amount,
                 "bet_amount": amount,
                 "winnings": winnings,
-                "new_amount": user["dustbunnies"]["collected_dustbunnies"],
+                "new_amount": new_amount,
                 "slots_result": f"{slot1} {slot2} {slot3}"
             })
 
@@ -271,20 +241,15 @@ def handle_slots_command(message_obj):
                 send_message_to_redis(f"{mention} 🎰 {slot1} {slot2} {slot3} 🎰 - You won {winnings} Dustbunnies! 🎉")
         else:
             # User lost
-            user["gambling"]["results"] = user["gambling"].get("results", 0) - amount
-            user["gambling"]["losses"] = user["gambling"].get("losses", 0) + amount
-
             log_info(f"User {username} lost {amount} dustbunnies on slots", "slots", {
                 "previous_amount": previous_amount,
                 "bet_amount": amount,
-                "new_amount": user["dustbunnies"]["collected_dustbunnies"],
+                "new_amount": new_amount,
                 "slots_result": f"{slot1} {slot2} {slot3}"
             })
 
             send_message_to_redis(f"{mention} 🎰 {slot1} {slot2} {slot3} 🎰 - You lost {amount} Dustbunnies! 😢")
 
-        # Save updated user data
-        redis_client.set(user_key, json.dumps(user))
         log_debug(f"Saved updated user data for {username}", "slots")
 
     except Exception as e:
@@ -298,26 +263,29 @@ def handle_slots_command(message_obj):
 ##########################
 # Main
 ##########################
-# Send startup message
-log_startup("Slots command is ready to be used", "slots")
-
-# Main message loop
-for message in pubsub.listen():
-    if message["type"] == "message":
-        try:
-            message_obj = json.loads(message['data'].decode('utf-8'))
-            command = message_obj.get('command')
-            content = message_obj.get('content', '')
-
-            log_debug(f"Received slots command", "slots", {"command": command, "content": content})
-            handle_slots_command(message_obj)
-
-        except Exception as e:
-            error_msg = f"Error processing slots command: {e}"
-            print(error_msg)
-            # Log the error with detailed information
-            log_error(error_msg, "slots", {
-                "error": str(e),
-                "traceback": str(e.__traceback__),
-                "message_data": str(message.get('data', 'N/A'))
-            })
+def handle_command_message(message_obj):
+    """Handles one parsed command message.
+
+    @param message_obj: The parsed message object from Twitch
+    """
+    try:
+        command = message_obj.get('command')
+        content = message_obj.get('content', '')
+
+        log_debug(f"Received slots command", "slots", {"command": command, "content": content})
+        handle_slots_command(message_obj)
+
+    except Exception as e:
+        error_msg = f"Error processing slots command: {e}"
+        print(error_msg)
+        # Log the error with detailed information
+        log_error(error_msg, "slots", {
+            "error": str(e),
+            "traceback": str(e.__traceback__),
+            "message_data": str(message_obj)
+        })
+
+
+if __name__ == "__main__":
+    run_command_loop(COMMAND_ALIASES, handle_command_message, "slots",
+                     "Slots command is ready to be used")
@@ -14,6 +14,8 @@ Example:
 """
 
 import time
+import json
+import tracemalloc
 import argparse
 import numpy as np
 import matplotlib.pyplot as plt
@@ -23,8 +25,9 @@ import pandas as pd
 from datetime import datetime, timedelta
 
 # Import Game of Life modules
-from commands.games.GOL.models import DEFAULT_CONFIG, create_game_state
-from commands.games.GOL.game_logic import initialize_grid, update_grid, is_stable
+from commands.games.GOL.models import DEFAULT_CONFIG, create_game_state, game_state as shared_game_state
+from commands.games.GOL.game_logic import initialize_grid, update_grid, create_grid_updater, CycleDetector
+from commands.games.GOL.frame_codec import FrameEncoder
 
 def run_simulation(config, seed=None):
     """
@@ -58,7 +61,8 @@ def run_simulation(config, seed=None):
     game_state['start_time'] = datetime.now()
     game_state['last_speed_up'] = datetime.now()
     game_state['speed_multiplier'] = 1
-    game_state['history'] = [game_state['grid'].copy()]
+    game_state['cycle_detector'] = CycleDetector(game_state['config'].get('max_loop_period', 20))
+    game_state['cycle_detector'].add(game_state['grid'])
     game_state['dustbunnies_awarded'] = 0
     game_state['steps'] = 0
     game_state['game_phase'] = 0
@@ -72,6 +76,7 @@ def run_simulation(config, seed=None):
     now = datetime.now()
     game_over = False
     all_grid_states = []
+    update = create_grid_updater(game_state['config'])
     
     # Store initial state
     all_grid_states.append({
@@ -96,18 +101,13 @@ def run_simulation(config, seed=None):
                 game_state['last_speed_up'] = now
         
         # Process a normal Game of Life step
-        final_grid, _, _ = update_grid(game_state['grid'])
+        final_grid, _, _ = update(game_state['grid'])
         game_state['grid'] = final_grid
         game_state['steps'] += 1
         
-        # Add to history and check for stability
-        game_state['history'].append(game_state['grid'].copy())
-        if len(game_state['history']) > 20:
-            game_state['history'].pop(0)
-        
         # Check for stability or timeout
         elapsed = (now - game_state['start_time']).total_seconds()
-        is_stable_result, stability_reason = is_stable(game_state['grid'], game_state['history'])
+        is_stable_result, stability_reason = game_state['cycle_detector'].check(game_state['grid'])
         
         if is_stable_result or elapsed >= game_state['config']['max_duration']:
             # Game is entering ending state
@@ -302,6 +302,147 @@ def benchmark_max_durations(durations, config=None, seed=None):
     
     return results
 
+def benchmark_frame_formats(sizes, steps=300, config=None, seed=None):
+    """
+    Compare the JSON grid payload of /start with the binary delta frame format.
+    
+    Args:
+        sizes: A list of pixel sizes to benchmark.
+        steps: Number of steps to simulate for each size.
+        config: A base configuration to use (default: DEFAULT_CONFIG).
+        seed: A random seed for reproducibility.
+        
+    Returns:
+        A list of benchmark results.
+    """
+    if config is None:
+        config = DEFAULT_CONFIG.copy()
+    
+    results = []
+    
+    for size in sizes:
+        print(f"Benchmarking frame formats for pixel size: {size}")
+        test_config = config.copy()
+        test_config['pixel_size'] = size
+        
+        # Simulate first, so only the encoding is timed. initialize_grid divides by the
+        # pixel size of the shared game state, so scale the dimensions to get this size.
+        scale = shared_game_state['config']['pixel_size']
+        grid = initialize_grid(test_config['width'] // size * scale, test_config['height'] // size * scale, seed)
+        grids = [grid]
+        for _ in range(steps):
+            grid, _, _ = update_grid(grid)
+            grids.append(grid)
+        
+        start_time = time.time()
+        json_payload = json.dumps([g.tolist() for g in grids])
+        json_time = time.time() - start_time
+        
+        start_time = time.time()
+        encoder = FrameEncoder(*grid.shape)
+        for g in grids:
+            encoder.add(g)
+        delta_payload = encoder.getvalue()
+        delta_time = time.time() - start_time
+        
+        result = {
+            'config': test_config,
+            'seed': seed,
+            'steps': steps,
+            'json_bytes': len(json_payload),
+            'json_encode_time': json_time,
+            'delta_bytes': len(delta_payload),
+            'delta_encode_time': delta_time,
+            'keyframes': encoder.stats['keyframes'],
+            'size_ratio': len(json_payload) / len(delta_payload)
+        }
+        results.append(result)
+        
+        print(f"  Grid dimensions: {grid.shape[1]}x{grid.shape[0]}")
+        print(f"  JSON:  {result['json_bytes'] / 1024 / 1024:.2f} MB in {json_time * 1000:.1f} ms")
+        print(f"  Delta: {result['delta_bytes'] / 1024 / 1024:.2f} MB in {delta_time * 1000:.1f} ms "
+              f"({result['keyframes']} keyframes)")
+        print(f"  Size ratio: {result['size_ratio']:.1f}x")
+        print()
+    
+    return results
+
+def benchmark_engines(sizes, steps=100, engines=('numpy', 'fused', 'bitpacked'), config=None, seed=None):
+    """
+    Compare the step time and the peak memory of a step of the grid engines on the same starting grid.
+    
+    Args:
+        sizes: A list of pixel sizes to benchmark.
+        steps: Number of steps to simulate for each size and engine.
+        engines: The engines to compare, the first one is the reference for the grids.
+        config: A base configuration to use (default: DEFAULT_CONFIG).
+        seed: A random seed for reproducibility.
+        
+    Returns:
+        A list of benchmark results.
+    """
+    if config is None:
+        config = DEFAULT_CONFIG.copy()
+    
+    results = []
+    
+    for size in sizes:
+        print(f"Benchmarking engines for pixel size: {size}")
+        # initialize_grid divides by the pixel size of the shared game state
+        scale = shared_game_state['config']['pixel_size']
+        start_grid = initialize_grid(config['width'] // size * scale, config['height'] // size * scale, seed)
+        print(f"  Grid dimensions: {start_grid.shape[1]}x{start_grid.shape[0]}")
+        
+        reference = None
+        for engine in engines:
+            test_config = config.copy()
+            test_config['pixel_size'] = size
+            test_config['engine'] = engine
+            update = create_grid_updater(test_config)
+            
+            grid = start_grid
+            grids = []
+            start_time = time.time()
+            for _ in range(steps):
+                grid, _, _ = update(grid)
+                grids.append(grid)
+            calculation_time = time.time() - start_time
+            
+            if reference is None:
+                reference = grids
+            identical = all(np.array_equal(a, b) for a, b in zip(reference, grids))
+            grids = None
+            
+            # Peak memory a step allocates, after a first step set up the engine's buffers
+            update = create_grid_updater(test_config)
+            grid, _, _ = update(start_grid)
+            peak_step_memory = 0
+            tracemalloc.start()
+            for _ in range(min(steps, 10)):
+                current_memory = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+                grid, _, _ = update(grid)
+                peak_step_memory = max(peak_step_memory, tracemalloc.get_traced_memory()[1] - current_memory)
+            tracemalloc.stop()
+            
+            result = {
+                'config': test_config,
+                'seed': seed,
+                'steps': steps,
+                'calculation_time': calculation_time,
+                'step_time_ms': calculation_time / steps * 1000,
+                'peak_step_memory': peak_step_memory / 1024 / 1024,
+                'identical': identical
+            }
+            results.append(result)
+            
+            print(f"  {engine}: {result['step_time_ms']:.2f} ms per step, "
+                  f"{result['peak_step_memory']:.2f} MB peak per step"
+                  f"{'' if identical else ' (grids differ from ' + engines[0] + '!)'}")
+        print()
+    
+    return results
+
 def plot_results(results, x_key, y_key, title, xlabel, ylabel):
     """
     Plot benchmark results.
@@ -359,6 +500,10 @@ def main():
                         help='Comma-separated list of speed-up intervals to benchmark')
     parser.add_argument('--max-durations', type=str, default='60,120,180,240,300',
                         help='Comma-separated list of maximum durations to benchmark')
+    parser.add_argument('--frame-format-sizes', type=str, default='5,10,20',
+                        help='Comma-separated list of pixel sizes to compare frame formats for')
+    parser.add_argument('--engine-sizes', type=str, default='1,2,5,10',
+                        help='Comma-separated list of pixel sizes to compare the grid engines for')
     parser.add_argument('--seed', type=int, default=42,
                         help='Random seed for reproducibility')
     
@@ -369,6 +514,8 @@ def main():
     speed_multipliers = [float(multiplier) for multiplier in args.speed_multipliers.split(',')]
     speed_up_intervals = [int(interval) for interval in args.speed_up_intervals.split(',')]
     max_durations = [int(duration) for duration in args.max_durations.split(',')]
+    frame_format_sizes = [int(size) for size in args.frame_format_sizes.split(',')]
+    engine_sizes = [int(size) for size in args.engine_sizes.split(',')]
     seed = args.seed
     
     # Create results directory
@@ -412,6 +559,16 @@ def main():
                  'Max Duration vs Steps', 'Max Duration (s)', 'Steps')
     save_results_to_csv(max_duration_results, 'benchmark_results/max_duration_results.csv')
     
+    # Compare frame formats
+    print("\nBenchmarking frame formats...")
+    frame_format_results = benchmark_frame_formats(frame_format_sizes, seed=seed)
+    save_results_to_csv(frame_format_results, 'benchmark_results/frame_format_results.csv')
+    
+    # Compare grid engines
+    print("\nBenchmarking grid engines...")
+    engine_results = benchmark_engines(engine_sizes, seed=seed)
+    save_results_to_csv(engine_results, 'benchmark_results/engine_results.csv')
+    
     print("\nBenchmarking complete. Results saved to benchmark_results directory.")
 
 if __name__ == '__main__':
@@ -0,0 +1,177 @@
+"""Compact binary frame format for Game of Life timelines.
+
+The JSON timeline sends every grid as nested lists (``grid.tolist()``), which
+is several bytes per cell per step. Server-side grids only hold 0 (off) and
+2 (alive), so a frame needs one bit per cell, and consecutive frames differ
+in few cells. The delta format therefore sends:
+
+* a keyframe: one type byte (FRAME_KEY) and the alive bits of the grid,
+  row-major, packed 8 cells per byte with the first cell in the high bit
+  (``np.packbits``)
+* a delta: one type byte (FRAME_DELTA), the number of changed cells as
+  uint32 and the row-major indices of the cells that flipped, as uint16 when
+  the grid has at most 65536 cells and uint32 otherwise
+
+The first frame and every ``keyframe_interval``-th frame after the last
+keyframe are keyframes, and so is any frame whose delta would be larger than
+a keyframe. All integers are little-endian.
+
+A packed timeline (``pack_timeline``) is the magic ``GOLF``, the length of a
+JSON metadata block as uint32, the metadata, and then the frames back to back.
+
+A streamed timeline starts with the magic ``GOLS``, the header length as
+uint32 and the JSON header (``stream_header``). Every state follows as one
+record: the metadata length and the frame length as uint32, the JSON state
+metadata and its frame (``stream_record``).
+"""
+import json
+import struct
+
+import numpy as np
+
+FRAME_KEY = 0
+FRAME_DELTA = 1
+KEYFRAME_INTERVAL = 60  # Frames between two forced keyframes
+TIMELINE_MAGIC = b'GOLF'
+STREAM_MAGIC = b'GOLS'
+ENCODING_NAME = 'delta-v1'
+ALIVE = 2  # Cell value the alive bit stands for
+
+
+class FrameEncoder:
+    """Encodes consecutive grids of one game as keyframes and deltas."""
+
+    def __init__(self, height, width, keyframe_interval=KEYFRAME_INTERVAL):
+        """
+        Args:
+            height: Number of grid rows
+            width: Number of grid columns
+            keyframe_interval: Frames between two forced keyframes
+        """
+        self.height = height
+        self.width = width
+        self.keyframe_interval = keyframe_interval
+        cells = height * width
+        self.index_dtype = np.dtype('<u2') if cells <= 0x10000 else np.dtype('<u4')
+        self.keyframe_size = 1 + (cells + 7) // 8
+        self.previous = None
+        self.since_keyframe = 0
+        self.frames = []
+        self.stats = {'keyframes': 0, 'deltas': 0, 'bytes': 0}
+
+    def format_info(self):
+        """Returns the parameters a decoder needs, for the timeline metadata."""
+        return {
+            'encoding': ENCODING_NAME,
+            'width': self.width,
+            'height': self.height,
+            'index_bytes': self.index_dtype.itemsize,
+            'keyframe_interval': self.keyframe_interval
+        }
+
+    def encode(self, grid):
+        """Encodes the next grid of the game.
+
+        Args:
+            grid: 2D numpy array of cell states
+
+        Returns:
+            bytes: One encoded frame
+        """
+        alive = (grid == ALIVE).ravel()
+        frame = None
+        if self.previous is not None and self.since_keyframe < self.keyframe_interval:
+            changed = np.flatnonzero(alive != self.previous)
+            if 5 + changed.size * self.index_dtype.itemsize < self.keyframe_size:
+                frame = (struct.pack('<BI', FRAME_DELTA, changed.size)
+                         + changed.astype(self.index_dtype).tobytes())
+                self.since_keyframe += 1
+                self.stats['deltas'] += 1
+        if frame is None:
+            frame = bytes((FRAME_KEY,)) + np.packbits(alive).tobytes()
+            self.since_keyframe = 0
+            self.stats['keyframes'] += 1
+        self.previous = alive
+        self.stats['bytes'] += len(frame)
+        return frame
+
+    def add(self, grid):
+        """Encodes the next grid and keeps the frame for getvalue()."""
+        self.frames.append(self.encode(grid))
+
+    def getvalue(self):
+        """Returns all frames added so far, back to back."""
+        return b''.join(self.frames)
+
+
+def decode_frames(data, height, width, index_bytes=None):
+    """Decodes a frame stream back into grids (the reference for the JavaScript decoder).
+
+    Args:
+        data: Frames as produced by FrameEncoder
+        height: Number of grid rows
+        width: Number of grid columns
+        index_bytes: Size of a delta index, derived from the grid size if None
+
+    Yields:
+        2D uint8 numpy arrays with 0 for off and 2 for alive cells
+    """
+    cells = height * width
+    if index_bytes is None:
+        index_bytes = 2 if cells <= 0x10000 else 4
+    index_dtype = np.dtype('<u2') if index_bytes == 2 else np.dtype('<u4')
+    packed_size = (cells + 7) // 8
+    alive = np.zeros(cells, dtype=bool)
+    offset = 0
+    while offset < len(data):
+        frame_type = data[offset]
+        offset += 1
+        if frame_type == FRAME_KEY:
+            packed = np.frombuffer(data, dtype=np.uint8, count=packed_size, offset=offset)
+            alive = np.unpackbits(packed, count=cells).astype(bool)
+            offset += packed_size
+        elif frame_type == FRAME_DELTA:
+            count, = struct.unpack_from('<I', data, offset)
+            offset += 4
+            changed = np.frombuffer(data, dtype=index_dtype, count=count, offset=offset)
+            alive = alive.copy()
+            alive[changed] ^= True
+            offset += count * index_bytes
+        else:
+            raise ValueError(f"Unknown frame type {frame_type} at offset {offset - 1}")
+        yield (alive.reshape(height, width).astype(np.uint8) * ALIVE)
+
+
+def pack_timeline(metadata, frames):
+    """Packs the JSON metadata and the frame stream of a timeline into one body.
+
+    Args:
+        metadata: JSON-serializable dictionary
+        frames: Encoded frames, back to back
+
+    Returns:
+        bytes: The response body
+    """
+    meta = json.dumps(metadata).encode('utf-8')
+    return TIMELINE_MAGIC + struct.pack('<I', len(meta)) + meta + frames
+
+
+def stream_header(metadata):
+    """Returns the first chunk of a streamed timeline.
+
+    Args:
+        metadata: JSON-serializable dictionary, including the frame format
+    """
+    meta = json.dumps(metadata).encode('utf-8')
+    return STREAM_MAGIC + struct.pack('<I', len(meta)) + meta
+
+
+def stream_record(state, frame):
+    """Returns the chunk of one state of a streamed timeline.
+
+    Args:
+        state: JSON-serializable state metadata
+        frame: The encoded frame of the state
+    """
+    meta = json.dumps(state).encode('utf-8')
+    return struct.pack('<II', len(meta), len(frame)) + meta + frame
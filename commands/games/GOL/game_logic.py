@@ -1,7 +1,10 @@
+import hashlib
 import random
+from collections import deque
 import numpy as np
 import json
 from commands.games.GOL.models import game_state, logger
+from commands.games.GOL.bitpacked import BitPackedEngine
 
 def initialize_grid(width, height, seed=None):
     """Initialize a random grid for Game of Life."""
@@ -113,6 +116,109 @@ def update_grid(grid):
 
     return final_grid, will_be_created, will_be_destroyed
 
+class StepKernel:
+    """Fused Game of Life step that reuses its buffers from one step to the next.
+
+    calculate_next_state and update_grid each build the masks of a step, and the
+    mark/remove/add helpers copy the whole grid. The kernel counts the neighbors
+    once, into uint8 buffers allocated for the first step, and derives the masks
+    and the transition grid from that count in place. Only the final grid is
+    allocated per step.
+
+    After a step, next_state holds the transition grid (0 off, 1 in_creation,
+    2 normal, 3 dying) and neighbors the neighbor counts. Both, and the masks
+    update_grid returns, are overwritten by the next step.
+    """
+
+    def __init__(self):
+        self.shape = None
+
+    def _allocate(self, shape):
+        height, width = shape
+        self.shape = shape
+        self.padded = np.zeros((height + 2, width + 2), dtype=np.uint8)  # Live cells with a wrapped border
+        self.row_sums = np.empty((height + 2, width), dtype=np.uint8)
+        self.neighbors = np.empty(shape, dtype=np.uint8)
+        self.next_state = np.empty(shape, dtype=np.uint8)
+        self.will_be_created = np.empty(shape, dtype=bool)
+        self.will_be_destroyed = np.empty(shape, dtype=bool)
+        self.survives = np.empty(shape, dtype=bool)
+        self.scratch = np.empty(shape, dtype=bool)
+
+    def update_grid(self, grid):
+        """Update the grid according to Game of Life rules, like update_grid.
+
+        Returns:
+            tuple: (final_grid, will_be_created, will_be_destroyed), the final grid as uint8
+        """
+        if grid.shape != self.shape:
+            self._allocate(grid.shape)
+        height, width = self.shape
+        padded = self.padded
+        alive = padded[1:-1, 1:-1]
+        neighbors = self.neighbors
+        will_be_created = self.will_be_created
+        will_be_destroyed = self.will_be_destroyed
+        survives = self.survives
+        scratch = self.scratch
+
+        # Live cells, with the opposite edges copied around them so the board wraps
+        np.equal(grid, 2, out=alive)
+        padded[0, 1:-1] = padded[height, 1:-1]
+        padded[-1, 1:-1] = padded[1, 1:-1]
+        padded[:, 0] = padded[:, width]
+        padded[:, -1] = padded[:, 1]
+
+        # Sum of each 3x3 block, minus the cell itself
+        row_sums = self.row_sums
+        np.add(padded[:, :-2], padded[:, 1:-1], out=row_sums)
+        np.add(row_sums, padded[:, 2:], out=row_sums)
+        np.add(row_sums[:-2], row_sums[1:-1], out=neighbors)
+        np.add(neighbors, row_sums[2:], out=neighbors)
+        np.subtract(neighbors, alive, out=neighbors)
+
+        # Off cells (0) with exactly 3 neighbors are created
+        np.equal(neighbors, 3, out=will_be_created)
+        np.equal(grid, 0, out=scratch)
+        np.logical_and(will_be_created, scratch, out=will_be_created)
+
+        # Normal cells (2) survive with 2 or 3 neighbors, the others are destroyed
+        np.equal(neighbors, 2, out=survives)
+        np.equal(neighbors, 3, out=scratch)
+        np.logical_or(survives, scratch, out=survives)
+        np.logical_and(survives, alive, out=survives)
+        np.logical_xor(alive, survives, out=will_be_destroyed)
+
+        # Transition grid, as calculate_next_state returns it
+        np.copyto(self.next_state, grid, casting='unsafe')
+        np.copyto(self.next_state, 1, where=will_be_created)
+        np.copyto(self.next_state, 3, where=will_be_destroyed)
+
+        np.logical_or(survives, will_be_created, out=scratch)
+        final_grid = np.multiply(scratch, 2, dtype=np.uint8)
+
+        return final_grid, will_be_created, will_be_destroyed
+
+def create_grid_updater(config):
+    """Get the update function of the engine selected by config['engine'].
+
+    'fused' steps with a StepKernel, 'bitpacked' a bit-packed board (see bitpacked.py)
+    and 'numpy' is update_grid. The first two keep buffers of one game, so create one
+    updater per game.
+
+    Returns:
+        function: Takes a grid and returns (final_grid, will_be_created, will_be_destroyed)
+    """
+    engine = config.get('engine', 'fused')
+    if engine == 'fused':
+        return StepKernel().update_grid
+    if engine == 'bitpacked':
+        return BitPackedEngine().update_grid
+    if engine != 'numpy':
+        logger.warning(f"Unknown engine '{engine}', using 'fused'")
+        return StepKernel().update_grid
+    return update_grid
+
 def is_stable(grid, history, max_history=20):
     """Check if the grid is stable (repeating pattern or all dead).
 
@@ -144,6 +250,66 @@ def is_stable(grid, history, max_history=20):
 
     return False, None
 
+class CycleDetector:
+    """Detects dead grids and repeating patterns of one game from fingerprints of its grids.
+
+    is_stable compares the grid against every grid in the history. The detector
+    keeps 16 bytes of the SHA-256 digest of each of the last max_period grids
+    instead: the first 8 are the key of a fingerprint -> step map, so a repeat
+    is found with one lookup per step, and the next 8 verify a key match.
+    A grid that matches one of the last max_period grids is a loop with a period
+    of at most max_period.
+    """
+
+    def __init__(self, max_period=20):
+        """
+        Args:
+            max_period: Longest loop period to detect, in steps
+        """
+        self.max_period = max_period
+        self.steps = {}  # fingerprint key -> (step, fingerprint check)
+        self.keys = deque()  # Fingerprint keys of the remembered steps, oldest first
+        self.step = -1
+
+    def add(self, grid):
+        """Remember the grid of the next step.
+
+        Returns:
+            int: The period if the grid repeats one of the last max_period grids, None otherwise
+        """
+        self.step += 1
+        # Grids of different engines hold the same cell values in different dtypes
+        digest = hashlib.sha256(np.ascontiguousarray(grid, dtype=np.uint8)).digest()
+        key = int.from_bytes(digest[:8], 'little')
+        check = int.from_bytes(digest[8:16], 'little')
+
+        period = None
+        seen = self.steps.get(key)
+        if seen is not None and seen[1] == check:
+            period = self.step - seen[0]
+        self.steps[key] = (self.step, check)
+        self.keys.append(key)
+
+        # Forget the step that fell out of the window, unless its key was just reused
+        if len(self.keys) > self.max_period:
+            old_key = self.keys.popleft()
+            if self.steps[old_key][0] == self.step - self.max_period:
+                del self.steps[old_key]
+        return period
+
+    def check(self, grid):
+        """Remember the grid of the next step and check if the game is stable, like is_stable.
+
+        Returns:
+            tuple: (is_stable, reason) where is_stable is a boolean and reason is a string
+        """
+        period = self.add(grid)
+        if not grid.any():
+            return True, 'dead'
+        if period is not None:
+            return True, 'loop'
+        return False, None
+
 def grid_to_json(grid):
     """Convert a numpy grid to a JSON-serializable format."""
     return grid.tolist() if grid is not None else None
@@ -16,7 +16,9 @@ DEFAULT_CONFIG = {
     'speed_up_interval': 10,
     'dustbunnies_per_second': 10,
     'update_interval': 0.5,
-    'ending_display_time': 5
+    'ending_display_time': 5,
+    'engine': 'fused',  # 'fused', 'bitpacked' or 'numpy', see game_logic.create_grid_updater
+    'max_loop_period': 20  # Longest repeating pattern that ends the game, in steps
 }
 
 # Game states dictionary - key is game UUID, value is game state
@@ -38,7 +40,7 @@ def create_game_state():
         'start_time': None,
         'last_speed_up': None,
         'speed_multiplier': 1,
-        'history': [],  # For detecting loops
+        'cycle_detector': None,  # CycleDetector for detecting loops
         'dustbunnies_awarded': 0,
         'test_mode': True,  # Flag to indicate if the game is running in test mode
         'steps': 0,  # Counter for game steps
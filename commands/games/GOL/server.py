@@ -1,16 +1,21 @@
 import threading
 import time
+from collections import deque
 from datetime import datetime, timedelta
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, render_template, jsonify, request, Response
 from pathlib import Path
 import uuid
 
 from commands.games.GOL.models import game_state, DEFAULT_CONFIG, games, get_game_state, update_game_state, reset_game_state
 from commands.games.GOL.game_logic import (
-    initialize_grid, update_grid, is_stable, grid_to_json, get_simulation_parameters, process_simulation_results,
+    initialize_grid, update_grid, create_grid_updater, CycleDetector, grid_to_json, get_simulation_parameters, process_simulation_results,
     calculate_next_state, mark_cells_to_be_created, mark_cells_to_be_destroyed, remove_dying_cells, add_new_cells
 )
 from commands.games.GOL.utils import ensure_directories, send_game_message, award_dustbunnies
+from commands.games.GOL.frame_codec import FrameEncoder, pack_timeline, stream_header, stream_record
+
+# States the stream may be ahead of the client's playback
+STREAM_LOOKAHEAD_STEPS = 30
 
 # Create Flask app
 app = Flask(__name__, 
@@ -84,10 +89,15 @@ def get_grid():
         'next_update': current_game['next_update'].timestamp() if current_game['next_update'] else None
     })
 
-@app.route('/start', methods=['POST'])
-def start_game():
-    """Start a new Game of Life and calculate all game states upfront."""
-    data = request.json or {}
+def prepare_game(data):
+    """Create or reset a game and set up its initial grid.
+
+    Args:
+        data: The request data with the optional 'seed' and 'id'
+
+    Returns:
+        tuple: (game state, game ID, seed)
+    """
     seed = data.get('seed', game_state['seed'])
     game_id = data.get('id')
 
@@ -114,7 +124,8 @@ def start_game():
     current_game['start_time'] = datetime.now()
     current_game['last_speed_up'] = datetime.now()
     current_game['speed_multiplier'] = 1
-    current_game['history'] = [current_game['grid'].copy()]
+    current_game['cycle_detector'] = CycleDetector(current_game['config'].get('max_loop_period', 20))
+    current_game['cycle_detector'].add(current_game['grid'])
     current_game['dustbunnies_awarded'] = 0
     current_game['steps'] = 0
     current_game['will_be_created'] = None
@@ -125,20 +136,30 @@ def start_game():
     # Update the game state
     update_game_state(current_game, game_id)
 
-    # Calculate all game states upfront
+    return current_game, game_id, seed
+
+def simulate_game(current_game, game_id):
+    """Run a game until it is stable or times out, one state at a time.
+
+    Args:
+        current_game: The game state set up by prepare_game
+        game_id: The ID of the game
+
+    Yields:
+        tuple: (grid, state) for the initial grid, every step and the final game over state
+    """
     now = datetime.now()
-    all_grid_states = []
+    update = create_grid_updater(current_game['config'])
 
-    # Store initial state
-    all_grid_states.append({
-        'grid': grid_to_json(current_game['grid']),
+    # Initial state
+    yield current_game['grid'], {
         'game_phase': current_game['game_phase'],
         'timestamp': now.timestamp(),
         'speed_multiplier': current_game['speed_multiplier'],
         'steps': current_game['steps'],
         'dustbunnies_awarded': current_game['dustbunnies_awarded'],
         'elapsed_time': 0
-    })
+    }
 
     # Calculate all steps until the game ends
     game_over = False
@@ -155,18 +176,13 @@ def start_game():
 
         # Process a normal Game of Life step (no intermediate phases)
         # Update the grid according to Game of Life rules
-        final_grid, _, _ = update_grid(current_game['grid'])
+        final_grid, _, _ = update(current_game['grid'])
         current_game['grid'] = final_grid
         current_game['steps'] += 1
 
-        # Add to history and check for stability
-        current_game['history'].append(current_game['grid'].copy())
-        if len(current_game['history']) > 20:
-            current_game['history'].pop(0)
-
         # Check for stability or timeout
         elapsed = (now - current_game['start_time']).total_seconds()
-        is_stable_result, stability_reason = is_stable(current_game['grid'], current_game['history'])
+        is_stable_result, stability_reason = current_game['cycle_detector'].check(current_game['grid'])
 
         if is_stable_result or elapsed >= current_game['config']['max_duration']:
             # Game is entering ending state
@@ -185,12 +201,11 @@ def start_game():
         # Award dustbunnies
         current_game['dustbunnies_awarded'] += current_game['config']['dustbunnies_per_second']
 
-        # Add the current state to the grid states array
+        # Hand out the current state
         now = now + timedelta(milliseconds=1000 / current_game['speed_multiplier'])
         elapsed = (now - current_game['start_time']).total_seconds()
 
-        all_grid_states.append({
-            'grid': grid_to_json(current_game['grid']),
+        yield current_game['grid'], {
             'game_phase': current_game['game_phase'],
             'timestamp': now.timestamp(),
             'speed_multiplier': current_game['speed_multiplier'],
@@ -199,7 +214,7 @@ def start_game():
             'elapsed_time': elapsed,
             'ending': current_game['ending'],
             'end_reason': current_game['end_reason']
-        })
+        }
 
         # If the game is over, add one more state with game_over flag
         if game_over:
@@ -207,8 +222,7 @@ def start_game():
             now = now + timedelta(seconds=current_game['config']['ending_display_time'])
             elapsed = (now - current_game['start_time']).total_seconds()
 
-            all_grid_states.append({
-                'grid': grid_to_json(current_game['grid']),
+            yield current_game['grid'], {
                 'game_phase': current_game['game_phase'],
                 'timestamp': now.timestamp(),
                 'speed_multiplier': current_game['speed_multiplier'],
@@ -219,27 +233,105 @@ def start_game():
                 'running': False,  # Game is over
                 'game_over': True,  # Explicit game over flag
                 'end_reason': current_game['end_reason']
-            })
+            }
 
     # Update the game state
     update_game_state(current_game, game_id)
 
-    # Calculate time intervals between states for the frontend
-    for i in range(len(all_grid_states) - 1):
-        all_grid_states[i]['display_time'] = (all_grid_states[i+1]['timestamp'] - all_grid_states[i]['timestamp']) * 1000  # in milliseconds
+def with_display_times(states):
+    """Add the display time of each state, which needs the timestamp of the next one.
 
-    # Set a default display time for the last state
-    if all_grid_states:
-        all_grid_states[-1]['display_time'] = 1000  # 1 second for the last state
+    Holds back one state, the last state is shown for one second.
 
-    return jsonify({
+    Args:
+        states: Iterable of (grid, state) from simulate_game
+
+    Yields:
+        tuple: (grid, state) with 'display_time' in milliseconds
+    """
+    previous = None
+    for grid, state in states:
+        if previous is not None:
+            previous[1]['display_time'] = (state['timestamp'] - previous[1]['timestamp']) * 1000
+            yield previous
+        previous = (grid, state)
+    if previous is not None:
+        previous[1]['display_time'] = 1000  # 1 second for the last state
+        yield previous
+
+@app.route('/start', methods=['POST'])
+def start_game():
+    """Start a new Game of Life and calculate all game states upfront."""
+    data = request.json or {}
+    # 'delta' returns a binary timeline (see frame_codec), 'json' the nested grid lists
+    frame_format = data.get('format', 'json')
+    current_game, game_id, seed = prepare_game(data)
+
+    # Calculate all game states upfront
+    all_grid_states = []
+    encoder = None
+    if frame_format == 'delta':
+        encoder = FrameEncoder(*current_game['grid'].shape)
+    for grid, state in with_display_times(simulate_game(current_game, game_id)):
+        if encoder is not None:
+            encoder.add(grid)
+        else:
+            state['grid'] = grid_to_json(grid)
+        all_grid_states.append(state)
+
+    response = {
         'status': 'started',
         'id': game_id,
         'seed': seed,
         'config': current_game['config'],
         'grid_states': all_grid_states,
         'total_states': len(all_grid_states)
-    })
+    }
+    if encoder is not None:
+        # Grids follow the metadata as one binary frame per state
+        response['frame_format'] = encoder.format_info()
+        return Response(pack_timeline(response, encoder.getvalue()), mimetype='application/octet-stream')
+    return jsonify(response)
+
+@app.route('/start_stream', methods=['POST'])
+def start_game_stream():
+    """Start a new Game of Life and stream its states while they are calculated.
+
+    The response is a chunked binary stream (see frame_codec.stream_header and
+    stream_record). The first state is sent right away; after that the server
+    stays at most STREAM_LOOKAHEAD_STEPS states ahead of playback, so memory does
+    not grow with the length of the game.
+    """
+    data = request.json or {}
+    current_game, game_id, seed = prepare_game(data)
+    encoder = FrameEncoder(*current_game['grid'].shape)
+    header = {
+        'status': 'started',
+        'id': game_id,
+        'seed': seed,
+        'config': current_game['config'],
+        'frame_format': encoder.format_info()
+    }
+
+    def generate():
+        yield stream_header(header)
+        # Wall-clock time at which each of the last sent states starts playing
+        play_times = deque(maxlen=STREAM_LOOKAHEAD_STEPS)
+        play_at = time.monotonic()
+        for grid, state in with_display_times(simulate_game(current_game, game_id)):
+            if not current_game['running']:
+                break  # Stopped through /stop
+            if len(play_times) == play_times.maxlen:
+                # Wait until the client plays the state STREAM_LOOKAHEAD_STEPS back
+                wait = play_times[0] - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+            yield stream_record(state, encoder.encode(grid))
+            play_times.append(play_at)
+            play_at += state['display_time'] / 1000
+
+    return Response(generate(), mimetype='application/octet-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/stop')
 def stop_game():
@@ -179,6 +179,9 @@ function init(customSeed = null) {
             statusDisplay.textContent = 'Error starting simulation';
             statusDisplay.className = 'error';
         });
+    } else if (window.ReadableStream && window.TextDecoder) {
+        // Stream the game, playback starts with the first state
+        startStreamedGame(customSeed);
     } else {
         // Start the game on the server
         fetch('/start', {
@@ -188,13 +191,19 @@ function init(customSeed = null) {
             },
             body: JSON.stringify({
                 seed: customSeed || seed,
-                id: gameId
+                id: gameId,
+                format: 'delta'
             })
         })
         .then(response => {
             if (!response.ok) {
                 throw new Error(`Server returned ${response.status}: ${response.statusText}`);
             }
+            // Binary timelines carry the grids as delta frames, older servers still send JSON
+            const contentType = response.headers.get('Content-Type') || '';
+            if (contentType.includes('application/octet-stream')) {
+                return response.arrayBuffer().then(parseTimeline);
+            }
             return response.json();
         })
         .then(data => {
@@ -232,7 +241,7 @@ function init(customSeed = null) {
                     const firstState = gridStates[0];
 
                     // Update the grid with the first state
-                    grid = firstState.grid;
+                    grid = stateGrid(firstState);
                     drawGrid();
 
                     // Set the time for the next state based on display_time
@@ -510,6 +519,202 @@ let currentGridStateIndex = 0; // Index of the current grid state being displaye
 let nextGridStateTime = null; // Time to display the next grid state
 let totalGridStates = 0; // Total number of grid states to display
 
+// Decoder for the binary frames of the current timeline (null for JSON timelines)
+let frameDecoder = null;
+let timelineFrames = null; // {bytes, offset} of the next undecoded frame of a binary timeline
+
+// Streaming state (see startStreamedGame)
+let streamOpen = false; // More states may still arrive from /start_stream
+let streamReader = null;
+
+// Parse a binary timeline: "GOLF", uint32 metadata length, JSON metadata, frames
+// (see commands/games/GOL/frame_codec.py for the frame layout)
+function parseTimeline(buffer) {
+    const bytes = new Uint8Array(buffer);
+    const view = new DataView(buffer);
+    const magic = String.fromCharCode(bytes[0], bytes[1], bytes[2], bytes[3]);
+    if (magic !== 'GOLF') {
+        throw new Error(`Unknown timeline format: ${magic}`);
+    }
+    const metadataLength = view.getUint32(4, true);
+    const data = JSON.parse(new TextDecoder().decode(bytes.subarray(8, 8 + metadataLength)));
+    frameDecoder = createFrameDecoder(data.frame_format);
+    timelineFrames = { bytes: bytes, offset: 8 + metadataLength };
+    return data;
+}
+
+// Create a decoder that turns consecutive frames into grids
+function createFrameDecoder(format) {
+    const width = format.width;
+    const height = format.height;
+    const indexBytes = format.index_bytes;
+    const cells = new Uint8Array(width * height);  // 0 = off, 2 = alive
+
+    return {
+        // Decode the frame at offset; returns the grid and the offset after the frame
+        decode(bytes, offset) {
+            const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+            const frameType = bytes[offset++];
+            if (frameType === 0) {
+                // Keyframe: alive bits, 8 cells per byte, first cell in the high bit
+                for (let i = 0; i < cells.length; i++) {
+                    cells[i] = (bytes[offset + (i >> 3)] >> (7 - (i & 7))) & 1 ? 2 : 0;
+                }
+                offset += Math.ceil(cells.length / 8);
+            } else {
+                // Delta: number of flipped cells, then their indices
+                const count = view.getUint32(offset, true);
+                offset += 4;
+                for (let k = 0; k < count; k++) {
+                    const index = indexBytes === 2 ? view.getUint16(offset, true) : view.getUint32(offset, true);
+                    offset += indexBytes;
+                    cells[index] = cells[index] ? 0 : 2;
+                }
+            }
+
+            // New rows every frame, drawGrid compares them against the previous grid
+            const rows = [];
+            for (let y = 0; y < height; y++) {
+                rows.push(cells.slice(y * width, (y + 1) * width));
+            }
+            return { grid: rows, offset: offset };
+        }
+    };
+}
+
+// Get the grid of a state; frames of a binary timeline or stream are decoded in playback order
+function stateGrid(gridState) {
+    if (gridState.grid === undefined) {
+        if (gridState.frame !== undefined) {
+            // Streamed states keep only their encoded frame until they are played
+            gridState.grid = frameDecoder.decode(gridState.frame, 0).grid;
+            gridState.frame = undefined;
+        } else if (timelineFrames) {
+            const decoded = frameDecoder.decode(timelineFrames.bytes, timelineFrames.offset);
+            timelineFrames.offset = decoded.offset;
+            gridState.grid = decoded.grid;
+        }
+    }
+    return gridState.grid;
+}
+
+// Start a game through /start_stream: playback begins with the first state while the
+// server is still calculating the rest ("GOLS" header, then one record per state)
+function startStreamedGame(customSeed) {
+    return fetch('/start_stream', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({
+            seed: customSeed || seed,
+            id: gameId
+        })
+    })
+    .then(response => {
+        if (!response.ok) {
+            throw new Error(`Server returned ${response.status}: ${response.statusText}`);
+        }
+        const reader = response.body.getReader();
+        const textDecoder = new TextDecoder();
+        let pending = new Uint8Array(0);
+        let header = null;
+        streamReader = reader;
+        streamOpen = true;
+
+        const readChunk = () => reader.read().then(({ done, value }) => {
+            if (streamReader !== reader) {
+                return; // A newer game replaced this stream
+            }
+            if (done) {
+                streamOpen = false;
+                return;
+            }
+
+            // Append the chunk to what is left of the previous one
+            const joined = new Uint8Array(pending.length + value.length);
+            joined.set(pending);
+            joined.set(value, pending.length);
+            const view = new DataView(joined.buffer);
+            let offset = 0;
+
+            if (header === null) {
+                if (joined.length < 8 || joined.length < 8 + view.getUint32(4, true)) {
+                    pending = joined;
+                    return readChunk();
+                }
+                const headerLength = view.getUint32(4, true);
+                header = JSON.parse(textDecoder.decode(joined.subarray(8, 8 + headerLength)));
+                offset = 8 + headerLength;
+                frameDecoder = createFrameDecoder(header.frame_format);
+                startPlayback(header);
+            }
+
+            // Complete records: uint32 metadata length, uint32 frame length, metadata, frame
+            while (joined.length - offset >= 8) {
+                const metadataLength = view.getUint32(offset, true);
+                const frameLength = view.getUint32(offset + 4, true);
+                if (joined.length - offset - 8 < metadataLength + frameLength) {
+                    break;
+                }
+                const state = JSON.parse(textDecoder.decode(joined.subarray(offset + 8, offset + 8 + metadataLength)));
+                // A copy, so the chunk can be freed; decoded when the state is played
+                state.frame = joined.slice(offset + 8 + metadataLength, offset + 8 + metadataLength + frameLength);
+                offset += 8 + metadataLength + frameLength;
+                receiveStreamedState(state);
+            }
+            pending = joined.slice(offset);
+            return readChunk();
+        });
+        return readChunk();
+    })
+    .catch(error => {
+        streamOpen = false;
+        console.error('Error streaming game:', error);
+        statusDisplay.textContent = 'Error starting game';
+        statusDisplay.className = 'error';
+    });
+}
+
+// Apply the header of a started game
+function startPlayback(data) {
+    // Update game ID if a new one was created
+    if (data.id && data.id !== gameId) {
+        gameId = data.id;
+        const gameIdElement = document.getElementById('game-id');
+        if (gameIdElement) {
+            gameIdElement.textContent = gameId;
+        }
+    }
+
+    seedDisplay.textContent = data.seed;
+    isRunning = true;
+    gameEnded = false;
+    statusDisplay.textContent = 'Running';
+    startButton.textContent = 'Restart Game';
+
+    // Store the configuration
+    config = data.config;
+    gridStates = [];
+    currentGridStateIndex = 0;
+    totalGridStates = 0;
+}
+
+// Add a streamed state; the first one starts playback
+function receiveStreamedState(state) {
+    gridStates.push(state);
+    totalGridStates++;
+
+    if (totalGridStates === 1) {
+        grid = stateGrid(state);
+        drawGrid();
+        nextGridStateTime = Date.now() + (state.display_time || 1000);
+        currentGridStateIndex = 1;
+        console.log('Received first streamed grid state. Starting playback.');
+        updateLoop();
+    }
+}
+
 // Update loop to play back all grid states
 function updateLoop() {
     if (!isRunning) return;
@@ -524,7 +729,7 @@ function updateLoop() {
             const gridState = gridStates[currentGridStateIndex];
 
             // Update the grid - directly assign the grid state to avoid deep copying
-            grid = gridState.grid;
+            grid = stateGrid(gridState);
 
             // Batch DOM updates to reduce layout thrashing
             // Prepare all text content updates
@@ -579,29 +784,22 @@ function updateLoop() {
 
             // Update steps display in test mode
             if (isTestMode) {
-                stepsDisplay.textContent = `${currentGridStateIndex} / ${totalGridStates}`;
+                stepsDisplay.textContent = `${totalGridStates - gridStates.length + currentGridStateIndex} / ${totalGridStates}`;
             }
 
-            // Memory management: remove processed grid states to free up memory
-            // Keep a minimal buffer of recent states
-            const bufferSize = 5; // Reduced buffer size to save memory
-            if (currentGridStateIndex > bufferSize) {
-                // Remove old states that are no longer needed
-                gridStates.splice(0, currentGridStateIndex - bufferSize);
-                // Adjust the current index to account for the removed states
-                currentGridStateIndex = bufferSize;
-
-                // Force garbage collection hint (not guaranteed but can help)
-                if (window.gc) {
-                    window.gc();
-                }
+            // Memory management: drop the states that have been played, only the one on
+            // screen is still needed (for its display time), so memory does not grow with
+            // the length of the run
+            if (currentGridStateIndex > 0) {
+                gridStates.splice(0, currentGridStateIndex);
+                currentGridStateIndex = 0;
             }
 
             // Move to the next grid state
             currentGridStateIndex++;
 
-            // If we have more grid states, schedule the next one
-            if (currentGridStateIndex < gridStates.length) {
+            // If we have more grid states (or more are being streamed), schedule the next one
+            if (currentGridStateIndex < gridStates.length || (streamOpen && !gameEnded)) {
                 // Use the display_time property if available, otherwise calculate based on timestamps
                 let timeToNextState;
                 const currentState = gridStates[currentGridStateIndex - 1];
@@ -645,6 +843,12 @@ function updateLoop() {
         }
     }
 
+    // The next streamed state has not arrived yet, wait for it
+    if (streamOpen) {
+        window.updateLoopTimeout = setTimeout(updateLoop, 50);
+        return;
+    }
+
     // If we don't have any grid states, log an error
     console.error('No grid states available for playback');
 }
@@ -701,6 +905,15 @@ function cleanupGameState() {
     // Clear grid states array to free memory
     gridStates = [];
     currentGridStateIndex = 0;
+    frameDecoder = null;
+    timelineFrames = null;
+
+    // Stop reading a stream that is still open
+    if (streamReader) {
+        streamReader.cancel().catch(() => {});
+        streamReader = null;
+    }
+    streamOpen = false;
 
     // Reset game state variables
     grid = [];
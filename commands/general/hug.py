@@ -1,10 +1,9 @@
-import json
 import random
 
-from module.shared_redis import pubsub
 
-from module.message_utils import send_message_to_redis, register_exit_handler
-from module.message_utils import log_startup, log_info, log_error, log_debug, log_warning
+from module.message_utils import send_message_to_redis
+from module.message_utils import log_info, log_error, log_debug, log_warning
+from module.command_host import run_command_loop
 
 ##########################
 # Configuration
@@ -15,14 +14,8 @@ LOG_LEVEL = "INFO"  # Use "DEBUG", "INFO", "WARNING", "ERROR", or "CRITICAL"
 ##########################
 # Initialize
 ##########################
-pubsub.subscribe('twitch.command.hug')
-pubsub.subscribe('twitch.command.cuddle')
-pubsub.subscribe('twitch.command.snuggle')
+COMMAND_ALIASES = ['hug', 'cuddle', 'snuggle']
 
-##########################
-# Exit Function
-##########################
-register_exit_handler()
 
 ##########################
 # Helper Functions
@@ -102,28 +95,31 @@ def handle_hug_command(message_obj):
 ##########################
 # Main
 ##########################
-# Send startup message
-log_startup("Hug command is ready to be used", "hug")
-
-# Main message loop
-for message in pubsub.listen():
-    if message["type"] == "message":
-        try:
-            message_obj = json.loads(message['data'].decode('utf-8'))
-            command = message_obj.get('command', '').lower()
-            content = message_obj.get('content', '')
-            print(f"Chat Command: {command} and Message: {content}")
-
-            if command in ["hug", "cuddle", "snuggle"]:
-                log_info(f"Received {command} command", "hug", {"content": content})
-                handle_hug_command(message_obj)
-
-        except Exception as e:
-            error_msg = f"Error processing hug command: {e}"
-            print(error_msg)
-            # Log the error with detailed information
-            log_error(error_msg, "hug", {
-                "error": str(e),
-                "traceback": str(e.__traceback__),
-                "message_data": str(message.get('data', 'N/A'))
-            })
+def handle_command_message(message_obj):
+    """Handles one parsed command message.
+
+    @param message_obj: The parsed message object from Twitch
+    """
+    try:
+        command = message_obj.get('command', '').lower()
+        content = message_obj.get('content', '')
+        print(f"Chat Command: {command} and Message: {content}")
+
+        if command in ["hug", "cuddle", "snuggle"]:
+            log_info(f"Received {command} command", "hug", {"content": content})
+            handle_hug_command(message_obj)
+
+    except Exception as e:
+        error_msg = f"Error processing hug command: {e}"
+        print(error_msg)
+        # Log the error with detailed information
+        log_error(error_msg, "hug", {
+            "error": str(e),
+            "traceback": str(e.__traceback__),
+            "message_data": str(message_obj)
+        })
+
+
+if __name__ == "__main__":
+    run_command_loop(COMMAND_ALIASES, handle_command_message, "hug",
+                     "Hug command is ready to be used")
@@ -1,8 +1,7 @@
-import json
-
-from module.message_utils import send_message_to_redis, register_exit_handler
-from module.message_utils import log_startup, log_info, log_error, log_debug, log_warning
-from module.shared_redis import redis_client, pubsub
+from module.message_utils import send_message_to_redis
+from module.message_utils import log_info, log_error, log_debug, log_warning
+from module.user_repository import user_repository
+from module.command_host import run_command_loop
 
 ##########################
 # Configuration
@@ -13,16 +12,8 @@ LOG_LEVEL = "INFO"  # Use "DEBUG", "INFO", "WARNING", "ERROR", or "CRITICAL"
 ##########################
 # Initialize
 ##########################
-pubsub.subscribe('twitch.command.points')
-pubsub.subscribe('twitch.command.stats')
-pubsub.subscribe('twitch.command.dustbunnies')
-pubsub.subscribe('twitch.command.balance')
+COMMAND_ALIASES = ['points', 'stats', 'dustbunnies', 'balance']
 
-##########################
-# Exit Function
-##########################
-# Register SIGINT handler for clean exit
-register_exit_handler()
 
 ##########################
 # Helper Functions
@@ -45,12 +36,11 @@ def print_statistics(username, command_name="points"):
         if username_lower.startswith("@"):
             username_lower = username_lower[1:]
 
-        user_key = f"user:{username_lower}"
+        # Only the sections shown here are read, in a single round-trip
+        user_obj = user_repository.get_user(username_lower, sections=("log", "dustbunnies", "banking"))
 
-        if redis_client.exists(user_key):
+        if user_obj is not None:
             log_debug(f"Found user data for {username}", command_name)
-            user_json = redis_client.get(user_key)
-            user_obj = json.loads(user_json)
 
             # User log information
             log = user_obj.get("log", {})
@@ -107,39 +97,42 @@ def print_statistics(username, command_name="points"):
 ##########################
 # Main
 ##########################
-# Send startup message
-log_startup("Points command is ready to be used", "points")
-
-# Main message loop
-for message in pubsub.listen():
-    if message["type"] == "message":
-        try:
-            message_obj = json.loads(message['data'].decode('utf-8'))
-            command = message_obj.get('command', '')
-            content = message_obj.get('content', '')
-            print(f"Chat Command: {command} and Message: {content}")
-
-            log_info(f"Received {command} command", command, {"content": content})
-
-            # Get username to check
-            username_to_check = message_obj["author"]["mention"]
-            requester = message_obj["author"]["display_name"]
-
-            # If moderator can check stats for other users
-            if message_obj["author"]["moderator"] or message_obj["author"]["broadcaster"]:
-                username_to_check_in_content = message_obj["content"].split()[1] if len(message_obj["content"].split()) > 1 else None
-                if username_to_check_in_content:
-                    username_to_check = username_to_check_in_content
-                    log_info(f"Moderator {requester} checking stats for {username_to_check}", command)
-
-            print_statistics(username_to_check, command)
-
-        except Exception as e:
-            error_msg = f"Error processing {command} command: {e}"
-            print(error_msg)
-            # Log the error with detailed information
-            log_error(error_msg, "points", {
-                "error": str(e),
-                "traceback": str(e.__traceback__),
-                "message_data": str(message.get('data', 'N/A'))
-            })
+def handle_command_message(message_obj):
+    """Handles one parsed command message.
+
+    @param message_obj: The parsed message object from Twitch
+    """
+    try:
+        command = message_obj.get('command', '')
+        content = message_obj.get('content', '')
+        print(f"Chat Command: {command} and Message: {content}")
+
+        log_info(f"Received {command} command", command, {"content": content})
+
+        # Get username to check
+        username_to_check = message_obj["author"]["mention"]
+        requester = message_obj["author"]["display_name"]
+
+        # If moderator can check stats for other users
+        if message_obj["author"]["moderator"] or message_obj["author"]["broadcaster"]:
+            username_to_check_in_content = message_obj["content"].split()[1] if len(message_obj["content"].split()) > 1 else None
+            if username_to_check_in_content:
+                username_to_check = username_to_check_in_content
+                log_info(f"Moderator {requester} checking stats for {username_to_check}", command)
+
+        print_statistics(username_to_check, command)
+
+    except Exception as e:
+        error_msg = f"Error processing {command} command: {e}"
+        print(error_msg)
+        # Log the error with detailed information
+        log_error(error_msg, "points", {
+            "error": str(e),
+            "traceback": str(e.__traceback__),
+            "message_data": str(message_obj)
+        })
+
+
+if __name__ == "__main__":
+    run_command_loop(COMMAND_ALIASES, handle_command_message, "points",
+                     "Points command is ready to be used")
@@ -1,10 +1,12 @@
-import json
 import threading
 
-from module.message_utils import send_message_to_redis, register_exit_handler
-from module.message_utils import log_startup, log_info, log_error, log_debug, log_warning
+from module.message_utils import send_message_to_redis
+from module.message_utils import log_info, log_error, log_debug, log_warning
 from module.shared_obs import get_obs_client
-from module.shared_redis import redis_client, pubsub
+from module.obs_batch import ObsRequestBatch, ObsBatchError, failed_results
+from module.obs_state import obs_state
+from module.shared_redis import redis_client
+from module.command_host import run_command_loop
 
 ##########################
 # Configuration
@@ -15,95 +17,88 @@ LOG_LEVEL = "WARNING"  # Use "DEBUG", "INFO", "WARNING", "ERROR", or "CRITICAL"
 ##########################
 # Initialize
 ##########################
-pubsub.subscribe('twitch.command.suika')
+COMMAND_ALIASES = ['suika']
 
 # OBS Variables
 scene_name = "Scene Fullscreen"
 source_name = "Suika Game Lite"
 zoom_filter_name = "Move: Suika Zoom"
 origin_filter_name = "Move: Suika Origin"
-is_already_big = False
+OBS_STARTUP_TIMEOUT = 10  # Seconds to wait for OBS before resetting the filter
 
-##########################
-# Exit Function
-##########################
-# Register SIGINT handler for clean exit
-register_exit_handler()
 
 ##########################
 # Helper Functions
 ##########################
-def is_filter_enabled(scene_name, filter_name):
+def add_filter_switch(batch, enable_filter, disable_filter):
     """
-    Check if a filter is enabled on a scene.
+    Add the requests that swap the two move filters of the scene to a batch,
+    leaving out filters that are already in the wanted state.
 
     Args:
-        scene_name (str): The name of the scene
-        filter_name (str): The name of the filter to check
+        batch (ObsRequestBatch): The batch to add the requests to
+        enable_filter (str): The filter to enable
+        disable_filter (str): The filter to disable
+    """
+    obs_state.add_filter_change(batch, scene_name, disable_filter, False)
+    obs_state.add_filter_change(batch, scene_name, enable_filter, True)
 
-    Returns:
-        bool or None: True if enabled, False if disabled, None if error
+def send_batch(batch):
     """
-    try:
-        obs_client = get_obs_client()
-        if obs_client is None:
-            log_warning("OBS client not connected yet. Filter status check will be skipped.", "suika")
-            return None
-
-        # Get the scene filter info
-        scene_filters = obs_client.get_source_filter_list(scene_name)
-        for filter_info in scene_filters.filters:
-            if filter_info["filterName"] == filter_name:
-                log_debug(f"Filter '{filter_name}' on scene '{scene_name}' is {'enabled' if filter_info['filterEnabled'] else 'disabled'}", "suika")
-                return filter_info["filterEnabled"]
-
-        log_warning(f"Filter '{filter_name}' not found on scene '{scene_name}'.", "suika")
-        return False
+    Send a batch and fail on the first request OBS rejected.
 
-    except Exception as e:
-        error_msg = f"Error checking filter status: {e}"
-        log_error(error_msg, "suika", {
-            "error": str(e),
-            "scene": scene_name,
-            "filter": filter_name
-        })
-        print(error_msg)
-        return None
+    Args:
+        batch (ObsRequestBatch): The batch to send
 
-def set_filter_enabled(scene_name, filter_name, enabled):
+    Returns:
+        list: The results of the batch
+    """
+    if not batch:
+        return []
+    try:
+        results = batch.send()
+    except ObsBatchError:
+        obs_state.clear()
+        raise
+    failed = failed_results(results)
+    if failed:
+        # The mirror already took the batch as done
+        obs_state.clear()
+        raise ObsBatchError(f"{failed[0]['requestType']} failed: {failed[0]['requestStatus'].get('comment')}")
+    return results
+
+def switch_filters(enable_filter, disable_filter):
     """
-    Enable or disable a filter on a scene.
+    Swap the two move filters of the scene in one OBS round-trip.
 
     Args:
-        scene_name (str): The name of the scene
-        filter_name (str): The name of the filter to modify
-        enabled (bool): Whether to enable or disable the filter
+        enable_filter (str): The filter to enable
+        disable_filter (str): The filter to disable
 
     Returns:
         bool: True if successful, False otherwise
     """
     try:
-        obs_client = get_obs_client()
-        if obs_client is None:
-            log_warning("OBS client not connected yet. Filter enable/disable will be skipped.", "suika")
-            return False
-
-        # Set the filter enabled state
-        obs_client.set_source_filter_enabled(scene_name, filter_name, enabled)
-        log_info(f"Filter '{filter_name}' on scene '{scene_name}' {'enabled' if enabled else 'disabled'}", "suika", {
+        batch = ObsRequestBatch()
+        add_filter_switch(batch, enable_filter, disable_filter)
+        if not batch:
+            log_debug(f"Filter '{enable_filter}' is already enabled.", "suika")
+            return True
+        send_batch(batch)
+        log_info(f"Filter '{enable_filter}' on scene '{scene_name}' enabled, '{disable_filter}' disabled", "suika", {
             "scene": scene_name,
-            "filter": filter_name,
-            "enabled": enabled
+            "enabled": enable_filter,
+            "disabled": disable_filter
         })
         return True
 
     except Exception as e:
-        error_msg = f"Error setting filter enabled state: {e}"
+        error_msg = f"Error switching filters: {e}"
         log_error(error_msg, "suika", {
             "error": str(e),
             "scene": scene_name,
-            "filter": filter_name,
-            "enabled": enabled
+            "enabled": enable_filter,
+            "disabled": disable_filter
         })
         print(error_msg)
         return False
@@ -112,58 +107,27 @@ def get_bigger():
     """
     Make the Suika game bigger by enabling the zoom filter.
     """
-    try:
-        global is_already_big
-        if is_already_big:
-            log_debug("Suika is already big, no change needed", "suika")
-            return
-
-        log_info("Making Suika game bigger", "suika")
-
-        # Check if the zoom filter is already enabled
-        if is_filter_enabled(scene_name, zoom_filter_name) == True:
-            log_debug(f"Filter '{zoom_filter_name}' is already enabled.", "suika")
-        else:
-            # Disable origin filter if it's enabled
-            if is_filter_enabled(scene_name, origin_filter_name) == True:
-                set_filter_enabled(scene_name, origin_filter_name, False)
-
-            # Enable zoom filter
-            set_filter_enabled(scene_name, zoom_filter_name, True)
-
-        is_already_big = True
-
-    except Exception as e:
-        error_msg = f"Error in get_bigger: {e}"
-        log_error(error_msg, "suika", {"error": str(e)})
-        print(error_msg)
+    log_info("Making Suika game bigger", "suika")
+    switch_filters(zoom_filter_name, origin_filter_name)
 
 def get_smaller():
     """
     Make the Suika game smaller by enabling the origin filter.
     """
-    try:
-        global is_already_big
-
-        log_info("Making Suika game smaller", "suika")
-
-        # Check if the origin filter is already enabled
-        if is_filter_enabled(scene_name, origin_filter_name) == True:
-            log_debug(f"Filter '{origin_filter_name}' is already enabled.", "suika")
-        else:
-            # Disable zoom filter if it's enabled
-            if is_filter_enabled(scene_name, zoom_filter_name) == True:
-                set_filter_enabled(scene_name, zoom_filter_name, False)
-
-            # Enable origin filter
-            set_filter_enabled(scene_name, origin_filter_name, True)
-
-        is_already_big = False
+    log_info("Making Suika game smaller", "suika")
+    switch_filters(origin_filter_name, zoom_filter_name)
 
+def reset_filters():
+    """
+    Make the Suika game smaller once OBS is connected, in case a previous run left it zoomed in.
+    """
+    try:
+        if get_obs_client(timeout=OBS_STARTUP_TIMEOUT) is None:
+            log_warning("OBS client not connected yet. Filter reset will be skipped.", "suika")
+            return
+        get_smaller()
     except Exception as e:
-        error_msg = f"Error in get_smaller: {e}"
-        log_error(error_msg, "suika", {"error": str(e)})
-        print(error_msg)
+        log_error(f"Error during startup: {e}", "suika", {"error": str(e)})
 
 def enable_scene():
     """
@@ -175,27 +139,27 @@ def enable_scene():
     try:
         log_info("Enabling Suika game scene", "suika")
 
-        obs_client = get_obs_client()
-        if obs_client is None:
+        current_scene = obs_state.current_program_scene()
+        if current_scene is None:
             log_warning("OBS client not connected yet. Scene change will be skipped.", "suika")
             return "Scene"  # Return a default scene name
 
-        current_scene = obs_client.get_current_program_scene().current_program_scene_name
-        scene_item_id = obs_client.get_scene_item_id(scene_name=current_scene, source_name="Suika Game Lite").scene_item_id
-        obs_client.set_scene_item_enabled(current_scene, scene_item_id, True)
+        # Show the game and apply the zoom filter in one round-trip
+        batch = ObsRequestBatch()
+        obs_state.add_scene_item_change(batch, current_scene, source_name, True)
+        add_filter_switch(batch, zoom_filter_name, origin_filter_name)
+        send_batch(batch)
 
         log_info(f"Enabled Suika Game Lite in scene {current_scene}", "suika", {
             "scene": current_scene,
-            "source": "Suika Game Lite",
-            "scene_item_id": scene_item_id
+            "source": source_name,
+            "scene_item_id": obs_state.scene_item_id(current_scene, source_name)
         })
 
-        # Apply zoom filter
-        get_bigger()
-
         return current_scene
 
     except Exception as e:
+        obs_state.clear()  # Changes queued before the error were taken as done
         error_msg = f"Error enabling scene: {e}"
         log_error(error_msg, "suika", {"error": str(e)})
         print(error_msg)
@@ -215,26 +179,23 @@ def disable_scene(scene_name, scene_item_name):
             "scene_item": scene_item_name
         })
 
-        obs_client = get_obs_client()
-        if obs_client is None:
+        current_scene = obs_state.current_program_scene()
+        if current_scene is None:
             log_warning("OBS client not connected yet. Scene change will be skipped.", "suika")
             return
 
-        # Apply origin filter
-        get_smaller()
+        # Apply the origin filter and hide the game everywhere in one round-trip
+        scenes = list(dict.fromkeys([current_scene, scene_item_name]))
+        batch = ObsRequestBatch()
+        add_filter_switch(batch, origin_filter_name, zoom_filter_name)
+        for scene in scenes:
+            obs_state.add_scene_item_change(batch, scene, source_name, False)
+        send_batch(batch)
 
-        current_scene = obs_client.get_current_program_scene().current_program_scene_name
-        scene_item_id = obs_client.get_scene_item_id(scene_name=current_scene, source_name="Suika Game Lite").scene_item_id
-        obs_client.set_scene_item_enabled(current_scene, scene_item_id, False)
-
-        log_info(f"Disabled Suika Game Lite in current scene {current_scene}", "suika")
-
-        scene_item_id = obs_client.get_scene_item_id(scene_name=scene_item_name, source_name="Suika Game Lite").scene_item_id
-        obs_client.set_scene_item_enabled(scene_item_name, scene_item_id, False)
-
-        log_info(f"Disabled Suika Game Lite in scene {scene_item_name}", "suika")
+        log_info(f"Disabled Suika Game Lite in scenes {', '.join(scenes)}", "suika")
 
     except Exception as e:
+        obs_state.clear()  # Changes queued before the error were taken as done
         error_msg = f"Error disabling scene: {e}"
         log_error(error_msg, "suika", {
             "error": str(e),
@@ -246,61 +207,61 @@ def disable_scene(scene_name, scene_item_name):
 ##########################
 # Main
 ##########################
-# Send startup message
-log_startup("Suika command is ready to be used", "suika")
-
-# Run the "Move: Sukia Origin" filter when the file is enabled
-try:
-    get_smaller()
-except Exception as e:
-    log_error(f"Error during startup: {e}", "suika", {"error": str(e)})
-
-# Main message loop
-for message in pubsub.listen():
-    if message["type"] == "message":
+# Run the "Move: Sukia Origin" filter when the file is enabled, without holding up the command host
+threading.Thread(target=reset_filters, name="suika_reset_filters", daemon=True).start()
+
+def handle_command_message(message_obj):
+    """Handles one parsed command message.
+
+    @param message_obj: The parsed message object from Twitch
+    """
+    try:
+        command = message_obj.get('command')
+        content = message_obj.get('content', '')
+        print(f"Chat Command: {command} and Message: {content}")
+
+        log_info(f"Received suika command", "suika", {"content": content})
+
+        # Send instructions
+        send_message_to_redis(' You can play Suika by typing !join. When its your turn put 0-100 in chat. If you want to leave the game type !leave. 🍉🍉🍉')
+
+        # Parse timeout duration
+        time_till_timeout = 5  # Default timeout in minutes
         try:
-            message_obj = json.loads(message['data'].decode('utf-8'))
-            command = message_obj.get('command')
-            content = message_obj.get('content', '')
-            print(f"Chat Command: {command} and Message: {content}")
-
-            log_info(f"Received suika command", "suika", {"content": content})
-
-            # Send instructions
-            send_message_to_redis(' You can play Suika by typing !join. When its your turn put 0-100 in chat. If you want to leave the game type !leave. 🍉🍉🍉')
-
-            # Parse timeout duration
-            time_till_timeout = 5  # Default timeout in minutes
-            try:
-                if len(content.split()) > 1:
-                    time_till_timeout = int(content.split()[1])
-                    log_info(f"Custom timeout set: {time_till_timeout} minutes", "suika")
-            except ValueError:
-                log_warning(f"Invalid timeout value: {content.split()[1] if len(content.split()) > 1 else 'none'}", "suika")
-
-            time_till_timeout_sec = time_till_timeout * 60
-
-            send_message_to_redis(f'Suika will timeout in {time_till_timeout} minutes')
-
-            # Enable the scene
-            save_scene = enable_scene()
-
-            # Set up the timeout timer
-            log_info(f"Setting up timeout timer for {time_till_timeout} minutes", "suika", {
-                "timeout_minutes": time_till_timeout,
-                "timeout_seconds": time_till_timeout_sec,
-                "scene": save_scene
-            })
-
-            delayed_func = threading.Timer(time_till_timeout_sec, disable_scene, args=(save_scene, "Scene BRB"))
-            delayed_func.start()
-
-        except Exception as e:
-            error_msg = f"Error processing suika command: {e}"
-            print(error_msg)
-            # Log the error with detailed information
-            log_error(error_msg, "suika", {
-                "error": str(e),
-                "traceback": str(e.__traceback__),
-                "message_data": str(message.get('data', 'N/A'))
-            })
+            if len(content.split()) > 1:
+                time_till_timeout = int(content.split()[1])
+                log_info(f"Custom timeout set: {time_till_timeout} minutes", "suika")
+        except ValueError:
+            log_warning(f"Invalid timeout value: {content.split()[1] if len(content.split()) > 1 else 'none'}", "suika")
+
+        time_till_timeout_sec = time_till_timeout * 60
+
+        send_message_to_redis(f'Suika will timeout in {time_till_timeout} minutes')
+
+        # Enable the scene
+        save_scene = enable_scene()
+
+        # Set up the timeout timer
+        log_info(f"Setting up timeout timer for {time_till_timeout} minutes", "suika", {
+            "timeout_minutes": time_till_timeout,
+            "timeout_seconds": time_till_timeout_sec,
+            "scene": save_scene
+        })
+
+        delayed_func = threading.Timer(time_till_timeout_sec, disable_scene, args=(save_scene, "Scene BRB"))
+        delayed_func.start()
+
+    except Exception as e:
+        error_msg = f"Error processing suika command: {e}"
+        print(error_msg)
+        # Log the error with detailed information
+        log_error(error_msg, "suika", {
+            "error": str(e),
+            "traceback": str(e.__traceback__),
+            "message_data": str(message_obj)
+        })
+
+
+if __name__ == "__main__":
+    run_command_loop(COMMAND_ALIASES, handle_command_message, "suika",
+                     "Suika command is ready to be used")
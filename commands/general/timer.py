@@ -1,9 +1,9 @@
-import json
 import threading
 
-from module.message_utils import send_message_to_redis, register_exit_handler
-from module.message_utils import log_startup, log_info, log_error, log_debug, log_warning
-from module.shared_redis import redis_client, pubsub
+from module.message_utils import send_message_to_redis
+from module.message_utils import log_info, log_error, log_debug, log_warning
+from module.shared_redis import redis_client
+from module.command_host import run_command_loop
 
 ##########################
 # Configuration
@@ -14,15 +14,8 @@ LOG_LEVEL = "INFO"  # Use "DEBUG", "INFO", "WARNING", "ERROR", or "CRITICAL"
 ##########################
 # Initialize
 ##########################
-pubsub.subscribe('twitch.command.timer')
-pubsub.subscribe('twitch.command.countdown')
-pubsub.subscribe('twitch.command.clock')
+COMMAND_ALIASES = ['timer', 'countdown', 'clock']
 
-##########################
-# Exit Function
-##########################
-# Register SIGINT handler for clean exit
-register_exit_handler()
 
 ##########################
 # Helper Functions
@@ -126,54 +119,57 @@ def setup_timer(username, time_name, time_in_minutes):
 ##########################
 # Main
 ##########################
-# Send startup message
-log_startup("Timer command is ready to be used", "timer")
+def handle_command_message(message_obj):
+    """Handles one parsed command message.
 
-# Main message loop
-for message in pubsub.listen():
-    if message["type"] == "message":
-        try:
-            message_obj = json.loads(message['data'].decode('utf-8'))
-            command = message_obj.get('command')
-            content = message_obj.get('content', '')
-            print(f"Chat Command: {command} and Message: {content}")
-
-            log_info(f"Received {command} command", "timer", {"content": content})
-
-            # Parse timer parameters
-            content_parts = content.split()
-            username = message_obj["author"]["mention"]
-
-            # Check if we have enough parameters
-            if len(content_parts) < 3:
-                log_warning(f"Invalid timer command format from {username}", "timer", {
-                    "content": content,
-                    "expected_format": "!timer <name> <minutes>"
-                })
-                send_message_to_redis(f"Invalid time value. Please specify the time in minutes (e.g., !timer focus 5).")
-                continue
-
-            time_name = content_parts[1]
-
-            # Parse time value
-            try:
-                time_in_minutes = int(content_parts[2])
-                if time_in_minutes <= 0:
-                    raise ValueError("Time must be positive")
-            except ValueError as e:
-                log_warning(f"Invalid time value from {username}: {content_parts[2]}", "timer")
-                send_message_to_redis(f"Invalid time value. Please specify a positive number of minutes.")
-                continue
-
-            # Set up the timer
-            setup_timer(username, time_name, time_in_minutes)
-
-        except Exception as e:
-            error_msg = f"Error processing timer command: {e}"
-            print(error_msg)
-            # Log the error with detailed information
-            log_error(error_msg, "timer", {
-                "error": str(e),
-                "traceback": str(e.__traceback__),
-                "message_data": str(message.get('data', 'N/A'))
+    @param message_obj: The parsed message object from Twitch
+    """
+    try:
+        command = message_obj.get('command')
+        content = message_obj.get('content', '')
+        print(f"Chat Command: {command} and Message: {content}")
+
+        log_info(f"Received {command} command", "timer", {"content": content})
+
+        # Parse timer parameters
+        content_parts = content.split()
+        username = message_obj["author"]["mention"]
+
+        # Check if we have enough parameters
+        if len(content_parts) < 3:
+            log_warning(f"Invalid timer command format from {username}", "timer", {
+                "content": content,
+                "expected_format": "!timer <name> <minutes>"
             })
+            send_message_to_redis(f"Invalid time value. Please specify the time in minutes (e.g., !timer focus 5).")
+            return
+
+        time_name = content_parts[1]
+
+        # Parse time value
+        try:
+            time_in_minutes = int(content_parts[2])
+            if time_in_minutes <= 0:
+                raise ValueError("Time must be positive")
+        except ValueError as e:
+            log_warning(f"Invalid time value from {username}: {content_parts[2]}", "timer")
+            send_message_to_redis(f"Invalid time value. Please specify a positive number of minutes.")
+            return
+
+        # Set up the timer
+        setup_timer(username, time_name, time_in_minutes)
+
+    except Exception as e:
+        error_msg = f"Error processing timer command: {e}"
+        print(error_msg)
+        # Log the error with detailed information
+        log_error(error_msg, "timer", {
+            "error": str(e),
+            "traceback": str(e.__traceback__),
+            "message_data": str(message_obj)
+        })
+
+
+if __name__ == "__main__":
+    run_command_loop(COMMAND_ALIASES, handle_command_message, "timer",
+                     "Timer command is ready to be used")
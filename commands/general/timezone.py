@@ -1,11 +1,10 @@
-import json
 from datetime import datetime, timedelta
 
 import pytz
-import redis
 
-from module.message_utils import send_message_to_redis, register_exit_handler
-from module.message_utils import log_startup, log_info, log_error, log_debug, log_warning
+from module.message_utils import send_message_to_redis
+from module.message_utils import log_info, log_error, log_debug, log_warning
+from module.command_host import run_command_loop
 
 ##########################
 # Configuration
@@ -16,17 +15,8 @@ LOG_LEVEL = "INFO"  # Use "DEBUG", "INFO", "WARNING", "ERROR", or "CRITICAL"
 ##########################
 # Initialize
 ##########################
-redis_client = redis.Redis(host='192.168.50.115', port=6379, db=0)
+COMMAND_ALIASES = ['timezone', 'time']
 
-pubsub = redis_client.pubsub()
-pubsub.subscribe('twitch.command.timezone')
-pubsub.subscribe('twitch.command.time')
-
-##########################
-# Exit Function
-##########################
-# Register SIGINT handler for clean exit
-register_exit_handler()
 
 ##########################
 # Helper Functions
@@ -127,58 +117,61 @@ def get_timezone_info(timezone_name=None):
 ##########################
 # Main
 ##########################
-# Send startup message
-log_startup("Timezone command is ready to be used", "timezone")
-
-# Main message loop
-for message in pubsub.listen():
-    if message["type"] == "message":
-        try:
-            message_obj = json.loads(message['data'].decode('utf-8'))
-            command = message_obj.get('command')
-            content = message_obj.get('content', '')
-            print(f"Chat Command: {command} and Message: {content}")
-
-            log_info(f"Received {command} command", "timezone", {"content": content})
-
-            # Parse timezone parameter
-            custom_timezone = None
-            content_parts = content.split()
-            if len(content_parts) > 1:
-                custom_timezone = content_parts[1]
-                username = message_obj["author"]["display_name"]
-                log_info(f"User {username} is checking timezone for {custom_timezone}", "timezone")
-            else:
-                username = message_obj["author"]["display_name"]
-                log_info(f"User {username} is checking default timezone", "timezone")
-
-            # Get timezone information
-            timezone_info = get_timezone_info(custom_timezone)
-
-            # Send German timezone info
-            german_msg = f'The current time in Germany is {timezone_info["german_time"]} ({timezone_info["german_timezone_name"]})'
-            send_message_to_redis(german_msg)
-
-            # Send custom timezone info if requested
-            if custom_timezone:
-                if timezone_info["error"]:
-                    if timezone_info["error"]["type"] == "UnknownTimeZoneError":
-                        send_message_to_redis(
-                            f'Invalid timezone: {custom_timezone}. Please use valid names like "GMT+7", "CET", "PST".')
-                    else:
-                        send_message_to_redis('An error occurred while processing the timezone. Please try again.')
+def handle_command_message(message_obj):
+    """Handles one parsed command message.
+
+    @param message_obj: The parsed message object from Twitch
+    """
+    try:
+        command = message_obj.get('command')
+        content = message_obj.get('content', '')
+        print(f"Chat Command: {command} and Message: {content}")
+
+        log_info(f"Received {command} command", "timezone", {"content": content})
+
+        # Parse timezone parameter
+        custom_timezone = None
+        content_parts = content.split()
+        if len(content_parts) > 1:
+            custom_timezone = content_parts[1]
+            username = message_obj["author"]["display_name"]
+            log_info(f"User {username} is checking timezone for {custom_timezone}", "timezone")
+        else:
+            username = message_obj["author"]["display_name"]
+            log_info(f"User {username} is checking default timezone", "timezone")
+
+        # Get timezone information
+        timezone_info = get_timezone_info(custom_timezone)
+
+        # Send German timezone info
+        german_msg = f'The current time in Germany is {timezone_info["german_time"]} ({timezone_info["german_timezone_name"]})'
+        send_message_to_redis(german_msg)
+
+        # Send custom timezone info if requested
+        if custom_timezone:
+            if timezone_info["error"]:
+                if timezone_info["error"]["type"] == "UnknownTimeZoneError":
+                    send_message_to_redis(
+                        f'Invalid timezone: {custom_timezone}. Please use valid names like "GMT+7", "CET", "PST".')
                 else:
-                    custom_info = timezone_info["custom_timezone_info"]
-                    custom_msg = f'The current time in {custom_info["name"]} is {custom_info["time"]}{custom_info["dst_status"]}.'
-                    send_message_to_redis(custom_msg)
-
-        except Exception as e:
-            error_msg = f"Error processing timezone command: {e}"
-            print(error_msg)
-            # Log the error with detailed information
-            log_error(error_msg, "timezone", {
-                "error": str(e),
-                "traceback": str(e.__traceback__),
-                "message_data": str(message.get('data', 'N/A'))
-            })
-            send_message_to_redis('An error occurred while processing the timezone. Please try again.')
+                    send_message_to_redis('An error occurred while processing the timezone. Please try again.')
+            else:
+                custom_info = timezone_info["custom_timezone_info"]
+                custom_msg = f'The current time in {custom_info["name"]} is {custom_info["time"]}{custom_info["dst_status"]}.'
+                send_message_to_redis(custom_msg)
+
+    except Exception as e:
+        error_msg = f"Error processing timezone command: {e}"
+        print(error_msg)
+        # Log the error with detailed information
+        log_error(error_msg, "timezone", {
+            "error": str(e),
+            "traceback": str(e.__traceback__),
+            "message_data": str(message_obj)
+        })
+        send_message_to_redis('An error occurred while processing the timezone. Please try again.')
+
+
+if __name__ == "__main__":
+    run_command_loop(COMMAND_ALIASES, handle_command_message, "timezone",
+                     "Timezone command is ready to be used")
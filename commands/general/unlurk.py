@@ -1,9 +1,7 @@
-import json
-
-import redis
-
-from module.message_utils import send_message_to_redis, register_exit_handler
-from module.message_utils import log_startup, log_info, log_error, log_debug, log_warning
+from module.message_utils import send_message_to_redis
+from module.message_utils import log_info, log_error, log_debug, log_warning
+from module.user_repository import user_repository
+from module.command_host import run_command_loop
 
 ##########################
 # Configuration
@@ -14,18 +12,8 @@ LOG_LEVEL = "INFO"  # Use "DEBUG", "INFO", "WARNING", "ERROR", or "CRITICAL"
 ##########################
 # Initialize
 ##########################
-redis_client = redis.Redis(host='192.168.50.115', port=6379, db=0)
-pubsub = redis_client.pubsub()
-pubsub.subscribe('twitch.command.unlurk')
-pubsub.subscribe('twitch.command.back')
-pubsub.subscribe('twitch.command.online')
-pubsub.subscribe('twitch.command.show')
+COMMAND_ALIASES = ['unlurk', 'back', 'online', 'show']
 
-##########################
-# Exit Function
-##########################
-# Register SIGINT handler for clean exit
-register_exit_handler()
 
 ##########################
 # Helper Functions
@@ -40,38 +28,16 @@ def write_unlurk_to_redis(author_obj):
     try:
         username = author_obj.get('display_name', author_obj['name'])
         username_lower = author_obj['name'].lower()
-        user_key = f"user:{username_lower}"
 
         log_info(f"Processing unlurk command for {username}", "unlurk", {
             "user": username
         })
 
-        if redis_client.exists(user_key):
-            user_json = redis_client.get(user_key)
-            user_obj = json.loads(user_json)
-            log_debug(f"Found existing user {username}", "unlurk")
-        else:
-            log_info(f"Creating new user account for {username}", "unlurk")
-            user_obj = {
-                "name": author_obj["name"],
-                "display_name": author_obj.get("display_name", author_obj["name"]),
-                "log": {"chat": 0, "command": 0, "admin": 0, "lurk": 0, "unlurk": 0},
-                "dustbunnies": {},
-                "banking": {}
-            }
-
-        if "log" not in user_obj:
-            log_debug(f"Creating log object for {username}", "unlurk")
-            user_obj["log"] = {"chat": 0, "command": 0, "admin": 0, "lurk": 0, "unlurk": 0}
-
-        previous_unlurk_count = user_obj["log"].get("unlurk", 0)
-        user_obj["log"]["unlurk"] = previous_unlurk_count + 1
-
-        redis_client.set(user_key, json.dumps(user_obj))
+        new_unlurk_count = user_repository.increment(username_lower, "log", "unlurk", display_name=author_obj.get("display_name", author_obj["name"]))
 
         log_info(f"User {username} has unlurked", "unlurk", {
-            "previous_unlurk_count": previous_unlurk_count,
-            "new_unlurk_count": user_obj["log"]["unlurk"]
+            "previous_unlurk_count": new_unlurk_count - 1,
+            "new_unlurk_count": new_unlurk_count
         })
 
         send_message_to_redis(f"Lord! {author_obj['mention']} has returned to the realm")
@@ -87,27 +53,30 @@ def write_unlurk_to_redis(author_obj):
 ##########################
 # Main
 ##########################
-# Send startup message
-log_startup("Unlurk command is ready to be used", "unlurk")
-
-# Main message loop
-for message in pubsub.listen():
-    if message["type"] == "message":
-        try:
-            message_obj = json.loads(message['data'].decode('utf-8'))
-            command = message_obj.get('command')
-            content = message_obj.get('content', '')
-            print(f"Chat Command: {command} and Message: {content}")
-
-            log_info(f"Received {command} command", "unlurk", {"content": content})
-            write_unlurk_to_redis(message_obj["author"])
-
-        except Exception as e:
-            error_msg = f"Error processing unlurk command: {e}"
-            print(error_msg)
-            # Log the error with detailed information
-            log_error(error_msg, "unlurk", {
-                "error": str(e),
-                "traceback": str(e.__traceback__),
-                "message_data": str(message.get('data', 'N/A'))
-            })
+def handle_command_message(message_obj):
+    """Handles one parsed command message.
+
+    @param message_obj: The parsed message object from Twitch
+    """
+    try:
+        command = message_obj.get('command')
+        content = message_obj.get('content', '')
+        print(f"Chat Command: {command} and Message: {content}")
+
+        log_info(f"Received {command} command", "unlurk", {"content": content})
+        write_unlurk_to_redis(message_obj["author"])
+
+    except Exception as e:
+        error_msg = f"Error processing unlurk command: {e}"
+        print(error_msg)
+        # Log the error with detailed information
+        log_error(error_msg, "unlurk", {
+            "error": str(e),
+            "traceback": str(e.__traceback__),
+            "message_data": str(message_obj)
+        })
+
+
+if __name__ == "__main__":
+    run_command_loop(COMMAND_ALIASES, handle_command_message, "unlurk",
+                     "Unlurk command is ready to be used")
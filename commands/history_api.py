@@ -0,0 +1,113 @@
+"""Small HTTP API over the chat and command history.
+
+Read-only JSON endpoints for moderation tools and overlays, backed by
+module.history_query:
+
+    GET /history/messages?type=chat          Messages of one type ("all" by default)
+    GET /history/author/<login>              Chat messages of one user
+    GET /history/command/<name>              Uses of one command
+    GET /history/activity?type=all           Messages per hour
+
+The list endpoints take ``start``/``end`` (unix seconds) or ``since`` (seconds
+before now), ``limit``, ``cursor`` (the ``next_cursor`` of the previous page)
+and ``order`` ("desc" by default, or "asc").
+
+Example: all !gamble commands in the last hour
+
+    curl "http://localhost:5010/history/command/gamble?since=3600"
+"""
+import time
+
+import redis
+from flask import Flask, jsonify, request
+
+from module.history_query import history_query, DEFAULT_PAGE_SIZE
+from module.message_utils import log_startup, log_error
+
+##########################
+# Configuration
+##########################
+# Set the log level for this command
+LOG_LEVEL = "INFO"  # Use "DEBUG", "INFO", "WARNING", "ERROR", or "CRITICAL"
+
+API_PORT = 5010
+MESSAGE_TYPE_KEY_PREFIX = 'twitch:messages:'
+
+##########################
+# Initialize
+##########################
+app = Flask(__name__)
+
+##########################
+# Helper Functions
+##########################
+def query_args():
+    """Reads the common query parameters, ignoring ones that are not numbers.
+
+    @return: Dict of keyword arguments for the HistoryQuery methods
+    """
+    start = request.args.get('start', type=float)
+    end = request.args.get('end', type=float)
+    since = request.args.get('since', type=float)
+    if since is not None:
+        start = time.time() - since
+    return {
+        "start": start,
+        "end": end,
+        "limit": request.args.get('limit', DEFAULT_PAGE_SIZE, type=int),
+        "cursor": request.args.get('cursor') or None,
+        "newest_first": request.args.get('order', 'desc').lower() != 'asc'
+    }
+
+
+def history_key_arg():
+    """@return: History key selected by the "type" parameter"""
+    return f"{MESSAGE_TYPE_KEY_PREFIX}{request.args.get('type', 'all').lower()}"
+
+
+def run_query(query, *args, params=None):
+    """Runs a query with the request's parameters and returns the JSON response.
+
+    @param params: Names of the query_args the query takes, None for all of them
+    """
+    try:
+        kwargs = query_args()
+        if params is not None:
+            kwargs = {name: kwargs[name] for name in params}
+        return jsonify(query(*args, **kwargs))
+    except (redis.ResponseError, ValueError, OverflowError) as e:
+        # Redis rejects malformed cursors, the queries reject impossible time ranges
+        return jsonify({"error": f"Invalid parameter: {e}"}), 400
+    except Exception as e:
+        error_msg = f"Error answering history query: {e}"
+        print(error_msg)
+        log_error(error_msg, "history_api", {"error": str(e), "path": request.path})
+        return jsonify({"error": "Internal error"}), 500
+
+##########################
+# Routes
+##########################
+@app.route('/history/messages')
+def messages():
+    return run_query(history_query.messages, history_key_arg())
+
+
+@app.route('/history/author/<login>')
+def author(login):
+    return run_query(history_query.by_author, login)
+
+
+@app.route('/history/command/<name>')
+def command(name):
+    return run_query(history_query.by_command, name)
+
+
+@app.route('/history/activity')
+def activity():
+    return run_query(history_query.activity, history_key_arg(), params=("start", "end"))
+
+##########################
+# Main
+##########################
+log_startup("History API is ready to be used", "history_api")
+app.run(port=API_PORT, host='0.0.0.0', threaded=True)
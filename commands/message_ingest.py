@@ -0,0 +1,305 @@
+"""Chat and command ingestion worker for the TwitchBotV2 project.
+
+Replaces chat_logger.py and command_logger.py with one process that consumes
+``twitch.chat.received`` and ``twitch.command.*`` from one pub/sub
+connection.
+
+Messages are micro-batched: the worker blocks for the first message, then
+drains whatever else is already waiting (up to MAX_BATCH_SIZE) and writes the
+whole batch with one pipeline, grouping the ZADDs per key. At low traffic a
+batch is a single message and nothing waits; during a raid batches grow on
+their own and the number of round-trips stays flat.
+
+History is appended to Redis Streams (module.chat_history) with XADD
+``MAXLEN ~``, so every entry gets a unique, time-ordered ID and trimming
+costs nothing extra. While WRITE_LEGACY_SORTED_SETS is on, the old sorted
+sets are written as well for consumers that have not moved yet.
+
+Retention is handled by module.history_retention: its policies give the
+MAXLEN of each stream, and its background sweeper (started by this worker)
+trims the sorted sets by count and age. Streams whose policy archives them
+are not capped at XADD; the sweeper archives their oldest entries and only
+then trims them. The author and time bucket indexes
+of module.history_query are written together with each batch.
+
+Per-user log counters go through the write-behind UserWriteCache.
+"""
+import json
+import signal
+import sys
+import time
+from datetime import datetime
+
+import redis
+
+from module.chat_history import chat_history, DEFAULT_MAXLEN
+from module.history_query import queue_authors, queue_buckets
+from module.history_retention import history_retention
+from module.message_utils import log_startup, log_info, log_error, log_debug
+from module.shared_redis import redis_client
+from module.user_write_cache import UserWriteCache
+
+##########################
+# Configuration
+##########################
+# Set the log level for this command
+LOG_LEVEL = "WARNING"  # Use "DEBUG", "INFO", "WARNING", "ERROR", or "CRITICAL"
+
+CHAT_CHANNEL = 'twitch.chat.received'
+COMMAND_CHANNEL_PREFIX = 'twitch.command.'
+CHAT_MESSAGES_KEY = 'twitch:messages:all'  # History of all chat messages
+COMMANDS_KEY = 'twitch:messages:commands'  # History of all commands
+COMMAND_KEY_PREFIX = 'twitch:commands:'  # History per command name
+MESSAGE_TYPE_KEY_PREFIX = 'twitch:messages:'  # History per message type
+
+# Keep writing the sorted sets next to the streams until every reader uses module.chat_history
+WRITE_LEGACY_SORTED_SETS = True
+MAX_BATCH_SIZE = 500  # Messages written per pipeline at most
+STATS_LOG_INTERVAL = 60  # Seconds between throughput log messages
+
+##########################
+# Initialize Redis
+##########################
+pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+
+# Repeated updates to the same chatters are merged and written in batches
+user_cache = UserWriteCache(name="message_ingest")
+
+##########################
+# Exit Function
+##########################
+def handle_exit(signum, frame):
+    """Handle graceful exit by unsubscribing from Redis channels."""
+    try:
+        log_info("Message ingest shutting down", "message_ingest", {"stats": stats})
+        print("Unsubscribing from all channels before exiting")
+        pubsub.unsubscribe()
+        pubsub.punsubscribe()
+        user_cache.stop()  # Write the pending user updates before exiting
+        history_retention.stop()
+    except Exception as e:
+        error_msg = f"Error during shutdown: {e}"
+        print(error_msg)
+        log_error(error_msg, "message_ingest")
+    sys.exit(0)  # Exit gracefully
+
+##########################
+# Helper Functions
+##########################
+stats = {"messages": 0, "batches": 0, "largest_batch": 0, "errors": 0}
+
+
+def stream_maxlen(key):
+    """@return: Approximate number of entries kept in the stream of a history key, None for no cap"""
+    policy = history_retention.policy_for(key)
+    if policy is not None and policy.archive and history_retention.archive is not None:
+        # Capping at XADD would drop entries before the sweeper archives them; it trims these streams itself
+        return None
+    if policy is None or policy.max_count is None:
+        return DEFAULT_MAXLEN
+    return policy.max_count
+
+
+def prepare_chat_message(message_obj, current_time):
+    """Normalizes a chat message and returns where it is stored.
+
+    @param message_obj: Parsed message from twitch.chat.received
+    @param current_time: Unix time used as the sorted set score
+    @return: (list of keys, user update)
+    """
+    # Use existing timestamp if available, otherwise add one
+    if 'timestamp' not in message_obj:
+        message_obj['timestamp'] = datetime.now().isoformat()
+    message_obj['_score'] = current_time  # Hidden field just for sorting
+
+    keys = [CHAT_MESSAGES_KEY]
+    if 'type' in message_obj:
+        keys.append(f"{MESSAGE_TYPE_KEY_PREFIX}{message_obj['type']}")
+
+    return keys, ("chat", "last_message", message_obj.get("content", ""))
+
+
+def prepare_command_message(message_obj, channel, current_time):
+    """Normalizes a command message to the unified structure and returns where it is stored.
+
+    Commands are not written to twitch:messages:all again, the chat line that
+    triggered them already arrives there through twitch.chat.received.
+
+    @param message_obj: Parsed message from twitch.command.<name>
+    @param channel: Channel the message arrived on
+    @param current_time: Unix time used as the sorted set score
+    @return: (list of keys, user update)
+    """
+    command_name = channel[len(COMMAND_CHANNEL_PREFIX):] or "unknown"
+
+    # Ensure message follows our unified structure
+    message_obj.setdefault('type', 'command')
+    message_obj.setdefault('source', 'twitch')
+    message_obj.setdefault('timestamp', datetime.now().isoformat())
+    message_obj.setdefault('metadata', {})
+    message_obj.setdefault('event_data', {})
+
+    # Make sure command is in event_data
+    if 'command' in message_obj:
+        message_obj['event_data']['command'] = message_obj.pop('command')
+    else:
+        message_obj['event_data']['command'] = command_name
+    message_obj['_score'] = current_time
+
+    keys = [COMMANDS_KEY, f"{COMMAND_KEY_PREFIX}{command_name}"]
+    return keys, ("command", "last_command", command_name)
+
+
+def queue_user_update(message_obj, user_update):
+    """Counts the message for its author in the write-behind cache."""
+    author = message_obj.get('author') or {}
+    username = author.get('name') or author.get('display_name')
+    if not username:
+        return
+    counter, last_field, last_value = user_update
+    user_cache.update(username.lower(),
+                      increments={"log": {counter: 1}},
+                      fields={"log": {
+                          last_field: last_value,
+                          "last_timestamp": message_obj["timestamp"]
+                      }},
+                      display_name=author.get('display_name', username))
+
+
+def write_batch(messages):
+    """Stores a batch of raw pub/sub messages with one pipeline.
+
+    The author index needs the stream IDs of the new messages, so it is
+    written with a second pipeline once the first one has returned them.
+
+    @param messages: List of raw pub/sub message dicts
+    @return: Number of messages stored
+    """
+    entries_by_key = {}  # key -> [(message JSON, time, author login)], duplicates kept
+    stored = 0
+
+    for message in messages:
+        channel = message['channel'].decode('utf-8')
+        try:
+            message_obj = json.loads(message['data'].decode('utf-8'))
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            stats["errors"] += 1
+            log_error(f"Error parsing message on {channel}: {e}", "message_ingest",
+                      {"data": str(message.get('data', 'N/A'))})
+            continue
+
+        current_time = time.time()
+        if message['type'] == 'pmessage':
+            keys, user_update = prepare_command_message(message_obj, channel, current_time)
+        else:
+            keys, user_update = prepare_chat_message(message_obj, current_time)
+
+        message_json = json.dumps(message_obj)
+        author = message_obj.get('author') or {}
+        login = (author.get('name') or author.get('display_name') or "").lower() or None
+        for key in keys:
+            entries_by_key.setdefault(key, []).append((message_json, current_time, login))
+
+        try:
+            queue_user_update(message_obj, user_update)
+        except Exception as ue:
+            stats["errors"] += 1
+            log_error(f"Error updating user data: {ue}", "message_ingest", {"error": str(ue)})
+        stored += 1
+
+    if not entries_by_key:
+        return 0
+
+    pipe = redis_client.pipeline(transaction=False)
+    chat_logins = []  # Author of each XADD to twitch:messages:all, in pipeline order
+    for key, entries in entries_by_key.items():
+        maxlen = stream_maxlen(key)
+        if key == CHAT_MESSAGES_KEY:
+            first_chat_result = len(pipe)
+            chat_logins = [login for _, _, login in entries]
+        for message_json, _, _ in entries:
+            chat_history.queue_append(pipe, key, message_json, maxlen)
+        queue_buckets(pipe, key, [current_time for _, current_time, _ in entries])
+
+    if WRITE_LEGACY_SORTED_SETS:
+        for key, entries in entries_by_key.items():
+            pipe.zadd(key, {message_json: current_time for message_json, current_time, _ in entries})
+
+    try:
+        results = pipe.execute()
+        if chat_logins:
+            entry_ids = results[first_chat_result:first_chat_result + len(chat_logins)]
+            index_pipe = redis_client.pipeline(transaction=False)
+            queue_authors(index_pipe, [(login, entry_id) for login, entry_id in zip(chat_logins, entry_ids)
+                                       if login])
+            index_pipe.execute()
+    except redis.RedisError as re:
+        stats["errors"] += 1
+        error_msg = f"Redis error storing {stored} messages: {re}"
+        print(error_msg)
+        log_error(error_msg, "message_ingest", {"error": str(re)})
+        return 0
+
+    log_debug(f"Stored batch of {stored} messages", "message_ingest", {"keys": len(entries_by_key)})
+    return stored
+
+
+def read_batch(timeout=1.0):
+    """Blocks for one message, then drains the ones already waiting.
+
+    @param timeout: Seconds to wait for the first message
+    @return: List of raw pub/sub messages, empty if nothing arrived
+    """
+    deadline = time.monotonic() + timeout
+    message = pubsub.get_message(timeout=timeout)
+    # Subscribe confirmations come back as None, keep waiting for a real message
+    while message is None:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return []
+        message = pubsub.get_message(timeout=remaining)
+    batch = [message]
+    while len(batch) < MAX_BATCH_SIZE:
+        message = pubsub.get_message(timeout=0)
+        if message is None:
+            break
+        batch.append(message)
+    return batch
+
+##########################
+# Main
+##########################
+def main():
+    signal.signal(signal.SIGINT, handle_exit)
+    signal.signal(signal.SIGTERM, handle_exit)
+
+    pubsub.subscribe(CHAT_CHANNEL)
+    pubsub.psubscribe(f"{COMMAND_CHANNEL_PREFIX}*")
+    user_cache.start()
+    history_retention.start()
+
+    # Send startup message
+    log_startup("Message ingest is now active and listening for chat messages and commands", "message_ingest")
+
+    last_stats_log = time.monotonic()
+    while True:
+        batch = read_batch()
+        if batch:
+            try:
+                stats["messages"] += write_batch(batch)
+                stats["batches"] += 1
+                stats["largest_batch"] = max(stats["largest_batch"], len(batch))
+            except Exception as e:
+                stats["errors"] += 1
+                error_msg = f"Error processing message batch: {e}"
+                print(error_msg)
+                log_error(error_msg, "message_ingest", {"error": str(e), "batch_size": len(batch)})
+
+        if time.monotonic() - last_stats_log >= STATS_LOG_INTERVAL:
+            last_stats_log = time.monotonic()
+            log_info("Message ingest throughput", "message_ingest", {"stats": stats, "user_cache": user_cache.stats,
+                                                         "retention": history_retention.stats})
+
+
+if __name__ == "__main__":
+    main()
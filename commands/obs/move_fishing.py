@@ -1,9 +1,11 @@
-import time
+from concurrent.futures import ThreadPoolExecutor
 
 from flask import Flask, request
 
 from module.message_utils import send_admin_message_to_redis, log_startup
 from module.shared_obs import get_obs_client
+from module.obs_batch import ObsRequestBatch, ObsBatchError, failed_results
+from module.obs_state import obs_state
 from module.shared_redis import redis_client
 
 ##########################
@@ -18,9 +20,12 @@ origin_filter_name = "Move: Fishing Origin"
 start_scale = (0.3, 0.3)
 end_scale = (1, 1)
 duration_ms = 1000
-is_already_big = False
+OBS_STARTUP_TIMEOUT = 10  # Seconds to wait for OBS before resetting the filter
 app = Flask(__name__)
 
+# One worker keeps OBS changes in the order the webhooks arrived
+obs_worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="move_fishing_obs")
+
 ##########################
 # Exit Function
 ##########################
@@ -32,120 +37,73 @@ app = Flask(__name__)
 def send_message_to_redis(send_message):
     redis_client.publish('twitch.chat.send', send_message)
 
-def get_scene_item_id(scene_name, source_name):
-    obs_client = get_obs_client()
-    if obs_client is None:
-        print("OBS client not connected yet. Scene item ID lookup will be skipped.")
-        return None
-
-    try:
-        scene_item_list = obs_client.get_scene_item_list(scene_name)
-        for item in scene_item_list.scene_items:
-            if item["sourceName"] == source_name:
-                return item["sceneItemId"]
-        raise ValueError(f"Quelle '{source_name}' nicht in Szene '{scene_name}' gefunden.")
-    except Exception as e:
-        print(f"Error getting scene item ID: {e}")
-        return None
-
-def is_filter_enabled(scene_name, filter_name):
-    """Check if a filter is enabled on a scene."""
-    obs_client = get_obs_client()
-    if obs_client is None:
-        print("OBS client not connected yet. Filter status check will be skipped.")
-        return None
-
+def switch_filters(scene_name, enable_filter, disable_filter):
+    """Disables one filter and enables another in a single OBS round-trip, skipping filters already set."""
+    batch = ObsRequestBatch()
     try:
-        # Get the scene filter info
-        scene_filters = obs_client.get_source_filter_list(scene_name)
-        for filter_info in scene_filters.filters:
-            if filter_info["filterName"] == filter_name:
-                return filter_info["filterEnabled"]
-        print(f"Filter '{filter_name}' not found on scene '{scene_name}'.")
-        return False
-    except Exception as e:
-        print(f"Error checking filter status: {e}")
-        return None
-
-def set_filter_enabled(scene_name, filter_name, enabled):
-    """Enable or disable a filter on a scene."""
-    obs_client = get_obs_client()
-    if obs_client is None:
-        print("OBS client not connected yet. Filter enable/disable will be skipped.")
-        return False
-
-    try:
-        # Set the filter enabled state
-        obs_client.set_source_filter_enabled(scene_name, filter_name, enabled)
-        print(f"Filter '{filter_name}' on scene '{scene_name}' {'enabled' if enabled else 'disabled'}.")
+        obs_state.add_filter_change(batch, scene_name, disable_filter, False)
+        obs_state.add_filter_change(batch, scene_name, enable_filter, True)
+        if not batch:
+            return True
+        for result in failed_results(batch.send()):
+            print(f"Error switching filters: {result['requestStatus'].get('comment')}")
+            obs_state.clear()
+            return False
+        print(f"Filter '{enable_filter}' on scene '{scene_name}' enabled, '{disable_filter}' disabled.")
         return True
     except Exception as e:
-        print(f"Error setting filter enabled state: {e}")
+        print(f"Error switching filters: {e}")
+        obs_state.clear()
         return False
 
 def resize_source(scene_name, source_name, start_scale, end_scale, duration_ms, steps=10):
-    scene_item_id = get_scene_item_id(scene_name, source_name)
+    try:
+        scene_item_id = obs_state.scene_item_id(scene_name, source_name)
+    except Exception as e:
+        print(f"Error getting scene item ID: {e}")
+        return
     if scene_item_id is None:
         print("Cannot resize source because scene item ID could not be found.")
         return
 
-    obs_client = get_obs_client()
-    if obs_client is None:
-        print("OBS client not connected yet. Resize will be skipped.")
-        return
-
     scale_step = [(end - start) / steps for start, end in zip(start_scale, end_scale)]
-    interval = duration_ms / steps / 1000  # Umrechnung von ms in Sekunden
-
+    interval_ms = duration_ms / steps
+
+    # All steps go to OBS in one batch, OBS sleeps between them
+    batch = ObsRequestBatch()
+    for i in range(steps + 1):
+        current_scale = [start + step * i for start, step in zip(start_scale, scale_step)]
+        transform = {
+            "scaleX": current_scale[0],
+            "scaleY": current_scale[1]
+        }
+        if i:
+            batch.sleep(millis=interval_ms)
+        batch.add("SetSceneItemTransform", {"sceneName": scene_name, "sceneItemId": scene_item_id,
+                                            "sceneItemTransform": transform})
     try:
-        for i in range(steps + 1):
-            current_scale = [start + step * i for start, step in zip(start_scale, scale_step)]
-            transform = {
-                "scaleX": current_scale[0],
-                "scaleY": current_scale[1]
-            }
-            obs_client.set_scene_item_transform(scene_name, scene_item_id, transform)
-            time.sleep(interval)
-    except Exception as e:
+        batch.send()
+    except ObsBatchError as e:
         print(f"Error resizing source: {e}")
 
 def get_bigger():
-    global is_already_big
-    if is_already_big:
-        return
-
-    # Check if the zoom filter is already enabled
-    if is_filter_enabled(scene_name, zoom_filter_name) == True:
-        print(f"Filter '{zoom_filter_name}' is already enabled.")
-    else:
-        # Disable origin filter if it's enabled
-        if is_filter_enabled(scene_name, origin_filter_name) == True:
-            set_filter_enabled(scene_name, origin_filter_name, False)
-
-        # Enable zoom filter
-        set_filter_enabled(scene_name, zoom_filter_name, True)
-
-    is_already_big = True
+    # Disable the origin filter and enable the zoom filter in one round-trip
+    switch_filters(scene_name, zoom_filter_name, origin_filter_name)
 
 def get_smaller():
-    global is_already_big
-
-    # Check if the origin filter is already enabled
-    if is_filter_enabled(scene_name, origin_filter_name) == True:
-        print(f"Filter '{origin_filter_name}' is already enabled.")
-    else:
-        # Disable zoom filter if it's enabled
-        if is_filter_enabled(scene_name, zoom_filter_name) == True:
-            set_filter_enabled(scene_name, zoom_filter_name, False)
-
-        # Enable origin filter
-        set_filter_enabled(scene_name, origin_filter_name, True)
+    # Disable the zoom filter and enable the origin filter in one round-trip
+    switch_filters(scene_name, origin_filter_name, zoom_filter_name)
 
-    is_already_big = False
+def reset_filters():
+    # Wait for the first connection, then undo a zoom a previous run may have left on
+    if get_obs_client(timeout=OBS_STARTUP_TIMEOUT) is None:
+        print("OBS client not connected yet. Filter reset will be skipped.")
+        return
+    get_smaller()
 
 @app.route('/webhook1', methods=['POST'])
 def webhook1():
-    get_bigger()
+    obs_worker.submit(get_bigger)  # Respond right away, OBS is updated in the background
     data = request.json
     print("Webhook 1 empfangen:", data)
     return '', 200
@@ -156,7 +114,7 @@ def webhook2():
     print("Webhook 2 empfangen:", data)
     if data["queueLength"] > 0:
         return '', 200
-    get_smaller()
+    obs_worker.submit(get_smaller)
     return '', 200
 
 
@@ -164,8 +122,9 @@ def webhook2():
 ##########################
 # Main
 ##########################
-# Run the "Move: Fishing Origin" filter when the file is enabled
-get_smaller()
+# Run the "Move: Fishing Origin" filter when the file is enabled; on the OBS worker, so the webhooks
+# start right away and their changes run after the reset
+obs_worker.submit(reset_filters)
 
 log_startup("Move Fishing command is ready to be used", "move_fishing" )
 app.run(port=5005, host='0.0.0.0')
@@ -5,7 +5,7 @@ import time
 from datetime import datetime
 
 from module.shared_redis import redis_client, pubsub
-from module.shared_obs import send_custom_message
+from module.overlay_delivery import OverlayLogDelivery
 
 ##########################
 # Configuration
@@ -135,6 +135,10 @@ print(f"System logger running with log level: {SYSTEM_LOG_LEVEL_NAME} ({SYSTEM_L
 # Subscribe to system command pattern (and admin for backward compatibility)
 pubsub.psubscribe('system.*', 'admin.*')
 
+# Log messages reach the OBS overlay merged and rate-limited from a background thread
+overlay_delivery = OverlayLogDelivery()
+overlay_delivery.start()
+
 ##########################
 # Helper Functions
 ##########################
@@ -290,10 +294,12 @@ def send_log_message(level_name, content, caller=None, **kwargs):
 def handle_exit(signum, frame):
     print("Unsubscribing from all channels before exiting")
     pubsub.punsubscribe()
+    overlay_delivery.stop()
     sys.exit(0)  # Exit gracefully
 
-# Register SIGINT handler
+# Register signal handlers
 signal.signal(signal.SIGINT, handle_exit)
+signal.signal(signal.SIGTERM, handle_exit)
 
 ##########################
 # Main
@@ -452,10 +458,10 @@ for message in pubsub.listen():
                     if 'col' not in obs_message:
                         obs_message['col'] = 0  # Default to first column
 
-                    # Send to OBS
-                    send_custom_message(obs_message)
+                    # Queue for OBS, the delivery thread merges and sends it
+                    overlay_delivery.submit(obs_message)
                 except Exception as e:
-                    print(f"Error sending log message to OBS: {e}")
+                    print(f"Error queueing log message for OBS: {e}")
             else:
                 print(f"Stored {command_type} command: {command_name} - {message_obj.get('content', 'No content')}")
 
@@ -1,16 +1,15 @@
 #!/usr/bin/env python3
 """Template for creating new command files in the TwitchBotV2 project.
 
-Usage: Copy, rename, modify subscriptions and implement command logic.
+Usage: Copy, rename, modify COMMAND_ALIASES and implement command logic.
+The file runs standalone (python command_template.py) or as a plugin inside
+the command host (python -m module.command_host command_template).
 """
-import json
-
 from module.message_utils import (
-    register_exit_handler, 
-    log_startup, log_debug, log_info, log_warning, log_error, log_critical
+    log_debug, log_info, log_warning, log_error, log_critical
 )
-from module.shared_obs import get_obs_client
-from module.shared_redis import pubsub
+from module.shared_obs import get_obs_client, obs_connection
+from module.command_host import run_command_loop
 
 ##########################
 # Configuration
@@ -21,19 +20,15 @@ LOG_LEVEL = "INFO"  # Use "DEBUG", "INFO", "WARNING", "ERROR", or "CRITICAL"
 ##########################
 # Initialize
 ##########################
-# Replace with your command name(s)
-pubsub.subscribe('twitch.command.example')
-pubsub.subscribe('twitch.command.alias')  # Optional additional command aliases
+# Replace with your command name(s), each is served on twitch.command.<alias>
+COMMAND_ALIASES = ['example', 'alias']  # First entry plus optional additional aliases
 
 # Initialize any command-specific variables here
 COOLDOWN_SECONDS = 30
 cooldown_users = {}
 
-##########################
-# Exit Function
-##########################
-# Register SIGINT handler for clean exit
-register_exit_handler()
+# Commands that use OBS connect in the background at startup, get_obs_client() never blocks
+obs_connection.start()
 
 ##########################
 # Helper Functions
@@ -120,72 +115,65 @@ def handle_command(message_obj):
 ##########################
 # Main
 ##########################
-# Send startup message with custom styling
-log_startup("Example command is ready to be used", "example", {
-    "version": "1.0.0",
-    "config": {
-        "log_level": LOG_LEVEL,
-        "cooldown": COOLDOWN_SECONDS
-    },
-    # Custom styling for this specific startup message
-    "icon": "rocket",
-    "actions": [
-        {
-            "label": "View Documentation",
-            "actionType": "url",
-            "url": "https://example.com/docs",
-            "urlTarget": "_blank",
-            "theme": "info"
-        }
-    ]
-})
-
-# Main message loop
-for message in pubsub.listen():
-    if message["type"] == "message":
-        try:
-            # Parse the message data
-            message_obj = json.loads(message['data'].decode('utf-8'))
-            command = message_obj.get('command')
-            content = message_obj.get('content')
-            username = message_obj.get('author', {}).get('name', 'Unknown')
-
-            # Log the received command with basic info
-            log_info(f"Received command: {command}", "example", {
-                "user": username,
-                "content": content,
-                "timestamp": message_obj.get('timestamp')
-            })
-
-            # Print to console for debugging
-            print(f"Chat Command: {command} from {username}: {content}")
-
-            # Process the command
-            handle_command(message_obj)
-
-        except json.JSONDecodeError as e:
-            # Specific handling for JSON parsing errors
-            error_msg = f"Invalid JSON format in message: {e}"
-            print(error_msg)
-            log_error(error_msg, "example", {
-                "error": str(e),
-                "error_type": "JSONDecodeError",
-                "message_data": str(message.get('data', 'N/A')),
-                "icon": "file-code"  # Custom icon for JSON errors
-            })
-
-        except Exception as e:
-            # General error handling
-            error_msg = f"Error processing command: {e}"
-            print(error_msg)
-
-            # Get detailed traceback information
-            import traceback
-            tb_str = traceback.format_exc()
+def handle_command_message(message_obj):
+    """Handles one parsed command message.
 
-            # Log the error with detailed information and custom styling
-            log_error(error_msg, "example", {
-                "error": str(e),
-                "traceback": str(e.__traceback__),
-                "message_data": str(message.get('data', 'N/A'))
-            })
+    @param message_obj: The parsed message object from Twitch
+    """
+    try:
+        # The message is already parsed from JSON by the command loop / host
+        command = message_obj.get('command')
+        content = message_obj.get('content')
+        username = message_obj.get('author', {}).get('name', 'Unknown')
+
+        # Log the received command with basic info
+        log_info(f"Received command: {command}", "example", {
+            "user": username,
+            "content": content,
+            "timestamp": message_obj.get('timestamp')
+        })
+
+        # Print to console for debugging
+        print(f"Chat Command: {command} from {username}: {content}")
+
+        # Process the command
+        handle_command(message_obj)
+
+    except Exception as e:
+        # General error handling
+        error_msg = f"Error processing command: {e}"
+        print(error_msg)
+
+        # Get detailed traceback information
+        import traceback
+        tb_str = traceback.format_exc()
+
+        # Log the error with detailed information and custom styling
+        log_error(error_msg, "example", {
+            "error": str(e),
+            "traceback": str(e.__traceback__),
+            "message_data": str(message_obj)
+        })
+
+
+if __name__ == "__main__":
+    # Send startup message with custom styling
+    run_command_loop(COMMAND_ALIASES, handle_command_message, "example",
+                     "Example command is ready to be used", startup_data={
+                         "version": "1.0.0",
+                         "config": {
+                             "log_level": LOG_LEVEL,
+                             "cooldown": COOLDOWN_SECONDS
+                         },
+                         # Custom styling for this specific startup message
+                         "icon": "rocket",
+                         "actions": [
+                             {
+                                 "label": "View Documentation",
+                                 "actionType": "url",
+                                 "url": "https://example.com/docs",
+                                 "urlTarget": "_blank",
+                                 "theme": "info"
+                             }
+                         ]
+                     })
@@ -0,0 +1,67 @@
+import redis
+import json
+import sys
+from datetime import datetime
+
+from module.user_repository import UserRepository, USER_SECTIONS
+
+REDIS_HOST = '192.168.50.115'
+REDIS_PORT = 6379
+REDIS_DB = 0
+
+def find_blob_users(r):
+    # Profile blobs that still carry their sections inline
+    repo = UserRepository(client=r)
+    for username in repo.iter_usernames():
+        raw = r.get(repo.profile_key(username))
+        if raw is None:
+            continue
+        try:
+            user_json = json.loads(raw)
+        except Exception as e:
+            print(f"[ERROR] Could not decode user:{username}: {e}")
+            continue
+        if any(isinstance(user_json.get(section), dict) for section in USER_SECTIONS):
+            yield username, user_json
+
+def migrate_user_json_to_hashes(test=False, show_final_json=False, log_file_path='migration_hashes_log.jsonl'):
+    r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB)
+    repo = UserRepository(client=r)
+    migrated_users = []
+    log_entries = []
+
+    for username, user_json in find_blob_users(r):
+        sections = {s: user_json[s] for s in USER_SECTIONS if isinstance(user_json.get(s), dict)}
+        if test or show_final_json:
+            for section, values in sections.items():
+                print(f"[TEST] {repo.section_key(username, section)}:\n{json.dumps(values, indent=2)}\n")
+        if not test:
+            sections = repo.migrate_user(username)
+        migrated_users.append(username)
+        log_entries.append({
+            'timestamp': datetime.utcnow().isoformat(),
+            'action': 'migrate_sections_to_hashes',
+            'key': repo.profile_key(username),
+            'username': username,
+            'old_data': user_json,
+            'sections': list(sections)
+        })
+
+    # Write log file
+    if log_entries and not test:
+        with open(log_file_path, 'w', encoding='utf-8') as f:
+            for entry in log_entries:
+                f.write(json.dumps(entry) + '\n')
+        print(f"Migration log written to {log_file_path}")
+
+    print(f"Migrated users: {sorted(migrated_users)}")
+    print(f"Total migrated: {len(migrated_users)}")
+    if test:
+        print("[TEST MODE] No changes were written to Redis.")
+        return
+    print("Migration complete.\n")
+
+if __name__ == '__main__':
+    test_mode = '--test' in sys.argv
+    show_final_json = '--show-json' in sys.argv or test_mode
+    migrate_user_json_to_hashes(test=test_mode, show_final_json=show_final_json)
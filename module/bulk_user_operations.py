@@ -0,0 +1,139 @@
+"""Bulk user operations for the TwitchBotV2 project.
+
+Applying something to every user (a broadcaster "give all", a reset, a
+backfill) used to list users with ``KEYS user:*`` - which blocks the Redis
+server for the whole keyspace walk - and then spend one or two round-trips
+per user, stalling every other command that shares the connection.
+
+``apply_to_all_users`` walks the profiles with cursor-based SCAN instead and
+queues the work for each SCAN batch into one pipeline, so Redis is never
+blocked for longer than one batch and a batch costs a single round-trip.
+Progress is reported through an optional callback after every batch and
+logged every few seconds.
+
+The operation is any function ``operation(pipe, repository, username)`` that
+queues commands on the pipeline; ``credit_all_users`` is the common case of
+adding an amount to one section counter of every user.
+"""
+import time
+
+from module.user_repository import user_repository, USER_KEY_PREFIX, BALANCE_SECTION, BALANCE_FIELD
+from module.message_utils import log_info, log_debug, log_error
+
+##########################
+# Configuration
+##########################
+# Set the log level for this module
+LOG_LEVEL = "INFO"  # Use "DEBUG", "INFO", "WARNING", "ERROR", or "CRITICAL"
+
+BULK_BATCH_SIZE = 1000  # SCAN count hint and keys handled per pipeline
+PROGRESS_LOG_INTERVAL = 5  # Seconds between progress log messages
+
+##########################
+# Bulk Operations
+##########################
+def iter_username_batches(repository=user_repository, batch_size=BULK_BATCH_SIZE):
+    """Walks all user profiles with SCAN, yielding one batch of usernames per call.
+
+    Section hashes (user:{name}:{section}) match the same pattern and are
+    skipped, so batches can be smaller than batch_size. SCAN can return a key
+    more than once while Redis rehashes the keyspace, so usernames that were
+    already yielded are skipped as well; otherwise a give-all would credit
+    them twice.
+
+    @param repository: UserRepository whose client is scanned
+    @param batch_size: SCAN count hint
+    @return: Generator of username lists
+    """
+    seen = set()
+    cursor = 0
+    while True:
+        cursor, keys = repository.client.scan(cursor=cursor, match=f"{USER_KEY_PREFIX}*", count=batch_size)
+        usernames = []
+        for key in keys:
+            if not repository.is_profile_key(key):
+                continue
+            username = key.decode('utf-8')[len(USER_KEY_PREFIX):]
+            if username not in seen:
+                seen.add(username)
+                usernames.append(username)
+        if usernames:
+            yield usernames
+        if cursor == 0:
+            break
+
+
+def apply_to_all_users(operation, name="bulk operation", repository=user_repository,
+                       batch_size=BULK_BATCH_SIZE, progress_callback=None):
+    """Runs an operation for every user, one pipeline per SCAN batch.
+
+    A failing batch is logged and skipped so the rest of the users are
+    still processed.
+
+    @param operation: Function(pipe, repository, username) that queues commands for one user
+    @param name: Name of the operation used in log messages
+    @param repository: UserRepository to operate on
+    @param batch_size: SCAN count hint and pipeline size
+    @param progress_callback: Optional function(processed_users, batches) called after each batch
+    @return: Dict with processed, failed, batches and elapsed seconds
+    """
+    result = {"processed": 0, "failed": 0, "batches": 0, "elapsed": 0.0}
+    start = time.perf_counter()
+    last_log = start
+
+    log_info(f"Starting {name} for all users", "bulk_user_operations", {"batch_size": batch_size})
+
+    for usernames in iter_username_batches(repository, batch_size):
+        result["batches"] += 1
+        try:
+            # Old-format blobs must be moved into their hashes before the hashes are written
+            repository.ensure_migrated_many(usernames)
+            with repository.client.pipeline(transaction=False) as pipe:
+                for username in usernames:
+                    operation(pipe, repository, username)
+                pipe.execute()
+            result["processed"] += len(usernames)
+        except Exception as e:
+            result["failed"] += len(usernames)
+            error_msg = f"Error in {name} for a batch of {len(usernames)} users: {e}"
+            print(error_msg)
+            log_error(error_msg, "bulk_user_operations", {"error": str(e), "first_user": usernames[0]})
+
+        if progress_callback:
+            progress_callback(result["processed"], result["batches"])
+
+        now = time.perf_counter()
+        if now - last_log >= PROGRESS_LOG_INTERVAL:
+            last_log = now
+            log_info(f"{name}: {result['processed']} users processed", "bulk_user_operations", {
+                "batches": result["batches"],
+                "failed": result["failed"]
+            })
+        else:
+            log_debug(f"{name}: batch {result['batches']} done", "bulk_user_operations", {
+                "batch_users": len(usernames),
+                "processed": result["processed"]
+            })
+
+    result["elapsed"] = time.perf_counter() - start
+    log_info(f"Finished {name} for {result['processed']} users", "bulk_user_operations", result)
+    return result
+
+
+def credit_all_users(amount, section=BALANCE_SECTION, field=BALANCE_FIELD, repository=user_repository,
+                     batch_size=BULK_BATCH_SIZE, progress_callback=None):
+    """Adds an amount to one counter of every user.
+
+    @param amount: Amount to add (negative to take away)
+    @param section: Section holding the counter
+    @param field: Counter field name
+    @param repository: UserRepository to operate on
+    @param batch_size: SCAN count hint and pipeline size
+    @param progress_callback: Optional function(processed_users, batches) called after each batch
+    @return: Dict with processed, failed, batches and elapsed seconds
+    """
+    def credit(pipe, repo, username):
+        pipe.hincrby(repo.section_key(username, section), field, amount)
+
+    return apply_to_all_users(credit, name=f"credit {amount} {field}", repository=repository,
+                              batch_size=batch_size, progress_callback=progress_callback)
@@ -0,0 +1,221 @@
+"""Chat and command history on Redis Streams for the TwitchBotV2 project.
+
+The history used to live in sorted sets (``twitch:messages:all``,
+``twitch:messages:{type}``, ``twitch:messages:commands`` and
+``twitch:commands:{command}``) with the full message JSON as the member and
+the arrival time as the score. That needed ZCARD + ZREMRANGEBYRANK to stay
+capped, and two identical payloads collapsed into one member.
+
+Each history key now has a stream next to it (``twitch:stream:`` + the part
+after ``twitch:``, e.g. ``twitch:stream:messages:all``):
+
+* entries are appended with XADD and trimmed in the same command with
+  ``MAXLEN ~``, which Redis applies cheaply on whole macro nodes
+* stream IDs are millisecond timestamps, so every entry has a unique,
+  time-ordered key and time ranges map directly to XRANGE bounds
+* consumers can follow the history with ``read_new`` (XREAD) instead of
+  polling
+
+During the switch the ingest worker can keep writing the sorted sets too
+(WRITE_LEGACY_SORTED_SETS in commands/message_ingest.py). ``read_scored``
+returns ``(message_json, score)`` pairs like ``ZRANGEBYSCORE ... WITHSCORES``
+and fills anything older than the stream from the sorted set, so code
+written against the sorted sets keeps working unchanged.
+"""
+import json
+
+from module.shared_redis import redis_client
+
+##########################
+# Configuration
+##########################
+# Set the log level for this module
+LOG_LEVEL = "INFO"  # Use "DEBUG", "INFO", "WARNING", "ERROR", or "CRITICAL"
+
+HISTORY_KEY_PREFIX = "twitch:"
+STREAM_KEY_PREFIX = "twitch:stream:"
+STREAM_DATA_FIELD = "data"
+DEFAULT_MAXLEN = 10000  # Approximate entries kept per stream without an explicit limit
+
+##########################
+# Keys and IDs
+##########################
+def stream_key(history_key):
+    """Maps a sorted set history key to its stream key.
+
+    @param history_key: e.g. "twitch:messages:all"
+    @return: e.g. "twitch:stream:messages:all"
+    """
+    if not history_key.startswith(HISTORY_KEY_PREFIX):
+        raise ValueError(f"Not a history key: {history_key}")
+    return f"{STREAM_KEY_PREFIX}{history_key[len(HISTORY_KEY_PREFIX):]}"
+
+
+def history_key_for_stream(key):
+    """Maps a stream key back to its sorted set history key (inverse of stream_key).
+
+    @param key: e.g. "twitch:stream:messages:all"
+    @return: e.g. "twitch:messages:all"
+    """
+    if not key.startswith(STREAM_KEY_PREFIX):
+        raise ValueError(f"Not a history stream key: {key}")
+    return f"{HISTORY_KEY_PREFIX}{key[len(STREAM_KEY_PREFIX):]}"
+
+
+def time_to_id(timestamp, upper=False):
+    """Converts a unix timestamp to an XRANGE bound.
+
+    @param timestamp: Unix time in seconds, or None for an open bound
+    @param upper: True for the end of a range
+    @return: Stream ID bound
+    """
+    if timestamp is None:
+        return "+" if upper else "-"
+    millis = int(timestamp * 1000)
+    return f"{millis}-{'18446744073709551615' if upper else '0'}"
+
+
+def id_to_time(entry_id):
+    """@return: Unix time in seconds encoded in a stream ID"""
+    if isinstance(entry_id, bytes):
+        entry_id = entry_id.decode('utf-8')
+    return int(entry_id.split("-")[0]) / 1000
+
+##########################
+# History
+##########################
+class ChatHistory:
+    """Appends to and reads from the stream-backed history."""
+
+    def __init__(self, client=redis_client):
+        self.client = client
+
+    def queue_append(self, pipe, history_key, message_json, maxlen=DEFAULT_MAXLEN):
+        """Queues one entry on a pipeline, trimming the stream approximately.
+
+        @param pipe: Pipeline to queue the XADD on
+        @param history_key: Sorted set style history key
+        @param message_json: Message as a JSON string
+        @param maxlen: Approximate number of entries to keep, None to not trim
+        """
+        pipe.xadd(stream_key(history_key), {STREAM_DATA_FIELD: message_json}, maxlen=maxlen, approximate=True)
+
+    def append(self, history_key, message_obj, maxlen=DEFAULT_MAXLEN):
+        """Appends one message.
+
+        @return: Stream ID of the new entry
+        """
+        return self.client.xadd(stream_key(history_key), {STREAM_DATA_FIELD: json.dumps(message_obj)},
+                                maxlen=maxlen, approximate=True)
+
+    def read_range(self, history_key, start=None, end=None, count=None, reverse=False):
+        """Reads entries between two unix timestamps.
+
+        @param history_key: Sorted set style history key
+        @param start: Oldest time (inclusive), None for the beginning
+        @param end: Newest time (inclusive), None for now
+        @param count: Optional maximum number of entries
+        @param reverse: Newest first
+        @return: List of (entry id, message dict)
+        """
+        key = stream_key(history_key)
+        if reverse:
+            entries = self.client.xrevrange(key, time_to_id(end, upper=True), time_to_id(start), count=count)
+        else:
+            entries = self.client.xrange(key, time_to_id(start), time_to_id(end, upper=True), count=count)
+        return [(entry_id.decode('utf-8'), json.loads(fields[STREAM_DATA_FIELD.encode()]))
+                for entry_id, fields in entries]
+
+    def read_latest(self, history_key, count=50):
+        """@return: The newest entries as (entry id, message dict), oldest first"""
+        return list(reversed(self.read_range(history_key, count=count, reverse=True)))
+
+    def read_new(self, history_key, last_id="$", count=100, block=None):
+        """Reads entries added after last_id, optionally blocking for them.
+
+        @param history_key: Sorted set style history key
+        @param last_id: ID of the last entry already seen, "$" for only new ones
+        @param count: Maximum number of entries
+        @param block: Milliseconds to block for new entries, None to return at once
+        @return: List of (entry id, message dict)
+        """
+        response = self.client.xread({stream_key(history_key): last_id}, count=count, block=block)
+        entries = response[0][1] if response else []
+        return [(entry_id.decode('utf-8'), json.loads(fields[STREAM_DATA_FIELD.encode()]))
+                for entry_id, fields in entries]
+
+    def length(self, history_key):
+        """@return: Number of entries in the stream"""
+        return self.client.xlen(stream_key(history_key))
+
+    ##########################
+    # Compatibility Reader
+    ##########################
+    def read_scored(self, history_key, min_score="-inf", max_score="+inf", limit=None):
+        """Reads history like ZRANGEBYSCORE key min max WITHSCORES.
+
+        Entries come from the stream; the part of the range older than the
+        first stream entry is filled from the legacy sorted set, so history
+        written before the switch is still returned.
+
+        @param history_key: Sorted set style history key
+        @param min_score: Oldest unix time or "-inf"
+        @param max_score: Newest unix time or "+inf"
+        @param limit: Optional maximum number of entries (oldest first)
+        @return: List of (message JSON bytes, score) oldest first
+        """
+        start = None if min_score == "-inf" else float(min_score)
+        end = None if max_score == "+inf" else float(max_score)
+
+        results = []
+        stream_start = self._stream_start(history_key)
+
+        # Older part of the range from the sorted set written before the switch
+        if stream_start is None or start is None or start < stream_start:
+            legacy_max = max_score if stream_start is None else f"({stream_start}"
+            if end is not None and stream_start is not None and end < stream_start:
+                legacy_max = max_score
+            results.extend(self.client.zrangebyscore(history_key, min_score, legacy_max, withscores=True,
+                                                     start=0 if limit else None, num=limit))
+
+        if stream_start is not None and (end is None or end >= stream_start):
+            remaining = None if limit is None else limit - len(results)
+            if remaining is None or remaining > 0:
+                entries = self.client.xrange(stream_key(history_key), time_to_id(start),
+                                             time_to_id(end, upper=True), count=remaining)
+                results.extend((fields[STREAM_DATA_FIELD.encode()], id_to_time(entry_id))
+                               for entry_id, fields in entries)
+        return results
+
+    def count_scored(self, history_key):
+        """Like ZCARD over the combined stream and legacy sorted set.
+
+        @return: Number of entries the compatibility reader can return
+        """
+        stream_start = self._stream_start(history_key)
+        if stream_start is None:
+            return self.client.zcard(history_key)
+        return self.client.xlen(stream_key(history_key)) + self.client.zcount(history_key, "-inf",
+                                                                             f"({stream_start}")
+
+    def _stream_start(self, history_key):
+        """Time of the oldest stream entry, None if the stream is empty.
+
+        Entries written to both backends carry the sorted set score in
+        ``_score``, which is a little older than their stream ID; using it
+        keeps the reader from returning them twice.
+        """
+        first = self.client.xrange(stream_key(history_key), count=1)
+        if not first:
+            return None
+        entry_id, fields = first[0]
+        start = id_to_time(entry_id)
+        try:
+            score = json.loads(fields[STREAM_DATA_FIELD.encode()]).get("_score")
+        except (json.JSONDecodeError, AttributeError, KeyError):
+            score = None
+        return min(start, float(score)) if isinstance(score, (int, float)) else start
+
+
+# Shared instance using the main Redis connection
+chat_history = ChatHistory()
@@ -0,0 +1,292 @@
+"""Command host for the TwitchBotV2 project.
+
+Command files under ``commands/`` can run two ways:
+
+* standalone, one process per command, through ``run_command_loop`` (the
+  classic ``pubsub.listen()`` loop started by the systemd unit), or
+* as plugins inside a ``CommandHost``, which serves many commands from one
+  asyncio event loop over a single Redis pub/sub connection, routed by a
+  ``CommandRouter`` (see module.command_router).
+
+A command file is a plugin when it declares:
+
+* ``COMMAND_ALIASES`` - command names it answers on ``twitch.command.<alias>``
+* ``handle_command_message(message_obj)`` - handler for one parsed message
+
+and optionally ``CHANNEL_HANDLERS``, a dict mapping extra channels to
+handlers taking the parsed message object.
+
+Several hosts with different plugin sets can run side by side to keep
+noisy or crash-prone commands isolated:
+
+    python -m module.command_host --name economy give steal gamble slots
+    python -m module.command_host --name general
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import signal
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import redis.asyncio as aioredis
+
+from module.shared_redis import REDIS_HOST, REDIS_PORT, pubsub
+from module.command_router import CommandRouter, COMMAND_CHANNEL_PREFIX
+from module.message_utils import register_exit_handler
+from module.message_utils import log_startup, log_info, log_error, log_debug, log_warning
+
+##########################
+# Configuration
+##########################
+# Set the log level for this module
+LOG_LEVEL = "INFO"  # Use "DEBUG", "INFO", "WARNING", "ERROR", or "CRITICAL"
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COMMANDS_DIR = os.path.join(PROJECT_DIR, "commands")
+EXCLUDED_PLUGIN_DIRS = {"template"}  # Examples that should never be served
+
+##########################
+# Standalone Mode
+##########################
+def run_command_loop(aliases, handler, command, startup_message, channel_handlers=None, startup_data=None):
+    """Runs a single command as its own process, blocking on the shared pubsub.
+
+    @param aliases: Command names to subscribe to (without the channel prefix)
+    @param handler: Function called with each parsed command message
+    @param command: Command name used for log channels
+    @param startup_message: Message sent once the subscriptions are in place
+    @param channel_handlers: Optional dict of extra channel -> handler
+    @param startup_data: Optional extra data for the startup message
+    """
+    channel_handlers = channel_handlers or {}
+
+    register_exit_handler()
+    for alias in aliases:
+        pubsub.subscribe(f"{COMMAND_CHANNEL_PREFIX}{alias}")
+    for channel in channel_handlers:
+        pubsub.subscribe(channel)
+
+    log_startup(startup_message, command, startup_data)
+
+    for message in pubsub.listen():
+        if message["type"] != "message":
+            continue
+
+        channel = message["channel"].decode('utf-8')
+        try:
+            message_obj = json.loads(message['data'].decode('utf-8'))
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            error_msg = f"Error parsing message on {channel}: {e}"
+            print(error_msg)
+            log_error(error_msg, command, {"error": str(e), "data": str(message.get('data', 'N/A'))})
+            continue
+
+        try:
+            channel_handlers.get(channel, handler)(message_obj)
+        except Exception as e:
+            error_msg = f"Error processing {command} command: {e}"
+            print(error_msg)
+            log_error(error_msg, command, {
+                "error": str(e),
+                "traceback": str(e.__traceback__),
+                "message_data": str(message.get('data', 'N/A'))
+            })
+
+##########################
+# Plugin Loading
+##########################
+class CommandPlugin:
+    """A command file loaded into the host process."""
+
+    def __init__(self, name, module):
+        self.name = name
+        self.module = module
+        self.aliases = [alias.lower() for alias in module.COMMAND_ALIASES]
+        self.handler = module.handle_command_message
+        self.channel_handlers = dict(getattr(module, "CHANNEL_HANDLERS", {}))
+
+
+def find_plugin_files(commands_dir=COMMANDS_DIR):
+    """Finds every command file that declares itself as a plugin.
+
+    Files are only scanned as text here; nothing is imported until the
+    plugin is actually selected.
+
+    @param commands_dir: Directory to search recursively
+    @return: Dict of plugin name (file name without .py) -> file path
+    """
+    plugin_files = {}
+    for root, dirs, files in os.walk(commands_dir):
+        dirs[:] = [d for d in dirs if d not in EXCLUDED_PLUGIN_DIRS]
+        for file in sorted(files):
+            if not file.endswith(".py") or file == "__init__.py":
+                continue
+            path = os.path.join(root, file)
+            try:
+                with open(path, encoding="utf-8") as f:
+                    source = f.read()
+            except OSError:
+                continue
+            if "COMMAND_ALIASES" in source and "def handle_command_message" in source:
+                plugin_files[file[:-3]] = path
+    return plugin_files
+
+
+def load_plugin(name, path):
+    """Imports a command file as a plugin module.
+
+    The module is registered in sys.modules before it runs so that
+    per-file LOG_LEVEL settings keep working for its log calls.
+
+    @param name: Plugin name
+    @param path: Path to the command file
+    @return: CommandPlugin instance
+    """
+    module_name = f"command_plugin_{name}"
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    try:
+        spec.loader.exec_module(module)
+    except Exception:
+        del sys.modules[module_name]
+        raise
+    return CommandPlugin(name, module)
+
+
+def load_plugins(names=None, commands_dir=COMMANDS_DIR):
+    """Loads the selected plugins, or every plugin found when none are given.
+
+    @param names: Optional list of plugin names to load
+    @param commands_dir: Directory to search recursively
+    @return: List of CommandPlugin instances that loaded successfully
+    """
+    plugin_files = find_plugin_files(commands_dir)
+    if not names:
+        names = list(plugin_files)
+
+    plugins = []
+    for name in names:
+        if name not in plugin_files:
+            log_warning(f"Command plugin '{name}' not found", "command_host")
+            continue
+        try:
+            plugins.append(load_plugin(name, plugin_files[name]))
+            log_debug(f"Loaded command plugin '{name}'", "command_host")
+        except Exception as e:
+            error_msg = f"Failed to load command plugin '{name}': {e}"
+            print(error_msg)
+            log_error(error_msg, "command_host", {"error": str(e), "path": plugin_files[name]})
+    return plugins
+
+##########################
+# Host
+##########################
+class CommandHost:
+    """Serves many command plugins from one event loop and one pub/sub connection.
+
+    A CommandRouter pattern-subscribes to every command once and hands parsed
+    messages to a queue per plugin. Handlers are synchronous, so each plugin
+    gets a worker task that runs them in a thread pool one message at a time,
+    keeping the ordering of the one-process-per-command setup.
+    """
+
+    def __init__(self, plugins, name="default"):
+        self.name = name
+        self.plugins = plugins
+        self.router = CommandRouter()
+        self.executor = ThreadPoolExecutor(max_workers=max(len(plugins), 1),
+                                           thread_name_prefix=f"command-host-{name}")
+        self.stop_event = None
+
+    def stop(self):
+        """Asks the running host to shut down."""
+        if self.stop_event is not None:
+            self.stop_event.set()
+
+    async def run(self):
+        """Subscribes the router and dispatches to plugin workers until stopped."""
+        loop = asyncio.get_running_loop()
+        self.stop_event = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self.stop)
+
+        workers = []
+        for plugin in self.plugins:
+            queue = self.router.register(plugin.name, plugin.aliases, plugin.handler, plugin.channel_handlers)
+            workers.append(asyncio.create_task(self._worker(plugin, queue)))
+
+        client = aioredis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=0)
+        host_pubsub = client.pubsub()
+        await self.router.subscribe(host_pubsub)
+
+        log_startup(f"Command host '{self.name}' is serving {len(self.plugins)} commands", "command_host", {
+            "plugins": [plugin.name for plugin in self.plugins],
+            "aliases": len(self.router.alias_table),
+            "channels": len(self.router.channel_table)
+        })
+
+        listener = asyncio.create_task(self.router.run(host_pubsub))
+        await self.stop_event.wait()
+
+        log_info(f"Command host '{self.name}' shutting down", "command_host", {"stats": self.router.stats})
+        listener.cancel()
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(listener, *workers, return_exceptions=True)
+        await host_pubsub.punsubscribe()
+        await host_pubsub.unsubscribe()
+        await host_pubsub.aclose()
+        await client.aclose()
+        self.executor.shutdown(wait=True)
+
+    async def _worker(self, plugin, queue):
+        loop = asyncio.get_running_loop()
+        while True:
+            handler, message_obj = await queue.get()
+            try:
+                await loop.run_in_executor(self.executor, self._call_handler, plugin, handler, message_obj)
+            finally:
+                queue.task_done()
+
+    @staticmethod
+    def _call_handler(plugin, handler, message_obj):
+        try:
+            handler(message_obj)
+        except Exception as e:
+            error_msg = f"Error processing {plugin.name} command: {e}"
+            print(error_msg)
+            log_error(error_msg, plugin.name, {
+                "error": str(e),
+                "traceback": str(e.__traceback__),
+                "message_data": str(message_obj)
+            })
+
+##########################
+# Main
+##########################
+def main():
+    parser = argparse.ArgumentParser(description="Run command plugins inside a single process")
+    parser.add_argument("plugins", nargs="*", help="Plugin names to load (default: every plugin found)")
+    parser.add_argument("--name", default="default", help="Name of this host, used in logs and service names")
+    parser.add_argument("--list", action="store_true", help="List available plugins and exit")
+    args = parser.parse_args()
+
+    if args.list:
+        for name, path in find_plugin_files().items():
+            print(f"{name}: {os.path.relpath(path, PROJECT_DIR)}")
+        return
+
+    plugins = load_plugins(args.plugins)
+    if not plugins:
+        log_error(f"Command host '{args.name}' has no plugins to run", "command_host")
+        sys.exit(1)
+
+    asyncio.run(CommandHost(plugins, name=args.name).run())
+
+
+if __name__ == "__main__":
+    main()
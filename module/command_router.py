@@ -0,0 +1,137 @@
+"""Central command router for the TwitchBotV2 project.
+
+Instead of every command subscribing to each of its alias channels (and Redis
+fanning every message out to every subscriber connection), the router holds a
+single ``psubscribe('twitch.command.*')`` and an alias -> handler table built
+from the ``COMMAND_ALIASES`` declarations of the loaded command plugins.
+
+Each message is looked up by alias first, so unknown commands are dropped
+before any JSON is parsed. Known commands are parsed once and delivered to
+their plugin through an in-process queue, so the per-message cost no longer
+grows with the number of commands. The queues are unbounded like the pub/sub
+buffers they replace: a slow plugin falls behind (with a warning) but never
+loses commands or holds up the others.
+"""
+import asyncio
+import json
+
+from module.message_utils import log_error, log_warning
+
+##########################
+# Configuration
+##########################
+# Set the log level for this module
+LOG_LEVEL = "INFO"  # Use "DEBUG", "INFO", "WARNING", "ERROR", or "CRITICAL"
+
+COMMAND_CHANNEL_PREFIX = "twitch.command."
+COMMAND_CHANNEL_PATTERN = f"{COMMAND_CHANNEL_PREFIX}*"
+COMMAND_BACKLOG_WARNING = 100  # Pending messages per plugin that log a warning
+
+##########################
+# Router
+##########################
+class CommandRouter:
+    """Routes command messages from one pattern subscription to per-plugin queues."""
+
+    def __init__(self, backlog_warning=COMMAND_BACKLOG_WARNING):
+        self.backlog_warning = backlog_warning
+        self.alias_table = {}
+        self.channel_table = {}
+        self.queues = {}
+        self.stats = {
+            "delivered": 0,
+            "unknown": 0,
+            "invalid": 0,
+            "backlog_warnings": 0
+        }
+
+    def register(self, name, aliases, handler, channel_handlers=None):
+        """Adds a plugin's aliases and extra channels to the routing tables.
+
+        @param name: Plugin name, one queue is kept per plugin
+        @param aliases: Command names handled on twitch.command.<alias>
+        @param handler: Function called with the parsed command message
+        @param channel_handlers: Optional dict of extra channel -> handler
+        @return: The plugin's asyncio.Queue of (handler, message_obj) items
+        """
+        queue = self.queues.setdefault(name, asyncio.Queue())
+
+        for alias in aliases:
+            alias = alias.lower()
+            if alias in self.alias_table:
+                log_warning(f"Alias '{alias}' is claimed by both '{self.alias_table[alias][0]}' and '{name}'", "command_router")
+                continue
+            self.alias_table[alias] = (name, handler)
+
+        for channel, channel_handler in (channel_handlers or {}).items():
+            if channel in self.channel_table:
+                log_warning(f"Channel {channel} is claimed by both '{self.channel_table[channel][0]}' and '{name}'", "command_router")
+                continue
+            self.channel_table[channel] = (name, channel_handler)
+
+        return queue
+
+    async def subscribe(self, pubsub):
+        """Subscribes the given asyncio pubsub to the command pattern and extra channels.
+
+        @param pubsub: redis.asyncio PubSub instance
+        """
+        await pubsub.psubscribe(COMMAND_CHANNEL_PATTERN)
+        if self.channel_table:
+            await pubsub.subscribe(*self.channel_table)
+
+    async def run(self, pubsub):
+        """Routes messages from the pubsub until cancelled.
+
+        @param pubsub: redis.asyncio PubSub instance already subscribed via subscribe()
+        """
+        async for message in pubsub.listen():
+            self.dispatch(message)
+
+    def lookup(self, message):
+        """Finds the route for a raw pubsub message without parsing its payload.
+
+        @param message: Raw pubsub message dict
+        @return: (plugin name, handler) tuple or None for unknown channels
+        """
+        channel = message["channel"].decode('utf-8')
+        if message["type"] == "pmessage":
+            return self.alias_table.get(channel[len(COMMAND_CHANNEL_PREFIX):].lower())
+        if message["type"] == "message":
+            return self.channel_table.get(channel)
+        return None
+
+    def dispatch(self, message):
+        """Parses a routed message once and puts it on its plugin queue.
+
+        @param message: Raw pubsub message dict
+        @return: True if the message was queued, False otherwise
+        """
+        if message["type"] not in ("message", "pmessage"):
+            return False
+
+        route = self.lookup(message)
+        if route is None:
+            self.stats["unknown"] += 1
+            return False
+
+        name, handler = route
+        try:
+            message_obj = json.loads(message['data'].decode('utf-8'))
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            self.stats["invalid"] += 1
+            log_error(f"Error parsing message on {message['channel'].decode('utf-8')}: {e}", "command_router",
+                      {"error": str(e), "data": str(message.get('data', 'N/A'))})
+            return False
+
+        queue = self.queues[name]
+        queue.put_nowait((handler, message_obj))
+        if queue.qsize() == self.backlog_warning:
+            # Once per time the backlog grows past the threshold, not for every message after it
+            self.stats["backlog_warnings"] += 1
+            log_warning(f"Queue for '{name}' has {self.backlog_warning} pending messages", "command_router", {
+                "content": message_obj.get("content")
+            })
+
+        self.stats["delivered"] += 1
+        return True
@@ -0,0 +1,222 @@
+"""Shared Twitch Helix API client for the TwitchBotV2 project.
+
+Every Helix call goes through one ``HelixClient`` so they all share:
+
+* a pooled keep-alive session instead of a new TLS connection per request
+* a token bucket fed by Twitch's ``Ratelimit-Limit``/``Ratelimit-Remaining``/
+  ``Ratelimit-Reset`` headers, so callers wait for the next refill instead
+  of running into 429 responses (a 429 that still happens is retried once
+  the bucket resets)
+* cursor pagination (``paginate``) and batched user lookups by id or login,
+  100 per request (``get_users``)
+
+Requests that fail raise ``HelixError``.
+
+Usage:
+
+    from module.helix_client import helix_client
+    users = helix_client.get_users(logins=["beastyrabbit"])
+    for chatter in helix_client.paginate("chat/chatters", {"broadcaster_id": ..., "moderator_id": ...}):
+        ...
+"""
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from module.shared_redis import redis_client_env
+from module.token_provider import token_provider
+from module.message_utils import log_debug, log_warning, log_error
+
+##########################
+# Configuration
+##########################
+# Set the log level for this module
+LOG_LEVEL = "INFO"  # Use "DEBUG", "INFO", "WARNING", "ERROR", or "CRITICAL"
+
+HELIX_BASE_URL = "https://api.twitch.tv/helix/"
+DEFAULT_RATE_LIMIT = 800  # Points per minute until Twitch tells us otherwise
+MAX_IDS_PER_REQUEST = 100  # Helix limit for id/login parameters per request
+MAX_PAGE_SIZE = 100  # Largest "first" most paginated endpoints accept
+REQUEST_TIMEOUT = 10  # Seconds before a request is abandoned
+MAX_RATE_LIMIT_RETRIES = 3  # Retries after a 429 response
+
+# Twitch API constants
+TWITCH_CLIENT_ID = redis_client_env.get("TWITCH_CLIENT_ID").decode('utf-8') if redis_client_env.exists("TWITCH_CLIENT_ID") else None
+
+##########################
+# Rate Limiting
+##########################
+class HelixError(Exception):
+    """A Helix request that could not be completed."""
+
+    def __init__(self, message, status_code=None, response_text=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.response_text = response_text
+
+
+class RateLimitBucket:
+    """Token bucket that mirrors Twitch's per-client rate limit.
+
+    Between responses the bucket refills at limit/60 points per second; every
+    response resets it to what Twitch reports, so several processes sharing
+    the same client ID still converge on the real budget.
+    """
+
+    def __init__(self, limit=DEFAULT_RATE_LIMIT):
+        self.limit = limit
+        self.tokens = float(limit)
+        self.reset_at = 0.0  # Wall clock time Twitch refills the bucket
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.limit, self.tokens + (now - self.updated) * self.limit / 60)
+        self.updated = now
+
+    def acquire(self, cost=1):
+        """Blocks until the bucket has room for a request, then takes its cost."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= cost:
+                    self.tokens -= cost
+                    return
+                wait = (cost - self.tokens) * 60 / self.limit
+                if self.reset_at:
+                    wait = min(wait, max(self.reset_at - time.time(), 0.05))
+            log_debug(f"Helix rate limit reached, waiting {wait:.2f}s", "helix_client")
+            time.sleep(wait)
+
+    def update(self, headers):
+        """Takes the bucket state from the Ratelimit-* response headers."""
+        try:
+            limit = int(headers["Ratelimit-Limit"])
+            remaining = int(headers["Ratelimit-Remaining"])
+            reset_at = float(headers["Ratelimit-Reset"])
+        except (KeyError, ValueError):
+            return
+        with self.lock:
+            self.limit = max(limit, 1)
+            self.tokens = float(remaining)
+            self.reset_at = reset_at
+            self.updated = time.monotonic()
+
+    def wait_for_reset(self):
+        """Sleeps until Twitch refills the bucket after a 429 response."""
+        with self.lock:
+            self.tokens = 0.0
+            self.updated = time.monotonic()
+            wait = max(self.reset_at - time.time(), 1.0) if self.reset_at else 1.0
+        log_warning(f"Helix rate limit exceeded, waiting {wait:.2f}s for the reset", "helix_client")
+        time.sleep(wait)
+
+##########################
+# Client
+##########################
+class HelixClient:
+    """Thread-safe Helix client with a pooled session and rate-limit scheduling."""
+
+    def __init__(self, token_provider=token_provider.get_token, client_id=TWITCH_CLIENT_ID, pool_size=10):
+        """
+        @param token_provider: Function returning a valid access token or None (the
+            in-memory module.token_provider by default)
+        @param client_id: Twitch client ID sent with every request
+        @param pool_size: Connections kept open for concurrent requests
+        """
+        self.token_provider = token_provider
+        self.client_id = client_id
+        self.bucket = RateLimitBucket()
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=2))
+
+    def request(self, method, endpoint, params=None, json_body=None):
+        """Sends one Helix request, waiting for the rate limit if needed.
+
+        @param method: HTTP method
+        @param endpoint: Path below /helix/, e.g. "users"
+        @param params: Query parameters (dict or list of pairs for repeated keys)
+        @param json_body: Optional JSON body
+        @return: Decoded JSON response, or None for empty responses
+        @raise HelixError: If the request fails or is rejected
+        """
+        access_token = self.token_provider()
+        if not access_token or not self.client_id:
+            raise HelixError("Missing Twitch access token or client ID")
+
+        headers = {
+            "Authorization": f"Bearer {access_token}",
+            "Client-Id": self.client_id
+        }
+        url = f"{HELIX_BASE_URL}{endpoint}"
+
+        for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+            self.bucket.acquire()
+            try:
+                response = self.session.request(method, url, headers=headers, params=params, json=json_body,
+                                                timeout=REQUEST_TIMEOUT)
+            except requests.RequestException as e:
+                raise HelixError(f"Helix request to {endpoint} failed: {e}") from e
+
+            self.bucket.update(response.headers)
+            if response.status_code == 429 and attempt < MAX_RATE_LIMIT_RETRIES:
+                self.bucket.wait_for_reset()
+                continue
+            if response.status_code >= 400:
+                log_error(f"Twitch API error: {response.status_code}", "helix_client", {
+                    "endpoint": endpoint,
+                    "response": response.text
+                })
+                raise HelixError(f"Helix request to {endpoint} returned {response.status_code}",
+                                 response.status_code, response.text)
+            return response.json() if response.content else None
+
+    def get(self, endpoint, params=None):
+        """@return: Decoded JSON of a GET request (see request)"""
+        return self.request("GET", endpoint, params=params)
+
+    def paginate(self, endpoint, params=None, page_size=MAX_PAGE_SIZE, max_items=None):
+        """Yields every item of a paginated endpoint, following the cursor.
+
+        @param endpoint: Path below /helix/
+        @param params: Query parameters (dict)
+        @param page_size: Items requested per page ("first")
+        @param max_items: Optional limit on the number of items yielded
+        @return: Generator of the entries in each page's "data" list
+        """
+        params = dict(params or {})
+        params["first"] = page_size
+        yielded = 0
+        while True:
+            data = self.get(endpoint, params) or {}
+            for item in data.get("data", []):
+                yield item
+                yielded += 1
+                if max_items is not None and yielded >= max_items:
+                    return
+            cursor = data.get("pagination", {}).get("cursor")
+            if not cursor:
+                return
+            params["after"] = cursor
+
+    def get_users(self, ids=None, logins=None):
+        """Looks up users by id and/or login, 100 per request.
+
+        @param ids: Iterable of user ids
+        @param logins: Iterable of login names
+        @return: List of user data dicts for the users that exist
+        """
+        keys = [("id", str(user_id)) for user_id in dict.fromkeys(ids or [])]
+        keys += [("login", login.lower()) for login in dict.fromkeys(logins or [])]
+        users = []
+        for start in range(0, len(keys), MAX_IDS_PER_REQUEST):
+            data = self.get("users", keys[start:start + MAX_IDS_PER_REQUEST]) or {}
+            users.extend(data.get("data", []))
+        return users
+
+
+# Shared client for the whole process
+helix_client = HelixClient()
@@ -0,0 +1,281 @@
+"""On-disk archive for aged chat and command history in the TwitchBotV2 project.
+
+Redis only keeps the newest messages (see module.history_retention). History
+that would be trimmed from ``twitch:messages:all`` and
+``twitch:messages:commands`` is written here first, so months of history cost
+disk space instead of RAM.
+
+Layout, per history name (e.g. ``messages_all``):
+
+    {ARCHIVE_DIR}/{name}/{first_ms}.jsonl.gz   segment
+    {ARCHIVE_DIR}/{name}/{first_ms}.idx        sparse time index
+
+A segment is a series of gzip members ("blocks") of up to ``block_records``
+JSON lines ``{"id": ..., "time": ..., "message": {...}}``. Concatenated gzip
+members are still a valid gzip file, so ``zcat`` reads a segment as plain
+JSONL. A new segment is started once the current one reaches
+``segment_max_bytes``.
+
+The index has one JSON line per block: ``[first_time, last_time, offset,
+length, count, last_id]``. A reader binary-searches the index for the first
+block that can hold the requested time, then decompresses blocks straight
+from a memory-mapped segment until it is past the end of the range, so only
+the blocks that overlap a query are read. Newest-first reads walk the
+segments and blocks backwards the same way.
+
+Appends write the block, fsync it, and only then add its index line. Entries
+with an ID that is already archived are skipped, so retrying after a crash
+does not duplicate history.
+"""
+import bisect
+import json
+import mmap
+import os
+import threading
+import zlib
+from pathlib import Path
+
+from module.message_utils import log_debug, log_error
+
+##########################
+# Configuration
+##########################
+# Set the log level for this module
+LOG_LEVEL = "INFO"  # Use "DEBUG", "INFO", "WARNING", "ERROR", or "CRITICAL"
+
+ARCHIVE_DIR = Path(os.environ.get("TWITCH_HISTORY_ARCHIVE_DIR",
+                                  Path(__file__).resolve().parent.parent / "archive" / "history"))
+BLOCK_RECORDS = 256  # Entries per compressed block, the unit the index points to
+SEGMENT_MAX_BYTES = 64 * 1024 * 1024  # Compressed size at which a new segment is started
+COMPRESSION_LEVEL = 6
+
+SEGMENT_SUFFIX = ".jsonl.gz"
+INDEX_SUFFIX = ".idx"
+GZIP_WBITS = 31  # zlib window bits for the gzip container
+
+##########################
+# Helpers
+##########################
+def archive_name(history_key):
+    """@return: Directory name of a history key, e.g. "messages_all" for "twitch:messages:all" """
+    return history_key.split(":", 1)[1].replace(":", "_")
+
+
+def entry_time(entry_id):
+    """@return: Unix time in seconds encoded in a stream ID string"""
+    return int(entry_id.split("-")[0]) / 1000
+
+
+def id_key(entry_id):
+    """@return: Sortable (milliseconds, sequence) tuple of a stream ID string"""
+    millis, sequence = entry_id.split("-")
+    return int(millis), int(sequence)
+
+
+def compress_block(lines):
+    """@return: One gzip member holding the given lines"""
+    compressor = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, GZIP_WBITS)
+    return compressor.compress("".join(lines).encode('utf-8')) + compressor.flush()
+
+##########################
+# Segments
+##########################
+class Segment:
+    """One segment file and its index."""
+
+    def __init__(self, path):
+        self.path = path
+        self.index_path = path.with_name(path.name[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX)
+        self.first_ms = int(path.name[:-len(SEGMENT_SUFFIX)])
+        self.blocks = None
+        self.index_bytes = 0  # Length of the readable part of the index file
+
+    def load_index(self):
+        """@return: List of [first_time, last_time, offset, length, count, last_id] per block"""
+        if self.blocks is None:
+            blocks = []
+            self.index_bytes = 0
+            if self.index_path.exists():
+                with open(self.index_path, "rb") as index_file:
+                    for line in index_file:
+                        if not line.endswith(b"\n"):
+                            break  # Torn last line after a crash, its block is ignored
+                        blocks.append(json.loads(line))
+                        self.index_bytes += len(line)
+            self.blocks = blocks
+        return self.blocks
+
+    def size(self):
+        blocks = self.load_index()
+        return blocks[-1][2] + blocks[-1][3] if blocks else 0
+
+    def read(self, start=None, end=None, reverse=False):
+        """Yields the archived entries of this segment between two unix times.
+
+        @param reverse: Newest first
+        @return: Generator of {"id", "time", "message"} dicts, oldest first unless reverse
+        """
+        blocks = self.load_index()
+        if reverse:
+            # Blocks up to the last one whose first entry is not newer than end
+            last = bisect.bisect_right([block[0] for block in blocks], end) if end is not None else len(blocks)
+            selected = blocks[last - 1::-1] if last else []
+        else:
+            # Blocks from the first one whose last entry is not older than start
+            first = bisect.bisect_left([block[1] for block in blocks], start) if start is not None else 0
+            selected = blocks[first:]
+        if not selected:
+            return
+
+        with open(self.path, "rb") as segment_file:
+            with mmap.mmap(segment_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                for first_time, last_time, offset, length, count, last_id in selected:
+                    if reverse and start is not None and last_time < start:
+                        return
+                    if not reverse and end is not None and first_time > end:
+                        return
+                    lines = zlib.decompress(data[offset:offset + length], GZIP_WBITS).decode('utf-8').splitlines()
+                    if reverse:
+                        lines.reverse()
+                    for line in lines:
+                        entry = json.loads(line)
+                        if start is not None and entry["time"] < start:
+                            if reverse:
+                                return
+                            continue
+                        if end is not None and entry["time"] > end:
+                            if reverse:
+                                continue
+                            return
+                        yield entry
+
+##########################
+# Archive
+##########################
+class HistoryArchive:
+    """Appends history to compressed segments and reads it back by time."""
+
+    def __init__(self, directory=ARCHIVE_DIR, block_records=BLOCK_RECORDS, segment_max_bytes=SEGMENT_MAX_BYTES):
+        """
+        @param directory: Root directory of the archive
+        @param block_records: Entries per compressed block
+        @param segment_max_bytes: Segment size at which a new segment is started
+        """
+        self.directory = Path(directory)
+        self.block_records = block_records
+        self.segment_max_bytes = segment_max_bytes
+        self.lock = threading.Lock()
+
+    def segments(self, name):
+        """@return: Segments of one history name, oldest first"""
+        path = self.directory / name
+        if not path.is_dir():
+            return []
+        segments = [Segment(file) for file in path.glob(f"*{SEGMENT_SUFFIX}")]
+        return sorted(segments, key=lambda segment: segment.first_ms)
+
+    def last_id(self, name):
+        """@return: ID of the newest archived entry, or None"""
+        segments = self.segments(name)
+        for segment in reversed(segments):
+            blocks = segment.load_index()
+            if blocks:
+                return blocks[-1][5]
+        return None
+
+    def append(self, history_key, entries):
+        """Archives entries of one history key.
+
+        @param history_key: Sorted set style history key, e.g. "twitch:messages:all"
+        @param entries: List of (stream ID string, message JSON string), oldest first
+        @return: Number of entries written (already archived ones are skipped)
+        """
+        name = archive_name(history_key)
+        with self.lock:
+            last_id = self.last_id(name)
+            if last_id is not None:
+                last_key = id_key(last_id)
+                entries = [entry for entry in entries if id_key(entry[0]) > last_key]
+            if not entries:
+                return 0
+
+            written = 0
+            segment = None
+            for block_start in range(0, len(entries), self.block_records):
+                block = entries[block_start:block_start + self.block_records]
+                if segment is None or segment.size() >= self.segment_max_bytes:
+                    segment = self._current_segment(name, block[0][0])
+                self._write_block(segment, block)
+                written += len(block)
+
+        log_debug(f"Archived {written} entries of {history_key}", "history_archive")
+        return written
+
+    def read(self, history_key, start=None, end=None, limit=None, reverse=False):
+        """Reads archived entries between two unix times.
+
+        @param history_key: Sorted set style history key
+        @param start: Oldest unix time (inclusive), None for no bound
+        @param end: Newest unix time (inclusive), None for no bound
+        @param limit: Optional maximum number of entries
+        @param reverse: Newest first
+        @return: Generator of {"id", "time", "message"} dicts, oldest first unless reverse
+        """
+        returned = 0
+        segments = self.segments(archive_name(history_key))
+        for segment in reversed(segments) if reverse else segments:
+            if end is not None and segment.first_ms / 1000 > end:
+                if reverse:
+                    continue  # Whole segment is newer than the range
+                return
+            blocks = segment.load_index()
+            if start is not None and blocks and blocks[-1][1] < start:
+                if reverse:
+                    return
+                continue  # Whole segment is older than the range
+            for entry in segment.read(start, end, reverse):
+                yield entry
+                returned += 1
+                if limit is not None and returned >= limit:
+                    return
+
+    def _current_segment(self, name, first_id):
+        """@return: Newest segment with room left, or a new one starting at first_id"""
+        segments = self.segments(name)
+        if segments and segments[-1].size() < self.segment_max_bytes:
+            return segments[-1]
+        directory = self.directory / name
+        directory.mkdir(parents=True, exist_ok=True)
+        return Segment(directory / f"{id_key(first_id)[0]}{SEGMENT_SUFFIX}")
+
+    def _write_block(self, segment, block):
+        lines = [f'{{"id": "{entry_id}", "time": {entry_time(entry_id)}, "message": {message_json}}}\n'
+                 for entry_id, message_json in block]
+        data = compress_block(lines)
+        offset = segment.size()
+        try:
+            with open(segment.path, "ab") as segment_file:
+                # Drop the bytes of a block whose index line never made it to disk
+                segment_file.truncate(offset)
+                segment_file.write(data)
+                segment_file.flush()
+                os.fsync(segment_file.fileno())
+            index_line = [entry_time(block[0][0]), entry_time(block[-1][0]), offset, len(data), len(block),
+                          block[-1][0]]
+            line = (json.dumps(index_line) + "\n").encode('utf-8')
+            with open(segment.index_path, "ab") as index_file:
+                index_file.truncate(segment.index_bytes)
+                index_file.write(line)
+                index_file.flush()
+                os.fsync(index_file.fileno())
+        except OSError as e:
+            error_msg = f"Error writing archive segment {segment.path}: {e}"
+            print(error_msg)
+            log_error(error_msg, "history_archive", {"error": str(e)})
+            raise
+        segment.load_index().append(index_line)
+        segment.index_bytes += len(line)
+
+
+# Shared archive in ARCHIVE_DIR
+history_archive = HistoryArchive()
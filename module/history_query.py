@@ -0,0 +1,270 @@
+"""Indexed queries over the chat and command history for the TwitchBotV2 project.
+
+Questions like "last 50 messages from user X" or "all !gamble commands in
+the last hour" used to mean loading a whole sorted set and filtering it in
+Python. Every query here is answered with range reads on streams instead,
+O(log n + k) for k results:
+
+* by time: the history streams themselves (module.chat_history), whose IDs
+  are timestamps, so a time range is one XRANGE/XREVRANGE
+* by command: the per-command stream ``twitch:stream:commands:{command}``
+* by author: ``twitch:index:author:{login}``, a stream per chatter whose
+  entries have the same IDs as the author's messages in
+  ``twitch:stream:messages:all``; the messages are fetched by ID afterwards
+* by time bucket: ``twitch:index:buckets:{history}:{YYYYMMDD}``, a hash of
+  messages per hour that expires after BUCKET_TTL
+
+Results are paged with an opaque cursor (the ID of the last returned entry),
+so a page costs the same no matter how deep into the history it is.
+
+History the retention sweeper moved to module.history_archive is still
+found: when a page reaches past the oldest entry left in a stream, the rest
+of it is read from the archive, which keeps the stream IDs. Author index
+entries whose message is only archived are looked up there by ID.
+
+The ingest worker keeps the indexes up to date with ``queue_buckets`` and
+``queue_authors``. Author index entries whose message is neither in the
+history nor in the archive are skipped, so a page can hold fewer than
+``limit`` results while ``next_cursor`` is still set.
+"""
+import json
+import math
+import time
+from datetime import datetime
+
+from module.chat_history import stream_key, time_to_id, id_to_time, HISTORY_KEY_PREFIX, STREAM_DATA_FIELD
+from module.history_archive import history_archive, id_key
+from module.shared_redis import redis_client
+
+##########################
+# Configuration
+##########################
+# Set the log level for this module
+LOG_LEVEL = "INFO"  # Use "DEBUG", "INFO", "WARNING", "ERROR", or "CRITICAL"
+
+ALL_MESSAGES_KEY = "twitch:messages:all"
+COMMAND_KEY_PREFIX = "twitch:commands:"
+AUTHOR_INDEX_PREFIX = "twitch:index:author:"
+BUCKET_INDEX_PREFIX = "twitch:index:buckets:"
+AUTHOR_INDEX_MAXLEN = 1000  # Approximate messages indexed per author
+BUCKET_SECONDS = 3600  # Size of one time bucket
+BUCKET_TTL = 90 * 24 * 60 * 60  # Seconds a day of buckets is kept
+MAX_ACTIVITY_SPAN = 31 * 24 * 60 * 60  # Seconds one activity query covers at most
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+##########################
+# Index Keys
+##########################
+def author_index_key(login):
+    """@return: Key of the author index stream for a login"""
+    return f"{AUTHOR_INDEX_PREFIX}{login.lower()}"
+
+
+def bucket_index_key(history_key, timestamp):
+    """@return: Key of the hash holding the hourly buckets of one day"""
+    day = datetime.fromtimestamp(timestamp).strftime("%Y%m%d")
+    return f"{BUCKET_INDEX_PREFIX}{history_key[len(HISTORY_KEY_PREFIX):]}:{day}"
+
+
+def bucket_start(timestamp):
+    """@return: Unix time of the start of the bucket holding timestamp"""
+    return int(timestamp // BUCKET_SECONDS * BUCKET_SECONDS)
+
+##########################
+# Index Writing
+##########################
+def queue_buckets(pipe, history_key, timestamps):
+    """Counts messages in their time buckets.
+
+    @param pipe: Pipeline to queue the HINCRBYs on
+    @param history_key: Sorted set style history key the messages went to
+    @param timestamps: Unix times of the new messages
+    """
+    counts = {}
+    for timestamp in timestamps:
+        bucket = bucket_start(timestamp)
+        counts[bucket] = counts.get(bucket, 0) + 1
+    for bucket, count in counts.items():
+        key = bucket_index_key(history_key, bucket)
+        pipe.hincrby(key, bucket, count)
+        pipe.expire(key, BUCKET_TTL)
+
+
+def queue_authors(pipe, refs):
+    """Adds messages to their authors' index streams.
+
+    @param pipe: Pipeline to queue the XADDs on
+    @param refs: List of (login, entry id in twitch:stream:messages:all), oldest first
+    """
+    for login, entry_id in refs:
+        # Same ID as the message, so the index is ordered and ranged like the history
+        pipe.xadd(author_index_key(login), {"m": ""}, id=entry_id, maxlen=AUTHOR_INDEX_MAXLEN, approximate=True)
+
+##########################
+# Queries
+##########################
+class HistoryQuery:
+    """Answers history queries from the streams and indexes."""
+
+    def __init__(self, client=redis_client, archive=history_archive):
+        """
+        @param client: Redis client holding the history
+        @param archive: HistoryArchive with the history trimmed from Redis, None to only read Redis
+        """
+        self.client = client
+        self.archive = archive
+
+    def messages(self, history_key=ALL_MESSAGES_KEY, start=None, end=None, limit=DEFAULT_PAGE_SIZE,
+                 cursor=None, newest_first=True):
+        """Pages through one history key by time.
+
+        @param history_key: Sorted set style history key, e.g. "twitch:messages:chat"
+        @param start: Oldest unix time (inclusive), None for no bound
+        @param end: Newest unix time (inclusive), None for no bound
+        @param limit: Page size, at most MAX_PAGE_SIZE
+        @param cursor: next_cursor of the previous page
+        @param newest_first: Page backwards from the newest entry
+        @return: Dict with "items" (list of {"id", "time", "message"}) and "next_cursor"
+        """
+        limit = self._clamp(limit)
+        key = stream_key(history_key)
+        if self.archive is None:
+            entries = self._range(key, start, end, limit, cursor, newest_first)
+            return self._page([self._item(entry_id, fields) for entry_id, fields in entries], limit)
+
+        oldest = self.client.xrange(key, "-", "+", count=1)
+        # Archived entries are the ones older than the stream (an entry whose XTRIM failed is in both)
+        before = id_key(oldest[0][0].decode('utf-8')) if oldest else None
+        if newest_first:
+            items = [self._item(entry_id, fields)
+                     for entry_id, fields in self._range(key, start, end, limit, cursor, True)]
+            if len(items) < limit:
+                items += self._archived(history_key, start, end, limit - len(items), cursor, True, before)
+        else:
+            items = self._archived(history_key, start, end, limit, cursor, False, before)
+            if len(items) < limit:
+                items += [self._item(entry_id, fields) for entry_id, fields in
+                          self._range(key, start, end, limit - len(items), cursor, False)]
+        return self._page(items, limit)
+
+    def by_command(self, command, start=None, end=None, limit=DEFAULT_PAGE_SIZE, cursor=None, newest_first=True):
+        """Pages through the uses of one command (see messages)."""
+        return self.messages(f"{COMMAND_KEY_PREFIX}{command.lower().lstrip('!')}", start, end, limit, cursor,
+                             newest_first)
+
+    def by_author(self, login, start=None, end=None, limit=DEFAULT_PAGE_SIZE, cursor=None, newest_first=True):
+        """Pages through the chat messages of one author (see messages)."""
+        limit = self._clamp(limit)
+        refs = self._range(author_index_key(login), start, end, limit, cursor, newest_first)
+        if not refs:
+            return self._page([], limit)
+
+        pipe = self.client.pipeline(transaction=False)
+        all_stream = stream_key(ALL_MESSAGES_KEY)
+        for entry_id, _ in refs:
+            pipe.xrange(all_stream, entry_id, entry_id, count=1)
+        items = []
+        for (entry_id, _), found in zip(refs, pipe.execute()):
+            entry_id = entry_id.decode('utf-8')
+            if found:
+                items.append(self._item(*found[0]))
+            else:
+                items.append(self._archived_entry(ALL_MESSAGES_KEY, entry_id))
+        # The cursor is the last index entry looked at, even if its message is gone
+        page = self._page([item for item in items if item is not None], limit)
+        page["next_cursor"] = refs[-1][0].decode('utf-8') if len(refs) == limit else None
+        return page
+
+    def activity(self, history_key=ALL_MESSAGES_KEY, start=None, end=None):
+        """Counts messages per time bucket.
+
+        @param history_key: Sorted set style history key
+        @param start: Oldest unix time, default one day before end; moved up to
+            MAX_ACTIVITY_SPAN before end if it is earlier
+        @param end: Newest unix time, default now
+        @return: List of {"bucket": unix time, "count": messages}, oldest first
+        @raise ValueError: If start is after end or a time is not a finite number
+        """
+        end = time.time() if end is None else end
+        start = end - 24 * 60 * 60 if start is None else start
+        if not (math.isfinite(start) and math.isfinite(end)):
+            raise ValueError("start and end must be finite")
+        if start > end:
+            raise ValueError("start is after end")
+        # One HGET per bucket, so the span is bounded
+        start = max(start, end - MAX_ACTIVITY_SPAN)
+        buckets = list(range(bucket_start(start), bucket_start(end) + 1, BUCKET_SECONDS))
+
+        pipe = self.client.pipeline(transaction=False)
+        for bucket in buckets:
+            pipe.hget(bucket_index_key(history_key, bucket), bucket)
+        return [{"bucket": bucket, "count": int(count or 0)} for bucket, count in zip(buckets, pipe.execute())]
+
+    def _archived(self, history_key, start, end, limit, cursor, newest_first, before):
+        """Reads up to limit archived entries past the cursor and older than the stream ID key before.
+
+        @return: List of items in page order
+        """
+        cursor_key = id_key(cursor) if cursor else None
+        if cursor_key is not None:
+            cursor_time = id_to_time(cursor)
+            if newest_first:
+                before = cursor_key if before is None else min(before, cursor_key)
+                end = cursor_time if end is None else min(end, cursor_time)
+            elif before is not None and cursor_key >= before:
+                return []  # The cursor is already in the stream, which holds everything newer
+            else:
+                start = cursor_time if start is None else max(start, cursor_time)
+
+        items = []
+        for entry in self.archive.read(history_key, start, end, reverse=newest_first):
+            entry_key = id_key(entry["id"])
+            if before is not None and entry_key >= before:
+                if newest_first:
+                    continue
+                break
+            if cursor_key is not None and not newest_first and entry_key <= cursor_key:
+                continue
+            items.append(entry)
+            if len(items) >= limit:
+                break
+        return items
+
+    def _archived_entry(self, history_key, entry_id):
+        """@return: The archived item with the given stream ID, or None"""
+        entry_time = id_to_time(entry_id)
+        for entry in self.archive.read(history_key, entry_time, entry_time) if self.archive is not None else []:
+            if entry["id"] == entry_id:
+                return entry
+        return None
+
+    def _range(self, key, start, end, limit, cursor, newest_first):
+        if newest_first:
+            upper = f"({cursor}" if cursor else time_to_id(end, upper=True)
+            return self.client.xrevrange(key, upper, time_to_id(start), count=limit)
+        lower = f"({cursor}" if cursor else time_to_id(start)
+        return self.client.xrange(key, lower, time_to_id(end, upper=True), count=limit)
+
+    @staticmethod
+    def _item(entry_id, fields):
+        entry_id = entry_id.decode('utf-8')
+        return {
+            "id": entry_id,
+            "time": id_to_time(entry_id),
+            "message": json.loads(fields[STREAM_DATA_FIELD.encode()])
+        }
+
+    @staticmethod
+    def _page(items, limit):
+        # A full page may be followed by more, the cursor is the ID of its last item
+        next_cursor = items[-1]["id"] if len(items) == limit else None
+        return {"items": items, "next_cursor": next_cursor}
+
+    @staticmethod
+    def _clamp(limit):
+        return max(1, min(int(limit), MAX_PAGE_SIZE))
+
+
+# Shared query service using the main Redis connection
+history_query = HistoryQuery()
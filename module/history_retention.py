@@ -0,0 +1,309 @@
+"""Retention for the chat and command history in the TwitchBotV2 project.
+
+Only ``twitch:messages:all`` and ``twitch:messages:commands`` used to be
+capped. The per-type sets (``twitch:messages:{type}``) and the per-command
+sets (``twitch:commands:{command}``) grew forever.
+
+``HistoryRetention`` applies a ``RetentionPolicy`` to every history key,
+chosen by the longest matching key prefix. A policy can keep at most
+``max_count`` entries, drop entries older than ``max_age`` seconds, or both.
+It applies to the sorted set and to its stream (module.chat_history).
+
+The sweeper runs in a background thread and never blocks Redis for long:
+
+* keys are found with SCAN, one page at a time
+* sorted sets lose at most ``chunk_size`` entries per ZREMRANGEBYRANK
+* streams are trimmed with XTRIM ``~`` and ``LIMIT chunk_size``
+* it pauses between chunks so other clients get their turn
+
+Every sweep reports how many entries it removed and how many bytes that
+freed, measured with MEMORY USAGE before and after trimming each key.
+
+Streams of policies with ``archive=True`` are trimmed exactly instead: the
+oldest chunk is read, written to module.history_archive, and only then
+removed with XTRIM MINID, so nothing is lost when it leaves Redis.
+"""
+import threading
+import time
+
+import redis
+
+from module.chat_history import STREAM_KEY_PREFIX, STREAM_DATA_FIELD, history_key_for_stream, time_to_id, id_to_time
+from module.history_archive import history_archive
+from module.shared_redis import redis_client
+from module.message_utils import log_debug, log_info, log_error
+
+##########################
+# Configuration
+##########################
+# Set the log level for this module
+LOG_LEVEL = "INFO"  # Use "DEBUG", "INFO", "WARNING", "ERROR", or "CRITICAL"
+
+HISTORY_KEY_PATTERN = "twitch:*"  # Keys the sweeper looks at
+SWEEP_INTERVAL = 60  # Seconds between two sweeps
+SCAN_COUNT = 200  # Keys requested per SCAN page
+CHUNK_SIZE = 500  # Entries removed per command at most
+CHUNK_PAUSE = 0.005  # Seconds slept between two chunks
+
+DAY = 24 * 60 * 60
+
+##########################
+# Policies
+##########################
+class RetentionPolicy:
+    """How much history a group of keys keeps."""
+
+    __slots__ = ("prefix", "max_count", "max_age", "archive")
+
+    def __init__(self, prefix, max_count=None, max_age=None, archive=False):
+        """
+        @param prefix: Sorted set key prefix the policy applies to
+        @param max_count: Entries kept at most, None for no limit
+        @param max_age: Seconds an entry is kept at most, None for no limit
+        @param archive: Write trimmed stream entries to the on-disk archive
+        """
+        self.prefix = prefix
+        self.max_count = max_count
+        self.max_age = max_age
+        self.archive = archive
+
+    def __repr__(self):
+        return (f"RetentionPolicy({self.prefix!r}, max_count={self.max_count}, max_age={self.max_age}, "
+                f"archive={self.archive})")
+
+
+DEFAULT_POLICIES = [
+    RetentionPolicy("twitch:messages:all", max_count=10000, archive=True),
+    RetentionPolicy("twitch:messages:commands", max_count=5000, archive=True),
+    RetentionPolicy("twitch:messages:", max_count=5000, max_age=7 * DAY),  # Per message type
+    RetentionPolicy("twitch:commands:", max_count=1000, max_age=30 * DAY),  # Per command
+    RetentionPolicy("twitch:index:author:", max_count=1000, max_age=30 * DAY),  # module.history_query
+]
+
+##########################
+# Sweeper
+##########################
+class HistoryRetention:
+    """Trims history keys by their policy, incrementally and in the background."""
+
+    def __init__(self, policies=None, client=redis_client, archive=history_archive, interval=SWEEP_INTERVAL,
+                 chunk_size=CHUNK_SIZE, chunk_pause=CHUNK_PAUSE):
+        """
+        @param policies: List of RetentionPolicy (DEFAULT_POLICIES if None)
+        @param client: Redis client holding the history
+        @param archive: HistoryArchive for policies with archive=True, None to never archive
+        @param interval: Seconds between background sweeps
+        @param chunk_size: Entries removed per command at most
+        @param chunk_pause: Seconds slept between two chunks
+        """
+        # Longest prefix first so the most specific policy wins
+        self.policies = sorted(policies or DEFAULT_POLICIES, key=lambda policy: len(policy.prefix), reverse=True)
+        self.client = client
+        self.archive = archive
+        self.interval = interval
+        self.chunk_size = chunk_size
+        self.chunk_pause = chunk_pause
+        self.memory_usage_supported = True
+        self.stop_event = threading.Event()
+        self.thread = None
+
+        self.stats = {"sweeps": 0, "entries_removed": 0, "entries_archived": 0, "bytes_reclaimed": 0, "errors": 0}
+
+    def policy_for(self, key):
+        """Finds the policy of a sorted set or stream history key.
+
+        @return: RetentionPolicy or None if no policy matches
+        """
+        if key.startswith(STREAM_KEY_PREFIX):
+            key = history_key_for_stream(key)
+        for policy in self.policies:
+            if key.startswith(policy.prefix):
+                return policy
+        return None
+
+    def sweep(self):
+        """Trims every history key once.
+
+        @return: Report dict with keys_scanned, keys_trimmed, entries_removed,
+            bytes_reclaimed (None if the server cannot measure it) and duration
+        """
+        started = time.monotonic()
+        report = {"keys_scanned": 0, "keys_trimmed": 0, "entries_removed": 0, "bytes_reclaimed": 0}
+
+        cursor = 0
+        while True:
+            cursor, keys = self.client.scan(cursor=cursor, match=HISTORY_KEY_PATTERN, count=SCAN_COUNT)
+            keys = [key.decode('utf-8') for key in keys]
+            keys = [key for key in keys if self.policy_for(key) is not None]
+            if keys:
+                pipe = self.client.pipeline(transaction=False)
+                for key in keys:
+                    pipe.type(key)
+                key_types = pipe.execute()
+                for key, key_type in zip(keys, key_types):
+                    if self.stop_event.is_set():
+                        break
+                    report["keys_scanned"] += 1
+                    try:
+                        removed, freed = self.trim_key(key, key_type.decode('utf-8'), self.policy_for(key))
+                    except (redis.RedisError, OSError) as e:
+                        self.stats["errors"] += 1
+                        log_error(f"Error trimming {key}: {e}", "history_retention", {"error": str(e)})
+                        continue
+                    if removed:
+                        report["keys_trimmed"] += 1
+                        report["entries_removed"] += removed
+                        if freed is not None and report["bytes_reclaimed"] is not None:
+                            report["bytes_reclaimed"] += freed
+                        else:
+                            report["bytes_reclaimed"] = None
+            if cursor == 0 or self.stop_event.is_set():
+                break
+
+        report["duration"] = round(time.monotonic() - started, 3)
+        self.stats["sweeps"] += 1
+        self.stats["entries_removed"] += report["entries_removed"]
+        self.stats["bytes_reclaimed"] += report["bytes_reclaimed"] or 0
+        if report["entries_removed"]:
+            log_info(f"History sweep removed {report['entries_removed']} entries", "history_retention", report)
+        else:
+            log_debug("History sweep found nothing to remove", "history_retention", report)
+        return report
+
+    def trim_key(self, key, key_type, policy):
+        """Applies a policy to one key in chunks.
+
+        @param key: History key
+        @param key_type: Redis type of the key ("zset" or "stream")
+        @param policy: RetentionPolicy for the key
+        @return: (entries removed, bytes freed or None if unknown)
+        """
+        if key_type == "zset":
+            count_excess = self._zset_excess
+            remove_chunk = self._zset_remove_chunk
+        elif key_type == "stream":
+            count_excess = self._stream_excess
+            if policy.archive and self.archive is not None:
+                remove_chunk = self._stream_archive_chunk
+            else:
+                remove_chunk = self._stream_remove_chunk
+        else:
+            return 0, 0
+
+        cutoff = time.time() - policy.max_age if policy.max_age is not None else None
+        excess = count_excess(key, policy, cutoff)
+        if excess <= 0:
+            return 0, 0
+
+        before = self._memory_usage(key)
+        removed = 0
+        while excess > 0 and not self.stop_event.is_set():
+            chunk = remove_chunk(key, policy, cutoff, min(excess, self.chunk_size))
+            if not chunk:
+                break
+            removed += chunk
+            excess -= chunk
+            time.sleep(self.chunk_pause)
+        after = self._memory_usage(key)
+
+        freed = before - after if before is not None and after is not None else None
+        log_debug(f"Trimmed {removed} entries from {key}", "history_retention", {"bytes_reclaimed": freed})
+        return removed, freed
+
+    def _zset_excess(self, key, policy, cutoff):
+        pipe = self.client.pipeline(transaction=False)
+        pipe.zcard(key)
+        pipe.zcount(key, "-inf", f"({cutoff}" if cutoff is not None else "-inf")
+        size, expired = pipe.execute()
+        if cutoff is None:
+            expired = 0
+        over_count = size - policy.max_count if policy.max_count is not None else 0
+        return max(over_count, expired)
+
+    def _zset_remove_chunk(self, key, policy, cutoff, count):
+        # The oldest entries have the lowest ranks, so both limits trim from rank 0
+        return self.client.zremrangebyrank(key, 0, count - 1)
+
+    def _stream_excess(self, key, policy, cutoff):
+        pipe = self.client.pipeline(transaction=False)
+        pipe.xlen(key)
+        pipe.xrange(key, "-", "+", count=1)
+        length, oldest = pipe.execute()
+        over_count = length - policy.max_count if policy.max_count is not None else 0
+        # Streams cannot count entries by ID, so if the oldest entry is too old every
+        # entry is an upper bound; trimming stops at the first chunk that removes nothing
+        expired = length if cutoff is not None and oldest and id_to_time(oldest[0][0]) < cutoff else 0
+        return max(over_count, expired)
+
+    def _stream_remove_chunk(self, key, policy, cutoff, count):
+        removed = 0
+        if cutoff is not None:
+            removed += self.client.xtrim(key, minid=time_to_id(cutoff), approximate=True, limit=count)
+        if policy.max_count is not None and removed < count:
+            removed += self.client.xtrim(key, maxlen=policy.max_count, approximate=True, limit=count - removed)
+        return removed
+
+    def _stream_archive_chunk(self, key, policy, cutoff, count):
+        """Archives the oldest entries that are due, then removes exactly those."""
+        pipe = self.client.pipeline(transaction=False)
+        pipe.xlen(key)
+        pipe.xrange(key, "-", "+", count=count)
+        length, entries = pipe.execute()
+        over_count = length - policy.max_count if policy.max_count is not None else 0
+
+        due = []
+        for position, (entry_id, fields) in enumerate(entries):
+            if position >= over_count and (cutoff is None or id_to_time(entry_id) >= cutoff):
+                break  # Entries are oldest first, everything after this one is kept too
+            due.append((entry_id.decode('utf-8'), fields[STREAM_DATA_FIELD.encode()].decode('utf-8')))
+        if not due:
+            return 0
+
+        self.stats["entries_archived"] += self.archive.append(history_key_for_stream(key), due)
+        millis, sequence = due[-1][0].split("-")
+        return self.client.xtrim(key, minid=f"{millis}-{int(sequence) + 1}", approximate=False)
+
+    def _memory_usage(self, key):
+        """@return: Bytes used by a key, 0 if it is gone, None if the server cannot tell"""
+        if not self.memory_usage_supported:
+            return None
+        try:
+            return self.client.memory_usage(key) or 0
+        except redis.ResponseError:
+            self.memory_usage_supported = False
+            log_debug("MEMORY USAGE is not available, sweep reports will not include bytes", "history_retention")
+            return None
+
+    ##########################
+    # Background Thread
+    ##########################
+    def start(self):
+        """Starts the background sweeper."""
+        if self.thread is not None:
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name="history_retention", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stops the background sweeper, interrupting a running sweep."""
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+            self.thread = None
+        log_info("History retention stopped", "history_retention", {"stats": self.stats})
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            try:
+                self.sweep()
+            except Exception as e:
+                self.stats["errors"] += 1
+                error_msg = f"History sweep failed: {e}"
+                print(error_msg)
+                log_error(error_msg, "history_retention", {"error": str(e)})
+            self.stop_event.wait(self.interval)
+
+
+# Shared sweeper with the default policies
+history_retention = HistoryRetention()
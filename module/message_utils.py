@@ -1,8 +1,11 @@
+import atexit
 import json
 import signal
 import sys
-import inspect
 import os
+import threading
+import time
+from collections import deque
 from datetime import datetime
 from module.shared_redis import redis_client, pubsub
 
@@ -88,52 +91,298 @@ class LogLevel:
         else:
             return f"LEVEL_{level}"
 
-def get_caller_info():
+##########################
+# Level Table
+##########################
+LOG_LEVELS_KEY = "logging:levels"  # Redis hash: command or module name -> level name
+LOG_LEVELS_CHANNEL = "logging.levels"  # Published to after the hash changed (outside system.* on purpose)
+LEVEL_LISTENER_SLEEP = 1.0  # Seconds the listener thread blocks waiting for an update
+LEVEL_LISTENER_RETRY = 30  # Seconds between attempts to load the levels and subscribe while Redis is unreachable
+
+class LogLevelTable:
+    """Per-module log levels, cached in-process and updated live over pub/sub.
+
+    Each (command, calling module) pair gets one numeric threshold. It comes from
+    an override in LOG_LEVELS_KEY for the command or the module name, or else
+    from the calling module's LOG_LEVEL, and is resolved once. After that a log
+    call below the threshold costs a dictionary lookup and an integer compare.
+
+    Changing an override (set_log_level) publishes on LOG_LEVELS_CHANNEL, and
+    every process reloads the overrides and drops its cached thresholds.
+    """
+
+    def __init__(self, client=redis_client):
+        """
+        @param client: Redis client holding the overrides
+        """
+        self.client = client
+        self.thresholds = {}  # (command, module name) -> numeric level
+        self.overrides = None  # name -> numeric level, loaded on first use
+        self.lock = threading.Lock()
+        self.listener = None
+
+    def threshold(self, command, module_globals):
+        """Resolves and caches the threshold of a (command, module) pair.
+
+        @param command: Command the message is logged for
+        @param module_globals: Globals of the calling module
+        @return: Numeric level below which messages are skipped
+        """
+        module_name = module_globals.get('__name__')
+        with self.lock:
+            if self.overrides is None:
+                self._start()
+            overrides = self.overrides
+        if command in overrides:
+            threshold = overrides[command]
+        elif module_name in overrides:
+            threshold = overrides[module_name]
+        elif 'LOG_LEVEL' in module_globals:
+            threshold = LogLevel.get_level(module_globals['LOG_LEVEL'])
+        else:
+            threshold = 0  # Modules without LOG_LEVEL log everything
+        self.thresholds[(command, module_name)] = threshold
+        return threshold
+
+    def reload(self, *_):
+        """Reloads the overrides from Redis and drops the cached thresholds.
+
+        @return: False if Redis could not be read and no overrides apply
+        """
+        loaded = True
+        try:
+            raw = self.client.hgetall(LOG_LEVELS_KEY)
+        except Exception as e:
+            print(f"Error loading log levels: {e}")
+            raw = {}
+            loaded = False
+        self.overrides = {name.decode('utf-8'): LogLevel.get_level(level.decode('utf-8')) for name, level in raw.items()}
+        self.thresholds = {}  # Replaced, not cleared, so readers never see a half-built table
+        return loaded
+
+    def _start(self):
+        loaded = self.reload()
+        if self.listener is None:
+            try:
+                level_pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                level_pubsub.subscribe(**{LOG_LEVELS_CHANNEL: self.reload})
+                self.listener = level_pubsub.run_in_thread(sleep_time=LEVEL_LISTENER_SLEEP, daemon=True,
+                                                           exception_handler=self._listener_error)
+            except Exception as e:
+                print(f"Error subscribing to log level updates: {e}")
+        if not loaded or self.listener is None:
+            # threshold() only starts once, so keep trying until the overrides and updates arrive
+            retry = threading.Timer(LEVEL_LISTENER_RETRY, self._retry_start)
+            retry.daemon = True
+            retry.start()
+
+    def _retry_start(self):
+        with self.lock:
+            self._start()
+
+    def _listener_error(self, error, level_pubsub, thread):
+        # redis-py resubscribes on the next read; the reload covers updates missed meanwhile
+        print(f"Log level listener error: {error}")
+        time.sleep(LEVEL_LISTENER_SLEEP)
+        self.reload()
+
+
+# Shared level table for the whole process
+log_levels = LogLevelTable()
+
+def set_log_level(name, level):
+    """Overrides the log level of a command or module in every running process.
+
+    @param name: Command name as passed to the log functions (e.g. "suika") or module name
+    @param level: Level name or number, None to go back to the module's LOG_LEVEL
+    """
+    if level is None:
+        redis_client.hdel(LOG_LEVELS_KEY, name)
+    else:
+        redis_client.hset(LOG_LEVELS_KEY, name, LogLevel.get_level_name(LogLevel.get_level(level)))
+    redis_client.publish(LOG_LEVELS_CHANNEL, name)
+
+##########################
+# Log Publisher
+##########################
+LOG_BUFFER_SIZE = 5000  # Log messages waiting for the sender thread at most
+LOG_BATCH_SIZE = 200  # Publishes sent in one pipeline
+LOG_RETRY_MIN_DELAY = 0.5  # Seconds before the first retry after Redis failed
+LOG_RETRY_MAX_DELAY = 10  # Upper bound of the retry backoff
+LOG_FLUSH_TIMEOUT = 2.0  # Seconds the exit flush may take
+
+class LogPublisher:
+    """Publishes log messages from a background thread in pipelined batches.
+
+    publish() only appends to a bounded buffer, so a log call never waits for
+    Redis. When the buffer is full, new messages below WARNING are dropped;
+    more important ones push out the oldest buffered message instead. If Redis
+    fails, the batch goes back to the front of the buffer and is retried with
+    backoff. Dropped messages are reported with one WARNING once Redis takes
+    messages again. The buffer is flushed when the process exits.
+    """
+
+    def __init__(self, client=redis_client, max_buffered=LOG_BUFFER_SIZE, batch_size=LOG_BATCH_SIZE):
+        """
+        @param client: Redis client to publish with
+        @param max_buffered: Log messages waiting for the sender thread at most
+        @param batch_size: Publishes sent in one pipeline
+        """
+        self.client = client
+        self.max_buffered = max_buffered
+        self.batch_size = batch_size
+        self.buffer = deque()  # (channel, payload, level)
+        self.condition = threading.Condition()
+        self.sending = 0  # Messages taken from the buffer but not yet published
+        self.stop_event = threading.Event()
+        self.thread = None
+
+        self.stats = {"published": 0, "dropped": 0, "batches": 0, "failed_batches": 0}
+        self.unreported_drops = 0
+
+    def publish(self, channel, payload, level=LogLevel.INFO):
+        """Queues one publish without waiting for Redis.
+
+        @param channel: Redis channel
+        @param payload: Message string
+        @param level: Numeric level, decides what is dropped when the buffer is full
+        """
+        with self.condition:
+            if len(self.buffer) >= self.max_buffered:
+                self.stats["dropped"] += 1
+                self.unreported_drops += 1
+                if level < LogLevel.WARNING:
+                    return
+                self.buffer.popleft()
+            self.buffer.append((channel, payload, level))
+            if self.thread is None:
+                self._start()
+            self.condition.notify()
+
+    def flush(self, timeout=LOG_FLUSH_TIMEOUT):
+        """Waits until everything buffered so far is published.
+
+        @return: True if the buffer is empty
+        """
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while self.buffer or self.sending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self.thread is None:
+                    return False
+                self.condition.wait(remaining)
+        return True
+
+    def stop(self, timeout=LOG_FLUSH_TIMEOUT):
+        """Flushes the buffer and stops the sender thread."""
+        self.flush(timeout)
+        self.stop_event.set()
+        with self.condition:
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout=timeout)
+            self.thread = None
+
+    ##########################
+    # Sender Thread
+    ##########################
+    def _start(self):
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name="log_publisher", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        delay = LOG_RETRY_MIN_DELAY
+        while not self.stop_event.is_set():
+            with self.condition:
+                while not self.buffer and not self.stop_event.is_set():
+                    self.condition.wait()
+                batch = [self.buffer.popleft() for _ in range(min(self.batch_size, len(self.buffer)))]
+                self.sending = len(batch)
+            if not batch:
+                continue
+            if self._send(batch):
+                delay = LOG_RETRY_MIN_DELAY
+                continue
+            # Keep the batch at the front so the order is kept, unless newer messages filled the buffer
+            with self.condition:
+                room = self.max_buffered - len(self.buffer)
+                kept = batch[len(batch) - room:] if room < len(batch) else batch
+                self.stats["dropped"] += len(batch) - len(kept)
+                self.unreported_drops += len(batch) - len(kept)
+                self.buffer.extendleft(reversed(kept))
+                self.sending = 0
+            self.stop_event.wait(delay)
+            delay = min(delay * 2, LOG_RETRY_MAX_DELAY)
+
+    def _send(self, batch):
+        """Publishes one batch in a pipeline.
+
+        @return: True if Redis took it
+        """
+        dropped = 0
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for channel, payload, _ in batch:
+                pipe.publish(channel, payload)
+            with self.condition:
+                dropped, self.unreported_drops = self.unreported_drops, 0
+            if dropped:
+                pipe.publish('system.log.log_publisher', json.dumps(build_log_object(
+                    LogLevel.WARNING, f"{dropped} log messages were dropped while Redis was busy or unreachable",
+                    {"filename": os.path.basename(__file__), "lineno": 0, "function": "_send"})))
+            pipe.execute()
+        except Exception as e:
+            if dropped:
+                with self.condition:
+                    self.unreported_drops += dropped
+            self.stats["failed_batches"] += 1
+            print(f"Error publishing log messages: {e}")
+            return False
+        with self.condition:
+            self.stats["published"] += len(batch)
+            self.stats["batches"] += 1
+            self.sending = 0
+            self.condition.notify_all()
+        return True
+
+
+# Shared publisher for the whole process, flushed on exit
+log_publisher = LogPublisher()
+atexit.register(log_publisher.stop)
+
+##########################
+# Log Functions
+##########################
+def get_caller_info(frame=None):
     """Get information about the caller of the logging function.
 
+    @param frame: Frame of the caller, two frames up from this function's caller if None
     @return: Dictionary with filename, line number, and function name
     """
-    frame = inspect.currentframe().f_back.f_back  # Go back two frames to get the caller
-    filename = os.path.basename(frame.f_code.co_filename)
-    lineno = frame.f_lineno
-    function = frame.f_code.co_name
+    if frame is None:
+        frame = sys._getframe(2)  # Go back two frames to get the caller
     return {
-        "filename": filename,
-        "lineno": lineno,
-        "function": function
+        "filename": os.path.basename(frame.f_code.co_filename),
+        "lineno": frame.f_lineno,
+        "function": frame.f_code.co_name
     }
 
-def log_message(level, message, command=None, extra_data=None):
-    """Send a log message to Redis.
+def build_log_object(numeric_level, message, caller_info, extra_data=None):
+    """Build the log message object system_logger expects.
 
-    @param level: The log level (use LogLevel constants or string names)
-    @param message: The message content to send
-    @param command: The command type for the Redis channel (optional, defaults to "log")
+    @param numeric_level: Numeric log level
+    @param message: The message content
+    @param caller_info: Dictionary from get_caller_info
     @param extra_data: Additional data to include in the log message (optional)
+    @return: Log message dictionary
     """
-    if command is None:
-        command = "log"
-
-    # Convert string level to numeric if needed
-    numeric_level = LogLevel.get_level(level)
-    level_name = LogLevel.get_level_name(numeric_level)
-
-    caller_info = get_caller_info()
-
-    # Check if the calling file has a LOG_LEVEL defined and respect it
-    caller_module = inspect.getmodule(inspect.currentframe().f_back.f_back)
-    if caller_module and hasattr(caller_module, 'LOG_LEVEL'):
-        caller_log_level = LogLevel.get_level(caller_module.LOG_LEVEL)
-        # Skip logging if the message level is lower than the caller's log level
-        if numeric_level < caller_log_level:
-            return
-
     log_message_obj = {
         "type": "system",
         "source": "system",
         "content": message,
         "level": numeric_level,
-        "level_name": level_name,
+        "level_name": LogLevel.get_level_name(numeric_level),
         "timestamp": datetime.now().isoformat(),
         "caller": caller_info
     }
@@ -141,8 +390,38 @@ def log_message(level, message, command=None, extra_data=None):
     # Add extra_data if provided
     if extra_data:
         log_message_obj["extra_data"] = extra_data
+    return log_message_obj
+
+def log_message(level, message, command=None, extra_data=None):
+    """Send a log message to Redis.
+
+    The level is checked against the caller's threshold first; caller info,
+    the message object and the JSON are only built for messages that pass.
+    The publish itself is queued for log_publisher's background thread.
+
+    @param level: The log level (use LogLevel constants or string names)
+    @param message: The message content to send
+    @param command: The command type for the Redis channel (optional, defaults to "log")
+    @param extra_data: Additional data to include in the log message (optional)
+    """
+    if command is None:
+        command = "log"
+
+    # Convert string level to numeric if needed
+    numeric_level = LogLevel.get_level(level)
+
+    # Respect the calling file's LOG_LEVEL or its override
+    frame = sys._getframe(2)  # Go back two frames to get the caller
+    module_globals = frame.f_globals
+    threshold = log_levels.thresholds.get((command, module_globals.get('__name__')))
+    if threshold is None:
+        threshold = log_levels.threshold(command, module_globals)
+    if numeric_level < threshold:
+        return
+
+    log_message_obj = build_log_object(numeric_level, message, get_caller_info(frame), extra_data)
 
-    redis_client.publish(f'system.log.{command}', json.dumps(log_message_obj))
+    log_publisher.publish(f'system.log.{command}', json.dumps(log_message_obj), numeric_level)
 
 def log_debug(message, command=None, extra_data=None):
     """Send a debug log message to Redis.
@@ -151,7 +430,7 @@ def log_debug(message, command=None, extra_data=None):
     @param command: The command type for the Redis channel (optional, defaults to "log")
     @param extra_data: Additional data to include in the log message (optional)
     """
-    log_message("DEBUG", message, command, extra_data)
+    log_message(LogLevel.DEBUG, message, command, extra_data)
 
 def log_info(message, command=None, extra_data=None):
     """Send an info log message to Redis.
@@ -160,7 +439,7 @@ def log_info(message, command=None, extra_data=None):
     @param command: The command type for the Redis channel (optional, defaults to "log")
     @param extra_data: Additional data to include in the log message (optional)
     """
-    log_message("INFO", message, command, extra_data)
+    log_message(LogLevel.INFO, message, command, extra_data)
 
 def log_warning(message, command=None, extra_data=None):
     """Send a warning log message to Redis.
@@ -169,7 +448,7 @@ def log_warning(message, command=None, extra_data=None):
     @param command: The command type for the Redis channel (optional, defaults to "log")
     @param extra_data: Additional data to include in the log message (optional)
     """
-    log_message("WARNING", message, command, extra_data)
+    log_message(LogLevel.WARNING, message, command, extra_data)
 
 def log_error(message, command=None, extra_data=None):
     """Send an error log message to Redis.
@@ -178,7 +457,7 @@ def log_error(message, command=None, extra_data=None):
     @param command: The command type for the Redis channel (optional, defaults to "log")
     @param extra_data: Additional data to include in the log message (optional)
     """
-    log_message("ERROR", message, command, extra_data)
+    log_message(LogLevel.ERROR, message, command, extra_data)
 
 def log_critical(message, command=None, extra_data=None):
     """Send a critical log message to Redis.
@@ -187,7 +466,7 @@ def log_critical(message, command=None, extra_data=None):
     @param command: The command type for the Redis channel (optional, defaults to "log")
     @param extra_data: Additional data to include in the log message (optional)
     """
-    log_message("CRITICAL", message, command, extra_data)
+    log_message(LogLevel.CRITICAL, message, command, extra_data)
 
 def log_important(message, command=None, extra_data=None):
     """Send an important notification message to Redis.
@@ -196,7 +475,7 @@ def log_important(message, command=None, extra_data=None):
     @param command: The command type for the Redis channel (optional, defaults to "log")
     @param extra_data: Additional data to include in the log message (optional)
     """
-    log_message("IMPORTANT", message, command, extra_data)
+    log_message(LogLevel.IMPORTANT, message, command, extra_data)
 
 def log_startup(message, command=None, extra_data=None):
     """Send a startup log message to Redis.
@@ -205,7 +484,7 @@ def log_startup(message, command=None, extra_data=None):
     @param command: The command type for the Redis channel (optional, defaults to "log")
     @param extra_data: Additional data to include in the log message (optional)
     """
-    log_message("STARTUP", message, command, extra_data)
+    log_message(LogLevel.STARTUP, message, command, extra_data)
 
 ##########################
 # Messaging Functions
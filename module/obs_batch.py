@@ -0,0 +1,138 @@
+"""OBS request batches for the TwitchBotV2 project.
+
+obs-websocket can run a whole list of requests from one ``RequestBatch``
+message (op 8) and answer with one ``RequestBatchResponse`` (op 9). Requests
+in a serial batch run in order on the OBS side, and ``Sleep`` requests
+between them pause the batch there, so an animation of eleven transform
+steps is one websocket round-trip instead of eleven requests with
+``time.sleep`` in between. obsws_python has no API for batches, so
+``ObsRequestBatch`` sends them on a websocket itself: the shared connection's
+batch client (see module.shared_obs), used by one batch at a time, so no
+other thread's response is read or swallowed here and a batch sleeping on
+the OBS side does not hold up the shared request client.
+
+Usage:
+
+    batch = ObsRequestBatch()
+    batch.add("SetSourceFilterEnabled", {"sourceName": scene, "filterName": "Zoom", "filterEnabled": True})
+    batch.sleep(millis=500)
+    batch.add("SetSourceFilterEnabled", {"sourceName": scene, "filterName": "Zoom", "filterEnabled": False})
+    results = batch.send()
+"""
+import json
+import uuid
+
+from module.shared_obs import obs_connection
+
+##########################
+# Configuration
+##########################
+# Set the log level for this module
+LOG_LEVEL = "INFO"  # Use "DEBUG", "INFO", "WARNING", "ERROR", or "CRITICAL"
+
+# RequestBatchExecutionType from the obs-websocket protocol
+SERIAL_REALTIME = 0  # Requests run one after another, Sleep takes sleepMillis
+SERIAL_FRAME = 1  # One request per rendered frame, Sleep takes sleepFrames
+PARALLEL = 2  # Requests run at once, no Sleep
+
+RESPONSE_TIMEOUT_MARGIN = 5  # Seconds added to the batch's own sleeps before giving up on the response
+
+##########################
+# Batches
+##########################
+class ObsBatchError(Exception):
+    """A batch that could not be sent, or a request in it that failed."""
+
+
+class ObsRequestBatch:
+    """Collects OBS requests and sends them in one round-trip."""
+
+    def __init__(self, execution_type=SERIAL_REALTIME, halt_on_failure=False):
+        """
+        @param execution_type: SERIAL_REALTIME, SERIAL_FRAME or PARALLEL
+        @param halt_on_failure: Skip the remaining requests once one fails
+        """
+        self.execution_type = execution_type
+        self.halt_on_failure = halt_on_failure
+        self.requests = []
+        self.sleep_millis = 0
+
+    def __len__(self):
+        return len(self.requests)
+
+    def add(self, request_type, request_data=None):
+        """Appends a request.
+
+        @param request_type: obs-websocket request type, e.g. "SetSceneItemTransform"
+        @param request_data: Request fields
+        @return: Index of the request's result in the list returned by send()
+        """
+        request = {"requestType": request_type}
+        if request_data:
+            request["requestData"] = request_data
+        self.requests.append(request)
+        return len(self.requests) - 1
+
+    def sleep(self, millis=None, frames=None):
+        """Appends a server-side pause (millis for SERIAL_REALTIME, frames for SERIAL_FRAME)."""
+        if millis is not None:
+            self.sleep_millis += millis
+            return self.add("Sleep", {"sleepMillis": int(millis)})
+        return self.add("Sleep", {"sleepFrames": int(frames)})
+
+    def send(self, client=None):
+        """Sends the batch and waits until OBS has run all of it.
+
+        @param client: obsws ReqClient used by nothing else while the batch runs; None (or the
+            shared request client) sends on the shared connection's batch client
+        @return: List of result dicts (requestType, requestStatus, responseData), one per request;
+            with halt_on_failure the list ends at the failed request
+        @raise ObsBatchError: If OBS is not connected or the batch could not be sent
+        """
+        if not self.requests:
+            return []
+        if client is not None and client is not obs_connection.req_client:
+            return self._send(client)
+        with obs_connection.batch_lock:
+            client = obs_connection.get_batch_client()
+            if client is None:
+                raise ObsBatchError("OBS client not connected")
+            return self._send(client)
+
+    def _send(self, client):
+        request_id = uuid.uuid4().hex
+        payload = {
+            "op": 8,
+            "d": {
+                "requestId": request_id,
+                "haltOnFailure": self.halt_on_failure,
+                "executionType": self.execution_type,
+                "requests": self.requests
+            }
+        }
+        ws = client.base_client.ws
+        previous_timeout = ws.gettimeout()
+        try:
+            # The response only arrives once OBS has slept through the whole batch
+            if previous_timeout is not None:
+                ws.settimeout(previous_timeout + self.sleep_millis / 1000 + RESPONSE_TIMEOUT_MARGIN)
+            ws.send(json.dumps(payload))
+            while True:
+                response = json.loads(ws.recv())
+                if response.get("op") == 9 and response["d"].get("requestId") == request_id:
+                    return response["d"]["results"]
+        except Exception as e:
+            obs_connection.report_failure(client)
+            raise ObsBatchError(f"OBS request batch failed: {e}") from e
+        finally:
+            ws.settimeout(previous_timeout)
+
+
+def failed_results(results):
+    """@return: The results of a batch whose request did not succeed"""
+    return [result for result in results if not result.get("requestStatus", {}).get("result")]
+
+
+def response_data(result):
+    """@return: responseData of one batch result, empty dict if there is none"""
+    return result.get("responseData") or {}
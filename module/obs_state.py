@@ -0,0 +1,325 @@
+"""Local mirror of OBS scene, scene item and filter state for the TwitchBotV2 project.
+
+Commands used to ask OBS for a filter list before every toggle and for a
+scene item list before every resize. ``ObsStateMirror`` answers those reads
+from memory instead:
+
+* a scene's items or a source's filters are fetched from OBS the first time
+  they are needed, after that they are kept up to date by obs-websocket
+  events (scene switch, scene item and filter enable state, items and
+  filters being created, removed or renamed)
+* structural changes the mirror does not model (renames, removed scenes)
+  drop the affected entry, so it is fetched again on the next read
+* after a reconnect everything is dropped, events may have been missed
+* the ``set_*`` and ``add_*`` write helpers skip changes that would not
+  change anything in OBS
+
+Usage:
+
+    from module.obs_state import obs_state
+
+    scene_item_id = obs_state.scene_item_id("Scene Fullscreen", "Fishing")
+    obs_state.set_filter_enabled("Scene Fullscreen", "Move: Fishing Zoom", True)
+"""
+import threading
+
+from module.shared_obs import get_obs_client, obs_connection
+
+##########################
+# Configuration
+##########################
+# Set the log level for this module
+LOG_LEVEL = "INFO"  # Use "DEBUG", "INFO", "WARNING", "ERROR", or "CRITICAL"
+
+##########################
+# State Mirror
+##########################
+class ObsStateMirror:
+    """In-memory model of OBS scenes, scene items and filters, kept current by events."""
+
+    def __init__(self, connection=obs_connection):
+        """
+        @param connection: ObsConnectionManager to read from and to receive events of
+        """
+        self.connection = connection
+        self.lock = threading.RLock()
+        self.client = None  # Client the cached state was read with
+        self.current_scene = None
+        self.scene_items = {}  # scene name -> {source name: {"id": scene item id, "enabled": bool}}
+        self.filters = {}  # source name -> {filter name: enabled}
+        self.started = False
+
+        self.stats = {"hits": 0, "fetches": 0, "events": 0, "skipped_writes": 0}
+
+    def start(self):
+        """Subscribes to the OBS events that keep the mirror current."""
+        with self.lock:
+            if self.started:
+                return
+            self.started = True
+        for callback in (self.on_current_program_scene_changed, self.on_scene_item_enable_state_changed,
+                         self.on_scene_item_created, self.on_scene_item_removed, self.on_scene_removed,
+                         self.on_scene_name_changed, self.on_input_name_changed, self.on_input_removed,
+                         self.on_source_filter_enable_state_changed, self.on_source_filter_created,
+                         self.on_source_filter_removed, self.on_source_filter_name_changed):
+            self.connection.add_event_listener(callback)
+
+    def clear(self):
+        """Drops all cached state, it is fetched again on the next read."""
+        with self.lock:
+            self.current_scene = None
+            self.scene_items.clear()
+            self.filters.clear()
+
+    ##########################
+    # Reads
+    ##########################
+    def current_program_scene(self):
+        """@return: Name of the current program scene, or None if OBS is not connected"""
+        client = self._client()
+        if client is None:
+            return None
+        with self.lock:
+            if self.current_scene is not None:
+                self.stats["hits"] += 1
+                return self.current_scene
+        scene = client.get_current_program_scene().current_program_scene_name
+        with self.lock:
+            self.stats["fetches"] += 1
+            if self.current_scene is None:
+                self.current_scene = scene
+            return self.current_scene
+
+    def scene_item(self, scene_name, source_name):
+        """@return: {"id", "enabled"} of a source in a scene, or None if it is not in the scene"""
+        items = self._scene_items(scene_name)
+        return None if items is None else items.get(source_name)
+
+    def scene_item_id(self, scene_name, source_name):
+        """@return: Scene item ID of a source in a scene, or None if it is not in the scene"""
+        item = self.scene_item(scene_name, source_name)
+        return None if item is None else item["id"]
+
+    def scene_item_enabled(self, scene_name, source_name):
+        """@return: True if the scene item is visible, None if it is not in the scene"""
+        item = self.scene_item(scene_name, source_name)
+        return None if item is None else item["enabled"]
+
+    def filter_enabled(self, source_name, filter_name):
+        """@return: True if the filter is enabled, None if the source has no such filter"""
+        filters = self._filters(source_name)
+        return None if filters is None else filters.get(filter_name)
+
+    ##########################
+    # Writes
+    ##########################
+    def set_filter_enabled(self, source_name, filter_name, enabled):
+        """Enables or disables a filter unless it already is in that state.
+
+        @return: True if a request was sent, False if the change was skipped
+        @raise ConnectionError: If OBS is not connected
+        """
+        if self.filter_enabled(source_name, filter_name) == enabled:
+            self.stats["skipped_writes"] += 1
+            return False
+        self._connected_client().set_source_filter_enabled(source_name, filter_name, enabled)
+        self._update_filter(source_name, filter_name, enabled)
+        return True
+
+    def set_scene_item_enabled(self, scene_name, source_name, enabled):
+        """Shows or hides a scene item unless it already is in that state.
+
+        @return: True if a request was sent, False if the change was skipped
+        @raise ConnectionError: If OBS is not connected
+        @raise ValueError: If the source is not in the scene
+        """
+        item = self.scene_item(scene_name, source_name)
+        if item is None:
+            raise ValueError(f"Source '{source_name}' not found in scene '{scene_name}'")
+        if item["enabled"] == enabled:
+            self.stats["skipped_writes"] += 1
+            return False
+        self._connected_client().set_scene_item_enabled(scene_name, item["id"], enabled)
+        self._update_scene_item(scene_name, item["id"], enabled)
+        return True
+
+    def add_filter_change(self, batch, source_name, filter_name, enabled):
+        """Adds a SetSourceFilterEnabled request to an ObsRequestBatch unless it would change nothing.
+
+        The mirror takes the change as done right away, so a second change queued before
+        OBS reports this one is not skipped by mistake. Call clear() if the batch fails.
+
+        @return: True if the request was added
+        """
+        if self.filter_enabled(source_name, filter_name) == enabled:
+            self.stats["skipped_writes"] += 1
+            return False
+        batch.add("SetSourceFilterEnabled", {"sourceName": source_name, "filterName": filter_name,
+                                             "filterEnabled": enabled})
+        self._update_filter(source_name, filter_name, enabled)
+        return True
+
+    def add_scene_item_change(self, batch, scene_name, source_name, enabled):
+        """Adds a SetSceneItemEnabled request to an ObsRequestBatch unless it would change nothing.
+
+        Like add_filter_change, the change is taken as done; call clear() if the batch fails.
+
+        @return: True if the request was added
+        @raise ValueError: If the source is not in the scene
+        """
+        item = self.scene_item(scene_name, source_name)
+        if item is None:
+            raise ValueError(f"Source '{source_name}' not found in scene '{scene_name}'")
+        if item["enabled"] == enabled:
+            self.stats["skipped_writes"] += 1
+            return False
+        batch.add("SetSceneItemEnabled", {"sceneName": scene_name, "sceneItemId": item["id"],
+                                          "sceneItemEnabled": enabled})
+        self._update_scene_item(scene_name, item["id"], enabled)
+        return True
+
+    ##########################
+    # Fetching
+    ##########################
+    def _client(self):
+        """@return: The connected client, dropping the cached state if it changed since the last read"""
+        client = get_obs_client()
+        with self.lock:
+            if client is not self.client:
+                self.clear()
+                self.client = client
+        return client
+
+    def _connected_client(self):
+        client = self._client()
+        if client is None:
+            raise ConnectionError("OBS client not connected")
+        return client
+
+    def _scene_items(self, scene_name):
+        client = self._client()
+        with self.lock:
+            if scene_name in self.scene_items:
+                self.stats["hits"] += 1
+                return self.scene_items[scene_name]
+        if client is None:
+            return None
+        items = {item["sourceName"]: {"id": item["sceneItemId"], "enabled": item["sceneItemEnabled"]}
+                 for item in client.get_scene_item_list(scene_name).scene_items}
+        with self.lock:
+            self.stats["fetches"] += 1
+            # An event may have filled the entry while the list was fetched
+            return self.scene_items.setdefault(scene_name, items)
+
+    def _filters(self, source_name):
+        client = self._client()
+        with self.lock:
+            if source_name in self.filters:
+                self.stats["hits"] += 1
+                return self.filters[source_name]
+        if client is None:
+            return None
+        filters = {filter_info["filterName"]: filter_info["filterEnabled"]
+                   for filter_info in client.get_source_filter_list(source_name).filters}
+        with self.lock:
+            self.stats["fetches"] += 1
+            return self.filters.setdefault(source_name, filters)
+
+    def _update_filter(self, source_name, filter_name, enabled):
+        with self.lock:
+            filters = self.filters.get(source_name)
+            if filters is not None:
+                filters[filter_name] = enabled
+
+    def _update_scene_item(self, scene_name, scene_item_id, enabled):
+        with self.lock:
+            for item in self.scene_items.get(scene_name, {}).values():
+                if item["id"] == scene_item_id:
+                    item["enabled"] = enabled
+
+    def _forget_scene(self, scene_name):
+        with self.lock:
+            self.scene_items.pop(scene_name, None)
+            self.filters.pop(scene_name, None)
+
+    def _forget_source(self, source_name):
+        with self.lock:
+            self.filters.pop(source_name, None)
+            # Scene item lists name their sources, drop the ones that hold it
+            for scene_name in [scene for scene, items in self.scene_items.items() if source_name in items]:
+                del self.scene_items[scene_name]
+
+    ##########################
+    # Events
+    ##########################
+    # obsws calls these from its event thread, the names select the event
+    def on_current_program_scene_changed(self, data):
+        with self.lock:
+            self.stats["events"] += 1
+            self.current_scene = data.scene_name
+
+    def on_scene_item_enable_state_changed(self, data):
+        self.stats["events"] += 1
+        self._update_scene_item(data.scene_name, data.scene_item_id, data.scene_item_enabled)
+
+    def on_scene_item_created(self, data):
+        with self.lock:
+            self.stats["events"] += 1
+            # The event does not carry the visibility, fetch the scene again
+            self.scene_items.pop(data.scene_name, None)
+
+    def on_scene_item_removed(self, data):
+        with self.lock:
+            self.stats["events"] += 1
+            items = self.scene_items.get(data.scene_name)
+            if items is not None and data.source_name in items:
+                del items[data.source_name]
+
+    def on_scene_removed(self, data):
+        self.stats["events"] += 1
+        self._forget_scene(data.scene_name)
+
+    def on_scene_name_changed(self, data):
+        self.stats["events"] += 1
+        self._forget_scene(data.old_scene_name)
+        self._forget_source(data.old_scene_name)
+        with self.lock:
+            if self.current_scene == data.old_scene_name:
+                self.current_scene = data.scene_name
+
+    def on_input_name_changed(self, data):
+        self.stats["events"] += 1
+        self._forget_source(data.old_input_name)
+
+    def on_input_removed(self, data):
+        self.stats["events"] += 1
+        self._forget_source(data.input_name)
+
+    def on_source_filter_enable_state_changed(self, data):
+        self.stats["events"] += 1
+        self._update_filter(data.source_name, data.filter_name, data.filter_enabled)
+
+    def on_source_filter_created(self, data):
+        with self.lock:
+            self.stats["events"] += 1
+            # New filters start enabled unless OBS is told otherwise, fetch to be sure
+            self.filters.pop(data.source_name, None)
+
+    def on_source_filter_removed(self, data):
+        with self.lock:
+            self.stats["events"] += 1
+            filters = self.filters.get(data.source_name)
+            if filters is not None:
+                filters.pop(data.filter_name, None)
+
+    def on_source_filter_name_changed(self, data):
+        with self.lock:
+            self.stats["events"] += 1
+            filters = self.filters.get(data.source_name)
+            if filters is not None and data.old_filter_name in filters:
+                filters[data.filter_name] = filters.pop(data.old_filter_name)
+
+
+# Shared mirror for the whole process
+obs_state = ObsStateMirror()
+obs_state.start()
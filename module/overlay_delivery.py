@@ -0,0 +1,241 @@
+"""Coalesced, rate-limited delivery of log messages to the OBS overlay.
+
+system_logger used to call ``send_custom_message`` once per log line, and
+every call went through ``get_obs_client()``, which probes OBS with
+``GetVersion`` before the actual ``BroadcastCustomEvent``. An error storm
+therefore turned into hundreds of synchronous websocket round-trips on the
+logger's main loop.
+
+``OverlayLogDelivery`` moves that work to a background thread:
+
+* ``submit()`` only appends to a bounded queue, so the logger never waits
+  for OBS (when the queue is full, the oldest message is dropped and counted)
+* messages arriving within ``window`` seconds are merged per level into one
+  broadcast; repeated lines are shown once with a count
+* each level has its own token bucket (LEVEL_RATE_LIMITS); a level that is
+  out of tokens keeps collecting lines and sends them merged later
+* the OBS connection is health-checked every ``health_check_interval``
+  seconds instead of once per message; broadcasts in between reuse the
+  checked client, and a failed broadcast drops it until the next check
+"""
+import threading
+import time
+from collections import deque, OrderedDict
+
+from module.shared_obs import get_obs_client, broadcast_custom_event
+
+##########################
+# Configuration
+##########################
+# Set the log level for this module
+LOG_LEVEL = "INFO"  # Use "DEBUG", "INFO", "WARNING", "ERROR", or "CRITICAL"
+
+COALESCE_WINDOW = 0.5  # Seconds a burst is collected before it is broadcast
+HEALTH_CHECK_INTERVAL = 10  # Seconds between two OBS connection checks
+MAX_QUEUED_MESSAGES = 1000  # Messages waiting for the delivery thread at most
+MAX_PENDING_PER_LEVEL = 200  # Messages held back per rate-limited level at most
+MAX_LINES_PER_BROADCAST = 8  # Distinct lines shown in one merged overlay message
+OVERLAY_EVENT_TYPE = "CUSTOM_CHAT_MESSAGE"
+
+# Broadcasts per second and burst size per level
+LEVEL_RATE_LIMITS = {
+    'DEBUG': (0.2, 1),
+    'INFO': (0.5, 2),
+    'WARNING': (1, 3),
+    'ERROR': (1, 5),
+    'CRITICAL': (2, 5),
+    'IMPORTANT': (2, 5),
+    'STARTUP': (2, 10),
+}
+DEFAULT_RATE_LIMIT = (0.5, 2)
+
+##########################
+# Helpers
+##########################
+class LevelBucket:
+    """Token bucket limiting the broadcasts of one level."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_take(self, now):
+        """@return: True if a broadcast may be sent now"""
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def seconds_until_token(self, now):
+        self._refill(now)
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+def merge_messages(messages, dropped=0):
+    """Merges log messages of one level into a single overlay message.
+
+    @param messages: Overlay message dicts, oldest first
+    @param dropped: Messages of this level that were dropped before merging
+    @return: One overlay message dict
+    """
+    if len(messages) == 1 and not dropped:
+        return messages[0]
+
+    counts = OrderedDict()
+    for message in messages:
+        content = message.get('message', message.get('content', ''))
+        counts[content] = counts.get(content, 0) + 1
+    lines = [content if count == 1 else f"{content} (x{count})" for content, count in counts.items()]
+    hidden = len(lines) - MAX_LINES_PER_BROADCAST
+    if hidden > 0:
+        lines = lines[:MAX_LINES_PER_BROADCAST] + [f"... and {hidden} more"]
+    if dropped:
+        lines.append(f"({dropped} messages dropped)")
+
+    merged = dict(messages[-1])  # Newest message provides timestamp and styling
+    merged['message'] = merged['content'] = "\n".join(lines)
+    merged['metadata'] = dict(merged.get('metadata') or {}, merged_count=len(messages) + dropped)
+    return merged
+
+##########################
+# Delivery
+##########################
+class OverlayLogDelivery:
+    """Queues overlay log messages and broadcasts them merged and rate-limited."""
+
+    def __init__(self, window=COALESCE_WINDOW, health_check_interval=HEALTH_CHECK_INTERVAL,
+                 max_queued=MAX_QUEUED_MESSAGES, connect=get_obs_client, broadcast=broadcast_custom_event):
+        """
+        @param window: Seconds a burst is collected before it is broadcast
+        @param health_check_interval: Seconds between two OBS connection checks
+        @param max_queued: Messages waiting for the delivery thread at most
+        @param connect: Function returning a checked OBS client or None
+        @param broadcast: Function (event type, data, client) sending one event, returns success
+        """
+        self.window = window
+        self.health_check_interval = health_check_interval
+        self.connect = connect
+        self.broadcast = broadcast
+        self.queue = deque(maxlen=max_queued)
+        self.condition = threading.Condition()
+        self.pending = {}  # level name -> messages held back by the rate limit
+        self.dropped = {}  # level name -> messages dropped while held back
+        self.buckets = {}
+        self.client = None
+        self.next_health_check = 0.0
+        self.stop_event = threading.Event()
+        self.thread = None
+
+        self.stats = {"submitted": 0, "broadcasts": 0, "merged": 0, "dropped": 0, "failed": 0}
+
+    def submit(self, message):
+        """Queues one overlay message without waiting for OBS.
+
+        @param message: Overlay message dict with a "level_name"
+        """
+        with self.condition:
+            if len(self.queue) == self.queue.maxlen:
+                self.stats["dropped"] += 1  # deque drops the oldest message
+            self.queue.append(message)
+            self.stats["submitted"] += 1
+            self.condition.notify()
+
+    def start(self):
+        """Starts the delivery thread."""
+        if self.thread is not None:
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name="overlay_delivery", daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=2.0):
+        """Stops the delivery thread after one last attempt to send what is pending."""
+        self.stop_event.set()
+        with self.condition:
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join(timeout=timeout)
+            self.thread = None
+
+    ##########################
+    # Delivery Thread
+    ##########################
+    def _run(self):
+        while not self.stop_event.is_set():
+            with self.condition:
+                if not self.queue:
+                    self.condition.wait(self._idle_timeout())
+            if self.queue:
+                # Let the rest of a burst arrive before broadcasting
+                self.stop_event.wait(self.window)
+            self._drain()
+            self._health_check()
+            self._deliver()
+        self._drain()
+        self._deliver(final=True)
+
+    def _idle_timeout(self):
+        now = time.monotonic()
+        timeout = max(self.next_health_check - now, 0.1)
+        for level in self.pending:
+            timeout = min(timeout, max(self._bucket(level).seconds_until_token(now), 0.05))
+        return timeout
+
+    def _drain(self):
+        with self.condition:
+            messages = list(self.queue)
+            self.queue.clear()
+        for message in messages:
+            level = message.get('level_name', 'INFO')
+            pending = self.pending.setdefault(level, [])
+            pending.append(message)
+            if len(pending) > MAX_PENDING_PER_LEVEL:
+                del pending[0]
+                self.dropped[level] = self.dropped.get(level, 0) + 1
+                self.stats["dropped"] += 1
+
+    def _bucket(self, level):
+        if level not in self.buckets:
+            self.buckets[level] = LevelBucket(*LEVEL_RATE_LIMITS.get(level, DEFAULT_RATE_LIMIT))
+        return self.buckets[level]
+
+    def _health_check(self, force=False):
+        now = time.monotonic()
+        if not force and now < self.next_health_check:
+            return
+        self.next_health_check = now + self.health_check_interval
+        try:
+            self.client = self.connect()
+        except Exception as e:
+            print(f"OBS health check failed: {e}")
+            self.client = None
+
+    def _deliver(self, final=False):
+        now = time.monotonic()
+        for level in list(self.pending):
+            if self.client is None:
+                return  # Keep everything until the next health check finds OBS
+            if not final and not self._bucket(level).try_take(now):
+                continue
+            messages = self.pending[level]
+            merged = merge_messages(messages, self.dropped.get(level, 0))
+            try:
+                sent = self.broadcast(OVERLAY_EVENT_TYPE, merged, client=self.client)
+            except Exception as e:
+                print(f"Error sending log message to OBS: {e}")
+                sent = False
+            if not sent:
+                self.stats["failed"] += 1
+                self.client = None
+                return
+            del self.pending[level]
+            self.dropped.pop(level, None)
+            self.stats["broadcasts"] += 1
+            self.stats["merged"] += len(messages) - 1
@@ -1,9 +1,10 @@
 """Redis user utility functions for the TwitchBotV2 project.
 
 This module provides functions for interacting with Redis to manage user data.
+User records are stored through module.user_repository; these helpers work on
+the whole record and are kept for callers that need the full user dict.
 """
-import json
-from module.shared_redis import redis_client
+from module.user_repository import user_repository
 from module.message_utils import log_debug, log_info, log_error
 from module.user_utils import normalize_username, user_exists
 
@@ -14,13 +15,9 @@ def get_user_data(username):
     @return: User data dict if exists, None otherwise
     """
     normalized_username = normalize_username(username)
-    user_key = f"user:{normalized_username}"
 
     try:
-        if redis_client.exists(user_key):
-            user_json = redis_client.get(user_key)
-            return json.loads(user_json)
-        return None
+        return user_repository.get_user(normalized_username)
     except Exception as e:
         error_msg = f"Error getting user data: {e}"
         log_error(error_msg, "redis_user_utils", {"error": str(e), "username": normalized_username})
@@ -38,19 +35,8 @@ def create_default_user(username, display_name=None):
     if display_name is None:
         display_name = username.replace("@", "")
 
-    user_data = {
-        "name": normalized_username,
-        "display_name": display_name,
-        "chat": {"count": 0},
-        "command": {"count": 0},
-        "admin": {"count": 0},
-        "dustbunnies": {"collected_dustbunnies": 0},
-        "banking": {}
-    }
-
     try:
-        user_key = f"user:{normalized_username}"
-        redis_client.set(user_key, json.dumps(user_data))
+        user_data = user_repository.create_user(normalized_username, display_name)
         log_info(f"Created new user: {normalized_username}", "redis_user_utils")
         return user_data
     except Exception as e:
@@ -86,10 +72,9 @@ def update_user_data(username, user_data):
     @return: True if successful, False otherwise
     """
     normalized_username = normalize_username(username)
-    user_key = f"user:{normalized_username}"
 
     try:
-        redis_client.set(user_key, json.dumps(user_data))
+        user_repository.save_user(normalized_username, user_data)
         log_debug(f"Updated user data for {normalized_username}", "redis_user_utils")
         return True
     except Exception as e:
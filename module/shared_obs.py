@@ -1,12 +1,34 @@
+"""Shared OBS connection for the TwitchBotV2 project.
+
+Importing this module does not connect to anything. The OBS connection is
+opened by ``ObsConnectionManager`` the first time a command asks for it (or
+calls ``obs_connection.start()`` at startup), and the VBAN sender is created
+on its first ``send()``.
+
+The manager keeps one request client and one event client per process:
+
+* connection state comes from the obs-websocket event stream: the event
+  thread ending, or OBS announcing ``ExitStarted``, marks the connection as
+  lost; no ``GetVersion`` probe is sent before requests
+* reconnects run in a background thread with exponential backoff
+  (RECONNECT_MIN_DELAY doubling up to RECONNECT_MAX_DELAY)
+* ``get_obs_client()`` never waits by default: it returns the connected
+  client or None at once and leaves reconnecting to the background thread;
+  one-shot scripts can pass a timeout to wait for the first connection
+* ``add_event_listener()`` registers obsws callbacks (``on_<event_name>``)
+  that survive reconnects
+* request batches (module.obs_batch) get a third connection of their own,
+  opened on the first batch, so their long server-side sleeps never hold up
+  the request client and their responses never mix with its responses
+"""
 import obsws_python as obs
 import pyvban
+import random
 import time
 import threading
 import logging
-import json
 from module.shared_redis import redis_client_env
-from module.message_utils import send_admin_message_to_redis
-from module.message_utils import log_startup, log_info, log_error, log_debug, log_warning, log_critical
+from module.message_utils import log_error
 
 ##########################
 # Configuration
@@ -14,6 +36,16 @@ from module.message_utils import log_startup, log_info, log_error, log_debug, lo
 # Set the log level for this module
 LOG_LEVEL = "INFO"  # Use "DEBUG", "INFO", "WARNING", "ERROR", or "CRITICAL"
 
+OBS_PORT = 4455
+CONNECT_TIMEOUT = 3  # Seconds a connection attempt may take
+RECONNECT_MIN_DELAY = 1  # Seconds before the first reconnect attempt
+RECONNECT_MAX_DELAY = 60  # Upper bound of the exponential backoff
+STATE_POLL_INTERVAL = 1  # Seconds between checks of the event thread
+NOTIFY_AFTER_FAILURES = 5  # Failed attempts before an error is logged to the overlay
+
+VBAN_PORT = 6981
+VBAN_STREAM_NAME = "Command1"
+
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -24,109 +56,224 @@ logging.getLogger('obsws_python').setLevel(logging.WARNING)
 ##########################
 # OBS Connection
 ##########################
-obs_host = redis_client_env.get("obs_host_ip").decode('utf-8')
-obs_password = redis_client_env.get("obs_password").decode('utf-8')
+def get_obs_settings():
+    """@return: (host, password) of OBS from Redis DB 1"""
+    return (redis_client_env.get("obs_host_ip").decode('utf-8'),
+            redis_client_env.get("obs_password").decode('utf-8'))
+
+
+class ObsConnectionManager:
+    """Lazily opened, self-healing OBS websocket connection."""
+
+    def __init__(self, settings=get_obs_settings):
+        """
+        @param settings: Function returning (host, password), called before each connection attempt
+        """
+        self.settings = settings
+        self.req_client = None
+        self.event_client = None
+        self.batch_client = None
+        self.batch_lock = threading.Lock()  # Held for the whole use of batch_client
+        self.connected = threading.Event()
+        self.lost = threading.Event()  # Set by the event stream when the connection ends
+        self.lock = threading.Lock()
+        self.listeners = []
+        self.thread = None
+        self.failed_attempts = 0
+        self.notified = False
+
+    def start(self):
+        """Starts connecting in the background if that has not happened yet."""
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(target=self._run, name="obs_connection", daemon=True)
+            self.thread.start()
+
+    def get_client(self, timeout=0):
+        """Returns the connected request client.
+
+        @param timeout: Seconds to wait for a connection, 0 to return at once
+        @return: obsws ReqClient, or None if OBS is not connected
+        """
+        if not self.connected.is_set():
+            self.start()
+            if not timeout or not self.connected.wait(timeout):
+                return None
+        return self.req_client
 
-# Initialize with None
-obs_client = None
+    def is_connected(self):
+        return self.connected.is_set()
 
-def connect_to_obs():
-    global obs_client
-    while True:
+    def get_batch_client(self):
+        """Returns the request client reserved for request batches, connecting it on first use.
+
+        Callers must hold batch_lock from this call until the batch's response is read.
+
+        @return: obsws ReqClient, or None if OBS is not connected
+        """
+        if not self.connected.is_set():
+            self.start()
+            return None
+        if self.batch_client is None:
+            try:
+                host, password = self.settings()
+                self.batch_client = obs.ReqClient(host=host, port=OBS_PORT, password=password,
+                                                  timeout=CONNECT_TIMEOUT)
+            except Exception as e:
+                logger.warning(f"Failed to open the OBS batch connection: {e}")
+                return None
+        return self.batch_client
+
+    def report_failure(self, client):
+        """Marks the connection as lost after a request on it failed.
+
+        @param client: The client the failed request was sent with
+        """
+        if client is None:
+            return
+        if client is self.req_client:
+            self.lost.set()
+        elif client is self.batch_client:
+            # Reopened by the next batch; the event stream tells whether OBS itself is gone
+            self.batch_client = None
+            self._close(client)
+
+    def add_event_listener(self, callback):
+        """Registers an obsws callback such as ``on_scene_item_enable_state_changed``.
+
+        The callback is registered on every event client, including the ones
+        created after a reconnect.
+        """
+        with self.lock:
+            self.listeners.append(callback)
+            event_client = self.event_client
+        if event_client is not None:
+            event_client.callback.register(callback)
+
+    ##########################
+    # Background Thread
+    ##########################
+    def _run(self):
+        delay = RECONNECT_MIN_DELAY
+        while True:
+            if self._connect():
+                delay = RECONNECT_MIN_DELAY
+                self._wait_until_lost()
+                self._disconnect()
+                logger.warning("OBS connection lost, reconnecting")
+                continue
+            # Exponential backoff with a little jitter so several processes do not retry in step
+            sleep_for = delay * random.uniform(0.8, 1.2)
+            logger.info(f"Retrying OBS connection in {sleep_for:.1f} seconds...")
+            time.sleep(sleep_for)
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+    def _connect(self):
         try:
+            host, password = self.settings()
             logger.info("Attempting to connect to OBS...")
-            obs_client = obs.ReqClient(host=obs_host, port=4455, password=obs_password, timeout=3)
-            logger.info("Successfully connected to OBS!")
-            break
+            req_client = obs.ReqClient(host=host, port=OBS_PORT, password=password, timeout=CONNECT_TIMEOUT)
+            event_client = obs.EventClient(host=host, port=OBS_PORT, password=password, timeout=CONNECT_TIMEOUT)
         except Exception as e:
-            logger.warning(f"Failed to connect to OBS: {e}")
-            logger.info("Retrying in 30 seconds...")
-            time.sleep(30)
+            self.failed_attempts += 1
+            logger.warning(f"Failed to connect to OBS: {e} (Attempt {self.failed_attempts})")
+            # Send system message after 5 failed attempts if not already notified
+            if self.failed_attempts >= NOTIFY_AFTER_FAILURES and not self.notified:
+                log_error(f"Unable to connect to OBS after {self.failed_attempts} attempts. Please check if OBS is running and configured correctly.", "obs")
+                self.notified = True
+            return False
 
-# Start OBS connection in a background thread
-obs_connection_thread = threading.Thread(target=connect_to_obs, daemon=True)
-obs_connection_thread.start()
+        def on_exit_started(_):
+            self.lost.set()
+
+        with self.lock:
+            event_client.callback.register([on_exit_started] + self.listeners)
+            self.req_client, self.event_client = req_client, event_client
+            self.lost.clear()
+            self.connected.set()
+        self.failed_attempts = 0
+        self.notified = False
+        logger.info("Successfully connected to OBS!")
+        return True
+
+    def _wait_until_lost(self):
+        # The obsws event thread ends when the websocket closes
+        while not self.lost.wait(STATE_POLL_INTERVAL):
+            if not self.event_client.worker.is_alive():
+                return
+
+    def _disconnect(self):
+        with self.lock:
+            self.connected.clear()
+            req_client, event_client, batch_client = self.req_client, self.event_client, self.batch_client
+            self.req_client = self.event_client = self.batch_client = None
+        for client in (event_client, req_client, batch_client):
+            self._close(client)
+
+    @staticmethod
+    def _close(client):
+        if client is None:
+            return
+        try:
+            client.disconnect()
+        except Exception:
+            pass
+
+
+# Shared connection for the whole process
+obs_connection = ObsConnectionManager()
+
+
+def get_obs_client(timeout=0):
+    """Returns the shared OBS client without blocking (see ObsConnectionManager.get_client).
+
+    @param timeout: Seconds to wait for a connection, 0 to return at once
+    @return: obsws ReqClient, or None if OBS is not connected
+    """
+    return obs_connection.get_client(timeout)
 
 ##########################
 # VBAN Text-to-Voice
 ##########################
-send_text_to_voice = pyvban.utils.VBAN_SendText(
-    receiver_ip=obs_host,
-    receiver_port=6981,
-    stream_name="Command1"
-)
-
-# Connection status tracking
-obs_connection_status = {
-    "is_connecting": False,
-    "last_attempt": 0,
-    "failed_attempts": 0,
-    "notified": False
-}
-
-# Helper function to safely interact with OBS client
-def get_obs_client():
-    global obs_client, obs_connection_status
-
-    # If we already have a client, check if it's still valid
-    if obs_client is not None:
-        try:
-            # Simple test call to check if connection is still active
-            obs_client.get_version()
-            # Reset failed attempts counter on successful connection
-            if obs_connection_status["failed_attempts"] > 0:
-                obs_connection_status["failed_attempts"] = 0
-                obs_connection_status["notified"] = False
-            return obs_client
-        except Exception:
-            logger.warning("OBS client connection lost, will attempt to reconnect")
-            obs_client = None
-
-    # If we're already in the process of connecting, don't start another connection
-    current_time = time.time()
-    if obs_connection_status["is_connecting"]:
-        # If the connection attempt has been going on for too long, reset the flag
-        if current_time - obs_connection_status["last_attempt"] > 30:
-            obs_connection_status["is_connecting"] = False
-        else:
-            logger.info("Connection attempt already in progress")
-            return None
+class LazyVBANSender:
+    """VBAN text sender that is only created when the first text is sent."""
 
-    # Don't attempt reconnections too frequently
-    if current_time - obs_connection_status["last_attempt"] < 5:
-        return None
+    def __init__(self, receiver_port=VBAN_PORT, stream_name=VBAN_STREAM_NAME):
+        self.receiver_port = receiver_port
+        self.stream_name = stream_name
+        self.sender = None
+        self.lock = threading.Lock()
 
-    # Update connection status
-    obs_connection_status["is_connecting"] = True
-    obs_connection_status["last_attempt"] = current_time
+    def send(self, text):
+        with self.lock:
+            if self.sender is None:
+                host, _ = get_obs_settings()
+                self.sender = pyvban.utils.VBAN_SendText(
+                    receiver_ip=host,
+                    receiver_port=self.receiver_port,
+                    stream_name=self.stream_name
+                )
+        return self.sender.send(text)
 
-    # Attempt to connect
-    try:
-        logger.info("Attempting to connect to OBS...")
-        obs_client = obs.ReqClient(host=obs_host, port=4455, password=obs_password, timeout=3)
-        logger.info("Successfully connected to OBS!")
-        # Reset counters on successful connection
-        obs_connection_status["failed_attempts"] = 0
-        obs_connection_status["notified"] = False
-        obs_connection_status["is_connecting"] = False
-        return obs_client
-    except Exception as e:
-        # Increment failed attempts counter
-        obs_connection_status["failed_attempts"] += 1
-        logger.warning(f"Failed to connect to OBS: {e} (Attempt {obs_connection_status['failed_attempts']})")
 
-        # Send system message after 5 failed attempts if not already notified
-        if obs_connection_status["failed_attempts"] >= 5 and not obs_connection_status["notified"]:
-            log_error(f"Unable to connect to OBS after {obs_connection_status['failed_attempts']} attempts. Please check if OBS is running and configured correctly.", "obs")
-            obs_connection_status["notified"] = True
+send_text_to_voice = LazyVBANSender()
 
-        obs_connection_status["is_connecting"] = False
-        return None
+##########################
+# Custom Events
+##########################
+def broadcast_custom_event(event_type, data, client=None):
+    """Broadcasts a custom event to OBS.
 
-def broadcast_custom_event(event_type, data):
-    client = get_obs_client()
+    @param event_type: Twitchat event type
+    @param data: Event data
+    @param client: OBS client to use, the shared connection if None
+    @return: True if the event was sent
+    """
     if client is None:
-        logger.warning(f"Failed to send custom event to OBS: No connection")
+        client = get_obs_client()
+    if client is None:
+        logger.warning("Failed to send custom event to OBS: No connection")
         return False
 
     try:
@@ -135,31 +282,12 @@ def broadcast_custom_event(event_type, data):
             "type": event_type,
             "data": data
         }
-
-        # Use the broadcast_custom_event method directly if available
-        if hasattr(client, 'broadcast_custom_event'):
-            client.broadcast_custom_event({"eventData": event_data})
-        # Try using send_custom_event if available
-        elif hasattr(client, 'send_custom_event'):
-            client.send_custom_event({"eventData": event_data})
-        # Try using a more generic approach with events
-        elif hasattr(client, 'trigger_custom_event'):
-            client.trigger_custom_event("BroadcastCustomEvent", {"eventData": event_data})
-        # Try using a more generic approach with events
-        elif hasattr(client, 'trigger_event'):
-            client.trigger_event("BroadcastCustomEvent", {"eventData": event_data})
-        # Try using a more generic approach with events
-        elif hasattr(client, 'send_request'):
-            client.send_request("BroadcastCustomEvent", {"eventData": event_data})
-        # As a last resort, try to use the call method (which is causing the error)
-        else:
-            logger.warning("Could not find appropriate method to broadcast custom event. Falling back to call method.")
-            client.call(request_type="BroadcastCustomEvent", request_data={"eventData": event_data})
-
-        logger.info(f"Sent custom event to OBS: {event_type}")
+        client.broadcast_custom_event({"eventData": event_data})
+        logger.debug(f"Sent custom event to OBS: {event_type}")
         return True
     except Exception as e:
         logger.error(f"Error sending custom event to OBS: {e}")
+        obs_connection.report_failure(client)
         return False
 
 def send_custom_message(message_data):
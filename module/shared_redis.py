@@ -5,15 +5,21 @@ import logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+##########################
+# Connection Settings
+##########################
+REDIS_HOST = '192.168.50.115'
+REDIS_PORT = 6379
+
 ##########################
 # Shared Redis Clients
 ##########################
-redis_client = redis.StrictRedis(host='192.168.50.115', port=6379, db=0)
+redis_client = redis.StrictRedis(host=REDIS_HOST, port=REDIS_PORT, db=0)
 
 ##########################
 # Shared Redis Environment Client
 ##########################
-redis_client_env = redis.StrictRedis(host='192.168.50.115', port=6379, db=1)
+redis_client_env = redis.StrictRedis(host=REDIS_HOST, port=REDIS_PORT, db=1)
 
 ##########################
 # Shared PubSub Instance
@@ -0,0 +1,273 @@
+"""In-memory Twitch token provider for the TwitchBotV2 project.
+
+``get_valid_token()`` used to read and parse the token JSON from Redis DB 1
+on every API call, and nothing refreshed the token except the interactive
+scripts in ``src/`` and the cron job in refesh_token.sh.
+
+``TokenProvider`` keeps the token in memory, so ``get_token()`` is a plain
+attribute read on the hot path. A background thread, started on first use:
+
+* refreshes the token ``refresh_margin`` seconds before ``expires_at`` using
+  the refresh token and writes it back to Redis in the same format as the
+  ``src/`` scripts
+* publishes ``{"key": ...}`` on ``twitch.token.rotated`` after a refresh
+* reloads the token from Redis when another process announces a rotation
+
+Refreshes are single-flight: within a process only one thread refreshes
+while the others wait for its result, and across processes a short Redis
+lock makes sure only one of them calls Twitch; the rest pick up the new
+token from the rotation message.
+"""
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+
+import requests
+
+from module.shared_redis import redis_client_env
+from module.message_utils import log_debug, log_info, log_warning, log_error
+
+##########################
+# Configuration
+##########################
+# Set the log level for this module
+LOG_LEVEL = "INFO"  # Use "DEBUG", "INFO", "WARNING", "ERROR", or "CRITICAL"
+
+TOKEN_URL = "https://id.twitch.tv/oauth2/token"
+MAIN_TOKEN_KEY = "twitch_token_main"
+TOKEN_ROTATED_CHANNEL = "twitch.token.rotated"
+REFRESH_MARGIN = 15 * 60  # Seconds before expires_at the token is refreshed
+REFRESH_LOCK_TIMEOUT = 30  # Seconds the cross-process refresh lock is held at most
+RETRY_DELAY = 60  # Seconds before a failed refresh is tried again
+REQUEST_TIMEOUT = 10  # Seconds before the refresh request is abandoned
+
+##########################
+# Token Helpers
+##########################
+def parse_expires_at(token_data):
+    """Converts the expires_at of a token to a unix timestamp.
+
+    Tokens saved by the Python scripts carry a naive local time, the ones
+    refreshed by refesh_token.sh carry an offset; both are handled.
+
+    @param token_data: Token dict as stored in Redis
+    @return: Unix timestamp, or 0 if the token has no usable expires_at
+    """
+    try:
+        return datetime.fromisoformat(token_data["expires_at"]).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return 0
+
+
+def notify_token_rotated(token_key, client=redis_client_env):
+    """Tells other processes that a token in Redis was replaced.
+
+    @param token_key: Redis key of the token that changed
+    @param client: Redis client used to publish
+    """
+    client.publish(TOKEN_ROTATED_CHANNEL, json.dumps({"key": token_key}))
+
+##########################
+# Provider
+##########################
+class TokenProvider:
+    """Serves a Twitch access token from memory and keeps it fresh."""
+
+    def __init__(self, token_key=MAIN_TOKEN_KEY, client=redis_client_env, refresh_margin=REFRESH_MARGIN):
+        """
+        @param token_key: Redis key (DB 1) holding the token JSON
+        @param client: Redis client for DB 1
+        @param refresh_margin: Seconds before expiry the token is refreshed
+        """
+        self.token_key = token_key
+        self.client = client
+        self.refresh_margin = refresh_margin
+        self.token_data = None
+        self.expires_at = 0.0
+        self.retry_at = 0.0
+        self.lock = threading.Lock()
+        self.refresh_lock = threading.Lock()  # Single-flight refresh within the process
+        self.started = False
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def get_token(self):
+        """Returns a valid access token without touching Redis when possible.
+
+        Only blocks when the token is missing or already expired, for
+        example when the background refresh failed.
+
+        @return: Access token or None if no valid token is available
+        """
+        token_data, expires_at = self.token_data, self.expires_at
+        if token_data and time.time() < expires_at:
+            return token_data["access_token"]
+
+        with self.lock:
+            if not self.token_data or time.time() >= self.expires_at:
+                self._load()
+        self.start()
+        if self.token_data and time.time() < self.expires_at:
+            return self.token_data["access_token"]
+
+        if time.time() >= self.retry_at:
+            self.refresh()
+            if self.token_data and time.time() < self.expires_at:
+                return self.token_data["access_token"]
+        log_warning('Twitch token expired, please refresh it', "token_provider")
+        return None
+
+    def _load(self):
+        """Reads the token from Redis into memory."""
+        raw = self.client.get(self.token_key)
+        if not raw:
+            self.token_data, self.expires_at = None, 0.0
+            return
+        try:
+            token_data = json.loads(raw)
+        except json.JSONDecodeError as e:
+            log_error(f"Could not decode token {self.token_key}: {e}", "token_provider")
+            return
+        self.token_data, self.expires_at = token_data, parse_expires_at(token_data)
+        log_debug(f"Loaded token {self.token_key}", "token_provider", {
+            "expires_in": int(self.expires_at - time.time())
+        })
+
+    ##########################
+    # Refreshing
+    ##########################
+    def refresh(self):
+        """Refreshes the token, once per process and once across processes.
+
+        @return: True if a valid token is in memory afterwards
+        """
+        if not self.refresh_lock.acquire(blocking=False):
+            # Another thread is already refreshing; wait for it and use its result
+            with self.refresh_lock:
+                return self.token_data is not None and time.time() < self.expires_at
+        try:
+            # Someone else may have rotated the token in the meantime
+            with self.lock:
+                self._load()
+            if self.token_data and time.time() < self.expires_at - self.refresh_margin:
+                return True
+
+            lock_key = f"{self.token_key}:refresh_lock"
+            if not self.client.set(lock_key, "1", nx=True, ex=REFRESH_LOCK_TIMEOUT):
+                return self._wait_for_other_process()
+            try:
+                return self._refresh_from_twitch()
+            finally:
+                self.client.delete(lock_key)
+        finally:
+            self.refresh_lock.release()
+
+    def _wait_for_other_process(self):
+        log_debug(f"Token {self.token_key} is being refreshed by another process", "token_provider")
+        deadline = time.time() + REFRESH_LOCK_TIMEOUT
+        previous = self.token_data
+        while time.time() < deadline:
+            time.sleep(0.5)
+            with self.lock:
+                self._load()
+            if self.token_data != previous and time.time() < self.expires_at:
+                return True
+        return self.token_data is not None and time.time() < self.expires_at
+
+    def _refresh_from_twitch(self):
+        if not self.token_data or "refresh_token" not in self.token_data:
+            log_error(f"No refresh token available for {self.token_key}", "token_provider")
+            self.retry_at = time.time() + RETRY_DELAY
+            return False
+
+        client_id = self.client.get("TWITCH_CLIENT_ID")
+        client_secret = self.client.get("TWITCH_CLIENT_SECRET")
+        if not client_id or not client_secret:
+            log_error("Missing TWITCH_CLIENT_ID or TWITCH_CLIENT_SECRET", "token_provider")
+            self.retry_at = time.time() + RETRY_DELAY
+            return False
+
+        try:
+            response = requests.post(TOKEN_URL, data={
+                "client_id": client_id.decode('utf-8'),
+                "client_secret": client_secret.decode('utf-8'),
+                "grant_type": "refresh_token",
+                "refresh_token": self.token_data["refresh_token"]
+            }, timeout=REQUEST_TIMEOUT)
+            response.raise_for_status()
+            token_data = response.json()
+        except (requests.RequestException, ValueError) as e:
+            error_msg = f"Error refreshing token {self.token_key}: {e}"
+            print(error_msg)
+            log_error(error_msg, "token_provider", {"error": str(e)})
+            self.retry_at = time.time() + RETRY_DELAY
+            return False
+
+        # Same format as save_token in the src/ token scripts
+        token_data["expires_at"] = (datetime.now() + timedelta(seconds=token_data["expires_in"])).isoformat()
+        self.client.set(self.token_key, json.dumps(token_data))
+        with self.lock:
+            self.token_data, self.expires_at = token_data, parse_expires_at(token_data)
+        self.retry_at = 0.0
+        notify_token_rotated(self.token_key, self.client)
+        log_info(f"Refreshed token {self.token_key}", "token_provider", {
+            "expires_at": token_data["expires_at"]
+        })
+        return True
+
+    ##########################
+    # Background Thread
+    ##########################
+    def start(self):
+        """Starts the background refresh thread once per process."""
+        with self.lock:
+            if self.started:
+                return
+            self.started = True
+        self.thread = threading.Thread(target=self._run, name=f"token-{self.token_key}", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stops the background thread."""
+        self.stop_event.set()
+
+    def _seconds_until_refresh(self):
+        due = self.expires_at - self.refresh_margin
+        return max(due, self.retry_at) - time.time()
+
+    def _run(self):
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(TOKEN_ROTATED_CHANNEL)
+        try:
+            while not self.stop_event.is_set():
+                wait = self._seconds_until_refresh()
+                if self.token_data and wait <= 0:
+                    self.refresh()
+                    continue
+
+                # Wake up for the next refresh, or at least every minute
+                timeout = min(max(wait, 1), 60) if self.token_data else 60
+                message = pubsub.get_message(timeout=timeout)
+                if message is None:
+                    continue
+                try:
+                    key = json.loads(message["data"]).get("key")
+                except (json.JSONDecodeError, AttributeError):
+                    continue
+                if key == self.token_key:
+                    with self.lock:
+                        self._load()
+                    log_debug(f"Reloaded token {self.token_key} after rotation", "token_provider")
+        except Exception as e:
+            error_msg = f"Token refresh thread for {self.token_key} stopped: {e}"
+            print(error_msg)
+            log_error(error_msg, "token_provider", {"error": str(e)})
+            with self.lock:
+                self.started = False
+        finally:
+            pubsub.close()
+
+
+# Shared provider for the main account token
+token_provider = TokenProvider()
@@ -0,0 +1,213 @@
+"""Cached and batched Twitch user lookups for the TwitchBotV2 project.
+
+Commands that target other users (give, steal, fight, collect) check that
+the target exists on Twitch. Doing that with one blocking Helix ``/users``
+request per call, without keep-alive, adds a full HTTPS round-trip to every
+command even when the same names come up again and again.
+
+``TwitchUserLookup`` answers from two TTL caches first: users that exist are
+remembered for ``positive_ttl`` seconds, names that do not exist for the
+shorter ``negative_ttl``. Misses from concurrent callers (the command host
+runs handlers on several threads) are coalesced: the first caller waits a
+few milliseconds for others to join, then resolves up to 100 logins per
+``/users?login=...`` request (through the shared module.helix_client) while
+the others wait for its result. API errors are never cached, so a hiccup
+does not mark real users as missing.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from module.helix_client import helix_client, MAX_IDS_PER_REQUEST
+from module.message_utils import log_debug, log_error
+
+##########################
+# Configuration
+##########################
+# Set the log level for this module
+LOG_LEVEL = "INFO"  # Use "DEBUG", "INFO", "WARNING", "ERROR", or "CRITICAL"
+
+POSITIVE_TTL = 3600  # Seconds a user that exists is remembered
+NEGATIVE_TTL = 300  # Seconds a name that does not exist is remembered
+MAX_CACHED_USERS = 10000  # Entries per cache before the oldest are dropped
+BATCH_WINDOW = 0.02  # Seconds the first caller waits for others to join its batch
+LOOKUP_TIMEOUT = 30  # Seconds a caller waits for another caller's batch
+
+##########################
+# Cache
+##########################
+class TTLCache:
+    """Small size-bounded cache whose entries expire after a fixed time."""
+
+    def __init__(self, ttl, max_entries=MAX_CACHED_USERS):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # key -> (expires_at, value), oldest first
+
+    def get(self, key, default=None):
+        entry = self.entries.get(key)
+        if entry is None:
+            return default
+        if entry[0] < time.monotonic():
+            del self.entries[key]
+            return default
+        return entry[1]
+
+    def __contains__(self, key):
+        return self.get(key, self) is not self
+
+    def set(self, key, value):
+        self.entries.pop(key, None)
+        self.entries[key] = (time.monotonic() + self.ttl, value)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def discard(self, key):
+        self.entries.pop(key, None)
+
+
+class PendingLookup:
+    """A login waiting for a batch to resolve it."""
+
+    __slots__ = ("event", "user", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.user = None
+        self.error = False
+
+##########################
+# Lookup Service
+##########################
+class TwitchUserLookup:
+    """Resolves Twitch logins to user data with caching and request coalescing."""
+
+    def __init__(self, client=helix_client, positive_ttl=POSITIVE_TTL, negative_ttl=NEGATIVE_TTL,
+                 batch_window=BATCH_WINDOW):
+        """
+        @param client: HelixClient used for the requests
+        @param positive_ttl: Seconds a user that exists is cached
+        @param negative_ttl: Seconds a name that does not exist is cached
+        @param batch_window: Seconds the first caller of a batch waits for others
+        """
+        self.client = client
+        self.batch_window = batch_window
+        self.found = TTLCache(positive_ttl)
+        self.missing = TTLCache(negative_ttl)
+        self.lock = threading.Lock()
+        self.pending = {}  # login -> PendingLookup, queued or in flight
+        self.queue = []  # logins not yet sent to Helix
+        self.batch_running = False
+
+        self.stats = {"hits": 0, "misses": 0, "requests": 0, "errors": 0}
+
+    def get_users(self, logins):
+        """Looks up several logins, using one Helix request per 100 uncached names.
+
+        @param logins: Iterable of normalized logins
+        @return: Dict of login -> user data dict, or None if the user does not exist
+            or could not be looked up
+        """
+        results = {}
+        waiting = {}
+        lead = False
+        with self.lock:
+            for login in dict.fromkeys(logins):
+                user = self.found.get(login)
+                if user is not None:
+                    results[login] = user
+                elif login in self.missing:
+                    results[login] = None
+                else:
+                    if login not in self.pending:
+                        self.pending[login] = PendingLookup()
+                        self.queue.append(login)
+                    waiting[login] = self.pending[login]
+                    continue
+                self.stats["hits"] += 1
+            self.stats["misses"] += len(waiting)
+            if waiting and not self.batch_running:
+                self.batch_running = lead = True
+
+        if lead:
+            self._run_batches()
+
+        for login, pending in waiting.items():
+            if not pending.event.wait(LOOKUP_TIMEOUT):
+                log_error(f"Timed out waiting for Twitch lookup of {login}", "twitch_user_lookup")
+            results[login] = pending.user
+        return results
+
+    def get_user(self, login):
+        """@return: User data dict for a normalized login, or None"""
+        return self.get_users([login])[login]
+
+    def exists(self, login):
+        """@return: True if the normalized login belongs to a Twitch user"""
+        return self.get_user(login) is not None
+
+    def invalidate(self, login):
+        """Forgets anything cached about a login."""
+        with self.lock:
+            self.found.discard(login)
+            self.missing.discard(login)
+
+    def _run_batches(self):
+        batch = []
+        finished = False
+        try:
+            # Give concurrent callers a moment to add their logins to this batch
+            if self.batch_window:
+                time.sleep(self.batch_window)
+            while True:
+                with self.lock:
+                    batch = self.queue[:MAX_IDS_PER_REQUEST]
+                    del self.queue[:MAX_IDS_PER_REQUEST]
+                    if not batch:
+                        self.batch_running = False
+                        finished = True
+                        return
+                users = self._fetch(batch)
+                with self.lock:
+                    for login in batch:
+                        pending = self.pending.pop(login)
+                        if users is None:
+                            pending.error = True
+                        elif login in users:
+                            pending.user = users[login]
+                            self.found.set(login, pending.user)
+                        else:
+                            self.missing.set(login, True)
+                        pending.event.set()
+                    batch = []
+        except Exception as e:
+            self.stats["errors"] += 1
+            log_error(f"Error running Twitch user lookups: {e}", "twitch_user_lookup", {"error": str(e)})
+        finally:
+            if not finished:
+                # Fail everything still queued or in flight, otherwise its callers (and every
+                # later lookup, with batch_running stuck) would wait for LOOKUP_TIMEOUT
+                with self.lock:
+                    self.batch_running = False
+                    for login in batch + self.queue:
+                        pending = self.pending.pop(login, None)
+                        if pending is not None:
+                            pending.error = True
+                            pending.event.set()
+                    self.queue.clear()
+
+    def _fetch(self, logins):
+        """Requests one batch of logins from Helix.
+
+        @return: Dict of login -> user data for the users that exist, or None on error
+        """
+        self.stats["requests"] += 1
+        try:
+            users = {user["login"].lower(): user for user in self.client.get_users(logins=logins)}
+        except Exception as e:
+            # HelixError, but also RequestException or a malformed response
+            self.stats["errors"] += 1
+            log_error(f"Error looking up Twitch users: {e}", "twitch_user_lookup", {"error": str(e), "logins": logins})
+            return None
+        log_debug(f"Looked up {len(logins)} Twitch users, {len(users)} exist", "twitch_user_lookup")
+        return users
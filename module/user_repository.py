@@ -0,0 +1,583 @@
+"""User repository for the TwitchBotV2 project.
+
+User records used to be a single JSON blob per user at ``user:{name}``. Every
+counter update read the whole blob, changed one value and wrote it back,
+which cost two round-trips and lost updates when two commands touched the
+same user at once.
+
+The repository keeps the profile (name, display name and anything that is
+not a section) in the ``user:{name}`` blob and stores each section in its own
+Redis hash:
+
+    user:{name}:log          chat/command/lurk counters, last message
+    user:{name}:dustbunnies  collected_dustbunnies, message_count
+    user:{name}:banking      bunnies_invested, interest bookkeeping
+    user:{name}:fighting     fights_won, fights_lost, fight_requested_by
+    user:{name}:gambling     input, results, wins, losses, slots stats
+
+Hash field values are JSON encoded, so integers work with HINCRBY, floats
+with HINCRBYFLOAT and strings or nested values round-trip unchanged.
+
+Anything that checks a balance before changing it (transfers, bets, paying
+for an investment) goes through ``transfer``, ``debit_if_sufficient`` and
+``settle_bet``, which run as Lua scripts so the check and the write happen in
+one atomic round-trip.
+
+Blobs written before the hashes existed still carry their sections inline.
+``migrate_user`` moves them into the hashes without overwriting hash fields,
+so a user must be migrated before anything reads or writes their hashes.
+Run migrate_redis_user_json_to_hashes.py to migrate every user at once before
+the new code goes live. As a safety net, every read and write of the
+repository first checks (once per user and process, see ``ensure_migrated``)
+that the user's blob has no inline sections left.
+"""
+import json
+
+import redis
+
+from module.shared_redis import redis_client
+from module.message_utils import log_debug, log_info, log_error
+
+##########################
+# Configuration
+##########################
+USER_KEY_PREFIX = "user:"
+USER_SECTIONS = ("log", "dustbunnies", "banking", "fighting", "gambling")
+BALANCE_SECTION = "dustbunnies"
+BALANCE_FIELD = "collected_dustbunnies"
+
+##########################
+# Balance Scripts
+##########################
+# Each script runs atomically inside Redis, so checking a balance and moving
+# coins can never interleave with another command. Extra counters (gambling
+# or banking stats) are passed as additional KEYS with field/amount pairs in
+# ARGV and are updated in the same step. Amounts that would move coins the
+# wrong way are rejected with an error reply (a ResponseError in Python).
+
+# KEYS[1] source balance hash, KEYS[2] target balance hash, KEYS[3] target profile
+# ARGV[1] amount, ARGV[2] '1' to move what is available up to amount, ARGV[3] profile JSON for a new target
+TRANSFER_SCRIPT = """
+local field = 'collected_dustbunnies'
+local amount = tonumber(ARGV[1])
+if not amount or amount <= 0 then
+    return redis.error_reply('ERR amount must be positive')
+end
+local balance = tonumber(redis.call('HGET', KEYS[1], field) or '0')
+if balance < amount then
+    if ARGV[2] ~= '1' then
+        return {0, 0, balance, tonumber(redis.call('HGET', KEYS[2], field) or '0')}
+    end
+    amount = math.max(balance, 0)
+end
+local source = redis.call('HINCRBY', KEYS[1], field, -amount)
+local target = redis.call('HINCRBY', KEYS[2], field, amount)
+redis.call('SET', KEYS[3], ARGV[3], 'NX')
+return {1, amount, source, target}
+"""
+
+# KEYS[1] balance hash, KEYS[2..] stat hashes
+# ARGV[1] amount, ARGV[2..] field/amount pairs for KEYS[2..]
+DEBIT_SCRIPT = """
+local field = 'collected_dustbunnies'
+local amount = tonumber(ARGV[1])
+if not amount or amount <= 0 then
+    return redis.error_reply('ERR amount must be positive')
+end
+local balance = tonumber(redis.call('HGET', KEYS[1], field) or '0')
+if balance < amount then
+    return {0, balance}
+end
+balance = redis.call('HINCRBY', KEYS[1], field, -amount)
+for i = 2, #KEYS do
+    redis.call('HINCRBY', KEYS[i], ARGV[i * 2 - 2], ARGV[i * 2 - 1])
+end
+return {1, balance}
+"""
+
+# KEYS[1] balance hash, KEYS[2..] stat hashes
+# ARGV[1] stake, ARGV[2] payout, ARGV[3..] field/amount pairs for KEYS[2..]
+SETTLE_BET_SCRIPT = """
+local field = 'collected_dustbunnies'
+local stake = tonumber(ARGV[1])
+local payout = tonumber(ARGV[2])
+if not stake or not payout or stake < 0 or payout < 0 then
+    return redis.error_reply('ERR stake and payout must not be negative')
+end
+local balance = tonumber(redis.call('HGET', KEYS[1], field) or '0')
+if balance < stake then
+    return {0, balance}
+end
+balance = redis.call('HINCRBY', KEYS[1], field, payout - stake)
+for i = 2, #KEYS do
+    redis.call('HINCRBY', KEYS[i], ARGV[i * 2 - 1], ARGV[i * 2])
+end
+return {1, balance}
+"""
+
+##########################
+# Field Encoding
+##########################
+def encode_value(value):
+    """Encodes a section field value for storage in a hash.
+
+    @param value: Any JSON serialisable value
+    @return: JSON string
+    """
+    return json.dumps(value)
+
+
+def decode_value(raw):
+    """Decodes a hash field value written by encode_value or HINCRBY.
+
+    @param raw: Raw value from Redis (bytes or None)
+    @return: Decoded value, the plain string if it is not JSON, or None
+    """
+    if raw is None:
+        return None
+    if isinstance(raw, bytes):
+        raw = raw.decode('utf-8')
+    try:
+        return json.loads(raw)
+    except json.JSONDecodeError:
+        return raw
+
+##########################
+# Repository
+##########################
+class UserRepository:
+    """Reads and updates user records stored as a profile blob plus section hashes."""
+
+    def __init__(self, client=redis_client):
+        self.client = client
+        # Scripts are sent by SHA and reloaded automatically after a Redis restart
+        self._transfer = client.register_script(TRANSFER_SCRIPT)
+        self._debit = client.register_script(DEBIT_SCRIPT)
+        self._settle_bet = client.register_script(SETTLE_BET_SCRIPT)
+        self._migrated = set()  # Usernames whose blob is known to have no inline sections
+
+    @staticmethod
+    def profile_key(username):
+        """@return: Key of the profile blob for a normalized username"""
+        return f"{USER_KEY_PREFIX}{username}"
+
+    @staticmethod
+    def section_key(username, section):
+        """@return: Key of the section hash for a normalized username"""
+        if section not in USER_SECTIONS:
+            raise ValueError(f"Unknown user section '{section}'")
+        return f"{USER_KEY_PREFIX}{username}:{section}"
+
+    @staticmethod
+    def has_inline_sections(profile):
+        """@return: True if a decoded profile blob still carries sections that belong in hashes"""
+        return any(isinstance(profile.get(section), dict) for section in USER_SECTIONS)
+
+    @staticmethod
+    def is_profile_key(key):
+        """Checks whether a key is a profile blob and not one of the section hashes.
+
+        @param key: Redis key (bytes or str)
+        @return: True for user:{name} keys
+        """
+        if isinstance(key, bytes):
+            key = key.decode('utf-8')
+        return key.startswith(USER_KEY_PREFIX) and ":" not in key[len(USER_KEY_PREFIX):]
+
+    ##########################
+    # Reads
+    ##########################
+    def exists(self, username):
+        """@return: True if the user has a profile"""
+        return bool(self.client.exists(self.profile_key(username)))
+
+    def get_profile(self, username):
+        """Reads the profile blob without any section data.
+
+        @param username: Normalized username
+        @return: Profile dict or None if the user has no profile
+        """
+        raw = self.client.get(self.profile_key(username))
+        if raw is None:
+            return None
+        profile = json.loads(raw)
+        for section in USER_SECTIONS:
+            profile.pop(section, None)
+        return profile
+
+    def get_field(self, username, section, field, default=None):
+        """Reads a single field of a section.
+
+        @param username: Normalized username
+        @param section: Section name, one of USER_SECTIONS
+        @param field: Field name
+        @param default: Value returned when the field is not set
+        @return: Decoded field value or default
+        """
+        self.ensure_migrated(username)
+        value = decode_value(self.client.hget(self.section_key(username, section), field))
+        return default if value is None else value
+
+    def get_fields(self, username, section, fields):
+        """Reads several fields of a section in one round-trip.
+
+        @param username: Normalized username
+        @param section: Section name
+        @param fields: List of field names
+        @return: Dict of field -> decoded value, missing fields are left out
+        """
+        self.ensure_migrated(username)
+        values = self.client.hmget(self.section_key(username, section), fields)
+        return {field: decode_value(value) for field, value in zip(fields, values) if value is not None}
+
+    def get_section(self, username, section):
+        """Reads a whole section.
+
+        @param username: Normalized username
+        @param section: Section name
+        @return: Dict of field -> decoded value (empty if the section is not set)
+        """
+        self.ensure_migrated(username)
+        raw = self.client.hgetall(self.section_key(username, section))
+        return {field.decode('utf-8'): decode_value(value) for field, value in raw.items()}
+
+    def get_user(self, username, sections=USER_SECTIONS):
+        """Reads the profile and the requested sections in one round-trip.
+
+        Blobs that still carry their sections inline are migrated first.
+
+        @param username: Normalized username
+        @param sections: Section names to include
+        @return: User dict shaped like the old blob, or None if the user has no data
+        """
+        pipe = self.client.pipeline(transaction=False)
+        pipe.get(self.profile_key(username))
+        for section in sections:
+            pipe.hgetall(self.section_key(username, section))
+        raw_profile, *raw_sections = pipe.execute()
+
+        if raw_profile is None and not any(raw_sections):
+            return None
+
+        if raw_profile is not None:
+            profile = json.loads(raw_profile)
+            if self.has_inline_sections(profile):
+                self.migrate_user(username)
+                return self.get_user(username, sections)
+            self._migrated.add(username)
+        else:
+            profile = {"name": username, "display_name": username}
+
+        for section, raw in zip(sections, raw_sections):
+            profile[section] = {field.decode('utf-8'): decode_value(value) for field, value in raw.items()}
+        return profile
+
+    def iter_usernames(self, count=1000):
+        """Yields every username that has a profile, once.
+
+        SCAN can return a key more than once while Redis rehashes, repeats are skipped.
+
+        @param count: SCAN batch size hint
+        """
+        seen = set()
+        for key in self.client.scan_iter(match=f"{USER_KEY_PREFIX}*", count=count):
+            if self.is_profile_key(key):
+                username = key.decode('utf-8')[len(USER_KEY_PREFIX):]
+                if username not in seen:
+                    seen.add(username)
+                    yield username
+
+    ##########################
+    # Writes
+    ##########################
+    def ensure_profile(self, username, display_name=None, pipe=None):
+        """Creates the profile blob if the user does not have one yet.
+
+        @param username: Normalized username
+        @param display_name: Display name for a new profile
+        @param pipe: Optional pipeline to queue the write on
+        @return: True if the profile was created (None when queued on a pipeline)
+        """
+        profile = {"name": username, "display_name": display_name or username}
+        target = pipe if pipe is not None else self.client
+        return target.set(self.profile_key(username), json.dumps(profile), nx=True)
+
+    def update(self, username, increments=None, fields=None, display_name=None):
+        """Applies counter increments and field writes across sections atomically.
+
+        Everything is sent in one MULTI/EXEC round-trip; increments use
+        HINCRBY (or HINCRBYFLOAT for floats) so concurrent updates add up
+        instead of overwriting each other.
+
+        @param username: Normalized username
+        @param increments: Dict of section -> {field: amount}
+        @param fields: Dict of section -> {field: value} written as-is
+        @param display_name: If given, the profile is created when missing
+        @return: Dict of section -> {field: new value} for the incremented fields
+        """
+        pipe = self.client.pipeline(transaction=True)
+        order = self.queue_update(pipe, username, increments, fields, display_name)
+        results = pipe.execute()
+
+        if display_name is not None:
+            results = results[1:]
+        updated = {}
+        for (section, field), value in zip(order, results):
+            updated.setdefault(section, {})[field] = value
+        return updated
+
+    def queue_update(self, pipe, username, increments=None, fields=None, display_name=None):
+        """Queues the commands of an update on a pipeline without executing it.
+
+        Lets callers write several users in one round-trip (see
+        module.user_write_cache).
+
+        @param pipe: Pipeline to queue the commands on
+        @param username: Normalized username
+        @param increments: Dict of section -> {field: amount}
+        @param fields: Dict of section -> {field: value} written as-is
+        @param display_name: If given, the profile is created when missing
+        @return: List of (section, field) in the order their increments were queued
+        """
+        increments = increments or {}
+        fields = fields or {}
+
+        self.ensure_migrated(username)
+        if display_name is not None:
+            self.ensure_profile(username, display_name, pipe=pipe)
+        order = []
+        for section, amounts in increments.items():
+            key = self.section_key(username, section)
+            for field, amount in amounts.items():
+                if isinstance(amount, float):
+                    pipe.hincrbyfloat(key, field, amount)
+                else:
+                    pipe.hincrby(key, field, amount)
+                order.append((section, field))
+        for section, values in fields.items():
+            if values:
+                pipe.hset(self.section_key(username, section),
+                          mapping={field: encode_value(value) for field, value in values.items()})
+        return order
+
+    def increment(self, username, section, field, amount=1, display_name=None):
+        """Atomically adds to a single counter.
+
+        @param username: Normalized username
+        @param section: Section name
+        @param field: Counter field
+        @param amount: Amount to add (may be negative)
+        @param display_name: If given, the profile is created when missing
+        @return: New counter value
+        """
+        return self.update(username, increments={section: {field: amount}}, display_name=display_name)[section][field]
+
+    def set_fields(self, username, section, values, display_name=None):
+        """Writes fields of a section without touching the others.
+
+        @param username: Normalized username
+        @param section: Section name
+        @param values: Dict of field -> value
+        @param display_name: If given, the profile is created when missing
+        """
+        self.update(username, fields={section: values}, display_name=display_name)
+
+    def create_user(self, username, display_name=None):
+        """Creates a profile with the default section values.
+
+        @param username: Normalized username
+        @param display_name: Display name (defaults to the username)
+        @return: The created user dict
+        """
+        self.update(username,
+                    increments={"log": {"chat": 0, "command": 0, "admin": 0, "lurk": 0, "unlurk": 0},
+                                "dustbunnies": {"collected_dustbunnies": 0}},
+                    display_name=display_name or username)
+        return self.get_user(username)
+
+    def save_user(self, username, user_data):
+        """Replaces a whole user record with the given dict.
+
+        Prefer update() for counters; this exists for callers that still
+        work on full user dicts.
+
+        @param username: Normalized username
+        @param user_data: User dict shaped like the old blob
+        """
+        profile = {key: value for key, value in user_data.items() if key not in USER_SECTIONS}
+        self.ensure_migrated(username)
+        pipe = self.client.pipeline(transaction=True)
+        pipe.set(self.profile_key(username), json.dumps(profile))
+        for section in USER_SECTIONS:
+            values = user_data.get(section)
+            if not isinstance(values, dict):
+                continue
+            key = self.section_key(username, section)
+            pipe.delete(key)
+            if values:
+                pipe.hset(key, mapping={field: encode_value(value) for field, value in values.items()})
+        pipe.execute()
+
+    ##########################
+    # Balance Operations
+    ##########################
+    def _stat_keys_and_args(self, username, stats):
+        """Flattens {section: {field: amount}} into script KEYS and field/amount ARGV pairs."""
+        keys, args = [], []
+        for section, amounts in (stats or {}).items():
+            key = self.section_key(username, section)
+            for field, amount in amounts.items():
+                keys.append(key)
+                args.extend([field, int(amount)])
+        return keys, args
+
+    def transfer(self, from_username, to_username, amount, allow_partial=False, to_display_name=None):
+        """Moves dustbunnies from one user to another in a single atomic step.
+
+        @param from_username: Normalized username that pays
+        @param to_username: Normalized username that receives
+        @param amount: Amount to move
+        @param allow_partial: Move whatever the payer has (up to amount) instead of failing
+        @param to_display_name: Display name used if the receiver has no profile yet
+        @return: (success, moved amount, payer balance, receiver balance)
+        @raise ValueError: If amount is not positive
+        """
+        if int(amount) <= 0:
+            raise ValueError(f"Transfer amount must be positive, got {amount}")
+        profile = json.dumps({"name": to_username, "display_name": to_display_name or to_username})
+        self.ensure_migrated_many([from_username, to_username])
+        success, moved, source, target = self._transfer(
+            keys=[self.section_key(from_username, BALANCE_SECTION),
+                  self.section_key(to_username, BALANCE_SECTION),
+                  self.profile_key(to_username)],
+            args=[int(amount), "1" if allow_partial else "0", profile])
+        return bool(success), moved, source, target
+
+    def debit_if_sufficient(self, username, amount, stats=None):
+        """Takes dustbunnies from a user only if the balance covers it.
+
+        @param username: Normalized username
+        @param amount: Amount to take
+        @param stats: Optional {section: {field: amount}} counters updated with the debit
+        @return: (success, balance after the call)
+        @raise ValueError: If amount is not positive
+        """
+        if int(amount) <= 0:
+            raise ValueError(f"Debit amount must be positive, got {amount}")
+        keys, args = self._stat_keys_and_args(username, stats)
+        self.ensure_migrated(username)
+        success, balance = self._debit(keys=[self.section_key(username, BALANCE_SECTION)] + keys,
+                                       args=[int(amount)] + args)
+        return bool(success), balance
+
+    def settle_bet(self, username, stake, payout, stats=None):
+        """Takes a stake and pays out the result of a bet in a single atomic step.
+
+        The stake must be covered by the balance; the balance changes by
+        payout - stake. A stake of 0 settles a bet whose stake was taken
+        earlier (for example with debit_if_sufficient).
+
+        @param username: Normalized username
+        @param stake: Amount the user bets
+        @param payout: Amount paid back to the user (0 for a loss)
+        @param stats: Optional {section: {field: amount}} counters updated with the bet
+        @return: (success, balance after the call)
+        @raise ValueError: If stake or payout is negative
+        """
+        if int(stake) < 0 or int(payout) < 0:
+            raise ValueError(f"Stake and payout must not be negative, got {stake} and {payout}")
+        keys, args = self._stat_keys_and_args(username, stats)
+        self.ensure_migrated(username)
+        success, balance = self._settle_bet(keys=[self.section_key(username, BALANCE_SECTION)] + keys,
+                                            args=[int(stake), int(payout)] + args)
+        return bool(success), balance
+
+    ##########################
+    # Migration
+    ##########################
+    def ensure_migrated(self, username):
+        """Migrates a user whose blob still carries inline sections, see ensure_migrated_many.
+
+        @param username: Normalized username
+        """
+        if username not in self._migrated:
+            self.ensure_migrated_many([username])
+
+    def ensure_migrated_many(self, usernames):
+        """Migrates the users whose blob still carries inline sections.
+
+        Each user is checked once per process; after that the blob cannot get
+        inline sections back, since the repository never writes them.
+
+        @param usernames: Normalized usernames
+        """
+        unchecked = [username for username in dict.fromkeys(usernames) if username not in self._migrated]
+        if not unchecked:
+            return
+        raw_profiles = self.client.mget([self.profile_key(username) for username in unchecked])
+        for username, raw in zip(unchecked, raw_profiles):
+            if raw is not None:
+                try:
+                    needs_migration = self.has_inline_sections(json.loads(raw))
+                except json.JSONDecodeError:
+                    needs_migration = False  # migrate_user cannot read it either
+                if needs_migration:
+                    self.migrate_user(username)
+            self._migrated.add(username)
+
+    def migrate_user(self, username):
+        """Moves the sections of an old-format blob into their hashes.
+
+        Fields that already exist in a hash are kept, since anything written
+        through the repository is newer than the blob. Safe to run repeatedly.
+        Whole-number floats are stored as integers so counters keep working
+        with HINCRBY.
+
+        @param username: Normalized username
+        @return: Dict of the migrated sections, empty if there was nothing to do
+        """
+        key = self.profile_key(username)
+        with self.client.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    raw = pipe.get(key)
+                    if raw is None:
+                        pipe.unwatch()
+                        return {}
+                    profile = json.loads(raw)
+                    sections = {section: profile.pop(section) for section in USER_SECTIONS
+                                if isinstance(profile.get(section), dict)}
+                    if not sections:
+                        pipe.unwatch()
+                        return {}
+
+                    pipe.multi()
+                    for section, values in sections.items():
+                        section_key = self.section_key(username, section)
+                        for field, value in values.items():
+                            # Whole-number floats from old blobs would break HINCRBY
+                            if isinstance(value, float) and value.is_integer():
+                                value = int(value)
+                            pipe.hsetnx(section_key, field, encode_value(value))
+                    pipe.set(key, json.dumps(profile))
+                    pipe.execute()
+                    break
+                except redis.WatchError:
+                    log_debug(f"User {username} changed during migration, retrying", "user_repository")
+                    continue
+                except json.JSONDecodeError as e:
+                    log_error(f"Could not decode user blob for {username}: {e}", "user_repository",
+                              {"error": str(e), "username": username})
+                    return {}
+
+        self._migrated.add(username)
+        log_info(f"Migrated user {username} to section hashes", "user_repository", {
+            "sections": list(sections)
+        })
+        return sections
+
+##########################
+# Shared Instance
+##########################
+user_repository = UserRepository()
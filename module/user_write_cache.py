@@ -0,0 +1,276 @@
+"""Write-behind cache for user record updates in the TwitchBotV2 project.
+
+During a raid the chat and command loggers update the same few users on
+every message: bump ``log.chat`` or ``log.command`` and overwrite
+``last_message``/``last_command``. Sending each of those as its own
+MULTI/EXEC costs one round-trip and several writes per message.
+
+``UserWriteCache`` absorbs those updates in memory instead. Each dirty user
+holds the sum of its pending increments and the latest value of each written
+field, so a hundred messages from one chatter turn into one HINCRBY and one
+HSET. Dirty users are flushed together in a single pipeline every
+``flush_interval`` seconds, early when the cache grows past ``max_entries``,
+and on shutdown. Flushes run on the background thread, so ``update`` never
+waits for Redis; while Redis is unreachable, changes are kept for at most
+``max_pending`` users and the least recently updated ones are dropped.
+
+Only changes are cached, never values: reads still go to Redis, and
+increments stay HINCRBYs, so other processes updating the same users (for
+example the economy commands) are never overwritten. The trade-off is that
+counters in Redis lag by up to one flush interval.
+
+A failed flush must not be sent again blindly: if the connection broke after
+EXEC, the increments were applied and would be applied twice. Each batch
+therefore sets a marker key inside its MULTI/EXEC. A batch whose outcome is
+unknown is kept aside and sent again before anything newer, under WATCH on
+its marker; if the marker exists, the first attempt went through and the
+batch is dropped. Commands that Redis rejects inside EXEC (a field that does
+not hold a number, for example) are logged and dropped; the rest of the
+batch was applied.
+"""
+import threading
+import uuid
+from collections import OrderedDict
+
+from module.user_repository import user_repository
+from module.message_utils import log_debug, log_error, log_info
+
+##########################
+# Configuration
+##########################
+# Set the log level for this module
+LOG_LEVEL = "INFO"  # Use "DEBUG", "INFO", "WARNING", "ERROR", or "CRITICAL"
+
+FLUSH_INTERVAL = 2.0  # Seconds between background flushes
+MAX_DIRTY_USERS = 500  # Dirty users that make the background thread flush early
+MAX_PENDING_USERS = 20000  # Dirty users kept while Redis is unreachable before the oldest are dropped
+APPLIED_MARKER_PREFIX = "user_write_cache:applied:"
+APPLIED_MARKER_TTL = 86400  # Seconds a batch marker is kept if it is not deleted after the next flush
+
+##########################
+# Cache
+##########################
+class PendingUpdate:
+    """Changes for one user that have not been written to Redis yet."""
+
+    __slots__ = ("increments", "fields", "display_name")
+
+    def __init__(self):
+        self.increments = {}
+        self.fields = {}
+        self.display_name = None
+
+    def merge(self, increments=None, fields=None, display_name=None):
+        """Adds increments to the pending sums and overwrites pending field values."""
+        for section, amounts in (increments or {}).items():
+            pending = self.increments.setdefault(section, {})
+            for field, amount in amounts.items():
+                pending[field] = pending.get(field, 0) + amount
+        for section, values in (fields or {}).items():
+            self.fields.setdefault(section, {}).update(values)
+        if self.display_name is None:
+            self.display_name = display_name
+
+    def merge_into(self, newer):
+        """Folds this (older) update under a newer one, keeping the newer field values."""
+        newer.merge(increments=self.increments, display_name=self.display_name)
+        for section, values in self.fields.items():
+            pending = newer.fields.setdefault(section, {})
+            for field, value in values.items():
+                pending.setdefault(field, value)
+
+
+class UserWriteCache:
+    """Collects user updates in memory and writes them in pipelined batches."""
+
+    def __init__(self, repository=user_repository, flush_interval=FLUSH_INTERVAL, max_entries=MAX_DIRTY_USERS,
+                 max_pending=MAX_PENDING_USERS, name="user_write_cache"):
+        self.repository = repository
+        self.flush_interval = flush_interval
+        self.max_entries = max_entries
+        self.max_pending = max(max_pending, max_entries)
+        self.name = name
+        self.dirty = OrderedDict()  # username -> PendingUpdate, least recently updated first
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()  # Keeps batches in order when flushes overlap
+        self.stop_event = threading.Event()
+        self.flush_requested = threading.Event()  # Wakes the background thread before its interval
+        self.thread = None
+        self.unconfirmed = []  # (batch id, batch) sent with an unknown outcome, oldest first
+        self.applied_markers = []  # Markers of applied batches, deleted with the next batch
+        self.unreported_drops = 0  # Users dropped by _drop_over_limit since the last log message
+        self.stats = {
+            "updates": 0,
+            "flushes": 0,
+            "users_written": 0,
+            "early_flushes": 0,
+            "errors": 0,
+            "dropped_commands": 0,
+            "dropped_users": 0
+        }
+
+    def update(self, username, increments=None, fields=None, display_name=None):
+        """Queues an update with the same arguments as UserRepository.update.
+
+        @param username: Normalized username
+        @param increments: Dict of section -> {field: amount}
+        @param fields: Dict of section -> {field: value} written as-is
+        @param display_name: If given, the profile is created when missing
+        """
+        with self.lock:
+            pending = self.dirty.pop(username, None) or PendingUpdate()
+            pending.merge(increments, fields, display_name)
+            self.dirty[username] = pending
+            self.stats["updates"] += 1
+            self._drop_over_limit()
+            full = len(self.dirty) > self.max_entries
+
+        if full and not self.flush_requested.is_set():
+            self.stats["early_flushes"] += 1
+            if self.thread is not None:
+                # The caller (the ingest read loop) must not wait for Redis
+                self.flush_requested.set()
+            else:
+                self.flush()
+
+    def flush(self):
+        """Writes every dirty user in one pipeline.
+
+        @return: Number of users written
+        """
+        with self.lock:
+            if not self.dirty and not self.unconfirmed:
+                return 0
+            batch = list(self.dirty.items())
+            self.dirty.clear()
+        return self._write(batch)
+
+    def _write(self, batch):
+        with self.flush_lock:
+            # Batches with an unknown outcome go first, so field values keep their order
+            written = 0
+            while self.unconfirmed:
+                batch_id, unconfirmed_batch = self.unconfirmed[0]
+                confirmed = self._send(batch_id, unconfirmed_batch)
+                if confirmed is None:
+                    # This batch was never sent, so it can simply wait in the cache
+                    self._requeue(batch)
+                    return written
+                written += confirmed
+                self.unconfirmed.pop(0)
+            if not batch:
+                return written
+
+            batch_id = uuid.uuid4().hex
+            sent = self._send(batch_id, batch)
+            if sent is None:
+                self.unconfirmed.append((batch_id, batch))
+                return written
+            return written + sent
+
+    def _send(self, batch_id, batch):
+        """Applies a batch unless its marker shows an earlier attempt was applied.
+
+        @return: Number of users written, or None if the outcome is unknown
+        """
+        marker = f"{APPLIED_MARKER_PREFIX}{batch_id}"
+        try:
+            # One round-trip for the migration check instead of one per user inside queue_update
+            self.repository.ensure_migrated_many([username for username, _ in batch])
+            with self.repository.client.pipeline(transaction=True) as pipe:
+                # WATCH also stops redis-py from sending the transaction again on its own
+                pipe.watch(marker)
+                if pipe.exists(marker):
+                    pipe.unwatch()
+                    log_info(f"Batch of {len(batch)} cached user updates was already applied", self.name)
+                    self.applied_markers.append(marker)
+                    return len(batch)
+                pipe.multi()
+                if self.applied_markers:
+                    pipe.delete(*self.applied_markers)
+                for username, pending in batch:
+                    self.repository.queue_update(pipe, username, pending.increments, pending.fields,
+                                                 pending.display_name)
+                pipe.set(marker, 1, ex=APPLIED_MARKER_TTL)
+                commands = [args for args, _ in pipe.command_stack]
+                results = pipe.execute(raise_on_error=False)
+        except Exception as e:
+            self.stats["errors"] += 1
+            error_msg = f"Error flushing {len(batch)} cached user updates, retrying with the next flush: {e}"
+            print(error_msg)
+            log_error(error_msg, self.name, {"error": str(e)})
+            return None
+
+        self.applied_markers = [marker]
+        for args, result in zip(commands, results):
+            if isinstance(result, Exception):
+                # The other commands of the transaction were applied, sending it again would repeat them
+                self.stats["dropped_commands"] += 1
+                command = " ".join(str(arg) for arg in args[:3])
+                log_error(f"Dropped cached user update '{command}': {result}", self.name, {
+                    "command": [str(arg) for arg in args],
+                    "error": str(result)
+                })
+
+        self.stats["flushes"] += 1
+        self.stats["users_written"] += len(batch)
+        log_debug(f"Flushed {len(batch)} cached user updates", self.name, {"stats": self.stats})
+        return len(batch)
+
+    def _requeue(self, batch):
+        # Keep the changes of a batch that was not sent for the next flush; anything newer wins
+        with self.lock:
+            for username, pending in batch:
+                newer = self.dirty.pop(username, None)
+                if newer is not None:
+                    pending.merge_into(newer)
+                    pending = newer
+                self.dirty[username] = pending
+                self.dirty.move_to_end(username, last=False)
+            self._drop_over_limit()
+            dropped, self.unreported_drops = self.unreported_drops, 0
+        if dropped:
+            # Once per failed flush rather than once per update
+            log_error(f"Dropped cached updates of {dropped} users while Redis was unreachable", self.name,
+                      {"max_pending": self.max_pending})
+
+    def _drop_over_limit(self):
+        # Caller holds self.lock; only reached while flushes keep failing
+        while len(self.dirty) > self.max_pending:
+            self.dirty.popitem(last=False)
+            self.stats["dropped_users"] += 1
+            self.unreported_drops += 1
+
+    ##########################
+    # Background Flushing
+    ##########################
+    def start(self):
+        """Starts the background flush thread."""
+        if self.thread is not None:
+            return
+        self.stop_event.clear()
+        self.flush_requested.clear()
+        self.thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stops the background thread and writes everything that is still pending."""
+        self.stop_event.set()
+        self.flush_requested.set()
+        if self.thread is not None:
+            self.thread.join(timeout=self.flush_interval + 5)
+            self.thread = None
+        self.flush()
+        log_info(f"User write cache '{self.name}' stopped", self.name, {"stats": self.stats})
+
+    def _run(self):
+        while True:
+            self.flush_requested.wait(self.flush_interval)
+            if self.stop_event.is_set():
+                return
+            self.flush_requested.clear()
+            errors = self.stats["errors"]
+            self.flush()
+            if self.stats["errors"] > errors:
+                # Redis is failing, a full cache must not turn retries into a busy loop
+                self.stop_event.wait(self.flush_interval)
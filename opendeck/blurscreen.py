@@ -1,12 +1,14 @@
 import json
 
 from module.shared_obs import get_obs_client
+from module.obs_state import obs_state
 from module.shared_redis import redis_client
 from module.message_utils import send_admin_message_to_redis, send_message_to_redis
 
 ##########################
 # Initialize
 ##########################
+OBS_CONNECT_TIMEOUT = 5  # Seconds this one-shot script waits for OBS
 
 ##########################
 # Exit Function
@@ -35,7 +37,7 @@ def toggle_filter(filter_name, scene_name=None, source_name=None, state=None):
     Returns:
         bool: True if the filter was found and toggled, False otherwise
     """
-    obs_client = get_obs_client()
+    obs_client = get_obs_client(timeout=OBS_CONNECT_TIMEOUT)
     if obs_client is None:
         print("OBS client not connected yet. Filter toggle will be skipped.")
         send_admin_message_to_redis("OBS client not connected yet. Filter toggle will be skipped.", command="obs")
@@ -44,45 +46,27 @@ def toggle_filter(filter_name, scene_name=None, source_name=None, state=None):
     try:
         # Get the scene name (current scene if not specified)
         if scene_name is None:
-            scene_name = obs_client.get_current_program_scene().current_program_scene_name
+            scene_name = obs_state.current_program_scene()
 
         # Determine the target (scene or source)
         target_name = source_name if source_name is not None else scene_name
-
-        # Get the list of filters on the target
-        if source_name is not None:
-            filters = obs_client.get_source_filter_list(source_name).filters
-        else:
-            filters = obs_client.get_source_filter_list(scene_name).filters
+        target_description = f"source '{source_name}'" if source_name else f"scene '{scene_name}'"
 
         # Check if the filter exists
-        filter_exists = any(filter["filterName"] == filter_name for filter in filters)
-
-        if filter_exists:
-            needed_filter = next(filter for filter in filters if filter["filterName"] == filter_name)
-            if state is None:
-                # Get the current state of the filter
-                current_state = needed_filter["filterEnabled"]
-
-                # Toggle to the opposite state
-                new_state = not current_state
-            else:
-                new_state = state
-
-            target_description = f"source '{source_name}'" if source_name else f"scene '{scene_name}'"
-            send_admin_message_to_redis(f"Filter '{filter_name}' on {target_description} toggled {'on' if new_state else 'off'}", command="obs")
-
-            # Set the filter to the new state
-            if source_name is not None:
-                obs_client.set_source_filter_enabled(source_name, filter_name, new_state)
-            else:
-                obs_client.set_source_filter_enabled(scene_name, filter_name, new_state)
-            return True
-        else:
-            target_description = f"source '{source_name}'" if source_name else f"scene '{scene_name}'"
+        current_state = obs_state.filter_enabled(target_name, filter_name)
+        if current_state is None:
             print(f"Filter '{filter_name}' not found on {target_description}")
             return False
 
+        # Toggle to the opposite state unless a state was given
+        new_state = not current_state if state is None else state
+
+        send_admin_message_to_redis(f"Filter '{filter_name}' on {target_description} toggled {'on' if new_state else 'off'}", command="obs")
+
+        # Set the filter to the new state, skipped if it already is
+        obs_state.set_filter_enabled(target_name, filter_name, new_state)
+        return True
+
     except Exception as e:
         print(f"Error toggling filter: {e}")
         return False
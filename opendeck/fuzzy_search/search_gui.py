@@ -4,7 +4,6 @@ import os
 import threading
 import time
 import uuid
-from datetime import datetime
 import gi
 import pyperclip
 import requests
@@ -16,7 +15,8 @@ gi.require_version('Gtk', '4.0')
 gi.require_version('Gdk', '4.0')
 from gi.repository import Gtk, Gdk, GLib, Gio
 from module.message_utils import send_admin_message_to_redis, send_message_to_redis
-from module.shared_redis import redis_client, redis_client_env
+from module.shared_redis import redis_client
+from module.helix_client import helix_client, HelixError
 
 
 # Constants
@@ -41,7 +41,6 @@ REDIS_REQUEST_STREAM = 'request_stream'
 REDIS_RESPONSE_STREAM_PREFIX = 'response_stream:'
 
 # Twitch API constants
-TWITCH_CLIENT_ID = redis_client_env.get("TWITCH_CLIENT_ID").decode('utf-8') if redis_client_env.exists("TWITCH_CLIENT_ID") else None
 BROADCASTER_ID = "29319793"  # Your broadcaster ID
 
 # Blacklist for viewers that should be excluded
@@ -51,98 +50,42 @@ VIEWER_BLACKLIST = ["StreamElements", "Sery_Bot", "KofiStreamBot", "beastyhelper
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Token management functions
-def load_token():
-    """Load token from Redis database."""
-    token_data = redis_client_env.get("twitch_token_main")
-    if token_data:
-        return json.loads(token_data)
-    return None
-
-def get_valid_token():
-    """Ensure a valid token is available."""
-    token_data = load_token()
-    if token_data:
-        expires_at = datetime.fromisoformat(token_data['expires_at'])
-        if datetime.now() < expires_at:
-            return token_data['access_token']  # Token is valid
-        logger.warning('Token expired, please refresh it')
-    return None  # Token expired or missing
-
 def get_current_viewers():
     """Fetch current viewers from Twitch API."""
     viewers = []
 
-    # Get valid token
-    access_token = get_valid_token()
-    if not access_token or not TWITCH_CLIENT_ID:
-        logger.error("Missing access token or client ID")
+    try:
+        # Get every chatter, following the pagination cursor
+        for user in helix_client.paginate("chat/chatters", {
+            "broadcaster_id": BROADCASTER_ID,
+            "moderator_id": BROADCASTER_ID
+        }, page_size=1000):  # Maximum allowed by the API
+            # Skip blacklisted viewers
+            if user["user_name"] in VIEWER_BLACKLIST:
+                logger.info(f"Skipping blacklisted viewer: {user['user_name']}")
+                continue
+
+            # Create a viewer entry in the same format as channels
+            viewers.append({
+                "broadcaster_id": user["user_id"],
+                "broadcaster_name": user["user_name"],
+                "is_viewer": True  # Flag to identify as viewer
+            })
+
+        logger.info(f"Fetched {len(viewers)} current viewers")
+    except HelixError as e:
+        logger.error(f"Error fetching viewers: {str(e)}")
         return viewers
 
-    # Set up headers
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Client-Id": TWITCH_CLIENT_ID
-    }
-
-    # Make API request to get chatters
-    url = f"https://api.twitch.tv/helix/chat/chatters"
-    params = {
-        "broadcaster_id": BROADCASTER_ID,
-        "moderator_id": BROADCASTER_ID,
-        "first": 1000  # Maximum allowed by the API
-    }
-
+    # Now fetch profile images for all viewers, 100 per request
     try:
-        response = requests.get(url, headers=headers, params=params)
-        if response.status_code == 200:
-            data = response.json()
-            user_ids = []
-
-            # First, collect all viewer data and their IDs
-            for user in data.get("data", []):
-                # Skip blacklisted viewers
-                if user["user_name"] in VIEWER_BLACKLIST:
-                    logger.info(f"Skipping blacklisted viewer: {user['user_name']}")
-                    continue
-
-                # Create a viewer entry in the same format as channels
-                viewer = {
-                    "broadcaster_id": user["user_id"],
-                    "broadcaster_name": user["user_name"],
-                    "is_viewer": True  # Flag to identify as viewer
-                }
-                viewers.append(viewer)
-                user_ids.append(user["user_id"])
-
-            logger.info(f"Fetched {len(viewers)} current viewers")
-
-            # Now fetch profile images for all viewers in batches of 100 (API limit)
-            if user_ids:
-                for i in range(0, len(user_ids), 100):
-                    batch_ids = user_ids[i:i+100]
-                    user_info_url = "https://api.twitch.tv/helix/users"
-                    user_params = {"id": batch_ids}
-
-                    try:
-                        user_resp = requests.get(user_info_url, headers=headers, params=user_params)
-                        if user_resp.status_code == 200:
-                            user_data = user_resp.json()
-
-                            # Map user data to viewers
-                            for user_info in user_data.get("data", []):
-                                for viewer in viewers:
-                                    if viewer["broadcaster_id"] == user_info["id"]:
-                                        viewer["profile_image_url"] = user_info["profile_image_url"]
-                                        break
-                        else:
-                            logger.error(f"Failed to fetch user profiles: {user_resp.status_code} - {user_resp.text}")
-                    except Exception as e:
-                        logger.error(f"Error fetching user profiles: {str(e)}")
-        else:
-            logger.error(f"Failed to fetch viewers: {response.status_code} - {response.text}")
-    except Exception as e:
-        logger.error(f"Error fetching viewers: {str(e)}")
+        users = helix_client.get_users(ids=[viewer["broadcaster_id"] for viewer in viewers])
+        profile_images = {user["id"]: user["profile_image_url"] for user in users}
+        for viewer in viewers:
+            if viewer["broadcaster_id"] in profile_images:
+                viewer["profile_image_url"] = profile_images[viewer["broadcaster_id"]]
+    except HelixError as e:
+        logger.error(f"Error fetching user profiles: {str(e)}")
 
     return viewers
 
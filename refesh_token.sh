@@ -118,6 +118,8 @@ refresh_token() {
 
     # Save the updated token
     save_token_to_redis $token_key "$updated_token_data"
+    # Let running processes reload the token from Redis
+    redis-cli -h $REDIS_HOST -p $REDIS_PORT -n $REDIS_DB PUBLISH twitch.token.rotated "{\"key\": \"$token_key\"}" > /dev/null
     echo "Successfully refreshed token for $token_key: $token_preview"
     return 0
   else
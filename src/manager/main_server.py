@@ -14,7 +14,7 @@ from module.message_utils import log_startup, log_info, log_error, log_debug, lo
 
 # Add the parent directory to sys.path to allow importing service_manager
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
-from src.manager.service_manager import setup_services, cleanup_services, manage_service, get_service_status, list_active_services
+from src.manager.service_manager import setup_services, setup_host_services, cleanup_services, manage_service, get_service_status, list_active_services
 
 ##########################
 # Configuration
@@ -37,7 +37,21 @@ services_managed =  ["brb","unbrb","discord","shoutout","todolist","collect","in
 services_managed += ["suika","timer","timezone","unlurk","blackjack","gamble","slots","accept","fight"]
 #services_managed += ["","","gameoflife"]
 services_managed += ["translate","hug"]
-services_managed += ["move_fishing","system_logger","chat_logger","command_logger"]
+services_managed += ["move_fishing","system_logger","message_ingest","history_api"]
+
+# Optional host mode: instead of one systemd unit (and one Python interpreter) per
+# command, the commands below are loaded as plugins into shared command host processes.
+# Each entry is one host; split commands across hosts to keep them isolated.
+USE_COMMAND_HOST = os.environ.get("TWITCH_COMMAND_HOST", "0") == "1"
+command_hosts = {
+    "admin": ["brb","unbrb","discord","shoutout","todolist"],
+    "economy": ["collect","invest","give","roomba","steal","blackjack","gamble","slots","accept","fight"],
+    "general": ["lurk","unlurk","points","suika","timer","timezone","hug","translate"],
+}
+if USE_COMMAND_HOST:
+    hosted_commands = {command for plugins in command_hosts.values() for command in plugins}
+    services_managed = [service for service in services_managed if service not in hosted_commands]
+    services_managed += [f"host-{host_name}" for host_name in command_hosts]
 manager_service_name = "twitch-manager.service"
 # Track the live status
 is_live = True  # Assume live on startup
@@ -112,7 +126,9 @@ def initialize_services():
     log_info("Initializing systemd services for all commands", command="system")
 
     # Set up services for all commands in services_managed
-    created_services = setup_services(services_managed)
+    created_services = setup_services([service for service in services_managed if not service.startswith("host-")])
+    if USE_COMMAND_HOST:
+        created_services += setup_host_services(command_hosts)
 
     # Build the service_map dictionary
     for service_name in created_services:
@@ -127,6 +143,23 @@ def initialize_services():
     return created_services
 
 
+def resolve_service_command(command_name):
+    """
+    Maps a command that runs inside a command host to the host that serves it.
+
+    Args:
+        command_name (str): Name of the command or service
+
+    Returns:
+        str: Name to manage in service_map
+    """
+    if USE_COMMAND_HOST:
+        for host_name, plugins in command_hosts.items():
+            if command_name in plugins:
+                return f"host-{host_name}"
+    return command_name
+
+
 def execute_command(command_name, action):
     """
     Manages a command by controlling its systemd service.
@@ -260,6 +293,7 @@ try:
                 action = message_obj["content"].split()[1] if len(message_obj["content"].split()) > 1 else None
                 service = message_obj["content"].split()[2] if len(message_obj["content"].split()) > 2 else None
 
+                service = resolve_service_command(service)
                 if service in services_managed:
                     execute_command(command_name=service, action=action)
                     continue
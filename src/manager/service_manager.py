@@ -66,6 +66,77 @@ WantedBy=multi-user.target
     print(f"Created service file: {service_path}")
     return service_path
 
+def create_host_service_file(host_name, plugins, project_dir):
+    """
+    Create a systemd service file for a command host that serves several commands.
+    
+    Args:
+        host_name (str): Name of the command host
+        plugins (list): Command names the host should load
+        project_dir (str): Path to the project directory
+        
+    Returns:
+        str: Path to the created service file
+    """
+    service_name = f"twitch-command-host-{host_name}.service"
+    service_path = os.path.join("/etc/systemd/system", service_name)
+    
+    # Get the Python interpreter path
+    python_path = sys.executable
+    plugin_args = " ".join(plugins)
+    
+    # Create service file content
+    service_content = f"""[Unit]
+Description=Twitch Bot Command Host - {host_name}
+After=network.target
+PartOf=twitch-manager.service
+
+[Service]
+Type=simple
+User=root
+WorkingDirectory={project_dir}
+ExecStart={python_path} -m module.command_host --name {host_name} {plugin_args}
+Restart=on-failure
+RestartSec=5
+StandardOutput=journal
+StandardError=journal
+
+[Install]
+WantedBy=multi-user.target
+"""
+    
+    # Write service file
+    with open(service_path, 'w') as f:
+        f.write(service_content)
+    
+    print(f"Created service file: {service_path}")
+    return service_path
+
+def setup_host_services(command_hosts):
+    """
+    Set up systemd services for command hosts.
+    
+    Args:
+        command_hosts (dict): Mapping of host name to the list of commands it serves
+        
+    Returns:
+        list: List of created service names
+    """
+    project_dir = os.getcwd()
+    created_services = []
+    
+    for host_name, plugins in command_hosts.items():
+        service_path = create_host_service_file(host_name, plugins, project_dir)
+        created_services.append(os.path.basename(service_path))
+    
+    if created_services:
+        try:
+            subprocess.run(["systemctl", "daemon-reload"], check=True)
+        except subprocess.CalledProcessError as e:
+            print(f"Error reloading systemd: {e}")
+    
+    return created_services
+
 def setup_services(services_list):
     """
     Set up systemd services for all commands in the services list.
@@ -242,12 +313,12 @@ if __name__ == "__main__":
     
     if action == "setup":
         # Example services list
-        test_services = ["chat_logger", "command_logger", "system_logger"]
+        test_services = ["message_ingest", "system_logger"]
         setup_services(test_services)
     
     elif action == "cleanup":
         # Example current services
-        current_services = ["twitch-command-chat_logger.service", "twitch-command-command_logger.service"]
+        current_services = ["twitch-command-message_ingest.service", "twitch-command-system_logger.service"]
         cleanup_services(current_services)
     
     elif action in ["start", "stop", "restart", "status"]:
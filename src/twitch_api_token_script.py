@@ -9,6 +9,8 @@ import requests
 from flask import Flask, request, jsonify
 from werkzeug.serving import run_simple
 
+from module.token_provider import notify_token_rotated
+
 # Construct the absolute path to the .env file
 env_path = os.path.join(os.path.dirname(__file__), '..', 'DONOTOPEN', '.env')
 # Load the environment variables from the .env file
@@ -60,6 +62,8 @@ def save_token(token_data):
 	# save token in redis as json
 	token_data = json.dumps(token_data)
 	redis_client_env.set("twitch_token", token_data)
+	# Let running processes reload the token from Redis
+	notify_token_rotated("twitch_token", redis_client_env)
 
 
 # Function to load the token from a JSON file